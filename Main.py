@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 from PySide6.QtWidgets import QApplication
 
 # Imposta environment
@@ -12,11 +13,18 @@ from services.document_service import DocumentService
 from services.deadline_service import DeadlineService
 from services.preferences_service import PreferencesService
 from services.supplier_service import SupplierService
+from services.autocomplete_service import get_autocomplete_index
+from services.categorizer_service import get_categorizer
+from services.text_index_service import get_text_index
+from services.change_log_service import get_change_log
 from translations_manager import get_translation_manager
 from ui_main import DashboardWindow
 from log_manager import LogManager
 
 if __name__ == "__main__":
+    # Necessario per i pool di processi (export, estrazione testo) nell'eseguibile pacchettizzato
+    multiprocessing.freeze_support()
+
     log_manager = LogManager()
     logger = log_manager.setup_logging()
     logger.info("🚀 Property Manager avviato")
@@ -27,6 +35,15 @@ if __name__ == "__main__":
     db_service = DatabaseService(logger=logger)
     db_service.initialize()
 
+    # Registro modifiche (trigger) per gli export incrementali
+    get_change_log(logger).ensure_schema()
+
+    # Indice autocompletamento (una query raggruppata, poi aggiornamenti incrementali)
+    get_autocomplete_index().build(logger)
+
+    # Categorizzatore automatico addestrato sullo storico (poi incrementale)
+    get_categorizer().train(logger)
+
     # Inizializza services (ora prendono solo logger)
     property_service = PropertyService(logger)
     transaction_service = TransactionService(logger)
@@ -34,6 +51,15 @@ if __name__ == "__main__":
     document_service = DocumentService(logger)
     supplier_service = SupplierService(logger)
 
+    # Primo avvio con l'indice documenti: indicizza i file già presenti in docs/
+    if document_service.index_is_empty():
+        document_service.rebuild_index()
+
+    # Testo dei documenti per la ricerca full-text (estrazione incrementale in background)
+    text_index = get_text_index(logger)
+    text_index.ensure_schema()
+    text_index.schedule()
+
     prefs_service = PreferencesService(logger)
     tm = get_translation_manager()
     tm.set_language(prefs_service.get_language())
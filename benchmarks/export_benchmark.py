@@ -0,0 +1,163 @@
+"""
+Benchmark degli export: righe al secondo e picco di memoria (RSS)
+
+Ogni misura gira in un processo separato, così il picco di RSS riportato
+dal sistema appartiene solo all'export misurato. Le transazioni sono
+sintetiche e generate al volo, quindi il benchmark non tocca il database.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.export_benchmark --rows 100000
+    python -m benchmarks.export_benchmark --portfolio 40 --rows 2000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+SERVICES = ["Luce", "Gas", "Acqua", "Condominio", "Affitto", "Manutenzione", "Tasse"]
+PROVIDERS = ["Enel", "Eni Plenitude", "Acea", "Amministratore Rossi", "Idraulico Bianchi", "Comune"]
+
+
+def generate_transactions(count, seed=42):
+    """Generatore di transazioni finte nel formato di Transaction.to_dict"""
+    rng = random.Random(seed)
+    for i in range(count):
+        kind = "Entrata" if rng.random() < 0.3 else "Uscita"
+        yield {
+            'id': i + 1,
+            'property_id': rng.randint(1, 20),
+            'supplier_id': None,
+            'date': f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2018, 2025)}",
+            'type': kind,
+            'amount': round(rng.uniform(5, 2500), 2),
+            'provider': rng.choice(PROVIDERS),
+            'service': rng.choice(SERVICES)
+        }
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux riporta KiB, macOS byte
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# Metodi confrontati: (etichetta, metodo di ExportService, input in lista?)
+ENGINES = {
+    'excel': ("export_to_excel", True),
+    'excel_stream': ("export_to_excel_stream", False),
+    'pdf': ("export_to_pdf", True),
+    'pdf_stream': ("export_to_pdf_stream", False),
+}
+
+
+def _run_engine(engine, rows):
+    """Eseguito nel processo figlio: una sola misura"""
+    from services.export_service import ExportService
+
+    method_name, needs_list = ENGINES[engine]
+    baseline_mb = _peak_rss_mb()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service = ExportService.__new__(ExportService)
+        service.exports_dir = tmp
+
+        start = time.perf_counter()
+        transactions = generate_transactions(rows)
+        if needs_list:
+            # Il motore in memoria riceve la lista completa, come da get_all
+            transactions = list(transactions)
+        path = getattr(service, method_name)(transactions)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+    return {
+        'engine': engine,
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed else 0,
+        'peak_rss_mb': _peak_rss_mb(),
+        'baseline_rss_mb': baseline_mb,
+        'file_mb': size / (1024 * 1024)
+    }
+
+
+def run(rows, engines):
+    results = []
+    for engine in engines:
+        # Un processo nuovo per misura: il picco RSS non si somma tra motori
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(_run_engine, engine, rows).result())
+    return results
+
+
+def run_portfolio(properties, rows_per_property, workers):
+    """
+    Scalabilità del batch di portafoglio: stessi report con 1..workers processi.
+    Misura solo l'impaginazione nei processi (render_property_report), senza database.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from services.export_worker import render_property_report, PORTFOLIO_ROW_FIELDS
+
+    rows = [tuple(t[field] for field in PORTFOLIO_ROW_FIELDS) for t in generate_transactions(rows_per_property)]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in range(1, workers + 1):
+            jobs = [{
+                'property_id': i,
+                'property_name': f"Proprietà {i}",
+                'owner': None,
+                'period_label': (None, None),
+                'formats': ('pdf', 'xlsx'),
+                'paths': {ext: os.path.join(tmp, f"{count}_{i}.{ext}") for ext in ('pdf', 'xlsx')}
+            } for i in range(properties)]
+
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=count, mp_context=multiprocessing.get_context("spawn")) as pool:
+                list(pool.map(render_property_report, jobs, [rows] * properties))
+            elapsed = time.perf_counter() - start
+            results.append((count, elapsed))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark export transazioni")
+    parser.add_argument("--rows", type=int, default=100000, help="numero di transazioni sintetiche")
+    parser.add_argument("--engine", action="append", choices=sorted(ENGINES),
+                        help="motore da misurare (ripetibile, default: tutti)")
+    parser.add_argument("--portfolio", type=int, metavar="N",
+                        help="misura invece il batch di portafoglio su N proprietà (--rows righe ciascuna)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processi massimi per --portfolio")
+    args = parser.parse_args(argv)
+
+    if args.portfolio:
+        print(f"{'processi':<10}{'secondi':>10}{'speedup':>10}")
+        results = run_portfolio(args.portfolio, args.rows, args.workers)
+        for count, elapsed in results:
+            print(f"{count:<10}{elapsed:>10.2f}{results[0][1] / elapsed:>10.2f}")
+        return
+
+    print(f"{'motore':<16}{'righe':>10}{'secondi':>10}{'righe/s':>12}{'RSS MB':>10}{'file MB':>10}")
+    for r in run(args.rows, args.engine or list(ENGINES)):
+        rss = f"{r['peak_rss_mb']:.1f}" if r['peak_rss_mb'] is not None else "n/d"
+        print(f"{r['engine']:<16}{r['rows']:>10}{r['seconds']:>10.2f}"
+              f"{r['rows_per_second']:>12.0f}{rss:>10}{r['file_mb']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark dell'acquisizione documenti: MB/s dell'ingest nell'archivio blob
+
+Confronta il percorso precedente (copy2 + rilettura per l'hash) con
+DocumentService._ingest_blob nelle sue varianti: copy_file_range, sendfile
+e copia a blocchi. I file sono sintetici (contenuto casuale, niente
+deduplicazione) e il benchmark non tocca il database.
+
+Uso (dalla radice del progetto):
+    python -m benchmarks.ingest_benchmark --files 10 --size 19
+    python -m benchmarks.ingest_benchmark --engine blocchi --cold
+"""
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.document_service import DocumentService  # noqa: E402
+
+
+class _BenchService(DocumentService):
+    """DocumentService senza database né config, con la copia lato kernel scelta"""
+
+    def __init__(self, blobs_dir, engine):
+        self.logger = logging.getLogger("ingest_benchmark")
+        self.blobs_dir = blobs_dir
+        self.engine = engine
+
+    def _kernel_copy(self, src_fd, dst_fd):
+        if self.engine == 'copy_file_range':
+            if not hasattr(os, 'copy_file_range'):
+                return None
+            return lambda count, position: os.copy_file_range(src_fd, dst_fd, count, position, position)
+        if self.engine == 'sendfile':
+            if not hasattr(os, 'sendfile'):
+                return None
+
+            def kernel_copy(count, position):
+                os.lseek(dst_fd, position, os.SEEK_SET)
+                return os.sendfile(dst_fd, src_fd, position, count)
+            return kernel_copy
+        return None
+
+
+def _ingest(service, source_path):
+    with open(source_path, 'rb') as src:
+        header = src.read(DocumentService.HEADER_SIZE)
+        return service._ingest_blob(src, header, os.fstat(src.fileno()))
+
+
+def _copy_and_hash(blobs_dir, source_path):
+    """Percorso precedente: copia con copy2 e seconda lettura completa per l'hash"""
+    dest_path = os.path.join(blobs_dir, os.path.basename(source_path))
+    shutil.copy2(source_path, dest_path)
+    sha256 = hashlib.sha256()
+    with open(dest_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DocumentService.CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    os.path.getsize(dest_path)
+    return sha256.hexdigest()
+
+
+ENGINES = ('copia+hash', 'copy_file_range', 'sendfile', 'blocchi')
+
+
+def _drop_caches(paths):
+    """Toglie i sorgenti dalla page cache (solo dove posix_fadvise esiste)"""
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+
+def run(files, size_mb, engines, cold=False):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = []
+        for i in range(files):
+            path = os.path.join(tmp, f"source_{i}.pdf")
+            with open(path, 'wb') as f:
+                f.write(b'%PDF-1.4\n')
+                f.write(os.urandom(size_mb * 1024 * 1024))
+            sources.append(path)
+        total_mb = sum(os.path.getsize(path) for path in sources) / (1024 * 1024)
+
+        for engine in engines:
+            blobs_dir = os.path.join(tmp, f"blobs_{engine}")
+            os.makedirs(blobs_dir)
+            if cold:
+                _drop_caches(sources)
+
+            start = time.perf_counter()
+            for path in sources:
+                if engine == 'copia+hash':
+                    _copy_and_hash(blobs_dir, path)
+                else:
+                    _ingest(_BenchService(blobs_dir, engine), path)
+            elapsed = time.perf_counter() - start
+
+            results.append({
+                'engine': engine,
+                'seconds': elapsed,
+                'mb_per_second': total_mb / elapsed if elapsed else 0
+            })
+            shutil.rmtree(blobs_dir, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark acquisizione documenti")
+    parser.add_argument("--files", type=int, default=10, help="numero di file sintetici")
+    parser.add_argument("--size", type=int, default=19, help="dimensione di ogni file (MB)")
+    parser.add_argument("--engine", action="append", choices=ENGINES,
+                        help="variante da misurare (ripetibile, default: tutte)")
+    parser.add_argument("--cold", action="store_true",
+                        help="sorgenti fuori dalla page cache prima di ogni misura")
+    args = parser.parse_args(argv)
+
+    print(f"{'variante':<18}{'secondi':>10}{'MB/s':>10}")
+    for r in run(args.files, args.size, args.engine or list(ENGINES), args.cold):
+        print(f"{r['engine']:<18}{r['seconds']:>10.2f}{r['mb_per_second']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
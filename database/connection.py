@@ -6,6 +6,9 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
 from database.models import Base
 import os
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
 
@@ -16,6 +19,17 @@ class DatabaseConnection:
     _engine = None
     _session_factory = None
 
+    # Aperto normalmente; chiuso durante un ripristino: get_session attende.
+    # Le sessioni aperte (get_session senza close_session) sono contate sotto
+    # la stessa condition: quiesce attende che scendano a zero
+    _gate = threading.Condition()
+    _gate_open = True
+    _open_sessions = 0
+    _thread_sessions = threading.local()
+
+    # Ultima richiesta di sessione (per la manutenzione nei momenti di inattività)
+    _last_activity = time.monotonic()
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
@@ -114,20 +128,96 @@ class DatabaseConnection:
                     return f"{parts[0]}://{user}:***@{rest}"
         return conn_str
 
+    def database_path(self):
+        """Percorso del file SQLite in uso (None se il database non è SQLite su file)"""
+        if self._engine is None or self._engine.dialect.name != 'sqlite':
+            return None
+        database = self._engine.url.database
+        if not database or database == ':memory:':
+            return None
+        return database
+
     def get_session(self):
         """Ritorna sessione database thread-safe"""
-        if self._session_factory is None:
-            raise RuntimeError("Database non inizializzato! Chiama initialize() prima.")
-        return self._session_factory()
+        depth = getattr(self._thread_sessions, 'depth', 0)
+        with self._gate:
+            # Ripristino in corso: la sessione verrà aperta sul nuovo database.
+            # Un thread che ha già una sessione aperta non attende (la sospensione
+            # aspetta proprio che la chiuda)
+            while not DatabaseConnection._gate_open and depth == 0:
+                self._gate.wait()
+            if self._session_factory is None:
+                raise RuntimeError("Database non inizializzato! Chiama initialize() prima.")
+            session = self._session_factory()
+            DatabaseConnection._open_sessions += 1
+        self._thread_sessions.depth = depth + 1
+        self._last_activity = time.monotonic()
+        return session
+
+    def idle_seconds(self):
+        """Secondi dall'ultima sessione aperta (0 se qualche sessione è ancora aperta)"""
+        if DatabaseConnection._open_sessions > 0:
+            return 0
+        return time.monotonic() - self._last_activity
 
     def close_session(self, session):
         """Chiude sessione"""
         if session:
-            session.close()
+            try:
+                session.close()
+            finally:
+                depth = getattr(self._thread_sessions, 'depth', 0)
+                if depth > 0:
+                    self._thread_sessions.depth = depth - 1
+                    with self._gate:
+                        DatabaseConnection._open_sessions -= 1
+                        self._gate.notify_all()
 
     def shutdown(self):
         """Chiude tutte le connessioni"""
         if self._session_factory:
             self._session_factory.remove()
         if self._engine:
-            self._engine.dispose()
\ No newline at end of file
+            self._engine.dispose()
+
+    @contextmanager
+    def quiesce(self, timeout=15):
+        """
+        Sospende l'accesso al database (es. per sostituirne il file)
+
+        Le nuove get_session attendono; si aspetta che tutte le sessioni
+        aperte vengano chiuse (non basta il pool: una sessione appena creata
+        non ha ancora una connessione), poi il pool viene chiuso. Se nel
+        frattempo il file è stato sostituito, l'engine va ricreato con
+        reinitialize() prima di riaprire l'accesso.
+
+        Raises:
+            TimeoutError: se qualche sessione resta aperta oltre timeout secondi
+        """
+        deadline = time.monotonic() + timeout
+        with self._gate:
+            DatabaseConnection._gate_open = False
+            try:
+                while DatabaseConnection._open_sessions > 0:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Database ancora in uso, riprovare tra qualche istante")
+                    self._gate.wait(remaining)
+            except BaseException:
+                DatabaseConnection._gate_open = True
+                self._gate.notify_all()
+                raise
+        try:
+            self.shutdown()
+            yield
+        finally:
+            with self._gate:
+                DatabaseConnection._gate_open = True
+                self._gate.notify_all()
+
+    def reinitialize(self, logger):
+        """Ricrea engine e session factory (dopo la sostituzione del file del database)"""
+        self.shutdown()
+        self._engine = None
+        self._session_factory = None
+        self.initialize(logger)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -17,6 +17,7 @@ class Property(Base):
     # Relazioni
     transactions = relationship("Transaction", back_populates="property", cascade="all, delete-orphan")
     deadlines = relationship("Deadline", back_populates="property", cascade="all, delete-orphan")
+    documents = relationship("Document", back_populates="property", cascade="all, delete-orphan")
 
     def to_dict(self):
         return {
@@ -48,6 +49,9 @@ class Transaction(Base):
     # AGGIUNGI QUESTA RELAZIONE:
     supplier = relationship("Supplier")
 
+    # Documenti allegati (restano indicizzati se la transazione viene eliminata)
+    documents = relationship("Document", back_populates="transaction")
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -61,6 +65,299 @@ class Transaction(Base):
         }
 
 
+class Document(Base):
+    """Indice dei file salvati in docs/, collegati alla transazione che li ha generati"""
+    __tablename__ = 'documents'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    transaction_id = Column(Integer, ForeignKey('transactions.id'), nullable=True, index=True)
+    property_id = Column(Integer, ForeignKey('properties.id'), nullable=False)
+    path = Column(String(500), nullable=False, unique=True)
+    folder = Column(String(500), nullable=False, default="")  # Relativa alla cartella proprietà, separatore '/'
+    name = Column(String(255), nullable=False)
+    size = Column(Integer, nullable=False, default=0)  # Byte
+    mtime = Column(Float, nullable=True)  # Timestamp modifica del file
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 esadecimale
+    mime = Column(String(100), nullable=True)
+    period = Column(String(10), nullable=True)  # Formato: yyyy-QN
+    service = Column(String(200), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index('ix_documents_property_folder', 'property_id', 'folder'),)
+
+    # Relazioni
+    property = relationship("Property", back_populates="documents")
+    transaction = relationship("Transaction", back_populates="documents")
+    text = relationship("DocumentText", back_populates="document", uselist=False,
+                        cascade="all, delete-orphan")
+    archive = relationship("DocumentArchive", back_populates="document", uselist=False,
+                           cascade="all, delete-orphan")
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'transaction_id': self.transaction_id,
+            'property_id': self.property_id,
+            'path': self.path,
+            'folder': self.folder,
+            'name': self.name,
+            'size': self.size,
+            'mtime': self.mtime,
+            'content_hash': self.content_hash,
+            'mime': self.mime,
+            'period': self.period,
+            'service': self.service,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class DocumentText(Base):
+    """Testo estratto da un documento (indicizzato full-text in document_texts_fts su SQLite)"""
+    __tablename__ = 'document_texts'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    document_id = Column(Integer, ForeignKey('documents.id'), nullable=False, unique=True)
+    content_hash = Column(String(64), nullable=True)  # Hash del contenuto estratto (salta se invariato)
+    keywords = Column(Text, nullable=True)  # Nome file, servizio, fornitore, mese/anno
+    text = Column(Text, nullable=True)
+    error = Column(String(500), nullable=True)
+    extracted_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relazione
+    document = relationship("Document", back_populates="text")
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'document_id': self.document_id,
+            'content_hash': self.content_hash,
+            'keywords': self.keywords,
+            'error': self.error,
+            'extracted_at': self.extracted_at.isoformat() if self.extracted_at else None
+        }
+
+
+class DocumentArchive(Base):
+    """Posizione di un documento archiviato in un pacchetto zip (proprietà + anno)"""
+    __tablename__ = 'document_archives'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    document_id = Column(Integer, ForeignKey('documents.id'), nullable=False, unique=True)
+    pack = Column(String(500), nullable=False, index=True)  # Es. docs/property_1/.archive/2021.zip
+    member = Column(String(500), nullable=False)  # Nome del file nel pacchetto
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relazione
+    document = relationship("Document", back_populates="archive")
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'document_id': self.document_id,
+            'pack': self.pack,
+            'member': self.member,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None
+        }
+
+
+class OrphanFolder(Base):
+    """Cartella documenti senza proprietà in coda di eliminazione (stato persistente, riprendibile)"""
+    __tablename__ = 'orphan_folders'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    property_id = Column(Integer, nullable=True)  # Proprietà non più esistente
+    path = Column(String(500), nullable=False, unique=True)
+    bytes_total = Column(Integer, nullable=True)  # Stima dall'indice (None se sconosciuta)
+    files_total = Column(Integer, nullable=True)
+    bytes_deleted = Column(Integer, nullable=False, default=0)
+    files_deleted = Column(Integer, nullable=False, default=0)
+    status = Column(String(20), nullable=False, default='pending')  # pending | deleting | done | error
+    error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'property_id': self.property_id,
+            'path': self.path,
+            'bytes_total': self.bytes_total,
+            'files_total': self.files_total,
+            'bytes_deleted': self.bytes_deleted,
+            'files_deleted': self.files_deleted,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class ExportJob(Base):
+    """Export eseguito in background: coda, esito e tempi (storico degli export)"""
+    __tablename__ = 'export_jobs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    format = Column(String(10), nullable=False)  # pdf | xlsx
+    property_id = Column(Integer, nullable=True)  # None = tutte le proprietà
+    property_name = Column(String(200), nullable=True)
+    start_date = Column(String(10), nullable=True)  # yyyy-MM-dd
+    end_date = Column(String(10), nullable=True)
+    status = Column(String(20), nullable=False, default='queued')  # queued | running | done | error | cancelled
+    filepath = Column(String(500), nullable=True)
+    rows = Column(Integer, nullable=True)
+    error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    duration = Column(Float, nullable=True)  # Secondi di elaborazione nel processo di lavoro
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'format': self.format,
+            'property_id': self.property_id,
+            'property_name': self.property_name,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'status': self.status,
+            'filepath': self.filepath,
+            'rows': self.rows,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration': self.duration
+        }
+
+
+class ChangeLog(Base):
+    """
+    Registro delle modifiche (change data capture) a transazioni, scadenze,
+    fornitori e proprietà, scritto da trigger SQLite: seq è il watermark
+    degli export incrementali
+    """
+    __tablename__ = 'change_log'
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    table_name = Column(String(50), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    op = Column(String(1), nullable=False)  # I | U | D
+    property_id = Column(Integer, nullable=True)
+    period = Column(String(7), nullable=True)  # yyyy-MM della riga (None per fornitori e proprietà)
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+    # AUTOINCREMENT: seq mai riutilizzati, anche dopo la pulizia del registro
+    __table_args__ = (
+        Index('ix_change_log_table_seq', 'table_name', 'seq'),
+        {'sqlite_autoincrement': True}
+    )
+
+
+class ExportFragment(Base):
+    """Frammento mensile in cache di un export CSV, valido finché il mese non cambia nel change_log"""
+    __tablename__ = 'export_fragments'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    dataset = Column(String(20), nullable=False)
+    property_id = Column(Integer, nullable=False, default=0)  # 0 = tutte le proprietà
+    period = Column(String(7), nullable=False)  # yyyy-MM
+    format = Column(String(10), nullable=False)  # csv | csv.gz
+    seq = Column(Integer, nullable=False)  # Ultimo seq del change_log incluso nel frammento
+    rows = Column(Integer, nullable=False, default=0)
+    path = Column(String(500), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint('dataset', 'property_id', 'period', 'format',
+                                       name='uq_export_fragment'),)
+
+
+class ExportWatermark(Base):
+    """Ultimo seq del change_log esportato da un export incrementale"""
+    __tablename__ = 'export_watermarks'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    dataset = Column(String(20), nullable=False)
+    property_id = Column(Integer, nullable=False, default=0)  # 0 = tutte le proprietà
+    seq = Column(Integer, nullable=False, default=0)
+    filepath = Column(String(500), nullable=True)
+    exported_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint('dataset', 'property_id', name='uq_export_watermark'),)
+
+
+class ImportProfile(Base):
+    """Profilo di mappatura delle colonne per l'import degli estratti conto CSV"""
+    __tablename__ = 'import_profiles'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(100), nullable=False, unique=True)
+    delimiter = Column(String(5), nullable=True)  # None = rilevato dal file
+    encoding = Column(String(20), nullable=False, default='utf-8-sig')
+    skip_rows = Column(Integer, nullable=False, default=0)  # Righe prima dell'intestazione
+    date_column = Column(String(100), nullable=False)
+    amount_column = Column(String(100), nullable=True)  # Importo con segno, oppure dare/avere
+    debit_column = Column(String(100), nullable=True)
+    credit_column = Column(String(100), nullable=True)
+    counterparty_column = Column(String(100), nullable=True)
+    description_column = Column(String(100), nullable=True)
+    date_format = Column(String(20), nullable=False, default='dd/MM/yyyy')
+    decimal_separator = Column(String(1), nullable=False, default=',')
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'delimiter': self.delimiter,
+            'encoding': self.encoding,
+            'skip_rows': self.skip_rows,
+            'date_column': self.date_column,
+            'amount_column': self.amount_column,
+            'debit_column': self.debit_column,
+            'credit_column': self.credit_column,
+            'counterparty_column': self.counterparty_column,
+            'description_column': self.description_column,
+            'date_format': self.date_format,
+            'decimal_separator': self.decimal_separator
+        }
+
+
+class MaintenanceRun(Base):
+    """Esecuzione di un'operazione di manutenzione del database: tempi e spazio recuperato"""
+    __tablename__ = 'maintenance_runs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    task = Column(String(30), nullable=False)  # optimize | analyze | incremental_vacuum | vacuum | integrity_check
+    trigger = Column(String(20), nullable=False, default='pianificato')  # pianificato | manuale
+    status = Column(String(20), nullable=False)  # ok | error
+    message = Column(String(500), nullable=True)
+    size_before = Column(Integer, nullable=True)  # Byte del file prima dell'operazione
+    size_after = Column(Integer, nullable=True)
+    free_pages_before = Column(Integer, nullable=True)  # freelist_count
+    free_pages_after = Column(Integer, nullable=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    duration = Column(Float, nullable=True)  # Secondi
+
+    __table_args__ = (Index('ix_maintenance_runs_task_started', 'task', 'started_at'),)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'task': self.task,
+            'trigger': self.trigger,
+            'status': self.status,
+            'message': self.message,
+            'size_before': self.size_before,
+            'size_after': self.size_after,
+            'saved': (self.size_before - self.size_after)
+            if self.size_before is not None and self.size_after is not None else None,
+            'free_pages_before': self.free_pages_before,
+            'free_pages_after': self.free_pages_after,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'duration': self.duration
+        }
+
+
 class Deadline(Base):
     __tablename__ = 'deadlines'
 
@@ -75,6 +372,11 @@ class Deadline(Base):
     # Relazione
     property = relationship("Property", back_populates="deadlines")
 
+    # Ricorrenza opzionale (una sola regola per scadenza)
+    recurrence = relationship("DeadlineRecurrence", back_populates="deadline", uselist=False,
+                              cascade="all, delete-orphan")
+    occurrences = relationship("DeadlineOccurrence", back_populates="deadline", cascade="all, delete-orphan")
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -87,6 +389,51 @@ class Deadline(Base):
         }
 
 
+class DeadlineRecurrence(Base):
+    """Regola di ricorrenza di una scadenza (stile RRULE), espansa al volo"""
+    __tablename__ = 'deadline_recurrences'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    deadline_id = Column(Integer, ForeignKey('deadlines.id'), nullable=False, unique=True)
+    frequency = Column(String(20), nullable=False)  # 'monthly', 'quarterly', 'yearly'
+    interval = Column(Integer, nullable=False, default=1)  # Ogni N periodi
+    until = Column(String(20), nullable=True)  # Formato: yyyy-MM-dd (inclusa), None = senza fine
+
+    # Relazione
+    deadline = relationship("Deadline", back_populates="recurrence")
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'deadline_id': self.deadline_id,
+            'frequency': self.frequency,
+            'interval': self.interval,
+            'until': self.until
+        }
+
+
+class DeadlineOccurrence(Base):
+    """Override per singola occorrenza di una scadenza ricorrente (es. completata)"""
+    __tablename__ = 'deadline_occurrences'
+    __table_args__ = (UniqueConstraint('deadline_id', 'occurrence_date'),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    deadline_id = Column(Integer, ForeignKey('deadlines.id'), nullable=False, index=True)
+    occurrence_date = Column(String(20), nullable=False)  # Formato: yyyy-MM-dd
+    completed = Column(Boolean, default=True)
+
+    # Relazione
+    deadline = relationship("Deadline", back_populates="occurrences")
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'deadline_id': self.deadline_id,
+            'occurrence_date': self.occurrence_date,
+            'completed': self.completed
+        }
+
+
 class Supplier(Base):
     __tablename__ = 'suppliers'
 
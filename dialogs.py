@@ -1,25 +1,131 @@
 # dialogs.py
 import os
 import shutil
+import threading
 
-from PySide6.QtCore import Qt, QDate, QPoint, QUrl
-from PySide6.QtGui import QIcon, QDesktopServices
+from PySide6.QtCore import Qt, QDate, QPoint, QUrl, QStringListModel, QObject, QTimer, QThread, Signal
+from PySide6.QtGui import QIcon, QDesktopServices, QPixmap
 from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QLabel, QPushButton, QMessageBox,
     QFileDialog, QListWidget, QFormLayout, QLineEdit, QComboBox, QDialogButtonBox,
     QDateEdit, QWidget, QHBoxLayout, QSizePolicy, QGridLayout, QFrame, QTextEdit, QRadioButton, QButtonGroup, QGroupBox,
-    QListWidgetItem
+    QListWidgetItem, QCompleter, QCheckBox, QTableWidget, QTableWidgetItem, QHeaderView, QProgressDialog, QInputDialog
 )
 
 from styles import COLORE_SECONDARIO, COLORE_WIDGET_2, COLORE_RIGA_1, COLORE_ITEM_HOVER, default_button_main_header, \
     default_aggiungi_button, default_selector_date_export, default_export_button, COLORE_ERROR, default_dialog_style, \
     COLORE_ITEM_SELEZIONATO
-from validation_utils import parse_decimal, validate_required_text, validate_date, ValidationError
+from validation_utils import parse_decimal, validate_required_text, validate_date, ValidationError, \
+    validate_metadata
+from services.autocomplete_service import get_autocomplete_index
+from services.backup_service import get_backup_service
+from services.data_export_service import DataExportService
+from services.categorizer_service import get_categorizer
+from services.export_job_service import get_export_jobs
+from services.maintenance_service import get_maintenance_service, MaintenanceError
+from services.portfolio_report_service import PortfolioReportService
+from services.statement_import_service import StatementImportService, StatementImportError, DATE_FORMATS
+from services.thumbnail_service import get_thumbnail_service
 
 
 DOCS_DIR = "docs"
 
 
+class TrieCompleter(QCompleter):
+    """Completer alimentato dall'indice in memoria: nessuna query SQL per tasto premuto"""
+
+    def __init__(self, field, parent=None):
+        self._model = QStringListModel()
+        super().__init__(self._model, parent)
+        self.field = field
+        self.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.setCompletionMode(QCompleter.CompletionMode.PopupCompletion)
+        self.setModelSorting(QCompleter.ModelSorting.UnsortedModel)
+
+    def update_prefix(self, text):
+        """Aggiorna i suggerimenti (già ordinati per frequenza) per il testo digitato"""
+        self._model.setStringList(get_autocomplete_index().suggest(self.field, text))
+        if text:
+            self.setCompletionPrefix(text)
+            self.complete()
+
+
+def attach_autocomplete(widget, field):
+    """
+    Collega un TrieCompleter a un QLineEdit o a un QComboBox editabile
+
+    Args:
+        widget: QLineEdit o QComboBox editabile
+        field: Campo dell'indice ('service', 'provider', 'category')
+    """
+    completer = TrieCompleter(field, widget)
+    widget.setCompleter(completer)
+    line_edit = widget.lineEdit() if isinstance(widget, QComboBox) else widget
+    line_edit.textEdited.connect(completer.update_prefix)
+    return completer
+
+
+class LazyThumbnailLoader(QObject):
+    """
+    Carica le miniature solo per le righe visibili di una QListWidget
+
+    Le righe registrano una QLabel segnaposto; allo scroll (e dopo il primo
+    layout) vengono richieste le miniature delle righe entrate nel viewport.
+    """
+
+    def __init__(self, list_widget, size=None):
+        super().__init__(list_widget)
+        self.list_widget = list_widget
+        self.service = get_thumbnail_service()
+        self.size = size or self.service.DEFAULT_SIZE
+        self._rows = []          # [item, label, path, content_hash, requested]
+        self._waiting = {}       # key -> [label]
+
+        self.service.thumbnail_ready.connect(self._on_ready, Qt.ConnectionType.QueuedConnection)
+        list_widget.verticalScrollBar().valueChanged.connect(self.load_visible)
+
+    def register(self, item, label, path, content_hash=None):
+        if self.service.is_supported(path):
+            self._rows.append([item, label, path, content_hash, False])
+
+    def reset(self):
+        """Da chiamare quando la lista viene svuotata"""
+        self._rows = []
+        self._waiting = {}
+
+    def schedule(self):
+        """Carica le righe visibili dopo il prossimo layout"""
+        QTimer.singleShot(0, self.load_visible)
+
+    def load_visible(self, *_):
+        viewport = self.list_widget.viewport().rect()
+        for row in self._rows:
+            item, label, path, content_hash, requested = row
+            if requested or not self.list_widget.visualItemRect(item).intersects(viewport):
+                continue
+            row[4] = True
+            key, image = self.service.request(path, content_hash, self.size)
+            if image is not None:
+                self._apply(label, image)
+            else:
+                self._waiting.setdefault(key, []).append(label)
+
+    def _on_ready(self, key, image):
+        for label in self._waiting.pop(key, []):
+            if not image.isNull():
+                self._apply(label, image)
+
+    def _apply(self, label, image):
+        try:
+            label.setPixmap(QPixmap.fromImage(image).scaled(
+                label.width(), label.height(),
+                Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+            ))
+            label.setText("")
+        except RuntimeError:
+            pass  # Riga già distrutta (lista ricaricata)
+
+
 class DocumentMetadataDialog(QDialog):
     """Dialog per inserire i metadati del documento CON VALIDAZIONE"""
 
@@ -39,11 +145,14 @@ class DocumentMetadataDialog(QDialog):
         # Emittente
         self.emittente_input = QLineEdit()
         self.emittente_input.setPlaceholderText("Es: ENEL Energia")
+        attach_autocomplete(self.emittente_input, 'provider')
+        self.emittente_input.editingFinished.connect(self.suggest_service)
         layout.addRow("Fornitore/Emittente:", self.emittente_input)
 
         # servizio
         self.service_input = QLineEdit()
         self.service_input.setPlaceholderText("Es: Bolletta Luce")
+        attach_autocomplete(self.service_input, 'service')
         layout.addRow("Servizio:", self.service_input)
 
         # Importo
@@ -104,6 +213,15 @@ class DocumentMetadataDialog(QDialog):
         except ValidationError as e:
             QMessageBox.warning(self, "⚠️ Validazione fallita", str(e))
 
+    def suggest_service(self):
+        """Precompila il servizio con la categoria predetta dallo storico"""
+        if self.service_input.text().strip():
+            return
+        prediction = get_categorizer().predict(self.emittente_input.text())
+        if prediction['category']:
+            self.service_input.setText(prediction['category'])
+            self.service_input.selectAll()
+
     def get_data(self):
         """Restituisce i dati validati"""
         return {
@@ -115,6 +233,118 @@ class DocumentMetadataDialog(QDialog):
         }
 
 
+class BatchMetadataDialog(QDialog):
+    """Dialog per compilare in un'unica tabella i metadati di più documenti"""
+
+    COLUMNS = [
+        ("File", None),
+        ("Data (dd/MM/yyyy)", 'data_fattura'),
+        ("Tipo", 'tipo'),
+        ("Importo (€)", 'importo'),
+        ("Fornitore/Emittente", 'provider'),
+        ("Servizio", 'service')
+    ]
+
+    def __init__(self, metadata_by_path, parent=None):
+        """
+        Args:
+            metadata_by_path: dict path -> metadati precompilati (da CSV/sidecar, anche vuoti)
+        """
+        super().__init__(parent)
+        self.setWindowTitle(f"Metadati per {len(metadata_by_path)} documenti")
+        self.setMinimumSize(900, 500)
+        self.setStyleSheet(default_dialog_style)
+
+        self.paths = list(metadata_by_path)
+        self.validated = []
+
+        layout = QVBoxLayout(self)
+
+        info = QLabel(
+            "Completa i campi mancanti. I valori letti da CSV o file sidecar sono già inseriti.\n"
+            "Il servizio viene suggerito dallo storico quando inserisci il fornitore."
+        )
+        info.setWordWrap(True)
+        layout.addWidget(info)
+
+        self.table = QTableWidget(len(self.paths), len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels([label for label, _ in self.COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+
+        default_date = QDate.currentDate().toString("dd/MM/yyyy")
+        for row, path in enumerate(self.paths):
+            metadata = metadata_by_path[path]
+
+            file_item = QTableWidgetItem(os.path.basename(path))
+            file_item.setFlags(file_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+            file_item.setToolTip(path)
+            self.table.setItem(row, 0, file_item)
+
+            type_box = QComboBox()
+            type_box.addItems(["Uscita", "Entrata"])
+            if metadata.get('tipo') in ("Entrata", "Uscita"):
+                type_box.setCurrentText(metadata['tipo'])
+            self.table.setCellWidget(row, 2, type_box)
+
+            for column, (_, key) in enumerate(self.COLUMNS):
+                if key in (None, 'tipo'):
+                    continue
+                value = metadata.get(key, default_date if key == 'data_fattura' else "")
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+        self.table.itemChanged.connect(self.suggest_service)
+        layout.addWidget(self.table)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def _row_data(self, row):
+        data = {'tipo': self.table.cellWidget(row, 2).currentText()}
+        for column, (_, key) in enumerate(self.COLUMNS):
+            if key in (None, 'tipo'):
+                continue
+            item = self.table.item(row, column)
+            data[key] = item.text().strip() if item else ""
+        return data
+
+    def suggest_service(self, item):
+        """Precompila il servizio dalla predizione sul fornitore"""
+        if item.column() != 4:
+            return
+        service_item = self.table.item(item.row(), 5)
+        if service_item and service_item.text().strip():
+            return
+        prediction = get_categorizer().predict(item.text())
+        if prediction['category']:
+            self.table.setItem(item.row(), 5, QTableWidgetItem(prediction['category']))
+
+    def accept(self):
+        """Valida tutte le righe e segnala la prima non valida"""
+        validated = []
+        for row, path in enumerate(self.paths):
+            data = self._row_data(row)
+            try:
+                validate_metadata(data)
+            except ValidationError as e:
+                self.table.selectRow(row)
+                QMessageBox.warning(
+                    self,
+                    "⚠️ Validazione fallita",
+                    f"Riga {row + 1} ({os.path.basename(path)}):\n\n{e}"
+                )
+                return
+            validated.append((path, data))
+
+        self.validated = validated
+        super().accept()
+
+    def get_data(self):
+        """Lista di (path, metadati) nello stesso formato di DocumentMetadataDialog"""
+        return self.validated
+
+
 class AddDeadlineDialog(QDialog):
     """Dialog per inserire una nuova scadenza CON VALIDAZIONE"""
 
@@ -153,6 +383,32 @@ class AddDeadlineDialog(QDialog):
                 self.property_combo.addItem(prop["name"], prop["id"])
         layout.addRow("Proprietà:", self.property_combo)
 
+        # Ricorrenza (opzionale)
+        self.recurrence_combo = QComboBox()
+        self.recurrence_combo.addItem("Nessuna", None)
+        self.recurrence_combo.addItem("Mensile", "monthly")
+        self.recurrence_combo.addItem("Trimestrale", "quarterly")
+        self.recurrence_combo.addItem("Annuale", "yearly")
+        layout.addRow("Ripetizione:", self.recurrence_combo)
+
+        # Data fine ricorrenza
+        until_layout = QHBoxLayout()
+        self.until_check = QCheckBox("Fino al")
+        self.until_date = QDateEdit()
+        self.until_date.setDisplayFormat("dd/MM/yyyy")
+        self.until_date.setCalendarPopup(True)
+        self.until_date.setDate(QDate.currentDate().addYears(1))
+        self.until_date.setEnabled(False)
+        self.until_check.toggled.connect(self.until_date.setEnabled)
+        until_layout.addWidget(self.until_check)
+        until_layout.addWidget(self.until_date)
+        layout.addRow("Fine ripetizione:", until_layout)
+
+        self.until_check.setEnabled(False)
+        self.recurrence_combo.currentIndexChanged.connect(
+            lambda: self.until_check.setEnabled(self.recurrence_combo.currentData() is not None)
+        )
+
         # Pulsanti
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         layout.addWidget(buttons)
@@ -173,6 +429,12 @@ class AddDeadlineDialog(QDialog):
             # Valida data
             validate_date(self.due_date.date(), "Data scadenza")
 
+            # Valida fine ricorrenza
+            if self.recurrence_combo.currentData() and self.until_check.isChecked():
+                validate_date(self.until_date.date(), "Fine ripetizione")
+                if self.until_date.date() < self.due_date.date():
+                    raise ValidationError("La fine della ripetizione deve seguire la data di scadenza")
+
             super().accept()
 
         except ValidationError as e:
@@ -183,7 +445,10 @@ class AddDeadlineDialog(QDialog):
             "title": self.title_input.text().strip(),
             "description": self.description_input.toPlainText().strip() or None,
             "due_date": self.due_date.date().toString("yyyy-MM-dd"),
-            "property_id": self.property_combo.currentData()
+            "property_id": self.property_combo.currentData(),
+            "frequency": self.recurrence_combo.currentData(),
+            "until": self.until_date.date().toString("yyyy-MM-dd")
+            if self.recurrence_combo.currentData() and self.until_check.isChecked() else None
         }
 
 class CustomTitleBar(QWidget):
@@ -279,6 +544,23 @@ class CustomTitleBar(QWidget):
             event.accept()
 
 
+class DeadlineLabel(QLabel):
+    """Scadenza nella cella del calendario: click = completa o riapri"""
+
+    def __init__(self, deadline, parent_calendar):
+        icon = "✅" if deadline.get('completed') else ("🔁" if deadline.get('recurring') else "📌")
+        super().__init__(f"{icon} {deadline['title']}")
+        self.deadline = deadline
+        self.parent_calendar = parent_calendar
+        self.setToolTip("Clicca per riaprire la scadenza" if deadline.get('completed')
+                        else "Clicca per segnare la scadenza come completata")
+
+    def mousePressEvent(self, event):
+        # Evento consumato: non arriva alla cella (che aprirebbe una nuova scadenza)
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.parent_calendar.toggle_deadline(self.deadline)
+
+
 class ClickableDayCell(QFrame):
     """Cella giorno cliccabile per aggiungere scadenze"""
 
@@ -317,11 +599,12 @@ class ClickableDayCell(QFrame):
         # Mostra scadenze
         if deadlines:
             for deadline in deadlines:
-                deadline_label = QLabel(f"📌 {deadline['title']}")
-                deadline_label.setStyleSheet("""
+                deadline_label = DeadlineLabel(deadline, parent_calendar)
+                background = "rgba(39, 174, 96, 0.8)" if deadline.get('completed') else "rgba(231, 76, 60, 0.8)"
+                deadline_label.setStyleSheet(f"""
                     font-size: 10px; 
                     color: white; 
-                    background-color: rgba(231, 76, 60, 0.8); 
+                    background-color: {background}; 
                     padding: 2px 4px; 
                     border-radius: 3px;
                     margin-top: 2px;
@@ -411,7 +694,9 @@ class PlannerCalendarWidget(QWidget):
                 title=data["title"],
                 description=data["description"],
                 due_date=data["due_date"],
-                property_id=data["property_id"]
+                property_id=data["property_id"],
+                frequency=data["frequency"],
+                until=data["until"]
             )
 
             if deadline_id:
@@ -426,6 +711,33 @@ class PlannerCalendarWidget(QWidget):
         """ Aggiunge scadenza per una data specifica (chiamato dal click sulla cella)"""
         self.add_deadline(preset_date=date_str)
 
+    def toggle_deadline(self, deadline):
+        """Completa o riapre una scadenza; per le ricorrenti solo l'occorrenza cliccata"""
+        completed = not deadline.get('completed')
+        if deadline.get('recurring'):
+            target = f"l'occorrenza del {QDate.fromString(deadline['due_date'], 'yyyy-MM-dd').toString('dd/MM/yyyy')}"
+        else:
+            target = "la scadenza"
+        reply = QMessageBox.question(
+            self,
+            "✅ Scadenza",
+            f"{'Segnare come completata' if completed else 'Riaprire'} {target} '{deadline['title']}'?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+
+        if deadline.get('recurring'):
+            success = self.deadline_service.set_occurrence_completed(deadline['id'], deadline['due_date'], completed)
+        else:
+            success = self.deadline_service.update(deadline['id'], completed=completed)
+
+        if success:
+            self.populate_month()
+        else:
+            QMessageBox.warning(self, self.tm.get("common", "error"), "Impossibile aggiornare la scadenza.")
+
     def populate_month(self):
         # pulisci celle precedenti
         while self.grid.count():
@@ -441,10 +753,17 @@ class PlannerCalendarWidget(QWidget):
         start_col = first_day.dayOfWeek() - 1
         days_in_month = first_day.daysInMonth()
 
+        # Una sola query per il mese: le ricorrenti vengono espanse nella finestra
+        month_deadlines = {}
+        for deadline in self.deadline_service.get_range(
+                f"{year:04d}-{month:02d}-01",
+                f"{year:04d}-{month:02d}-{days_in_month:02d}"):
+            month_deadlines.setdefault(deadline['due_date'], []).append(deadline)
+
         row, col = 0, start_col
         for day in range(1, days_in_month + 1):
             date_str = f"{year:04d}-{month:02d}-{day:02d}"
-            deadlines = self.deadline_service.get_by_date(date_str)
+            deadlines = month_deadlines.get(date_str, [])
 
             # Cella cliccabile
             cell = ClickableDayCell(day, date_str, deadlines, self, self.tm)
@@ -473,6 +792,7 @@ class ExportDialog(QDialog):
         self.property_service = property_service
         self.export_service = export_service
         self.tm = tm
+        self.job_id = None
 
         self.setWindowTitle(self.tm.get("report", "export"))
         self.setMinimumSize(500, 400)
@@ -680,66 +1000,1204 @@ class ExportDialog(QDialog):
         self.end_date.setDate(end)
 
     def do_export(self):
-        """Esegue l'export"""
+        """Mette in coda l'export: il file viene generato in background"""
         # Valida date
         if self.start_date.date() > self.end_date.date():
             QMessageBox.warning(self, self.tm.get("common","error"), "La data di inizio deve essere precedente alla data di fine!")
             return
 
-        # Recupera transazioni
         property_id = self.property_combo.currentData()
         property_name = self.property_combo.currentText().replace("🏠 ", "").replace("🏡 ", "")
 
         start_str = self.start_date.date().toString("yyyy-MM-dd")
         end_str = self.end_date.date().toString("yyyy-MM-dd")
 
-        transactions = self.transaction_service.get_all(
+        if not self.transaction_service.count(property_id=property_id, start_date=start_str, end_date=end_str):
+            QMessageBox.warning(self, "Nessun dato", "Nessuna transazione trovata per il periodo selezionato!")
+            return
+
+        # Senza filtro proprietà il PDF ha una sezione per proprietà
+        property_names = None
+        if self.pdf_radio.isChecked() and not property_id:
+            property_names = {
+                self.property_combo.itemData(i): self.property_combo.itemText(i)
+                for i in range(self.property_combo.count())
+                if self.property_combo.itemData(i) is not None
+            }
+
+        self.job_id = get_export_jobs(self.transaction_service.logger).submit(
+            'pdf' if self.pdf_radio.isChecked() else 'xlsx',
             property_id=property_id,
+            property_name=property_name if property_id else None,
             start_date=start_str,
-            end_date=end_str
+            end_date=end_str,
+            period_label=(
+                self.start_date.date().toString("dd/MM/yyyy"),
+                self.end_date.date().toString("dd/MM/yyyy")
+            ),
+            property_names=property_names
         )
 
-        if not transactions:
-            QMessageBox.warning(self, "Nessun dato", "Nessuna transazione trovata per il periodo selezionato!")
+        if self.job_id is None:
+            QMessageBox.critical(self, "Errore", "Impossibile avviare l'export, controlla il log.")
             return
 
-        try:
-            # Esporta
-            if self.pdf_radio.isChecked():
-                filepath = self.export_service.export_to_pdf(
-                    transactions,
-                    property_name=property_name if property_id else None,
-                    start_date=self.start_date.date().toString("dd/MM/yyyy"),
-                    end_date=self.end_date.date().toString("dd/MM/yyyy")
-                )
-                format_name = "PDF"
+        self.accept()
+
+
+class ExportJobsDialog(QDialog):
+    """Export in coda/in corso con avanzamento e storico dei precedenti"""
+
+    COLUMNS = ["#", "Formato", "Proprietà", "Periodo", "Stato", "Righe", "Durata", "Creato"]
+
+    STATUS_LABELS = {
+        'queued': "⏳ In coda",
+        'running': "⚙️ In corso",
+        'done': "✅ Completato",
+        'error': "❌ Errore",
+        'cancelled': "🚫 Annullato"
+    }
+
+    def __init__(self, logger, parent=None):
+        super().__init__(parent)
+        self.jobs = get_export_jobs(logger)
+        self.history = []
+        self.rows_by_job = {}
+
+        self.setWindowTitle("📥 Export")
+        self.setMinimumSize(900, 420)
+        self.setStyleSheet(default_dialog_style)
+
+        layout = QVBoxLayout(self)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        self.table.itemSelectionChanged.connect(self.update_buttons)
+        self.table.itemDoubleClicked.connect(lambda _: self.open_selected())
+        layout.addWidget(self.table)
+
+        buttons_layout = QHBoxLayout()
+        self.cancel_btn = QPushButton("🚫 Annulla export")
+        self.cancel_btn.clicked.connect(self.cancel_selected)
+        buttons_layout.addWidget(self.cancel_btn)
+
+        self.open_btn = QPushButton("📄 Apri file")
+        self.open_btn.clicked.connect(self.open_selected)
+        buttons_layout.addWidget(self.open_btn)
+
+        folder_btn = QPushButton("📁 Apri cartella")
+        folder_btn.clicked.connect(self.open_folder)
+        buttons_layout.addWidget(folder_btn)
+
+        buttons_layout.addStretch()
+        close_btn = QPushButton("Chiudi")
+        close_btn.clicked.connect(self.close)
+        buttons_layout.addWidget(close_btn)
+        layout.addLayout(buttons_layout)
+
+        self.jobs.job_added.connect(self.refresh)
+        self.jobs.job_finished.connect(self.on_job_finished)
+        self.jobs.job_progress.connect(self.on_job_progress)
+
+        self.refresh()
+
+    def refresh(self, *_):
+        """Ricarica lo storico dal database"""
+        selected = self.selected_job()
+        self.history = self.jobs.history()
+        self.rows_by_job = {}
+
+        self.table.setRowCount(len(self.history))
+        for row, job in enumerate(self.history):
+            self.rows_by_job[job['id']] = row
+            if job['start_date'] and job['end_date']:
+                period = f"{QDate.fromString(job['start_date'], 'yyyy-MM-dd').toString('dd/MM/yyyy')} - " \
+                         f"{QDate.fromString(job['end_date'], 'yyyy-MM-dd').toString('dd/MM/yyyy')}"
             else:
-                filepath = self.export_service.export_to_excel(
-                    transactions,
-                    property_name=property_name if property_id else None,
-                    start_date=self.start_date.date().toString("dd/MM/yyyy"),
-                    end_date=self.end_date.date().toString("dd/MM/yyyy")
-                )
-                format_name = "Excel"
+                period = ""
+            created = job['created_at'][:16].replace('T', ' ') if job['created_at'] else ""
+            values = [
+                str(job['id']),
+                "PDF" if job['format'] == 'pdf' else "Excel",
+                job['property_name'] or "Tutte",
+                period,
+                self.STATUS_LABELS.get(job['status'], job['status']),
+                f"{job['rows']:,}" if job['rows'] is not None else "",
+                f"{job['duration']:.1f} s" if job['duration'] is not None else "",
+                created
+            ]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column == 4 and job['error']:
+                    item.setToolTip(job['error'])
+                if column == 0 and job['filepath']:
+                    item.setToolTip(job['filepath'])
+                self.table.setItem(row, column, item)
+
+            progress = self.jobs.progress(job['id'])
+            if progress:
+                self.on_job_progress(job['id'], *progress)
+
+        if selected is not None and selected in self.rows_by_job:
+            self.table.selectRow(self.rows_by_job[selected])
+        self.update_buttons()
+
+    def on_job_progress(self, job_id, written, total):
+        row = self.rows_by_job.get(job_id)
+        if row is None:
+            return
+        percent = f" {written * 100 // total}%" if total else ""
+        self.table.item(row, 4).setText(f"{self.STATUS_LABELS['running']}{percent}")
+        self.table.item(row, 5).setText(f"{written:,} / {total:,}")
+
+    def on_job_finished(self, job_id, status):
+        self.refresh()
+        if status == 'error':
+            job = self._job(job_id)
+            if job and self.isVisible():
+                QMessageBox.warning(self, "Export", f"Export #{job_id} non riuscito:\n{job['error']}")
+
+    def selected_job(self):
+        rows = self.table.selectionModel().selectedRows() if self.table.selectionModel() else []
+        if not rows or not self.history:
+            return None
+        return self.history[rows[0].row()]['id']
+
+    def _job(self, job_id):
+        return next((j for j in self.history if j['id'] == job_id), None)
+
+    def update_buttons(self):
+        job = self._job(self.selected_job())
+        self.cancel_btn.setEnabled(bool(job) and self.jobs.is_active(job['id']))
+        self.open_btn.setEnabled(bool(job) and bool(job['filepath']) and job['status'] == 'done')
+
+    def cancel_selected(self):
+        job_id = self.selected_job()
+        if job_id is not None:
+            self.jobs.cancel(job_id)
+
+    def open_selected(self):
+        job = self._job(self.selected_job())
+        if job and job['status'] == 'done' and job['filepath'] and os.path.exists(job['filepath']):
+            QDesktopServices.openUrl(QUrl.fromLocalFile(job['filepath']))
+
+    def open_folder(self):
+        QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(self.jobs.export_service.exports_dir)))
+
+
+class PortfolioReportWorker(QObject):
+    """Esegue il batch di rendiconti di portafoglio fuori dal thread GUI"""
+
+    progress = Signal(int, int)
+    # risultato, messaggio di errore ("" se nessuno)
+    finished = Signal(dict, str)
+
+    def __init__(self, service, properties, start_date, end_date, period_label, formats):
+        super().__init__()
+        self.service = service
+        self.properties = properties
+        self.start_date = start_date
+        self.end_date = end_date
+        self.period_label = period_label
+        self.formats = formats
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            result = self.service.run(
+                self.properties,
+                self.start_date,
+                self.end_date,
+                period_label=self.period_label,
+                formats=self.formats,
+                progress=lambda done, total: self.progress.emit(done, total),
+                cancel_event=self.cancel_event
+            )
+        except Exception as e:
+            self.finished.emit({}, f"Errore imprevisto: {e}")
+            return
+        self.finished.emit(result, "")
+
+
+class PortfolioReportDialog(QDialog):
+    """Rendiconti di tutte le proprietà (o di alcuni proprietari) per un periodo, in un unico zip"""
+
+    def __init__(self, logger, parent=None):
+        super().__init__(parent)
+        self.service = PortfolioReportService(logger)
+        self.thread = None
+        self.worker = None
+
+        self.setWindowTitle("🗂️ Rendiconti di portafoglio")
+        self.setMinimumSize(700, 520)
+        self.setStyleSheet(default_dialog_style)
+
+        layout = QVBoxLayout(self)
+
+        info = QLabel(
+            "Seleziona proprietari e/o singole proprietà (nessuna selezione = tutto il portafoglio).\n"
+            "Per ogni proprietà vengono generati i report nei formati scelti, raccolti in uno zip per proprietario."
+        )
+        info.setWordWrap(True)
+        layout.addWidget(info)
+
+        lists_layout = QHBoxLayout()
+
+        owners_layout = QVBoxLayout()
+        owners_layout.addWidget(QLabel("Proprietari"))
+        self.owners_list = QListWidget()
+        for owner in self.service.owners():
+            item = QListWidgetItem(owner)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Unchecked)
+            self.owners_list.addItem(item)
+        owners_layout.addWidget(self.owners_list)
+        lists_layout.addLayout(owners_layout)
+
+        properties_layout = QVBoxLayout()
+        properties_layout.addWidget(QLabel("Proprietà"))
+        self.properties_list = QListWidget()
+        for prop in self.service.select_properties():
+            item = QListWidgetItem(f"{prop['name']} ({prop['owner']})")
+            item.setData(Qt.ItemDataRole.UserRole, prop['id'])
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Unchecked)
+            self.properties_list.addItem(item)
+        properties_layout.addWidget(self.properties_list)
+        lists_layout.addLayout(properties_layout)
+
+        layout.addLayout(lists_layout)
+
+        # Periodo: di default l'anno solare precedente
+        last_year = QDate.currentDate().year() - 1
+        period_layout = QHBoxLayout()
+        period_layout.addWidget(QLabel("Dal:"))
+        self.start_date = QDateEdit()
+        self.start_date.setDisplayFormat("dd/MM/yyyy")
+        self.start_date.setCalendarPopup(True)
+        self.start_date.setDate(QDate(last_year, 1, 1))
+        self.start_date.setStyleSheet(default_selector_date_export)
+        period_layout.addWidget(self.start_date)
+        period_layout.addWidget(QLabel("Al:"))
+        self.end_date = QDateEdit()
+        self.end_date.setDisplayFormat("dd/MM/yyyy")
+        self.end_date.setCalendarPopup(True)
+        self.end_date.setDate(QDate(last_year, 12, 31))
+        self.end_date.setStyleSheet(default_selector_date_export)
+        period_layout.addWidget(self.end_date)
+        period_layout.addStretch()
+
+        self.pdf_check = QCheckBox("📄 PDF")
+        self.pdf_check.setChecked(True)
+        period_layout.addWidget(self.pdf_check)
+        self.excel_check = QCheckBox("📊 Excel")
+        self.excel_check.setChecked(True)
+        period_layout.addWidget(self.excel_check)
+        layout.addLayout(period_layout)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.button(QDialogButtonBox.Ok).setText("🗂️ Genera")
+        buttons.accepted.connect(self.generate)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    @staticmethod
+    def _checked(list_widget, role=None):
+        values = []
+        for i in range(list_widget.count()):
+            item = list_widget.item(i)
+            if item.checkState() == Qt.CheckState.Checked:
+                values.append(item.data(role) if role is not None else item.text())
+        return values
+
+    def generate(self):
+        if self.start_date.date() > self.end_date.date():
+            QMessageBox.warning(self, "Errore", "La data di inizio deve essere precedente alla data di fine!")
+            return
+
+        formats = tuple(fmt for fmt, check in (('pdf', self.pdf_check), ('xlsx', self.excel_check)) if check.isChecked())
+        if not formats:
+            QMessageBox.warning(self, "Errore", "Seleziona almeno un formato.")
+            return
+
+        properties = self.service.select_properties(
+            property_ids=self._checked(self.properties_list, Qt.ItemDataRole.UserRole),
+            owners=self._checked(self.owners_list)
+        )
+        if not properties:
+            QMessageBox.warning(self, "Nessun dato", "Nessuna proprietà selezionata.")
+            return
+
+        self.progress = QProgressDialog("Generazione rendiconti...", "Annulla", 0, len(properties), self)
+        self.progress.setWindowTitle("🗂️ Rendiconti di portafoglio")
+        self.progress.setWindowModality(Qt.WindowModal)
+        self.progress.setMinimumDuration(0)
+
+        self.thread = QThread(self)
+        self.worker = PortfolioReportWorker(
+            self.service,
+            properties,
+            self.start_date.date().toString("yyyy-MM-dd"),
+            self.end_date.date().toString("yyyy-MM-dd"),
+            (self.start_date.date().toString("dd/MM/yyyy"), self.end_date.date().toString("dd/MM/yyyy")),
+            formats
+        )
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.progress.canceled.connect(self.worker.cancel_event.set)
+        self.worker.progress.connect(lambda done, total: self.progress.setValue(done))
+        self.worker.finished.connect(self.on_finished)
+        self.worker.finished.connect(self.thread.quit)
+        self.thread.finished.connect(self.worker.deleteLater)
+        self.thread.start()
+
+    def on_finished(self, result, error):
+        self.progress.close()
+        if error:
+            QMessageBox.critical(self, "🗂️ Rendiconti di portafoglio", f"Generazione non riuscita:\n{error}")
+            return
+        if result['cancelled']:
+            QMessageBox.information(self, "🗂️ Rendiconti di portafoglio", "Generazione annullata.")
+            return
+
+        message = (
+            f"Proprietà: {result['properties']}\n"
+            f"Transazioni: {result['rows']:,}\n"
+            f"File generati: {result['files']} in {result['duration']:.1f} s\n\n"
+            f"📁 {result['zip_path']}"
+        )
+        if result['errors']:
+            message += "\n\n⚠️ Report non generati:\n" + "\n".join(f"• {name}: {error}" for name, error in result['errors'][:10])
+
+        reply = QMessageBox.question(
+            self,
+            "✅ Rendiconti generati",
+            message + "\n\nVuoi aprire la cartella?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.dirname(os.path.abspath(result['zip_path']))))
+        self.accept()
+
+    def reject(self):
+        # Non chiudere con un batch in corso: lo si annulla dalla finestra di avanzamento
+        if self.thread is not None and self.thread.isRunning():
+            return
+        super().reject()
+
+
+class DataExportWorker(QObject):
+    """Esegue l'export dei dati grezzi fuori dal thread GUI"""
+
+    # dataset, righe scritte
+    progress = Signal(str, int)
+    # risultati per dataset, messaggio di errore ("" se nessuno)
+    finished = Signal(dict, str)
+
+    def __init__(self, service, datasets, export_format, property_id, start_date, end_date, delta=False):
+        super().__init__()
+        self.service = service
+        self.datasets = datasets
+        self.export_format = export_format
+        self.property_id = property_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.delta = delta
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            results = self.service.export_all(
+                self.export_format,
+                property_id=self.property_id,
+                start_date=self.start_date,
+                end_date=self.end_date,
+                datasets=self.datasets,
+                delta=self.delta,
+                progress=lambda dataset, rows: self.progress.emit(dataset, rows),
+                cancel_event=self.cancel_event
+            )
+        except Exception as e:
+            self.finished.emit({}, str(e))
+            return
+        self.finished.emit(results, "")
+
 
-            # Messaggio successo
+class DataExportDialog(QDialog):
+    """Export dei dati grezzi (transazioni, scadenze, fornitori, documenti) in CSV o Parquet"""
+
+    DATASET_LABELS = {
+        'transazioni': "💶 Transazioni",
+        'scadenze': "📅 Scadenze",
+        'fornitori': "🔧 Fornitori",
+        'documenti': "📎 Documenti (metadati)",
+    }
+
+    FORMAT_LABELS = {
+        'csv': "CSV",
+        'csv.gz': "CSV compresso (.gz)",
+        'parquet': "Parquet",
+        'arrow': "Arrow (IPC)",
+    }
+
+    def __init__(self, property_service, logger, parent=None):
+        super().__init__(parent)
+        self.service = DataExportService(logger)
+        self.thread = None
+        self.worker = None
+
+        self.setWindowTitle("🧾 Esporta dati")
+        self.setMinimumWidth(520)
+        self.setStyleSheet(default_dialog_style)
+
+        layout = QVBoxLayout(self)
+
+        info = QLabel(
+            "Dati grezzi per i programmi di contabilità e le analisi: un file per ogni dataset in exports/.\n"
+            "Le date sono esportate come yyyy-MM-dd; i fornitori non hanno un periodo e vengono esportati tutti."
+        )
+        info.setWordWrap(True)
+        layout.addWidget(info)
+
+        self.dataset_checks = {}
+        datasets_layout = QHBoxLayout()
+        for dataset, label in self.DATASET_LABELS.items():
+            check = QCheckBox(label)
+            check.setChecked(dataset == 'transazioni')
+            datasets_layout.addWidget(check)
+            self.dataset_checks[dataset] = check
+        datasets_layout.addStretch()
+        layout.addLayout(datasets_layout)
+
+        filters_layout = QHBoxLayout()
+        filters_layout.addWidget(QLabel("Proprietà:"))
+        self.property_combo = QComboBox()
+        self.property_combo.addItem("Tutte", None)
+        for prop in property_service.get_all():
+            self.property_combo.addItem(prop['name'], prop['id'])
+        filters_layout.addWidget(self.property_combo)
+
+        filters_layout.addWidget(QLabel("Formato:"))
+        self.format_combo = QComboBox()
+        for export_format, label in self.FORMAT_LABELS.items():
+            if export_format in ('parquet', 'arrow') and not self.service.parquet_available():
+                continue
+            self.format_combo.addItem(label, export_format)
+        filters_layout.addWidget(self.format_combo)
+        filters_layout.addStretch()
+        layout.addLayout(filters_layout)
+
+        # Periodo opzionale: senza spunta si esporta tutto lo storico
+        period_layout = QHBoxLayout()
+        self.period_check = QCheckBox("Solo il periodo dal")
+        period_layout.addWidget(self.period_check)
+        self.start_date = QDateEdit()
+        self.start_date.setDisplayFormat("dd/MM/yyyy")
+        self.start_date.setCalendarPopup(True)
+        self.start_date.setDate(QDate(QDate.currentDate().year(), 1, 1))
+        self.start_date.setStyleSheet(default_selector_date_export)
+        period_layout.addWidget(self.start_date)
+        period_layout.addWidget(QLabel("al"))
+        self.end_date = QDateEdit()
+        self.end_date.setDisplayFormat("dd/MM/yyyy")
+        self.end_date.setCalendarPopup(True)
+        self.end_date.setDate(QDate.currentDate())
+        self.end_date.setStyleSheet(default_selector_date_export)
+        period_layout.addWidget(self.end_date)
+        period_layout.addStretch()
+        layout.addLayout(period_layout)
+
+        # Export incrementale: solo le righe cambiate dall'ultimo export incrementale
+        self.delta_check = QCheckBox("Solo le modifiche dall'ultimo export incrementale")
+        self.delta_check.setToolTip("Righe inserite, modificate o eliminate (colonne _seq e _op); documenti esclusi")
+        self.delta_check.setEnabled(self.service.delta_available())
+        self.delta_check.toggled.connect(self.on_delta_toggled)
+        layout.addWidget(self.delta_check)
+
+        if not self.service.parquet_available():
+            note = QLabel("ℹ️ Parquet e Arrow richiedono il pacchetto pyarrow.")
+            note.setStyleSheet("color: #95a5a6; font-size: 11px;")
+            layout.addWidget(note)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.button(QDialogButtonBox.Ok).setText("🧾 Esporta")
+        buttons.accepted.connect(self.do_export)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def on_delta_toggled(self, checked):
+        # Il periodo non si applica agli export incrementali e i documenti non hanno change_log
+        self.period_check.setEnabled(not checked)
+        self.start_date.setEnabled(not checked)
+        self.end_date.setEnabled(not checked)
+        self.dataset_checks['documenti'].setEnabled(not checked)
+        if checked:
+            self.dataset_checks['documenti'].setChecked(False)
+
+    def do_export(self):
+        datasets = [dataset for dataset, check in self.dataset_checks.items() if check.isChecked()]
+        if not datasets:
+            QMessageBox.warning(self, "Errore", "Seleziona almeno un dataset.")
+            return
+
+        delta = self.delta_check.isChecked()
+        start_date = end_date = None
+        if self.period_check.isChecked() and not delta:
+            if self.start_date.date() > self.end_date.date():
+                QMessageBox.warning(self, "Errore", "La data di inizio deve essere precedente alla data di fine!")
+                return
+            start_date = self.start_date.date().toString("yyyy-MM-dd")
+            end_date = self.end_date.date().toString("yyyy-MM-dd")
+
+        # Totale righe non noto in anticipo: avanzamento indeterminato con il conteggio nel testo
+        self.progress = QProgressDialog("Esportazione in corso...", "Annulla", 0, 0, self)
+        self.progress.setWindowTitle("🧾 Esporta dati")
+        self.progress.setWindowModality(Qt.WindowModal)
+        self.progress.setMinimumDuration(0)
+
+        self.thread = QThread(self)
+        self.worker = DataExportWorker(
+            self.service, datasets, self.format_combo.currentData(),
+            self.property_combo.currentData(), start_date, end_date, delta=delta
+        )
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.progress.canceled.connect(self.worker.cancel_event.set)
+        self.worker.progress.connect(
+            lambda dataset, rows: self.progress.setLabelText(
+                f"{self.DATASET_LABELS[dataset]}: {rows:,} righe esportate..."
+            )
+        )
+        self.worker.finished.connect(self.on_finished)
+        self.worker.finished.connect(self.thread.quit)
+        self.thread.finished.connect(self.worker.deleteLater)
+        self.thread.start()
+
+    @staticmethod
+    def _delta_note(result):
+        if 'watermark' not in result:
+            return ""
+        if result.get('full'):
+            # Registro già pulito oltre since_seq: tutte le righe attuali
+            return f" (completo fino a {result['watermark']})"
+        return f" (modifiche {result['since_seq']} → {result['watermark']})"
+
+    def on_finished(self, results, error):
+        self.progress.close()
+        if error:
+            QMessageBox.critical(self, "Errore", f"Export non riuscito:\n{error}")
+            return
+        if any(result['cancelled'] for result in results.values()):
+            QMessageBox.information(self, "🧾 Esporta dati", "Export annullato.")
+            return
+
+        lines = [
+            f"{self.DATASET_LABELS[dataset]}: {result['rows']:,} righe in {result['duration']:.1f} s"
+            + self._delta_note(result)
+            for dataset, result in results.items()
+        ]
+        reply = QMessageBox.question(
+            self,
+            "✅ Export completato",
+            "\n".join(lines) + "\n\nVuoi aprire la cartella?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            folder = os.path.dirname(os.path.abspath(next(iter(results.values()))['filepath']))
+            QDesktopServices.openUrl(QUrl.fromLocalFile(folder))
+        self.accept()
+
+    def reject(self):
+        # Non chiudere con un export in corso: lo si annulla dalla finestra di avanzamento
+        if self.thread is not None and self.thread.isRunning():
+            return
+        super().reject()
+
+
+class StatementImportWorker(QObject):
+    """Analizza e importa un estratto conto fuori dal thread GUI"""
+
+    # righe lette
+    progress = Signal(int)
+    # risultato, messaggio di errore ("" se nessuno)
+    finished = Signal(dict, str)
+
+    def __init__(self, service, path, property_id, profile, dry_run):
+        super().__init__()
+        self.service = service
+        self.path = path
+        self.property_id = property_id
+        self.profile = profile
+        self.dry_run = dry_run
+
+    def run(self):
+        try:
+            result = self.service.import_statement(
+                self.path, self.property_id, profile=self.profile, dry_run=self.dry_run,
+                progress=lambda rows: self.progress.emit(rows)
+            )
+            if not self.dry_run:
+                result['report_path'] = self.service.write_error_report(result)
+        except StatementImportError as e:
+            self.finished.emit({}, str(e))
+            return
+        except Exception as e:
+            self.finished.emit({}, f"Errore imprevisto: {e}")
+            return
+        self.finished.emit(result, "")
+
+
+class StatementImportDialog(QDialog):
+    """Import di un estratto conto bancario (CSV, OFX, CAMT.053) nelle transazioni di una proprietà"""
+
+    MAPPING_LABELS = {
+        'date_column': "Data",
+        'amount_column': "Importo (con segno)",
+        'debit_column': "Dare / addebiti",
+        'credit_column': "Avere / accrediti",
+        'counterparty_column': "Controparte",
+        'description_column': "Descrizione",
+    }
+
+    PREVIEW_ROWS = 200
+
+    def __init__(self, property_service, logger, parent=None):
+        super().__init__(parent)
+        self.service = StatementImportService(logger)
+        self.thread = None
+        self.worker = None
+        self.path = None
+        self.file_format = None
+        self.csv_delimiter = None
+
+        self.setWindowTitle("🏦 Importa estratto conto")
+        self.setMinimumSize(760, 620)
+        self.setStyleSheet(default_dialog_style)
+
+        layout = QVBoxLayout(self)
+
+        info = QLabel(
+            "CSV della banca, OFX o CAMT.053 (XML). I movimenti già presenti (stessa data, importo e controparte) "
+            "vengono saltati; i fornitori riconosciuti sono collegati automaticamente."
+        )
+        info.setWordWrap(True)
+        layout.addWidget(info)
+
+        file_layout = QHBoxLayout()
+        self.file_label = QLabel("Nessun file selezionato")
+        file_layout.addWidget(self.file_label, 1)
+        choose_button = QPushButton("📂 Scegli file...")
+        choose_button.clicked.connect(self.choose_file)
+        file_layout.addWidget(choose_button)
+        layout.addLayout(file_layout)
+
+        form = QFormLayout()
+        self.property_combo = QComboBox()
+        for prop in property_service.get_all():
+            self.property_combo.addItem(prop['name'], prop['id'])
+        form.addRow("Proprietà:", self.property_combo)
+        layout.addLayout(form)
+
+        # Mappatura delle colonne (solo CSV)
+        self.mapping_group = QGroupBox("Mappatura colonne CSV")
+        mapping_layout = QFormLayout(self.mapping_group)
+
+        profile_layout = QHBoxLayout()
+        self.profile_combo = QComboBox()
+        self.profile_combo.currentIndexChanged.connect(self.on_profile_changed)
+        profile_layout.addWidget(self.profile_combo, 1)
+        save_profile_button = QPushButton("💾 Salva profilo")
+        save_profile_button.clicked.connect(self.save_profile)
+        profile_layout.addWidget(save_profile_button)
+        mapping_layout.addRow("Profilo:", profile_layout)
+
+        self.mapping_combos = {}
+        for field, label in self.MAPPING_LABELS.items():
+            combo = QComboBox()
+            mapping_layout.addRow(f"{label}:", combo)
+            self.mapping_combos[field] = combo
+
+        self.date_format_combo = QComboBox()
+        self.date_format_combo.addItems(DATE_FORMATS)
+        mapping_layout.addRow("Formato data:", self.date_format_combo)
+        self.decimal_combo = QComboBox()
+        self.decimal_combo.addItem("Virgola (1.234,56)", ',')
+        self.decimal_combo.addItem("Punto (1,234.56)", '.')
+        mapping_layout.addRow("Decimali:", self.decimal_combo)
+        self.mapping_group.setEnabled(False)
+        layout.addWidget(self.mapping_group)
+
+        self.summary_label = QLabel("")
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        self.preview_table = QTableWidget(0, 5)
+        self.preview_table.setHorizontalHeaderLabels(["Data", "Tipo", "Importo", "Controparte", "Servizio"])
+        self.preview_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.preview_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.preview_table, 1)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
+        self.preview_button = QPushButton("🔍 Anteprima")
+        self.preview_button.clicked.connect(lambda: self.start(dry_run=True))
+        buttons_layout.addWidget(self.preview_button)
+        self.import_button = QPushButton("🏦 Importa")
+        self.import_button.clicked.connect(lambda: self.start(dry_run=False))
+        buttons_layout.addWidget(self.import_button)
+        close_button = QPushButton("Chiudi")
+        close_button.clicked.connect(self.reject)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+
+        self.preview_button.setEnabled(False)
+        self.import_button.setEnabled(False)
+        self.load_profiles()
+
+    def load_profiles(self, select_name=None):
+        self.profile_combo.blockSignals(True)
+        self.profile_combo.clear()
+        self.profile_combo.addItem("Rileva dalle intestazioni", None)
+        for profile in self.service.get_profiles():
+            self.profile_combo.addItem(profile['name'], profile)
+            if profile['name'] == select_name:
+                self.profile_combo.setCurrentIndex(self.profile_combo.count() - 1)
+        self.profile_combo.blockSignals(False)
+
+    def choose_file(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Seleziona estratto conto", "",
+            "Estratti conto (*.csv *.txt *.ofx *.qfx *.xml);;Tutti i file (*)"
+        )
+        if not path:
+            return
+        try:
+            self.file_format = self.service.detect_format(path)
+        except (StatementImportError, OSError) as e:
+            QMessageBox.warning(self, "Errore", str(e))
+            return
+
+        self.path = path
+        self.file_label.setText(f"{os.path.basename(path)} ({self.file_format.upper()})")
+        self.mapping_group.setEnabled(self.file_format == 'csv')
+        self.preview_table.setRowCount(0)
+        self.summary_label.setText("")
+        if self.file_format == 'csv':
+            self.on_profile_changed()
+        self.preview_button.setEnabled(True)
+        self.import_button.setEnabled(True)
+
+    def on_profile_changed(self, *_):
+        if not self.path or self.file_format != 'csv':
+            return
+        profile = self.profile_combo.currentData() or {}
+        try:
+            header = self.service.read_csv_header(
+                self.path, profile.get('encoding') or 'utf-8-sig', profile.get('skip_rows') or 0,
+                profile.get('delimiter')
+            )
+        except (UnicodeDecodeError, OSError) as e:
+            QMessageBox.warning(self, "Errore", f"File non leggibile: {e}")
+            return
+
+        mapping = {field: profile.get(field) for field in self.MAPPING_LABELS} if profile else header['mapping']
+        for field, combo in self.mapping_combos.items():
+            combo.clear()
+            combo.addItem("—", None)
+            for column in header['headers']:
+                combo.addItem(column, column)
+            index = combo.findData(mapping.get(field))
+            combo.setCurrentIndex(max(index, 0))
+
+        if profile:
+            self.date_format_combo.setCurrentText(profile.get('date_format') or 'dd/MM/yyyy')
+            self.decimal_combo.setCurrentIndex(max(self.decimal_combo.findData(profile.get('decimal_separator')), 0))
+        self.csv_delimiter = header['delimiter']
+
+    def current_profile(self):
+        """Mappatura corrente (profilo selezionato con le modifiche fatte nei campi)"""
+        if self.file_format != 'csv':
+            return None
+        base = self.profile_combo.currentData() or {}
+        profile = {
+            'encoding': base.get('encoding') or 'utf-8-sig',
+            'skip_rows': base.get('skip_rows') or 0,
+            'delimiter': base.get('delimiter') or self.csv_delimiter,
+            'date_format': self.date_format_combo.currentText(),
+            'decimal_separator': self.decimal_combo.currentData(),
+        }
+        for field, combo in self.mapping_combos.items():
+            profile[field] = combo.currentData()
+        return profile
+
+    def save_profile(self):
+        if self.file_format != 'csv':
+            return
+        current = self.profile_combo.currentData()
+        name, ok = QInputDialog.getText(self, "💾 Salva profilo", "Nome del profilo (es. banca):",
+                                        text=current['name'] if current else "")
+        if not ok or not name.strip():
+            return
+        profile = self.current_profile()
+        if not profile['date_column']:
+            QMessageBox.warning(self, "Errore", "Seleziona almeno la colonna della data.")
+            return
+        profile['name'] = name.strip()
+        if self.service.save_profile(profile) is None:
+            QMessageBox.critical(self, "Errore", "Salvataggio del profilo non riuscito.")
+            return
+        self.load_profiles(select_name=profile['name'])
+
+    def start(self, dry_run):
+        if not self.path:
+            return
+        if self.property_combo.currentData() is None:
+            QMessageBox.warning(self, "Errore", "Seleziona la proprietà di destinazione.")
+            return
+        if not dry_run:
             reply = QMessageBox.question(
-                self,
-                "✅ Export Completato",
-                f"Report {format_name} generato con successo!\n\n"
-                f"📁 {filepath}\n\n"
-                f"Vuoi aprire la cartella?",
+                self, "🏦 Importa estratto conto",
+                f"Importare i movimenti in «{self.property_combo.currentText()}»?",
                 QMessageBox.Yes | QMessageBox.No
             )
+            if reply != QMessageBox.Yes:
+                return
 
-            if reply == QMessageBox.Yes:
-                # Apri cartella exports
-                QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.dirname(filepath)))
+        self.dry_run = dry_run
+        self.preview_button.setEnabled(False)
+        self.import_button.setEnabled(False)
+        self.summary_label.setText("Analisi del file in corso...")
 
+        self.thread = QThread(self)
+        self.worker = StatementImportWorker(
+            self.service, self.path, self.property_combo.currentData(), self.current_profile(), dry_run
+        )
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.worker.progress.connect(lambda rows: self.summary_label.setText(f"{rows:,} righe lette..."))
+        self.worker.finished.connect(self.on_finished)
+        self.worker.finished.connect(self.thread.quit)
+        self.thread.finished.connect(self.worker.deleteLater)
+        self.thread.start()
+
+    def on_finished(self, result, error):
+        self.preview_button.setEnabled(True)
+        self.import_button.setEnabled(True)
+        if error:
+            self.summary_label.setText("")
+            QMessageBox.critical(self, "Errore", f"Import non riuscito:\n{error}")
+            return
+
+        verb = "da importare" if self.dry_run else "importati"
+        summary = (
+            f"{result['rows']:,} movimenti letti: {result['imported']:,} {verb}, "
+            f"{result['duplicates']:,} già presenti, {len(result['errors']):,} scartati per errore, "
+            f"{result['suppliers_linked']:,} collegati a un fornitore ({result['duration']:.1f} s)."
+        )
+        if result['errors']:
+            first = result['errors'][0]
+            summary += f"\nPrimo errore: riga {first['line']}, {first['field']} «{first['value']}»: {first['message']}"
+        self.summary_label.setText(summary)
+
+        if self.dry_run:
+            items = result['items'][:self.PREVIEW_ROWS]
+            self.preview_table.setRowCount(len(items))
+            for row, item in enumerate(items):
+                values = [item['date'], item['trans_type'], f"€ {item['amount']:,.2f}", item['provider'],
+                          item['service']]
+                for column, value in enumerate(values):
+                    self.preview_table.setItem(row, column, QTableWidgetItem(value))
+            return
+
+        self.preview_table.setRowCount(0)
+        message = summary
+        if result.get('report_path'):
+            message += f"\n\nDettaglio degli errori: {result['report_path']}"
+        QMessageBox.information(self, "✅ Import completato", message)
+        if result['imported']:
             self.accept()
 
+    def reject(self):
+        if self.thread is not None and self.thread.isRunning():
+            return
+        super().reject()
+
+
+class RestoreBackupDialog(QDialog):
+    """Scelta del backup da ripristinare: archivio backups/ o file esterno"""
+
+    COLUMNS = ["Data", "Motivo", "Database", "Documenti", "Verifica"]
+
+    REASON_LABELS = {
+        'manuale': "Manuale",
+        'pianificato': "Pianificato",
+        'pre-ripristino': "Prima di un ripristino",
+    }
+
+    def __init__(self, logger, parent=None):
+        super().__init__(parent)
+        self.backup_service = get_backup_service(logger)
+        self.backups = self.backup_service.list_backups()
+        self.file_path = None
+
+        self.setWindowTitle("♻️ Ripristina backup")
+        self.setMinimumSize(760, 420)
+        self.setStyleSheet(default_dialog_style)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(
+            "Il database attuale viene salvato automaticamente nell'archivio prima del ripristino;\n"
+            "l'applicazione resta aperta e le viste vengono ricaricate al termine."
+        ))
+
+        self.table = QTableWidget(len(self.backups), len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        for row, backup in enumerate(self.backups):
+            if backup.get('documents') is not None:
+                documents = f"{len(backup['documents'])} file, " \
+                            f"{self.backup_service.format_size(backup.get('documents_size', 0))}"
+            else:
+                documents = "—"
+            verified = {True: "✅", False: "❌", None: "Non verificato"}.get(backup.get('verified'), "")
+            values = [
+                backup['created_at'][:16].replace('T', ' '),
+                self.REASON_LABELS.get(backup.get('reason'), backup.get('reason', "")),
+                self.backup_service.format_size(backup['size']),
+                documents,
+                verified
+            ]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column == 4 and backup.get('verify_message'):
+                    item.setToolTip(backup['verify_message'])
+                self.table.setItem(row, column, item)
+        self.table.itemSelectionChanged.connect(self.update_controls)
+        self.table.itemDoubleClicked.connect(lambda _: self.accept())
+        layout.addWidget(self.table)
+
+        self.documents_check = QCheckBox("Ripristina anche i documenti (la cartella attuale viene conservata a parte)")
+        layout.addWidget(self.documents_check)
+
+        buttons_layout = QHBoxLayout()
+        file_btn = QPushButton("📂 Da file...")
+        file_btn.clicked.connect(self.choose_file)
+        buttons_layout.addWidget(file_btn)
+        buttons_layout.addStretch()
+
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        self.button_box.button(QDialogButtonBox.Ok).setText("♻️ Ripristina")
+        self.button_box.accepted.connect(self.accept)
+        self.button_box.rejected.connect(self.reject)
+        buttons_layout.addWidget(self.button_box)
+        layout.addLayout(buttons_layout)
+
+        if self.backups:
+            self.table.selectRow(0)
+        self.update_controls()
+
+    def selected_backup(self):
+        rows = self.table.selectionModel().selectedRows() if self.table.selectionModel() else []
+        if not rows:
+            return None
+        return self.backups[rows[0].row()]
+
+    def update_controls(self):
+        backup = self.selected_backup()
+        has_documents = bool(backup) and backup.get('documents') is not None
+        self.documents_check.setEnabled(has_documents)
+        if not has_documents:
+            self.documents_check.setChecked(False)
+        self.button_box.button(QDialogButtonBox.Ok).setEnabled(bool(backup))
+
+    def choose_file(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Seleziona Backup Database",
+            "",
+            "Backup database (*.db *.db.gz);;All Files (*)"
+        )
+        if path:
+            self.file_path = path
+            super().accept()
+
+    def source(self):
+        """(backup_id, percorso): uno dei due è None"""
+        if self.file_path:
+            return None, self.file_path
+        return self.selected_backup()['id'], None
+
+    def documents(self):
+        return self.documents_check.isEnabled() and self.documents_check.isChecked() and not self.file_path
+
+
+class MaintenanceWorker(QObject):
+    """Esegue la manutenzione del database fuori dal thread GUI"""
+
+    # operazione, fatte, totale
+    progress = Signal(str, int, int)
+    # esecuzioni registrate, messaggio di errore ("" se nessuno)
+    finished = Signal(list, str)
+
+    def __init__(self, service, tasks):
+        super().__init__()
+        self.service = service
+        self.tasks = tasks
+
+    def run(self):
+        try:
+            results = self.service.run(
+                self.tasks, trigger='manuale',
+                progress=lambda task, done, total: self.progress.emit(task, done, total)
+            )
+        except MaintenanceError as e:
+            self.finished.emit([], str(e))
+            return
+        except Exception as e:
+            self.finished.emit([], f"Errore imprevisto: {e}")
+            return
+        self.finished.emit(results, "")
+
+
+class MaintenanceDialog(QDialog):
+    """Stato del file del database e storico della manutenzione, con esecuzione manuale"""
+
+    COLUMNS = ["Data", "Operazione", "Avvio", "Esito", "Durata", "Prima", "Dopo", "Recuperato"]
+
+    TASK_LABELS = {
+        'optimize': "Ottimizzazione",
+        'analyze': "Statistiche (ANALYZE)",
+        'incremental_vacuum': "Compattazione incrementale",
+        'integrity_check': "Controllo integrità",
+        'vacuum': "Compattazione completa (VACUUM)",
+    }
+
+    def __init__(self, logger, parent=None):
+        super().__init__(parent)
+        self.service = get_maintenance_service(logger)
+        self.thread = None
+        self.worker = None
+
+        self.setWindowTitle("🧹 Manutenzione database")
+        self.setMinimumSize(900, 460)
+        self.setStyleSheet(default_dialog_style)
+
+        layout = QVBoxLayout(self)
+        self.stats_label = QLabel()
+        layout.addWidget(self.stats_label)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        layout.addWidget(self.table)
+
+        buttons_layout = QHBoxLayout()
+        self.vacuum_check = QCheckBox("Includi compattazione completa (l'app resta in attesa per qualche secondo)")
+        buttons_layout.addWidget(self.vacuum_check)
+        buttons_layout.addStretch()
+
+        self.run_btn = QPushButton("🧹 Esegui ora")
+        self.run_btn.clicked.connect(self.run_now)
+        buttons_layout.addWidget(self.run_btn)
+
+        close_btn = QPushButton("Chiudi")
+        close_btn.clicked.connect(self.reject)
+        buttons_layout.addWidget(close_btn)
+        layout.addLayout(buttons_layout)
+
+        self.refresh()
+
+    def refresh(self):
+        size = self.service.backup_service.format_size
+        try:
+            stats = self.service.stats()
+            free = stats['free_pages'] / max(stats['page_count'], 1)
+            mode = "incrementale" if stats['auto_vacuum'] == self.service.AUTO_VACUUM_INCREMENTAL else "non attiva"
+            text = f"Dimensione: {size(stats['size'])} — pagine libere: " \
+                   f"{size(stats['free_pages'] * stats['page_size'])} ({free:.0%}) — compattazione automatica: {mode}"
         except Exception as e:
-            QMessageBox.critical(self, "Errore", f"Errore durante l'export:\n{str(e)}")
+            text = f"Stato del database non disponibile: {e}"
+
+        history = self.service.history()
+        saved = sum(run['saved'] for run in history if run['saved'] and run['saved'] > 0)
+        due = [self.TASK_LABELS[task] for task in self.service.due_tasks()] if self.service.available() else []
+        text += f"\nSpazio recuperato (ultime {len(history)} operazioni): {size(saved)}"
+        text += f"\nIn programma al prossimo momento di inattività: {', '.join(due) if due else 'nulla'}"
+        self.stats_label.setText(text)
+
+        self.table.setRowCount(len(history))
+        for row, run in enumerate(history):
+            values = [
+                run['started_at'][:16].replace('T', ' ') if run['started_at'] else "",
+                self.TASK_LABELS.get(run['task'], run['task']),
+                "Manuale" if run['trigger'] == 'manuale' else "Pianificato",
+                "✅" if run['status'] == 'ok' else "❌ Errore",
+                f"{run['duration']:.2f} s" if run['duration'] is not None else "",
+                size(run['size_before']) if run['size_before'] is not None else "",
+                size(run['size_after']) if run['size_after'] is not None else "",
+                size(run['saved']) if run['saved'] and run['saved'] > 0 else "",
+            ]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column == 3 and run['message']:
+                    item.setToolTip(run['message'])
+                self.table.setItem(row, column, item)
+
+    def run_now(self):
+        tasks = [task for task in self.service.TASKS if task != 'vacuum' or self.vacuum_check.isChecked()]
+
+        self.progress = QProgressDialog("Manutenzione in corso...", None, 0, len(tasks), self)
+        self.progress.setWindowTitle("🧹 Manutenzione")
+        self.progress.setWindowModality(Qt.WindowModal)
+        self.progress.setMinimumDuration(0)
+        self.run_btn.setEnabled(False)
+
+        def on_progress(task, done, total):
+            if task:
+                self.progress.setLabelText(f"{self.TASK_LABELS.get(task, task)}...")
+            self.progress.setValue(done)
+
+        self.thread = QThread(self)
+        self.worker = MaintenanceWorker(self.service, tasks)
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.worker.progress.connect(on_progress)
+        self.worker.finished.connect(self.on_finished)
+        self.worker.finished.connect(self.thread.quit)
+        self.thread.finished.connect(self.worker.deleteLater)
+        self.thread.start()
+
+    def on_finished(self, results, error):
+        self.progress.close()
+        self.run_btn.setEnabled(True)
+        if error:
+            QMessageBox.warning(self, "🧹 Manutenzione", error)
+            return
+
+        self.refresh()
+        failed = [run for run in results if run['status'] != 'ok']
+        if failed:
+            QMessageBox.warning(
+                self,
+                "🧹 Manutenzione",
+                f"{len(failed)} operazioni non riuscite:\n\n"
+                + "\n".join(f"  • {self.TASK_LABELS.get(run['task'], run['task'])}: {run['message']}"
+                             for run in failed)
+            )
+
+    def reject(self):
+        if self.thread is not None and self.thread.isRunning():
+            return
+        super().reject()
 
 
 class TransactionDialogWithSuppliers(QDialog):
@@ -826,10 +2284,12 @@ class TransactionDialogWithSuppliers(QDialog):
             }}
         """)
 
-        # Popola categorie dai fornitori
-        categories = self.supplier_service.get_categories()
+        # Popola categorie dall'indice in memoria (fallback: query ai fornitori)
+        index = get_autocomplete_index()
+        categories = index.values('category') if index.is_built else self.supplier_service.get_categories()
         for cat in categories:
             self.service_combo.addItem(cat)
+        attach_autocomplete(self.service_combo, 'service')
 
         # Quando cambia la categoria, mostra suggerimenti
         self.service_combo.currentTextChanged.connect(self.show_supplier_suggestions)
@@ -904,6 +2364,8 @@ class TransactionDialogWithSuppliers(QDialog):
 
         self.provider_input = QLineEdit()
         self.provider_input.setPlaceholderText("Es: ENEL Energia")
+        attach_autocomplete(self.provider_input, 'provider')
+        self.provider_input.editingFinished.connect(self.apply_prediction)
         provider_layout.addWidget(self.provider_input)
         provider_layout.addStretch()
         layout.addLayout(provider_layout)
@@ -1009,13 +2471,32 @@ class TransactionDialogWithSuppliers(QDialog):
         layout.addStretch()
         return widget
 
+    def apply_prediction(self):
+        """Completa categoria e fornitore con la predizione appresa dallo storico"""
+        prediction = get_categorizer().predict(
+            self.provider_input.text(),
+            self.service_combo.currentText()
+        )
+
+        if prediction['category'] and not self.service_combo.currentText().strip():
+            self.service_combo.setCurrentText(prediction['category'])
+
+        if prediction['supplier_id'] and not self.selected_supplier:
+            supplier = self.supplier_service.get_by_id(prediction['supplier_id'])
+            if supplier:
+                self.set_selected_supplier(supplier, fill_provider=False)
+
     def select_supplier(self, item):
         """Seleziona un fornitore suggerito"""
-        supplier = item.data(Qt.ItemDataRole.UserRole)
+        self.set_selected_supplier(item.data(Qt.ItemDataRole.UserRole))
+
+    def set_selected_supplier(self, supplier, fill_provider=True):
+        """Imposta il fornitore collegato e mostra il badge"""
         self.selected_supplier = supplier
 
         # Compila automaticamente i campi
-        self.provider_input.setText(supplier['name'])
+        if fill_provider:
+            self.provider_input.setText(supplier['name'])
         if supplier.get('phone'):
             self.provider_input.setToolTip(f"📞 {supplier['phone']}")
 
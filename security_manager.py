@@ -4,6 +4,7 @@ Protegge da: SQL Injection, Path Traversal, XSS, File Upload malicious
 """
 import re
 import os
+import codecs
 import hashlib
 import secrets
 from pathlib import Path
@@ -23,6 +24,24 @@ class SecurityManager:
     # Dimensione massima file (20 MB)
     MAX_FILE_SIZE = 20 * 1024 * 1024
 
+    # Firme (magic bytes) attese per estensione: il contenuto deve iniziare così
+    MAGIC_SIGNATURES = {
+        'pdf': ((b'%PDF-', 'application/pdf'),),
+        'png': ((b'\x89PNG\r\n\x1a\n', 'image/png'),),
+        'jpg': ((b'\xff\xd8\xff', 'image/jpeg'),),
+        'jpeg': ((b'\xff\xd8\xff', 'image/jpeg'),),
+        'gif': ((b'GIF87a', 'image/gif'), (b'GIF89a', 'image/gif')),
+        'doc': ((b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/msword'),),
+        'xls': ((b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/vnd.ms-excel'),),
+        'docx': ((b'PK\x03\x04', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),),
+        'xlsx': ((b'PK\x03\x04', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),),
+    }
+
+    # Testo semplice: BOM UTF-16 e caratteri di controllo ammessi (tab, a capo, form feed, ESC)
+    UTF16_BOMS = (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+    TEXT_CONTROLS = frozenset(b'\t\n\r\x0c\x1b')
+    MAX_CONTROL_RATIO = 0.05
+
     # Caratteri pericolosi per SQL/Path Traversal
     DANGEROUS_CHARS_PATTERN = re.compile(r'[;<>|&$`\n\r]')
 
@@ -168,6 +187,83 @@ class SecurityManager:
         result['valid'] = True
         return result
 
+    @staticmethod
+    def sniff_mime(header: bytes, ext: str) -> Optional[str]:
+        """
+        MIME type dai magic bytes del primo blocco, se coerente con l'estensione
+
+        Returns:
+            MIME type o None se il contenuto non corrisponde all'estensione
+        """
+        if ext == 'txt':
+            # UTF-16 (Blocco note "Unicode"): i byte nulli fanno parte del testo
+            if header.startswith(SecurityManager.UTF16_BOMS):
+                return 'text/plain'
+            if header.startswith(codecs.BOM_UTF8):
+                header = header[len(codecs.BOM_UTF8):]
+            # Testo: nessun byte nullo. Se non è UTF-8 si assume una codifica
+            # a byte singolo (cp1252/latin-1), dove ogni byte è valido: si
+            # scartano solo i blocchi con troppi caratteri di controllo
+            if b'\x00' in header:
+                return None
+            controls = sum(1 for byte in header if byte < 0x20 and byte not in SecurityManager.TEXT_CONTROLS)
+            if controls > len(header) * SecurityManager.MAX_CONTROL_RATIO:
+                return None
+            return 'text/plain'
+
+        for signature, mime_type in SecurityManager.MAGIC_SIGNATURES.get(ext, ()):
+            if header.startswith(signature):
+                return mime_type
+        return None
+
+    @staticmethod
+    def validate_upload_stream(filepath: str, size: int, header: bytes,
+                               allowed_extensions: Optional[set] = None) -> dict:
+        """
+        Valida un upload già aperto: dimensione da fstat e contenuto dai magic bytes
+
+        A differenza di validate_file_upload non tocca il filesystem: il
+        chiamante passa la dimensione e il primo blocco letti dallo stesso fd.
+
+        Returns:
+            dict con le stesse chiavi di validate_file_upload
+        """
+        result = {
+            'valid': False,
+            'error': None,
+            'size': size,
+            'extension': '',
+            'mime_type': ''
+        }
+
+        if allowed_extensions is None:
+            allowed_extensions = SecurityManager.ALLOWED_EXTENSIONS
+
+        if size > SecurityManager.MAX_FILE_SIZE:
+            result['error'] = f"File troppo grande (max {SecurityManager.MAX_FILE_SIZE / 1024 / 1024:.0f} MB)"
+            return result
+
+        if size == 0:
+            result['error'] = "File vuoto"
+            return result
+
+        _, ext = os.path.splitext(filepath)
+        ext = ext.lower().lstrip('.')
+        result['extension'] = ext
+
+        if ext not in allowed_extensions:
+            result['error'] = f"Estensione '{ext}' non permessa. Permesse: {', '.join(allowed_extensions)}"
+            return result
+
+        mime_type = SecurityManager.sniff_mime(header, ext)
+        if mime_type is None:
+            result['error'] = f"Il contenuto del file non corrisponde all'estensione '{ext}'"
+            return result
+
+        result['mime_type'] = mime_type
+        result['valid'] = True
+        return result
+
     @staticmethod
     def sanitize_sql_input(value: str, max_length: int = 500) -> str:
         """
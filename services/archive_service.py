@@ -0,0 +1,552 @@
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+import zlib
+from datetime import date
+
+from sqlalchemy import or_
+
+from database.models import Document, DocumentArchive
+from database.connection import DatabaseConnection
+from services.document_service import DocumentService, remove_file
+
+
+# Cartella dei pacchetti dentro la cartella di ogni proprietà (nascosta al watcher)
+PACK_DIR = ".archive"
+
+# Formati già compressi: memorizzati senza ricompressione
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.zip', '.7z', '.rar', '.gz',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods'
+}
+
+# Una sola scrittura per volta sui pacchetti
+_PACK_LOCK = threading.Lock()
+
+
+class DocumentArchiver:
+    """
+    Archiviazione a freddo dei trimestri chiusi
+
+    I documenti dei trimestri più vecchi di N anni vengono spostati in un
+    pacchetto zip per proprietà e anno (docs/property_N/.archive/<anno>.zip).
+    La tabella document_archives registra pacchetto e nome interno di ogni
+    documento: le righe dell'indice restano invariate, quindi list_documents
+    continua a mostrarli, e un singolo file si legge dalla directory
+    centrale dello zip senza estrarre il pacchetto.
+    """
+
+    DEFAULT_YEARS = 2
+
+    # Cache dei file estratti per l'apertura (LRU per mtime)
+    CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+        self.document_service = DocumentService(logger)
+        self.cache_dir = os.path.join(self.document_service.docs_dir, ".cache")
+
+    # ------------------------------------------------------------------
+    # Selezione
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def quarter_of(period, folder):
+        """(anno, trimestre) da period yyyy-QN o dalla cartella .../yyyy/NT; None se ignoto"""
+        if period and '-Q' in period:
+            year, quarter = period.split('-Q', 1)
+            if year.isdigit() and quarter.isdigit():
+                return int(year), int(quarter)
+
+        parts = (folder or "").split("/")
+        if len(parts) >= 2 and parts[-2].isdigit() and parts[-1][:-1].isdigit() and parts[-1].endswith("T"):
+            return int(parts[-2]), int(parts[-1][:-1])
+        return None
+
+    @staticmethod
+    def _quarter_end(year, quarter):
+        return date(year + 1, 1, 1) if quarter == 4 else date(year, quarter * 3 + 1, 1)
+
+    def candidates(self, years=None, today=None):
+        """
+        Documenti non archiviati di trimestri chiusi da più di years anni
+
+        Returns:
+            dict: (property_id, anno) -> lista di righe (id, path, folder, name, content_hash)
+        """
+        years = self.DEFAULT_YEARS if years is None else years
+        today = today or date.today()
+        try:
+            cutoff = today.replace(year=today.year - years)
+        except ValueError:  # 29 febbraio
+            cutoff = today.replace(year=today.year - years, day=28)
+
+        session = self.db.get_session()
+        try:
+            rows = session.query(
+                Document.id, Document.property_id, Document.path, Document.folder,
+                Document.name, Document.content_hash, Document.period
+            ).outerjoin(
+                DocumentArchive, DocumentArchive.document_id == Document.id
+            ).filter(DocumentArchive.id.is_(None)).all()
+        except Exception as e:
+            self.logger.error(f"DocumentArchiver: Errore lettura indice documenti: {e}")
+            return {}
+        finally:
+            self.db.close_session(session)
+
+        groups = {}
+        for row in rows:
+            quarter = self.quarter_of(row.period, row.folder)
+            if quarter and self._quarter_end(*quarter) <= cutoff:
+                groups.setdefault((row.property_id, quarter[0]), []).append(row)
+        return groups
+
+    # ------------------------------------------------------------------
+    # Archiviazione
+    # ------------------------------------------------------------------
+
+    def pack_path(self, property_id, year):
+        return os.path.join(self.document_service.get_property_folder(property_id), PACK_DIR, f"{year}.zip")
+
+    def archive(self, years=None, progress=None):
+        """
+        Archivia i trimestri chiusi
+
+        Args:
+            years: Età minima in anni dei trimestri da archiviare
+            progress: Callback opzionale (pacchetti completati, totale)
+
+        Returns:
+            dict: {'packs', 'documents', 'bytes_before', 'bytes_packed'}
+        """
+        result = {'packs': 0, 'documents': 0, 'bytes_before': 0, 'bytes_packed': 0}
+        self._remove_leftovers()
+        groups = self.candidates(years)
+
+        for done, ((property_id, year), rows) in enumerate(sorted(groups.items()), start=1):
+            try:
+                packed = self._archive_group(property_id, year, rows, result)
+                if packed:
+                    result['packs'] += 1
+                    result['documents'] += packed
+            except Exception as e:
+                self.logger.error(f"DocumentArchiver: Errore archiviazione proprietà {property_id}, {year}: {e}")
+            if progress:
+                progress(done, len(groups))
+
+        self.logger.info(
+            f"DocumentArchiver: {result['documents']} documenti in {result['packs']} pacchetti "
+            f"({self.document_service.format_size(result['bytes_before'])} -> "
+            f"{self.document_service.format_size(result['bytes_packed'])})"
+        )
+        return result
+
+    def _archive_group(self, property_id, year, rows, result):
+        rows = [row for row in rows if os.path.isfile(row.path)]
+        if not rows:
+            return 0
+
+        pack_path = self.pack_path(property_id, year)
+        os.makedirs(os.path.dirname(pack_path), exist_ok=True)
+        pack_size = os.path.getsize(pack_path) if os.path.exists(pack_path) else 0
+
+        with _PACK_LOCK:
+            members = self._write_pack(pack_path, rows)
+
+            # Riferimenti nel DB solo dopo che il pacchetto è su disco
+            session = self.db.get_session()
+            try:
+                for row in rows:
+                    session.add(DocumentArchive(document_id=row.id, pack=pack_path, member=members[row.id]))
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                self.db.close_session(session)
+
+        result['bytes_before'] += sum(os.path.getsize(row.path) for row in rows)
+        result['bytes_packed'] += os.path.getsize(pack_path) - pack_size
+
+        self._remove_originals(property_id, rows)
+        self._release_blobs({row.content_hash for row in rows if row.content_hash})
+        return len(rows)
+
+    def _write_pack(self, pack_path, rows, drop=frozenset()):
+        """
+        Scrive il pacchetto (esistente + nuovi file - membri in drop) in un file
+        temporaneo e lo sostituisce in modo atomico: un'interruzione non
+        corrompe il pacchetto. Un pacchetto rimasto vuoto viene eliminato.
+
+        Returns:
+            dict: document_id -> nome nel pacchetto
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(pack_path), prefix=".pack-")
+        os.close(fd)
+        members = {}
+        try:
+            with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True, compresslevel=6) as pack:
+                names = set()
+                if os.path.exists(pack_path):
+                    with zipfile.ZipFile(pack_path) as existing:
+                        for info in existing.infolist():
+                            if info.filename in drop:
+                                continue
+                            with existing.open(info) as src, pack.open(info, 'w', force_zip64=True) as dst:
+                                shutil.copyfileobj(src, dst, DocumentService.CHUNK_SIZE)
+                            names.add(info.filename)
+
+                for row in rows:
+                    member = f"{row.folder}/{row.name}" if row.folder else row.name
+                    if member in names:
+                        member = f"{row.folder}/{row.id}_{row.name}" if row.folder else f"{row.id}_{row.name}"
+                    ext = os.path.splitext(row.name)[1].lower()
+                    pack.write(row.path, member,
+                               compress_type=zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED)
+                    names.add(member)
+                    members[row.id] = member
+
+            if not names:
+                os.remove(tmp_path)
+                if os.path.exists(pack_path):
+                    remove_file(pack_path)
+                return members
+
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, pack_path)
+            return members
+
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _remove_leftovers(self):
+        """
+        File ancora nell'albero di documenti già archiviati (interruzione dopo
+        il commit). Si eliminano solo se identici al membro del pacchetto
+        (dimensione e CRC): un file nuovo con lo stesso nome resta e il
+        watcher lo indicizza
+        """
+        session = self.db.get_session()
+        try:
+            rows = session.query(
+                Document.id, Document.property_id, Document.path,
+                DocumentArchive.pack, DocumentArchive.member
+            ).join(
+                DocumentArchive, DocumentArchive.document_id == Document.id
+            ).all()
+        finally:
+            self.db.close_session(session)
+
+        leftovers = {}
+        for row in rows:
+            if os.path.isfile(row.path):
+                if self._same_as_member(row.path, row.pack, row.member):
+                    leftovers.setdefault(row.property_id, []).append(row)
+                else:
+                    self.logger.warning(
+                        f"DocumentArchiver: {row.path} diverso dalla copia archiviata, non rimosso"
+                    )
+        for property_id, property_rows in leftovers.items():
+            self._remove_originals(property_id, property_rows)
+
+    @staticmethod
+    def _same_as_member(path, pack_path, member):
+        """True se il file ha dimensione e CRC-32 del membro nel pacchetto"""
+        try:
+            with zipfile.ZipFile(pack_path) as pack:
+                info = pack.getinfo(member)
+            if os.path.getsize(path) != info.file_size:
+                return False
+            crc = 0
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(DocumentService.CHUNK_SIZE), b''):
+                    crc = zlib.crc32(chunk, crc)
+            return crc == info.CRC
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return False
+
+    def members_under(self, path):
+        """
+        Membri dei pacchetti dei documenti archiviati con path uguale a path o
+        sotto la cartella path
+
+        Returns:
+            dict: pacchetto -> insieme dei nomi nel pacchetto
+        """
+        prefix = os.path.join(path, "")
+        session = self.db.get_session()
+        try:
+            rows = session.query(DocumentArchive.pack, DocumentArchive.member).join(
+                Document, DocumentArchive.document_id == Document.id
+            ).filter(
+                or_(Document.path == path, Document.path.startswith(prefix, autoescape=True))
+            ).all()
+        except Exception as e:
+            self.logger.error(f"DocumentArchiver: Errore lettura archivio: {e}")
+            return {}
+        finally:
+            self.db.close_session(session)
+
+        packed = {}
+        for row in rows:
+            packed.setdefault(row.pack, set()).add(row.member)
+        return packed
+
+    def drop_members(self, packed):
+        """Riscrive i pacchetti senza i membri indicati (documenti eliminati)"""
+        with _PACK_LOCK:
+            for pack_path, members in packed.items():
+                if not os.path.exists(pack_path):
+                    continue
+                try:
+                    self._write_pack(pack_path, [], drop=members)
+                except Exception as e:
+                    self.logger.error(f"DocumentArchiver: Errore rimozione dal pacchetto {pack_path}: {e}")
+
+    def _remove_originals(self, property_id, rows):
+        """Elimina i file archiviati e le cartelle trimestre rimaste vuote"""
+        base = os.path.abspath(self.document_service.get_property_folder(property_id))
+        folders = set()
+        for row in rows:
+            try:
+                remove_file(row.path)
+                folders.add(os.path.dirname(os.path.abspath(row.path)))
+            except OSError as e:
+                self.logger.warning(f"DocumentArchiver: File archiviato non rimosso {row.path}: {e}")
+
+        # Dal più profondo: rimuove .../anno/NT, poi .../anno e .../servizio se vuote
+        for folder in sorted(folders, key=len, reverse=True):
+            while folder.startswith(base + os.sep):
+                try:
+                    os.rmdir(folder)
+                except OSError:
+                    break
+                folder = os.path.dirname(folder)
+
+    def _release_blobs(self, content_hashes):
+        """Rimuove i blob usati solo da documenti ormai archiviati"""
+        if not content_hashes:
+            return
+
+        session = self.db.get_session()
+        try:
+            live = {
+                h for (h,) in session.query(Document.content_hash).outerjoin(
+                    DocumentArchive, DocumentArchive.document_id == Document.id
+                ).filter(
+                    Document.content_hash.in_(content_hashes),
+                    DocumentArchive.id.is_(None)
+                ).distinct().all()
+            }
+        except Exception as e:
+            self.logger.error(f"DocumentArchiver: Errore verifica riferimenti blob: {e}")
+            return
+        finally:
+            self.db.close_session(session)
+
+        for content_hash in content_hashes - live:
+            blob_path = self.document_service._blob_path(content_hash)
+            try:
+                if os.path.exists(blob_path):
+                    remove_file(blob_path)
+            except OSError as e:
+                self.logger.warning(f"DocumentArchiver: Blob non eliminato {content_hash[:12]}: {e}")
+
+    def reconcile(self):
+        """
+        Allinea document_archives ai pacchetti su disco (dopo un ripristino)
+
+        Una voce con pacchetto o membro mancante viene rimossa; la riga del
+        documento resta solo se il file è di nuovo nell'albero. Un documento
+        non archiviato, senza file ma presente nel pacchetto del suo anno
+        (stesso nome e dimensione), torna archiviato invece di sparire.
+
+        Returns:
+            dict: {'dropped', 'removed', 'relinked'}
+        """
+        result = {'dropped': 0, 'removed': 0, 'relinked': 0}
+        session = self.db.get_session()
+        try:
+            archived = session.query(
+                DocumentArchive.id, DocumentArchive.document_id, DocumentArchive.pack,
+                DocumentArchive.member, Document.path
+            ).join(Document, DocumentArchive.document_id == Document.id).all()
+            loose = session.query(
+                Document.id, Document.property_id, Document.path, Document.folder,
+                Document.name, Document.size, Document.period
+            ).outerjoin(
+                DocumentArchive, DocumentArchive.document_id == Document.id
+            ).filter(DocumentArchive.id.is_(None)).all()
+        finally:
+            self.db.close_session(session)
+
+        contents = {}
+
+        def members(pack_path):
+            """{nome: dimensione} dei membri del pacchetto ({} se assente o illeggibile)"""
+            if pack_path not in contents:
+                try:
+                    with zipfile.ZipFile(pack_path) as pack:
+                        contents[pack_path] = {info.filename: info.file_size for info in pack.infolist()}
+                except (OSError, zipfile.BadZipFile):
+                    contents[pack_path] = {}
+            return contents[pack_path]
+
+        dropped, removed = [], []
+        for row in archived:
+            if row.member not in members(row.pack):
+                dropped.append(row.id)
+                if not os.path.isfile(row.path):
+                    removed.append(row.document_id)
+
+        relinked = []
+        for row in loose:
+            quarter = self.quarter_of(row.period, row.folder)
+            if quarter is None or os.path.isfile(row.path):
+                continue
+            pack_path = self.pack_path(row.property_id, quarter[0])
+            if not os.path.exists(pack_path):
+                continue
+            prefix = f"{row.folder}/" if row.folder else ""
+            for member in (f"{prefix}{row.name}", f"{prefix}{row.id}_{row.name}"):
+                if members(pack_path).get(member) == row.size:
+                    relinked.append(DocumentArchive(document_id=row.id, pack=pack_path, member=member))
+                    break
+
+        if not (dropped or relinked):
+            return result
+
+        session = self.db.get_session()
+        try:
+            if dropped:
+                session.query(DocumentArchive).filter(
+                    DocumentArchive.id.in_(dropped)
+                ).delete(synchronize_session=False)
+            if removed:
+                session.query(Document).filter(Document.id.in_(removed)).delete(synchronize_session=False)
+            session.add_all(relinked)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"DocumentArchiver: Errore riallineamento archivio: {e}")
+            return result
+        finally:
+            self.db.close_session(session)
+
+        result.update(dropped=len(dropped), removed=len(removed), relinked=len(relinked))
+        self.logger.info(
+            f"DocumentArchiver: Archivio riallineato ({result['dropped']} voci senza pacchetto, "
+            f"{result['removed']} documenti rimossi, {result['relinked']} riagganciati)"
+        )
+        return result
+
+    # ------------------------------------------------------------------
+    # Lettura
+    # ------------------------------------------------------------------
+
+    def is_archived(self, path):
+        return not os.path.exists(path) and self._locate(path) is not None
+
+    def _locate(self, path):
+        session = self.db.get_session()
+        try:
+            return session.query(
+                Document.id, Document.name, Document.content_hash,
+                DocumentArchive.pack, DocumentArchive.member
+            ).join(
+                DocumentArchive, DocumentArchive.document_id == Document.id
+            ).filter(Document.path == path).first()
+        except Exception as e:
+            self.logger.error(f"DocumentArchiver: Errore lettura archivio: {e}")
+            return None
+        finally:
+            self.db.close_session(session)
+
+    def read_bytes(self, path):
+        """Contenuto di un documento, dal file o dal pacchetto"""
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+
+        location = self._locate(path)
+        if location is None:
+            raise FileNotFoundError(path)
+        with zipfile.ZipFile(location.pack) as pack:
+            return pack.read(location.member)
+
+    def resolve_path(self, path):
+        """
+        Percorso leggibile di un documento
+
+        Per i documenti archiviati estrae il solo file richiesto in docs/.cache
+        (riusato alle aperture successive); altrimenti ritorna path invariato.
+        """
+        if os.path.exists(path):
+            return path
+
+        location = self._locate(path)
+        if location is None:
+            return path
+
+        ext = os.path.splitext(location.name)[1]
+        cached = os.path.join(self.cache_dir, f"{location.content_hash or location.id}{ext}")
+        if os.path.exists(cached):
+            os.utime(cached)
+            return cached
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".extract-")
+        try:
+            with os.fdopen(fd, 'wb') as dst, zipfile.ZipFile(location.pack) as pack, \
+                    pack.open(location.member) as src:
+                shutil.copyfileobj(src, dst, DocumentService.CHUNK_SIZE)
+            os.replace(tmp_path, cached)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._trim_cache()
+        return cached
+
+    def clear_cache(self):
+        """Svuota la cache dei documenti estratti (es. dopo un ripristino del database)"""
+        if os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _trim_cache(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith("."):
+                    file_stat = entry.stat()
+                    entries.append((file_stat.st_mtime, file_stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+# Istanza globale dell'archiviatore
+_archiver = None
+
+
+def get_document_archiver(logger=None):
+    """Ottiene l'istanza globale del DocumentArchiver"""
+    global _archiver
+    if _archiver is None:
+        _archiver = DocumentArchiver(logger)
+    return _archiver
@@ -0,0 +1,162 @@
+import threading
+
+from sqlalchemy import func
+
+from database.models import Transaction, Supplier
+from database.connection import DatabaseConnection
+
+
+class PrefixTrie:
+    """
+    Trie di prefissi pesato per frequenza d'uso
+
+    Ogni nodo mantiene in cache i top-K valori del proprio sottoalbero,
+    così una ricerca costa solo la discesa lungo il prefisso.
+    """
+
+    TOP_K = 10
+
+    __slots__ = ('root', 'counts', 'display')
+
+    def __init__(self):
+        self.root = {}
+        self.counts = {}     # chiave normalizzata -> frequenza
+        self.display = {}    # chiave normalizzata -> valore originale
+
+    @staticmethod
+    def _key(value):
+        return value.strip().casefold()
+
+    def add(self, value, count=1):
+        """Aggiunge (o incrementa) un valore e aggiorna la cache top-K sul percorso"""
+        if not value or not value.strip():
+            return
+
+        key = self._key(value)
+        self.display.setdefault(key, value.strip())
+        total = self.counts.get(key, 0) + count
+        self.counts[key] = total
+
+        node = self.root
+        self._update_top(node, key)
+        for char in key:
+            node = node.setdefault(char, {})
+            self._update_top(node, key)
+
+    def _update_top(self, node, key):
+        """Inserisce/riordina key nella lista top-K del nodo"""
+        top = node.get('\0')
+        if top is None:
+            top = node['\0'] = []
+
+        if key in top:
+            top.remove(key)
+        elif len(top) >= self.TOP_K and self.counts[top[-1]] >= self.counts[key]:
+            return
+
+        # Inserimento ordinato per frequenza decrescente (lista corta)
+        count = self.counts[key]
+        position = len(top)
+        while position > 0 and self.counts[top[position - 1]] < count:
+            position -= 1
+        top.insert(position, key)
+        del top[self.TOP_K:]
+
+    def suggest(self, prefix, limit=TOP_K):
+        """Valori più frequenti che iniziano con prefix (case-insensitive)"""
+        node = self.root
+        for char in self._key(prefix or ""):
+            node = node.get(char)
+            if node is None:
+                return []
+        return [self.display[key] for key in node.get('\0', [])[:limit]]
+
+    def values(self):
+        """Tutti i valori ordinati per frequenza decrescente"""
+        keys = sorted(self.counts, key=lambda k: (-self.counts[k], k))
+        return [self.display[key] for key in keys]
+
+    def __len__(self):
+        return len(self.counts)
+
+
+class AutocompleteIndex:
+    """Indice in memoria dei valori distinti di servizio, fornitore e categoria"""
+
+    FIELDS = ('service', 'provider', 'category')
+
+    def __init__(self):
+        self.tries = {field: PrefixTrie() for field in self.FIELDS}
+        self.is_built = False
+        self._lock = threading.Lock()
+
+    def build(self, logger):
+        """Costruisce l'indice con query raggruppate (una per campo)"""
+        db = DatabaseConnection()
+        session = db.get_session()
+        try:
+            tries = {field: PrefixTrie() for field in self.FIELDS}
+
+            for column, field in ((Transaction.service, 'service'),
+                                  (Transaction.provider, 'provider')):
+                rows = session.query(column, func.count()).group_by(column).all()
+                for value, count in rows:
+                    tries[field].add(value, count)
+
+            rows = session.query(Supplier.category, func.count()).group_by(Supplier.category).all()
+            for value, count in rows:
+                tries['category'].add(value, count)
+                # Le categorie dei fornitori sono anche servizi validi
+                tries['service'].add(value, 0)
+
+            with self._lock:
+                self.tries = tries
+                self.is_built = True
+
+            logger.info(
+                f"AutocompleteIndex: Indice costruito "
+                f"({', '.join(f'{f}={len(t)}' for f, t in tries.items())})"
+            )
+            return True
+
+        except Exception as e:
+            logger.error(f"AutocompleteIndex: Errore costruzione indice: {e}")
+            return False
+        finally:
+            db.close_session(session)
+
+    def add_transaction(self, provider, service):
+        """Aggiornamento incrementale dopo una scrittura di transazione"""
+        if not self.is_built:
+            return
+        with self._lock:
+            self.tries['provider'].add(provider)
+            self.tries['service'].add(service)
+
+    def add_category(self, category):
+        """Aggiornamento incrementale dopo la creazione di un fornitore"""
+        if not self.is_built:
+            return
+        with self._lock:
+            self.tries['category'].add(category)
+            self.tries['service'].add(category, 0)
+
+    def suggest(self, field, prefix, limit=PrefixTrie.TOP_K):
+        """Suggerimenti per un campo ('service', 'provider', 'category')"""
+        return self.tries[field].suggest(prefix, limit)
+
+    def values(self, field):
+        """Tutti i valori di un campo ordinati per frequenza"""
+        return self.tries[field].values()
+
+
+# Istanza globale dell'indice
+_autocomplete_index = None
+
+
+def get_autocomplete_index():
+    """Ottiene l'istanza globale dell'AutocompleteIndex"""
+    global _autocomplete_index
+    if _autocomplete_index is None:
+        _autocomplete_index = AutocompleteIndex()
+    return _autocomplete_index
@@ -0,0 +1,716 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from database.connection import DatabaseConnection
+from services.document_service import get_docs_dir
+
+
+class BackupError(Exception):
+    """Backup non eseguibile (database non SQLite, backup già in corso, archivio danneggiato)"""
+
+
+class _CopyStalled(Exception):
+    """Interrompe la copia a passi quando il database continua a cambiare"""
+
+
+class BackupService:
+    """
+    Backup online, incrementali e compressi del database SQLite
+
+    La copia usa l'API di backup di SQLite a passi di STEP_PAGES pagine con
+    una breve pausa tra un passo e l'altro: l'app continua a leggere e
+    scrivere e se il database cambia a metà SQLite riparte da capo, quindi
+    la copia è sempre consistente (a differenza di una copia del file).
+
+    L'istantanea viene divisa in blocchi di BLOCK_PAGES pagine; ogni blocco
+    è salvato compresso in backups/blocks/ab/<sha256> solo se non esiste già.
+    Un backup è un manifest JSON con la lista ordinata degli hash: le pagine
+    non modificate dal backup precedente non occupano spazio. Il catalogo
+    sta su file, non nel database, così sopravvive a un ripristino.
+
+    Un backup combinato include anche l'albero docs/: ogni file è un oggetto
+    compresso nello stesso archivio (nome = SHA-256 del contenuto), quindi i
+    documenti invariati o duplicati non vengono riscritti.
+    """
+
+    # Pagine copiate per passo dell'API di backup
+    STEP_PAGES = 256
+
+    # Pausa tra un passo e l'altro: lascia spazio alle scritture dell'app
+    STEP_PAUSE = 0.005
+
+    # Passi senza avanzamento tollerati (database occupato o copia ripartita per
+    # una scrittura dell'app) prima di copiare tutto in un solo passo, tenendo
+    # il lock di lettura per la sola durata della copia
+    MAX_STALLED_STEPS = 50
+
+    # Pagine per blocco deduplicato (64 KB con pagine da 4 KB)
+    BLOCK_PAGES = 16
+
+    COMPRESS_LEVEL = 6
+
+    # Cartelle di primo livello di docs/ escluse dal backup: cache ricostruibili,
+    # archivio blob (ricollegato dal ripristino) e cartelle in eliminazione
+    DOCS_SKIP_PREFIX = "."
+
+    # Blocchi di lettura dei documenti
+    CHUNK_SIZE = 1024 * 1024
+
+    # Conservazione: gli ultimi KEEP_LAST, poi il più recente per giorno,
+    # settimana e mese fino ai limiti indicati
+    KEEP_LAST = 5
+    KEEP_DAILY = 7
+    KEEP_WEEKLY = 4
+    KEEP_MONTHLY = 12
+
+    # Backup automatico: ogni quante ore e ogni quanto controllare
+    DEFAULT_INTERVAL_HOURS = 24
+    CHECK_INTERVAL = 15 * 60
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.interval_hours = self.DEFAULT_INTERVAL_HOURS
+
+    # ------------------------------------------------------------------
+    # Percorsi
+    # ------------------------------------------------------------------
+
+    def available(self):
+        """True se il database è un file SQLite (gli altri DB hanno i loro backup)"""
+        return self.db.database_path() is not None
+
+    @property
+    def backups_dir(self):
+        """backups/ accanto al file del database"""
+        db_path = self.db.database_path()
+        if db_path is None:
+            raise BackupError("Backup disponibili solo per il database SQLite locale")
+        return os.path.join(os.path.dirname(os.path.abspath(db_path)), "backups")
+
+    def _blocks_dir(self):
+        return os.path.join(self.backups_dir, "blocks")
+
+    def _manifests_dir(self):
+        return os.path.join(self.backups_dir, "manifests")
+
+    def _block_path(self, block_hash):
+        """backups/blocks/ab/<sha256>"""
+        return os.path.join(self._blocks_dir(), block_hash[:2], block_hash)
+
+    def _manifest_path(self, backup_id):
+        return os.path.join(self._manifests_dir(), f"{backup_id}.json")
+
+    @staticmethod
+    def _write_atomic(path, data):
+        """Scrive in <path>.part e rinomina: mai file a metà nell'archivio"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part = f"{path}.part"
+        with open(part, 'wb') as f:
+            f.write(data)
+        os.replace(part, path)
+
+    # ------------------------------------------------------------------
+    # Catalogo
+    # ------------------------------------------------------------------
+
+    def list_backups(self):
+        """Manifest di tutti i backup, dal più recente"""
+        try:
+            directory = self._manifests_dir()
+        except BackupError:
+            return []
+        if not os.path.isdir(directory):
+            return []
+
+        backups = []
+        for name in os.listdir(directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                    backups.append(json.load(f))
+            except (OSError, ValueError) as e:
+                self.logger.error(f"BackupService: Manifest illeggibile {name}: {e}")
+        return sorted(backups, key=lambda backup: backup['created_at'], reverse=True)
+
+    def get_backup(self, backup_id):
+        with open(self._manifest_path(backup_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest):
+        data = json.dumps(manifest, indent=1, ensure_ascii=False).encode('utf-8')
+        self._write_atomic(self._manifest_path(manifest['id']), data)
+
+    def last_backup_time(self):
+        backups = self.list_backups()
+        return datetime.fromisoformat(backups[0]['created_at']) if backups else None
+
+    # ------------------------------------------------------------------
+    # Backup
+    # ------------------------------------------------------------------
+
+    def create_backup(self, reason="manuale", verify=True, progress=None, include_documents=False):
+        """
+        Esegue un backup online del database
+
+        Args:
+            reason: 'manuale', 'pianificato' o 'pre-ripristino' (registrato nel manifest)
+            verify: Se True ricostruisce il backup e ne esegue integrity_check
+            progress: callback(fase, fatto, totale), fase 'copia' | 'archivio' | 'documenti' | 'verifica'
+            include_documents: Se True è un backup combinato con l'albero docs/
+
+        Returns:
+            dict: manifest del backup (id, created_at, size, stored_bytes, new_blocks,
+            blocks_total, duration, verified, ...)
+
+        Raises:
+            BackupError: database non SQLite o backup già in corso
+        """
+        if not self._run_lock.acquire(blocking=False):
+            raise BackupError("Un backup è già in corso")
+        try:
+            return self._create_backup(reason, verify, progress, include_documents)
+        finally:
+            self._run_lock.release()
+
+    @contextmanager
+    def exclusive(self, timeout=60):
+        """Nessun backup (manuale o pianificato) durante il blocco: usato dal ripristino"""
+        if not self._run_lock.acquire(timeout=timeout):
+            raise BackupError("Un backup è in corso, riprovare al termine")
+        try:
+            yield
+        finally:
+            self._run_lock.release()
+
+    def _create_backup(self, reason, verify, progress, include_documents):
+        started = time.perf_counter()
+        db_path = self.db.database_path()
+        if db_path is None:
+            raise BackupError("Backup disponibili solo per il database SQLite locale")
+
+        os.makedirs(self.backups_dir, exist_ok=True)
+        self._remove_temporary()
+        fd, snapshot_path = tempfile.mkstemp(dir=self.backups_dir, prefix=".snapshot-", suffix=".db")
+        os.close(fd)
+        try:
+            page_size = self._snapshot(db_path, snapshot_path, progress)
+            created = datetime.now()
+            backup_id = f"backup_{created.strftime('%Y%m%d_%H%M%S')}"
+            if os.path.exists(self._manifest_path(backup_id)):
+                backup_id += f"_{created.microsecond:06d}"
+            manifest = {
+                'id': backup_id,
+                'created_at': created.isoformat(timespec='seconds'),
+                'reason': reason,
+                'page_size': page_size,
+                'block_size': page_size * self.BLOCK_PAGES,
+            }
+            manifest.update(self._store_blocks(snapshot_path, manifest['block_size'], progress))
+            manifest['tables'] = self._tables(snapshot_path)
+        finally:
+            os.remove(snapshot_path)
+
+        if include_documents:
+            manifest.update(self._store_documents(progress))
+
+        manifest['duration'] = round(time.perf_counter() - started, 2)
+        manifest['verified'] = None
+        self._save_manifest(manifest)
+        self.logger.info(
+            f"BackupService: {manifest['id']} ({reason}) {self.format_size(manifest['size'])}, "
+            f"{manifest['new_blocks']}/{manifest['blocks_total']} blocchi nuovi, "
+            f"{self.format_size(manifest['stored_bytes'])} scritti in {manifest['duration']:.1f}s"
+        )
+
+        self.apply_retention()
+        if verify:
+            manifest = self.verify(manifest['id'], progress=progress)
+        return manifest
+
+    def _snapshot(self, db_path, snapshot_path, progress):
+        """Copia online a passi con l'API di backup; ritorna la dimensione di pagina"""
+        source = sqlite3.connect(db_path, timeout=30)
+        target = sqlite3.connect(snapshot_path)
+        try:
+            state = {'done': 0, 'stalled': 0}
+
+            def step(status, remaining, total):
+                done = total - remaining
+                if done > state['done']:
+                    state['done'] = done
+                    state['stalled'] = 0
+                    if progress:
+                        progress('copia', done, total)
+                else:
+                    # Database occupato, oppure cambiato durante la copia e SQLite è ripartito da capo
+                    state['stalled'] += 1
+                    if state['stalled'] > self.MAX_STALLED_STEPS:
+                        raise _CopyStalled()
+                # Tra un passo e l'altro il lock di lettura è rilasciato: le scritture dell'app passano
+                time.sleep(self.STEP_PAUSE)
+
+            try:
+                source.backup(target, pages=self.STEP_PAGES, progress=step, sleep=self.STEP_PAUSE)
+            except _CopyStalled:
+                self.logger.info("BackupService: Database in scrittura continua, copia in un solo passo")
+                source.backup(target, pages=-1, sleep=self.STEP_PAUSE)
+            return target.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+
+    def _store_blocks(self, snapshot_path, block_size, progress):
+        """Divide l'istantanea in blocchi e scrive compressi solo quelli nuovi"""
+        size = os.path.getsize(snapshot_path)
+        total = max(1, -(-size // block_size))
+        blocks = []
+        new_blocks = 0
+        stored_bytes = 0
+        file_hash = hashlib.sha256()
+
+        with open(snapshot_path, 'rb') as f:
+            while True:
+                data = f.read(block_size)
+                if not data:
+                    break
+                file_hash.update(data)
+                block_hash = hashlib.sha256(data).hexdigest()
+                blocks.append(block_hash)
+
+                path = self._block_path(block_hash)
+                if not os.path.exists(path):
+                    compressed = zlib.compress(data, self.COMPRESS_LEVEL)
+                    self._write_atomic(path, compressed)
+                    new_blocks += 1
+                    stored_bytes += len(compressed)
+
+                if progress and len(blocks) % 64 == 0:
+                    progress('archivio', len(blocks), total)
+
+        return {
+            'size': size,
+            'sha256': file_hash.hexdigest(),
+            'blocks': blocks,
+            'blocks_total': len(blocks),
+            'new_blocks': new_blocks,
+            'stored_bytes': stored_bytes,
+        }
+
+    def _store_object(self, path):
+        """
+        Archivia un file come oggetto compresso (nome = SHA-256 del contenuto)
+
+        Una sola lettura: il file viene compresso in un temporaneo mentre se
+        ne calcola l'hash, poi rinominato; se l'oggetto esiste già il
+        temporaneo viene scartato.
+
+        Returns:
+            (hash, byte scritti nell'archivio)
+        """
+        os.makedirs(self._blocks_dir(), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._blocks_dir(), prefix=".object-")
+        sha256 = hashlib.sha256()
+        compressor = zlib.compressobj(self.COMPRESS_LEVEL)
+        written = 0
+        try:
+            with os.fdopen(fd, 'wb') as out, open(path, 'rb') as src:
+                for chunk in iter(lambda: src.read(self.CHUNK_SIZE), b''):
+                    sha256.update(chunk)
+                    data = compressor.compress(chunk)
+                    out.write(data)
+                    written += len(data)
+                data = compressor.flush()
+                out.write(data)
+                written += len(data)
+
+            object_hash = sha256.hexdigest()
+            target = self._block_path(object_hash)
+            if os.path.exists(target):
+                os.remove(tmp_path)
+                return object_hash, 0
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+            return object_hash, written
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _extract_object(self, object_hash, target_path):
+        """Decomprime un oggetto in target_path controllandone l'hash"""
+        source = self._block_path(object_hash)
+        if not os.path.exists(source):
+            raise BackupError(f"Documento mancante nell'archivio: {object_hash[:12]}")
+        sha256 = hashlib.sha256()
+        decompressor = zlib.decompressobj()
+        part = f"{target_path}.part"
+        with open(source, 'rb') as src, open(part, 'wb') as out:
+            for chunk in iter(lambda: src.read(self.CHUNK_SIZE), b''):
+                data = decompressor.decompress(chunk)
+                sha256.update(data)
+                out.write(data)
+            data = decompressor.flush()
+            sha256.update(data)
+            out.write(data)
+        if sha256.hexdigest() != object_hash:
+            os.remove(part)
+            raise BackupError(f"Documento danneggiato nell'archivio: {object_hash[:12]}")
+        os.replace(part, target_path)
+
+    def _iter_document_files(self, docs_dir):
+        """(percorso relativo con '/', percorso) dei file di docs/, escluse le cartelle nascoste di primo livello"""
+        for entry in sorted(os.listdir(docs_dir)):
+            if entry.startswith(self.DOCS_SKIP_PREFIX):
+                continue
+            top = os.path.join(docs_dir, entry)
+            if os.path.isfile(top):
+                yield entry, top
+                continue
+            for root, dirs, files in os.walk(top):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, docs_dir).replace(os.sep, '/'), path
+
+    def _store_documents(self, progress):
+        """
+        Archivia l'albero docs/; i file con stessa dimensione e mtime del
+        backup combinato precedente non vengono riletti
+
+        Returns:
+            dict: {'documents': [[percorso, hash, size, mtime]], 'documents_size',
+            'documents_new', 'documents_stored_bytes'}
+        """
+        docs_dir = str(get_docs_dir())
+        previous = next((backup for backup in self.list_backups() if backup.get('documents')), None)
+        known = {path: (object_hash, size, mtime) for path, object_hash, size, mtime in
+                 (previous['documents'] if previous else [])}
+
+        documents = []
+        total_size = new_objects = stored_bytes = 0
+        files = list(self._iter_document_files(docs_dir)) if os.path.isdir(docs_dir) else []
+        for done, (relative, path) in enumerate(files, start=1):
+            try:
+                stat = os.stat(path)
+                cached = known.get(relative)
+                if cached and cached[1] == stat.st_size and cached[2] == stat.st_mtime \
+                        and os.path.exists(self._block_path(cached[0])):
+                    object_hash = cached[0]
+                else:
+                    object_hash, written = self._store_object(path)
+                    if written:
+                        new_objects += 1
+                        stored_bytes += written
+            except OSError as e:
+                # File rimosso o bloccato durante il backup: il resto dell'albero viene salvato comunque
+                self.logger.warning(f"BackupService: Documento saltato {relative}: {e}")
+                continue
+            documents.append([relative, object_hash, stat.st_size, stat.st_mtime])
+            total_size += stat.st_size
+            if progress and done % 50 == 0:
+                progress('documenti', done, len(files))
+
+        return {
+            'documents': documents,
+            'documents_size': total_size,
+            'documents_new': new_objects,
+            'documents_stored_bytes': stored_bytes,
+        }
+
+    def restore_documents(self, backup_id, target_dir, progress=None):
+        """Ricrea in target_dir (nuova cartella) l'albero docs/ di un backup combinato; ritorna i file scritti"""
+        manifest = self.get_backup(backup_id)
+        if not manifest.get('documents'):
+            raise BackupError("Il backup non contiene documenti")
+        total = len(manifest['documents'])
+        for done, (relative, object_hash, size, mtime) in enumerate(manifest['documents'], start=1):
+            path = os.path.join(target_dir, *relative.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._extract_object(object_hash, path)
+            os.utime(path, (mtime, mtime))
+            if progress and done % 50 == 0:
+                progress('documenti', done, total)
+        return total
+
+    def _remove_temporary(self):
+        """Istantanee e verifiche rimaste da un backup interrotto alla chiusura dell'app"""
+        for name in os.listdir(self.backups_dir):
+            if name.startswith((".snapshot-", ".verify-")):
+                os.remove(os.path.join(self.backups_dir, name))
+        blocks_dir = self._blocks_dir()
+        if os.path.isdir(blocks_dir):
+            for name in os.listdir(blocks_dir):
+                if name.startswith(".object-"):
+                    os.remove(os.path.join(blocks_dir, name))
+
+    @staticmethod
+    def _tables(path):
+        connection = sqlite3.connect(path)
+        try:
+            return sorted(name for (name,) in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            ))
+        finally:
+            connection.close()
+
+    # ------------------------------------------------------------------
+    # Ricostruzione e verifica
+    # ------------------------------------------------------------------
+
+    def _iter_blocks(self, manifest):
+        """Blocchi decompressi del backup, ciascuno controllato contro il proprio hash"""
+        for block_hash in manifest['blocks']:
+            path = self._block_path(block_hash)
+            if not os.path.exists(path):
+                raise BackupError(f"Blocco mancante nell'archivio: {block_hash[:12]}")
+            with open(path, 'rb') as f:
+                data = zlib.decompress(f.read())
+            if hashlib.sha256(data).hexdigest() != block_hash:
+                raise BackupError(f"Blocco danneggiato nell'archivio: {block_hash[:12]}")
+            yield data
+
+    def materialize(self, backup_id, target_path):
+        """Ricostruisce il file del database di un backup in target_path"""
+        manifest = self.get_backup(backup_id)
+        file_hash = hashlib.sha256()
+        part = f"{target_path}.part"
+        with open(part, 'wb') as f:
+            for data in self._iter_blocks(manifest):
+                file_hash.update(data)
+                f.write(data)
+        if file_hash.hexdigest() != manifest['sha256']:
+            os.remove(part)
+            raise BackupError("Il backup ricostruito non corrisponde all'originale")
+        os.replace(part, target_path)
+        return target_path
+
+    def export_copy(self, backup_id, path):
+        """Copia portatile di un backup (database compresso .db.gz), ad esempio su un disco esterno"""
+        manifest = self.get_backup(backup_id)
+        part = f"{path}.part"
+        with gzip.open(part, 'wb', compresslevel=self.COMPRESS_LEVEL) as f:
+            for data in self._iter_blocks(manifest):
+                f.write(data)
+        os.replace(part, path)
+        return path
+
+    def verify(self, backup_id, progress=None):
+        """
+        Ricostruisce il backup in un file temporaneo ed esegue PRAGMA integrity_check
+
+        Returns:
+            Manifest aggiornato con verified (True/False), verified_at e verify_message
+        """
+        manifest = self.get_backup(backup_id)
+        if progress:
+            progress('verifica', 0, 1)
+
+        fd, path = tempfile.mkstemp(dir=self.backups_dir, prefix=".verify-", suffix=".db")
+        os.close(fd)
+        try:
+            try:
+                self.materialize(backup_id, path)
+                connection = sqlite3.connect(path)
+                try:
+                    rows = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+                finally:
+                    connection.close()
+                ok = rows == ['ok']
+                message = "ok" if ok else "; ".join(rows[:5])
+                if ok and manifest.get('documents'):
+                    missing = self._check_documents(manifest)
+                    ok = not missing
+                    message = "ok" if ok else f"{len(missing)} documenti mancanti o danneggiati: {missing[0]}"
+            except (BackupError, sqlite3.DatabaseError, OSError, zlib.error) as e:
+                ok, message = False, str(e)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+        manifest['verified'] = ok
+        manifest['verified_at'] = datetime.now().isoformat(timespec='seconds')
+        manifest['verify_message'] = message
+        self._save_manifest(manifest)
+        if progress:
+            progress('verifica', 1, 1)
+
+        if ok:
+            self.logger.info(f"BackupService: {backup_id} verificato")
+        else:
+            self.logger.error(f"BackupService: {backup_id} NON valido: {message}")
+        return manifest
+
+    def _check_documents(self, manifest):
+        """Percorsi dei documenti del backup il cui oggetto manca o non corrisponde all'hash"""
+        bad = []
+        for relative, object_hash, size, mtime in manifest['documents']:
+            source = self._block_path(object_hash)
+            try:
+                sha256 = hashlib.sha256()
+                decompressor = zlib.decompressobj()
+                with open(source, 'rb') as f:
+                    for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                        sha256.update(decompressor.decompress(chunk))
+                sha256.update(decompressor.flush())
+                if sha256.hexdigest() != object_hash:
+                    bad.append(relative)
+            except (OSError, zlib.error):
+                bad.append(relative)
+        return bad
+
+    def verify_all(self, progress=None):
+        """Verifica tutti i backup; ritorna {backup_id: (ok, messaggio)}"""
+        if not self._run_lock.acquire(blocking=False):
+            raise BackupError("Un backup è già in corso")
+        try:
+            results = {}
+            for manifest in self.list_backups():
+                checked = self.verify(manifest['id'], progress=progress)
+                results[manifest['id']] = (checked['verified'], checked['verify_message'])
+            return results
+        finally:
+            self._run_lock.release()
+
+    # ------------------------------------------------------------------
+    # Conservazione
+    # ------------------------------------------------------------------
+
+    def _to_keep(self, backups):
+        """ID dei backup da conservare (backups dal più recente)"""
+        keep = {backup['id'] for backup in backups[:self.KEEP_LAST]}
+        buckets = (
+            (self.KEEP_DAILY, lambda d: d.date()),
+            (self.KEEP_WEEKLY, lambda d: tuple(d.isocalendar())[:2]),
+            (self.KEEP_MONTHLY, lambda d: (d.year, d.month)),
+        )
+        for limit, bucket in buckets:
+            seen = set()
+            for backup in backups:
+                key = bucket(datetime.fromisoformat(backup['created_at']))
+                if key not in seen and len(seen) < limit:
+                    seen.add(key)
+                    keep.add(backup['id'])
+        return keep
+
+    def apply_retention(self):
+        """
+        Elimina i backup fuori dalla politica di conservazione e i blocchi
+        non più usati da nessun backup
+
+        Returns:
+            dict: {'backups_deleted', 'blocks_deleted', 'bytes_freed'}
+        """
+        backups = self.list_backups()
+        keep = self._to_keep(backups)
+        result = {'backups_deleted': 0, 'blocks_deleted': 0, 'bytes_freed': 0}
+
+        for backup in backups:
+            if backup['id'] not in keep:
+                os.remove(self._manifest_path(backup['id']))
+                result['backups_deleted'] += 1
+
+        if result['backups_deleted']:
+            used = set()
+            for backup in backups:
+                if backup['id'] in keep:
+                    used.update(backup['blocks'])
+                    used.update(document[1] for document in backup.get('documents') or ())
+            blocks_dir = self._blocks_dir()
+            for prefix in os.listdir(blocks_dir):
+                folder = os.path.join(blocks_dir, prefix)
+                if not os.path.isdir(folder):
+                    continue
+                for name in os.listdir(folder):
+                    if name not in used and not name.endswith(".part"):
+                        path = os.path.join(folder, name)
+                        result['bytes_freed'] += os.path.getsize(path)
+                        os.remove(path)
+                        result['blocks_deleted'] += 1
+
+            self.logger.info(
+                f"BackupService: Conservazione: {result['backups_deleted']} backup e "
+                f"{result['blocks_deleted']} blocchi eliminati ({self.format_size(result['bytes_freed'])})"
+            )
+        return result
+
+    def archive_size(self):
+        """Spazio occupato dall'archivio dei backup (blocchi compressi)"""
+        total = 0
+        try:
+            blocks_dir = self._blocks_dir()
+        except BackupError:
+            return 0
+        for root, _, files in os.walk(blocks_dir):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return total
+
+    # ------------------------------------------------------------------
+    # Backup pianificato
+    # ------------------------------------------------------------------
+
+    def start_schedule(self, interval_hours=None):
+        """Avvia il thread che esegue un backup quando l'ultimo è più vecchio dell'intervallo"""
+        if not self.available():
+            return
+        if interval_hours is not None:
+            self.interval_hours = interval_hours
+        if self.interval_hours <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_schedule, name="BackupScheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def is_due(self, now=None):
+        last = self.last_backup_time()
+        return last is None or (now or datetime.now()) - last >= timedelta(hours=self.interval_hours)
+
+    def _run_schedule(self):
+        # Primo controllo dopo qualche minuto: l'avvio dell'app ha la precedenza
+        while not self._stop.wait(self.CHECK_INTERVAL):
+            try:
+                if self.is_due():
+                    self.create_backup(reason="pianificato")
+            except BackupError as e:
+                self.logger.info(f"BackupService: Backup pianificato rimandato: {e}")
+            except Exception as e:
+                self.logger.error(f"BackupService: Errore backup pianificato: {e}")
+
+    @staticmethod
+    def format_size(size):
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024:
+                return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+            size /= 1024
+        return f"{size:.1f} TB"
+
+
+# Istanza globale del servizio di backup
+_backup_service = None
+
+
+def get_backup_service(logger=None):
+    """Ottiene l'istanza globale del BackupService"""
+    global _backup_service
+    if _backup_service is None:
+        _backup_service = BackupService(logger)
+    return _backup_service
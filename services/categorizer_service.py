@@ -0,0 +1,220 @@
+import math
+import threading
+from collections import defaultdict, Counter
+
+from sqlalchemy import func
+
+from database.models import Transaction
+from database.connection import DatabaseConnection
+from services.supplier_link_service import normalize_name
+
+
+class NaiveBayesModel:
+    """
+    Naive Bayes multinomiale con aggiornamento incrementale
+
+    I conteggi sono memorizzati per token (posting list token -> classe),
+    quindi lo scoring tocca solo le classi che condividono almeno un token
+    con l'input più un termine di base per classe.
+    """
+
+    def __init__(self):
+        self.class_docs = Counter()                  # classe -> numero esempi
+        self.class_tokens = Counter()                # classe -> numero token
+        self.postings = defaultdict(Counter)         # token -> {classe: conteggio}
+        self.total_docs = 0
+
+    def learn(self, tokens, label, weight=1):
+        """Aggiunge un esempio (o weight esempi identici)"""
+        if label is None or not tokens:
+            return
+        self.class_docs[label] += weight
+        self.class_tokens[label] += len(tokens) * weight
+        self.total_docs += weight
+        for token in tokens:
+            self.postings[token][label] += weight
+
+    def predict(self, tokens, top=3):
+        """
+        Returns:
+            Lista di (label, probabilità) ordinata, al massimo top elementi
+        """
+        known = [t for t in tokens if t in self.postings]
+        if not known or not self.total_docs:
+            return []
+
+        vocab_size = len(self.postings)
+        n = len(known)
+
+        # Termine di base (prior + smoothing di Laplace per ogni token)
+        scores = {
+            label: math.log(docs / self.total_docs) - n * math.log(self.class_tokens[label] + vocab_size)
+            for label, docs in self.class_docs.items()
+        }
+
+        # Contributo sparso: solo le classi in cui il token compare
+        for token in known:
+            for label, count in self.postings[token].items():
+                scores[label] += math.log(count + 1)
+
+        best = sorted(scores.items(), key=lambda item: -item[1])[:top]
+
+        # Normalizza in probabilità (softmax sui punteggi log)
+        max_score = best[0][1]
+        norm = sum(math.exp(score - max_score) for score in scores.values())
+        return [(label, math.exp(score - max_score) / norm) for label, score in best]
+
+
+class TransactionCategorizer:
+    """
+    Predice categoria (service) e fornitore di una nuova transazione
+    a partire dallo storico delle transazioni
+    """
+
+    # Esempi minimi per fidarsi della sola tabella per provider
+    MIN_PROVIDER_SAMPLES = 2
+
+    def __init__(self):
+        self.provider_categories = defaultdict(Counter)   # provider normalizzato -> {service: n}
+        self.provider_suppliers = defaultdict(Counter)    # provider normalizzato -> {supplier_id: n}
+        self.category_model = NaiveBayesModel()
+        self.supplier_model = NaiveBayesModel()
+        self.display = {}                                 # service normalizzato -> testo originale
+        self.is_trained = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tokens(text):
+        return normalize_name(text).split()
+
+    def train(self, logger):
+        """Addestra il modello con una sola query raggruppata sullo storico"""
+        db = DatabaseConnection()
+        session = db.get_session()
+        try:
+            rows = session.query(
+                Transaction.provider,
+                Transaction.service,
+                Transaction.supplier_id,
+                func.count(Transaction.id)
+            ).group_by(
+                Transaction.provider, Transaction.service, Transaction.supplier_id
+            ).all()
+
+            fresh = TransactionCategorizer()
+            for provider, service, supplier_id, count in rows:
+                fresh._learn(provider, service, supplier_id, count)
+
+            with self._lock:
+                self.provider_categories = fresh.provider_categories
+                self.provider_suppliers = fresh.provider_suppliers
+                self.category_model = fresh.category_model
+                self.supplier_model = fresh.supplier_model
+                self.display = fresh.display
+                self.is_trained = True
+
+            logger.info(
+                f"TransactionCategorizer: Modello addestrato su "
+                f"{self.category_model.total_docs} transazioni "
+                f"({len(self.category_model.postings)} token)"
+            )
+            return True
+
+        except Exception as e:
+            logger.error(f"TransactionCategorizer: Errore addestramento: {e}")
+            return False
+        finally:
+            db.close_session(session)
+
+    def learn(self, provider, service, supplier_id=None):
+        """Aggiornamento incrementale dopo la creazione di una transazione"""
+        if not self.is_trained:
+            return
+        with self._lock:
+            self._learn(provider, service, supplier_id, 1)
+
+    def _learn(self, provider, service, supplier_id, weight):
+        provider_key = normalize_name(provider)
+        service_key = (service or "").strip().casefold()
+        if not provider_key or not service_key:
+            return
+
+        self.display.setdefault(service_key, service.strip())
+        provider_tokens = provider_key.split()
+
+        self.provider_categories[provider_key][service_key] += weight
+        self.category_model.learn(provider_tokens, service_key, weight)
+
+        if supplier_id:
+            self.provider_suppliers[provider_key][supplier_id] += weight
+            self.supplier_model.learn(provider_tokens + self._tokens(service), supplier_id, weight)
+
+    def predict(self, provider, service=None):
+        """
+        Predice categoria e fornitore
+
+        Args:
+            provider: Testo del fornitore/emittente
+            service: Testo del servizio (opzionale, migliora il fornitore)
+
+        Returns:
+            dict: {
+                'category': str o None,
+                'category_confidence': float,
+                'supplier_id': int o None,
+                'supplier_confidence': float
+            }
+        """
+        result = {
+            'category': None,
+            'category_confidence': 0.0,
+            'supplier_id': None,
+            'supplier_confidence': 0.0
+        }
+
+        provider_key = normalize_name(provider)
+        if not provider_key or not self.is_trained:
+            return result
+
+        provider_tokens = provider_key.split()
+        supplier_tokens = provider_tokens + self._tokens(service)
+
+        # learn() aggiorna le stesse tabelle da altri thread (import, salvataggi)
+        with self._lock:
+            # 1. Tabella di frequenza per provider (match esatto normalizzato)
+            categories = self.provider_categories.get(provider_key)
+            if categories and sum(categories.values()) >= self.MIN_PROVIDER_SAMPLES:
+                service_key, count = categories.most_common(1)[0]
+                result['category'] = self.display[service_key]
+                result['category_confidence'] = count / sum(categories.values())
+            else:
+                # 2. Naive Bayes sui token del provider
+                predictions = self.category_model.predict(provider_tokens, top=1)
+                if predictions:
+                    service_key, probability = predictions[0]
+                    result['category'] = self.display[service_key]
+                    result['category_confidence'] = probability
+
+            suppliers = self.provider_suppliers.get(provider_key)
+            if suppliers:
+                supplier_id, count = suppliers.most_common(1)[0]
+                result['supplier_id'] = supplier_id
+                result['supplier_confidence'] = count / sum(suppliers.values())
+            else:
+                predictions = self.supplier_model.predict(supplier_tokens, top=1)
+                if predictions:
+                    result['supplier_id'], result['supplier_confidence'] = predictions[0]
+
+        return result
+
+
+# Istanza globale del categorizzatore
+_categorizer = None
+
+
+def get_categorizer():
+    """Ottiene l'istanza globale del TransactionCategorizer"""
+    global _categorizer
+    if _categorizer is None:
+        _categorizer = TransactionCategorizer()
+    return _categorizer
@@ -0,0 +1,194 @@
+from sqlalchemy import text as sql_text, func
+
+from database.models import ChangeLog
+from database.connection import DatabaseConnection
+
+
+# Tabelle registrate: (colonne confrontate negli UPDATE, proprietà della riga, periodo yyyy-MM della riga).
+# Negli SQL "{row}" è new oppure old.
+TRACKED_TABLES = {
+    'transactions': (
+        ('property_id', 'supplier_id', 'date', 'type', 'amount', 'provider', 'service'),
+        "{row}.property_id",
+        # dd/MM/yyyy -> yyyy-MM
+        "substr({row}.date, 7, 4) || '-' || substr({row}.date, 4, 2)"
+    ),
+    'deadlines': (
+        ('property_id', 'title', 'description', 'due_date', 'completed'),
+        "{row}.property_id",
+        "substr({row}.due_date, 1, 7)"
+    ),
+    'suppliers': (
+        ('property_id', 'name', 'category', 'phone', 'email', 'address', 'notes', 'rating',
+         'last_service_date', 'total_spent', 'service_count'),
+        "{row}.property_id",
+        "NULL"
+    ),
+    # Nome e indirizzo della proprietà compaiono negli export delle righe collegate
+    'properties': (
+        ('name', 'address', 'owner'),
+        "{row}.id",
+        "NULL"
+    ),
+}
+
+
+def _insert(table, op, row, property_sql, period_sql):
+    return (
+        f"INSERT INTO change_log(table_name, row_id, op, property_id, period, changed_at) "
+        f"VALUES ('{table}', {row}.id, '{op}', {property_sql.format(row=row)}, "
+        f"{period_sql.format(row=row)}, CURRENT_TIMESTAMP);"
+    )
+
+
+def _triggers(table, columns, property_sql, period_sql):
+    changed = " OR ".join(f"old.{column} IS NOT new.{column}" for column in columns)
+    moved = (
+        f"{property_sql.format(row='old')} IS NOT {property_sql.format(row='new')} "
+        f"OR {period_sql.format(row='old')} IS NOT {period_sql.format(row='new')}"
+    )
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_cdc_ai AFTER INSERT ON {table} BEGIN
+            {_insert(table, 'I', 'new', property_sql, period_sql)}
+        END""",
+        # Solo modifiche reali: i ricalcoli che riscrivono gli stessi valori non contano.
+        # Se la riga cambia proprietà o mese viene registrata anche la posizione precedente.
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_cdc_au AFTER UPDATE ON {table} WHEN {changed} BEGIN
+            {_insert(table, 'U', 'new', property_sql, period_sql)}
+            INSERT INTO change_log(table_name, row_id, op, property_id, period, changed_at)
+            SELECT '{table}', old.id, 'U', {property_sql.format(row='old')}, {period_sql.format(row='old')},
+                   CURRENT_TIMESTAMP
+            WHERE {moved};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_cdc_ad AFTER DELETE ON {table} BEGIN
+            {_insert(table, 'D', 'old', property_sql, period_sql)}
+        END""",
+    ]
+
+
+CHANGE_LOG_DDL = [
+    statement
+    for table, spec in TRACKED_TABLES.items()
+    for statement in _triggers(table, *spec)
+]
+
+
+class ChangeLogService:
+    """
+    Change data capture per gli export incrementali
+
+    Su SQLite ogni INSERT/UPDATE/DELETE su transazioni, scadenze, fornitori e
+    proprietà aggiunge una riga a change_log tramite trigger, nella stessa
+    transazione della modifica: vengono registrate anche le scritture in
+    blocco (UPDATE/DELETE diretti) che non passano dagli oggetti ORM.
+    Su altri database il registro non è attivo e gli export restano completi.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+        self.enabled = False
+
+    def ensure_schema(self):
+        """Crea i trigger del change_log (solo SQLite)"""
+        session = self.db.get_session()
+        try:
+            if session.get_bind().dialect.name != 'sqlite':
+                self.enabled = False
+                return False
+
+            for statement in CHANGE_LOG_DDL:
+                session.execute(sql_text(statement))
+            session.commit()
+            self.enabled = True
+            return True
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"ChangeLogService: Trigger change_log non creati, export solo completi: {e}")
+            self.enabled = False
+            return False
+        finally:
+            self.db.close_session(session)
+
+    def current_seq(self):
+        """Ultimo numero di sequenza registrato (0 se il registro è vuoto)"""
+        session = self.db.get_session()
+        try:
+            if self.enabled:
+                # AUTOINCREMENT: sqlite_sequence conserva l'ultimo seq anche dopo la pulizia del registro
+                seq = session.execute(
+                    sql_text("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+                ).scalar()
+                if seq is not None:
+                    return seq
+            return session.query(func.max(ChangeLog.seq)).scalar() or 0
+        except Exception as e:
+            self.logger.error(f"ChangeLogService: Errore lettura sequenza: {e}")
+            return 0
+        finally:
+            self.db.close_session(session)
+
+    def last_changes(self, table_name, property_id=None):
+        """
+        Ultima modifica per periodo di una tabella
+
+        Returns:
+            ({periodo: seq}, seq) dove il secondo valore è l'ultima modifica che
+            riguarda tutti i periodi (righe senza periodo, proprietà modificate);
+            None se il registro non è attivo
+        """
+        if not self.enabled:
+            return None
+        session = self.db.get_session()
+        try:
+            query = session.query(ChangeLog.period, func.max(ChangeLog.seq)).filter(
+                ChangeLog.table_name == table_name
+            )
+            if property_id:
+                query = query.filter(ChangeLog.property_id == property_id)
+            by_period = dict(query.group_by(ChangeLog.period).all())
+
+            everything = by_period.pop(None, 0) or 0
+            property_query = session.query(func.max(ChangeLog.seq)).filter(ChangeLog.table_name == 'properties')
+            if property_id:
+                property_query = property_query.filter(ChangeLog.row_id == property_id)
+            everything = max(everything, property_query.scalar() or 0)
+            return by_period, everything
+
+        except Exception as e:
+            self.logger.error(f"ChangeLogService: Errore lettura modifiche {table_name}: {e}")
+            return None
+        finally:
+            self.db.close_session(session)
+
+    def prune(self, table_name, up_to_seq):
+        """Elimina le modifiche di una tabella con seq <= up_to_seq; ritorna quante righe"""
+        if not self.enabled or up_to_seq <= 0:
+            return 0
+        session = self.db.get_session()
+        try:
+            deleted = session.query(ChangeLog).filter(
+                ChangeLog.table_name == table_name,
+                ChangeLog.seq <= up_to_seq
+            ).delete(synchronize_session=False)
+            session.commit()
+            return deleted
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"ChangeLogService: Errore pulizia registro {table_name}: {e}")
+            return 0
+        finally:
+            self.db.close_session(session)
+
+
+# Istanza globale del registro modifiche
+_change_log = None
+
+
+def get_change_log(logger=None):
+    """Ottiene l'istanza globale del ChangeLogService"""
+    global _change_log
+    if _change_log is None:
+        _change_log = ChangeLogService(logger)
+    return _change_log
@@ -0,0 +1,896 @@
+import calendar
+import csv
+import gzip
+import io
+import itertools
+import os
+import shutil
+import time
+from datetime import date, datetime
+
+from sqlalchemy import select, func, case, and_, not_, literal, String
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet/Arrow disponibili solo con pyarrow installato
+    pa = None
+    pq = None
+
+from database.models import (
+    Transaction, Deadline, Supplier, Document, Property, ChangeLog, ExportFragment, ExportWatermark
+)
+from database.connection import DatabaseConnection
+from services.change_log_service import get_change_log
+from services.export_service import ExportService
+
+
+class DataExportError(Exception):
+    """Export dei dati grezzi non eseguibile (formato o dataset non validi, pyarrow mancante)"""
+
+
+class DataExportService:
+    """
+    Export dei dati grezzi (transazioni, scadenze, fornitori, metadati dei
+    documenti) per i programmi di contabilità e per le analisi.
+
+    La lettura è colonnare: una select delle sole colonne esportate, letta a
+    blocchi di CHUNK_SIZE righe (yield_per) senza creare oggetti ORM. Ogni
+    blocco viene scritto subito (righe CSV, oppure un row group Parquet / un
+    record batch Arrow) e poi scartato: la memoria dipende da CHUNK_SIZE,
+    non dal numero di righe.
+
+    Formati: 'csv', 'csv.gz', 'parquet', 'arrow' (questi ultimi due
+    richiedono pyarrow). Le date sono sempre yyyy-MM-dd.
+
+    Con il change_log attivo (SQLite):
+    - i CSV di transazioni e scadenze sono composti da frammenti mensili in
+      cache, rigenerati solo per i mesi modificati dall'export precedente;
+    - export_delta esporta solo le righe inserite, modificate o eliminate
+      dopo un watermark (numero di sequenza del change_log).
+    """
+
+    FORMATS = ('csv', 'csv.gz', 'parquet', 'arrow')
+
+    # Righe per blocco letto dal database e scritto su file
+    CHUNK_SIZE = 50000
+
+    # Come il riepilogo CSV del portafoglio: Excel italiano si aspetta ';'
+    CSV_DELIMITER = ';'
+
+    # compresslevel 6: quasi la stessa dimensione del 9, molto più veloce
+    GZIP_LEVEL = 6
+
+    # Dataset registrati nel change_log (export incrementali)
+    CHANGE_TABLES = {
+        'transazioni': 'transactions',
+        'scadenze': 'deadlines',
+        'fornitori': 'suppliers',
+    }
+
+    # Colonne aggiunte in testa agli export incrementali: ultimo seq e operazione (I | U | D)
+    DELTA_COLUMNS = (('_seq', 'int'), ('_op', 'str'))
+
+    # property_id del watermark che registra fin dove il change_log del dataset è stato pulito
+    PRUNED_WATERMARK = -1
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+        self.export_service = ExportService()
+        self.change_log = get_change_log(logger)
+        self.fragments_dir = os.path.join(self.export_service.exports_dir, ".cache", "frammenti")
+
+    # ------------------------------------------------------------------
+    # Dataset
+    # ------------------------------------------------------------------
+
+    # Colonne per dataset: (nome, colonna, tipo). Tipi: int, float, str, bool, date, datetime.
+    # Il tipo 'date_dmy' è una data salvata come dd/MM/yyyy, esportata come yyyy-MM-dd.
+    DATASETS = {
+        'transazioni': (
+            ('id', Transaction.id, 'int'),
+            ('property_id', Transaction.property_id, 'int'),
+            ('property', Property.name, 'str'),
+            ('supplier_id', Transaction.supplier_id, 'int'),
+            ('date', Transaction.date, 'date_dmy'),
+            ('type', Transaction.type, 'str'),
+            ('amount', Transaction.amount, 'float'),
+            ('provider', Transaction.provider, 'str'),
+            ('service', Transaction.service, 'str'),
+        ),
+        'scadenze': (
+            ('id', Deadline.id, 'int'),
+            ('property_id', Deadline.property_id, 'int'),
+            ('property', Property.name, 'str'),
+            ('title', Deadline.title, 'str'),
+            ('description', Deadline.description, 'str'),
+            ('due_date', Deadline.due_date, 'date'),
+            ('completed', Deadline.completed, 'bool'),
+            ('created_at', Deadline.created_at, 'datetime'),
+        ),
+        'fornitori': (
+            ('id', Supplier.id, 'int'),
+            ('property_id', Supplier.property_id, 'int'),
+            ('property', Property.name, 'str'),
+            ('name', Supplier.name, 'str'),
+            ('category', Supplier.category, 'str'),
+            ('phone', Supplier.phone, 'str'),
+            ('email', Supplier.email, 'str'),
+            ('address', Supplier.address, 'str'),
+            ('notes', Supplier.notes, 'str'),
+            ('rating', Supplier.rating, 'int'),
+            ('last_service_date', Supplier.last_service_date, 'date'),
+            ('total_spent', Supplier.total_spent, 'float'),
+            ('service_count', Supplier.service_count, 'int'),
+            ('created_at', Supplier.created_at, 'datetime'),
+            ('updated_at', Supplier.updated_at, 'datetime'),
+        ),
+        'documenti': (
+            ('id', Document.id, 'int'),
+            ('transaction_id', Document.transaction_id, 'int'),
+            ('property_id', Document.property_id, 'int'),
+            ('property', Property.name, 'str'),
+            ('path', Document.path, 'str'),
+            ('folder', Document.folder, 'str'),
+            ('name', Document.name, 'str'),
+            ('size', Document.size, 'int'),
+            ('mtime', Document.mtime, 'float'),
+            ('content_hash', Document.content_hash, 'str'),
+            ('mime', Document.mime, 'str'),
+            ('period', Document.period, 'str'),
+            ('service', Document.service, 'str'),
+            ('created_at', Document.created_at, 'datetime'),
+        ),
+    }
+
+    MODELS = {
+        'transazioni': Transaction,
+        'scadenze': Deadline,
+        'fornitori': Supplier,
+        'documenti': Document,
+    }
+
+    @staticmethod
+    def parquet_available():
+        return pa is not None
+
+    def delta_available(self):
+        return self.change_log.enabled
+
+    def _columns(self, dataset):
+        """[(nome, tipo)] delle colonne esportate"""
+        return [(name, kind) for name, _, kind in self.DATASETS[dataset]]
+
+    def _select_columns(self, dataset):
+        return [
+            self._iso_from_dmy(column).label(name) if kind == 'date_dmy' else column
+            for name, column, kind in self.DATASETS[dataset]
+        ]
+
+    def _query(self, dataset, property_id=None, start_date=None, end_date=None):
+        """Select colonnare del dataset con i filtri per proprietà e periodo (yyyy-MM-dd)"""
+        model = self.MODELS[dataset]
+        query = select(*self._select_columns(dataset)).select_from(model).outerjoin(
+            Property, model.property_id == Property.id
+        )
+
+        if property_id:
+            query = query.where(model.property_id == property_id)
+
+        if start_date and end_date:
+            if dataset in self.MONTHLY_DATES:
+                date_expr = self._date_expr(dataset)
+                query = query.where(date_expr >= start_date, date_expr <= end_date)
+            elif dataset == 'documenti':
+                # Periodo dei documenti: trimestre yyyy-QN, confrontabile come stringa
+                query = query.where(
+                    Document.period >= self._quarter(start_date),
+                    Document.period <= self._quarter(end_date)
+                )
+            # I fornitori non hanno un periodo: esportati tutti
+
+        return query.order_by(model.id)
+
+    @staticmethod
+    def _iso_from_dmy(column):
+        """dd/MM/yyyy -> yyyy-MM-dd nel database (con String '+' diventa || o concat secondo il dialetto)"""
+        return (
+            func.substr(column, 7, 4, type_=String) + '-'
+            + func.substr(column, 4, 2, type_=String) + '-'
+            + func.substr(column, 1, 2, type_=String)
+        )
+
+    @staticmethod
+    def _quarter(iso_date):
+        return f"{iso_date[:4]}-Q{(int(iso_date[5:7]) - 1) // 3 + 1}"
+
+    def _chunks(self, query):
+        """Blocchi di righe (tuple) da CHUNK_SIZE"""
+        session = self.db.get_session()
+        try:
+            # Esecuzione Core sulla connessione: niente elaborazione ORM delle righe
+            result = session.connection().execute(query.execution_options(yield_per=self.CHUNK_SIZE))
+            yield from result.partitions()
+        except Exception as e:
+            self.logger.error(f"DataExportService: Errore lettura dati: {e}")
+            raise
+        finally:
+            self.db.close_session(session)
+
+    @staticmethod
+    def _tracked(chunks, state, progress, cancel_event):
+        """Conta le righe, segnala l'avanzamento e si ferma se l'export viene annullato"""
+        try:
+            for chunk in chunks:
+                if cancel_event is not None and cancel_event.is_set():
+                    state['cancelled'] = True
+                    return
+                yield chunk
+                state['rows'] += len(chunk)
+                if progress:
+                    progress(state['rows'])
+        finally:
+            # Chiude la sessione anche se il ciclo si è fermato prima della fine
+            chunks.close()
+
+    def _validate(self, dataset, export_format):
+        if dataset not in self.DATASETS:
+            raise DataExportError(f"Dataset sconosciuto: {dataset}")
+        if export_format not in self.FORMATS:
+            raise DataExportError(f"Formato non supportato: {export_format}")
+        if export_format in ('parquet', 'arrow') and pa is None:
+            raise DataExportError("Export Parquet/Arrow non disponibile: installare pyarrow")
+
+    def _write(self, filepath, write):
+        """
+        Esegue write(percorso parziale) -> annullato e rinomina il file solo a
+        export completo: in exports/ non restano mai file a metà
+
+        Returns:
+            filepath, o None se l'export è stato annullato
+        """
+        partial = filepath + ".part"
+        try:
+            cancelled = write(partial)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+        if cancelled:
+            if os.path.exists(partial):
+                os.remove(partial)
+            return None
+        os.replace(partial, filepath)
+        return filepath
+
+    # ------------------------------------------------------------------
+    # Export completo
+    # ------------------------------------------------------------------
+
+    def export(self, dataset, export_format='csv', property_id=None, start_date=None, end_date=None,
+               filepath=None, progress=None, cancel_event=None):
+        """
+        Esporta un dataset in exports/dati_<dataset>_*.<formato>
+
+        Args:
+            dataset: 'transazioni' | 'scadenze' | 'fornitori' | 'documenti'
+            export_format: uno di FORMATS
+            property_id: filtro proprietà (None = tutte)
+            start_date, end_date: filtro periodo yyyy-MM-dd
+            progress: callback(righe scritte) dopo ogni blocco
+            cancel_event: threading.Event per interrompere l'export
+
+        Returns:
+            dict: {filepath, rows, duration, cancelled, fragments_reused};
+            filepath è None se annullato
+
+        Raises:
+            DataExportError: dataset o formato non validi, pyarrow non installato
+        """
+        self._validate(dataset, export_format)
+
+        started = time.perf_counter()
+        filepath = filepath or self.export_service.export_path(export_format, prefix=f"dati_{dataset}")
+        state = {'rows': 0, 'cancelled': False, 'reused': 0}
+        compress = export_format == 'csv.gz'
+
+        if export_format in ('csv', 'csv.gz') and dataset in self.MONTHLY_DATES and self.change_log.enabled:
+            def write(partial):
+                self._write_from_fragments(
+                    partial, dataset, property_id, start_date, end_date, compress, state, progress, cancel_event
+                )
+                return state['cancelled']
+        else:
+            writer = {
+                'csv': self._write_csv,
+                'csv.gz': self._write_csv,
+                'parquet': self._write_parquet,
+                'arrow': self._write_arrow,
+            }[export_format]
+
+            def write(partial):
+                chunks = self._tracked(
+                    self._chunks(self._query(dataset, property_id, start_date, end_date)),
+                    state, progress, cancel_event
+                )
+                try:
+                    writer(partial, self._columns(dataset), chunks, compress=compress)
+                finally:
+                    chunks.close()
+                return state['cancelled']
+
+        filepath = self._write(filepath, write)
+
+        duration = time.perf_counter() - started
+        self.logger.info(
+            f"DataExportService: {dataset} ({export_format}) {state['rows']} righe in {duration:.1f}s"
+            + (f", {state['reused']} mesi dalla cache" if state['reused'] else "")
+            + (" (annullato)" if filepath is None else f" -> {filepath}")
+        )
+        return {
+            'filepath': filepath, 'rows': state['rows'], 'duration': duration,
+            'cancelled': filepath is None, 'fragments_reused': state['reused']
+        }
+
+    def export_all(self, export_format='csv', property_id=None, start_date=None, end_date=None,
+                   datasets=None, delta=False, progress=None, cancel_event=None):
+        """
+        Esporta più dataset (di default tutti), un file per dataset
+
+        Args:
+            delta: solo le modifiche dall'ultimo export incrementale (ignora il
+                   periodo; solo i dataset registrati nel change_log)
+
+        Returns:
+            dict: {dataset: risultato di export()/export_delta()}; si ferma al primo annullamento
+        """
+        results = {}
+        for dataset in datasets or self.DATASETS:
+            dataset_progress = (lambda rows, dataset=dataset: progress(dataset, rows)) if progress else None
+            if delta:
+                if dataset not in self.CHANGE_TABLES:
+                    continue
+                results[dataset] = self.export_delta(
+                    dataset, export_format, property_id=property_id,
+                    progress=dataset_progress, cancel_event=cancel_event
+                )
+            else:
+                results[dataset] = self.export(
+                    dataset, export_format, property_id, start_date, end_date,
+                    progress=dataset_progress, cancel_event=cancel_event
+                )
+            if results[dataset]['cancelled']:
+                break
+        return results
+
+    # ------------------------------------------------------------------
+    # Frammenti mensili (CSV)
+    # ------------------------------------------------------------------
+
+    # Dataset divisibili per mese: la colonna data (yyyy-MM-dd nella select) e la sua posizione
+    MONTHLY_DATES = {
+        'transazioni': 'date',
+        'scadenze': 'due_date',
+    }
+
+    def _date_expr(self, dataset):
+        """Espressione SQL della data yyyy-MM-dd di un dataset mensile"""
+        if dataset == 'transazioni':
+            return self._iso_from_dmy(Transaction.date)
+        return Deadline.due_date
+
+    def _month_expr(self, dataset):
+        return func.substr(self._date_expr(dataset), 1, 7, type_=String)
+
+    def _segments(self, dataset, property_id, start_date, end_date):
+        """
+        Mesi da esportare, in ordine: (mese, filtro) dove filtro è None per i
+        mesi interi (frammento in cache) oppure la condizione SQL di un mese
+        parziale ai bordi del periodo o di date non valide (sempre rigenerati)
+        """
+        date_expr = self._date_expr(dataset)
+        if start_date and end_date:
+            segments = []
+            year, month = int(start_date[:4]), int(start_date[5:7])
+            while f"{year:04d}-{month:02d}" <= end_date[:7]:
+                key = f"{year:04d}-{month:02d}"
+                first, last = f"{key}-01", f"{key}-{calendar.monthrange(year, month)[1]:02d}"
+                if start_date <= first and end_date >= last:
+                    segments.append((key, None))
+                else:
+                    segments.append((key, and_(date_expr >= max(start_date, first), date_expr <= min(end_date, last))))
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            return segments
+
+        # Senza periodo: i mesi presenti nei dati
+        model = self.MODELS[dataset]
+        month_expr = self._month_expr(dataset)
+        session = self.db.get_session()
+        try:
+            query = select(month_expr).distinct()
+            if property_id:
+                query = query.where(model.property_id == property_id)
+            months = sorted(month for (month,) in session.execute(query) if month is not None)
+        finally:
+            self.db.close_session(session)
+
+        return [
+            (month, None) if self._is_month(month) else (month, month_expr == month)
+            for month in months
+        ]
+
+    @staticmethod
+    def _is_month(key):
+        return len(key) == 7 and key[4] == '-' and key[:4].isdigit() and key[5:].isdigit()
+
+    def _fragment_path(self, dataset, property_key, month, compress):
+        return os.path.join(self.fragments_dir, f"{dataset}_{property_key}_{month}.{'csv.gz' if compress else 'csv'}")
+
+    def _open_fragment(self, path, compress):
+        if compress:
+            # Ogni frammento è un membro gzip: membri concatenati formano un .gz valido
+            return gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=self.GZIP_LEVEL)
+        return open(path, 'w', encoding='utf-8', newline='')
+
+    def _write_from_fragments(self, path, dataset, property_id, start_date, end_date, compress,
+                              state, progress, cancel_event):
+        """
+        CSV composto da frammenti mensili: i mesi interi non modificati dopo
+        l'ultimo export vengono copiati dalla cache, gli altri sono letti in
+        una sola query ordinata per mese e salvati come nuovi frammenti
+        """
+        os.makedirs(self.fragments_dir, exist_ok=True)
+        export_format = 'csv.gz' if compress else 'csv'
+        table = self.CHANGE_TABLES[dataset]
+        property_key = property_id or 0
+
+        # Il watermark va letto prima dei dati: una scrittura concorrente rende il frammento
+        # più recente del suo seq (verrà solo rigenerato al prossimo export)
+        snapshot = self.change_log.current_seq()
+        segments = self._segments(dataset, property_id, start_date, end_date)
+        changes = self.change_log.last_changes(table, property_id) or ({}, float('inf'))
+        cached = self._load_fragments(dataset, property_key, export_format)
+
+        stale = []
+        for month, condition in segments:
+            if condition is not None:
+                continue
+            fragment = cached.get(month)
+            last_change = max(changes[0].get(month, 0), changes[1])
+            if fragment and fragment['seq'] >= last_change and os.path.exists(fragment['path']):
+                continue
+            stale.append(month)
+
+        rendered = {}
+        temporary = []
+        try:
+            if stale:
+                rendered.update(self._render_months(dataset, property_id, stale, property_key, compress,
+                                                    state, progress, cancel_event))
+                if state['cancelled']:
+                    return
+                self._save_fragments(dataset, property_key, export_format, snapshot, rendered)
+
+            with open(path, 'wb') as out:
+                out.write(self._csv_header(self._columns(dataset), compress))
+                for month, condition in segments:
+                    if cancel_event is not None and cancel_event.is_set():
+                        state['cancelled'] = True
+                        return
+                    if condition is not None:
+                        fragment_path = os.path.join(self.fragments_dir, f".live_{os.getpid()}_{len(temporary)}")
+                        temporary.append(fragment_path)
+                        self._render_live(dataset, property_id, condition, fragment_path, compress, state, progress)
+                    elif month in rendered:
+                        fragment_path = rendered[month][0]
+                    else:
+                        fragment_path = cached[month]['path']
+                        state['rows'] += cached[month]['rows']
+                        state['reused'] += 1
+                        if progress:
+                            progress(state['rows'])
+                    with open(fragment_path, 'rb') as fragment:
+                        shutil.copyfileobj(fragment, out, 1024 * 1024)
+        finally:
+            for fragment_path in temporary:
+                if os.path.exists(fragment_path):
+                    os.remove(fragment_path)
+
+    def _render_months(self, dataset, property_id, months, property_key, compress, state, progress, cancel_event):
+        """Frammenti dei mesi indicati da un'unica query ordinata per mese: {mese: (percorso, righe)}"""
+        model = self.MODELS[dataset]
+        date_index = [name for name, _ in self._columns(dataset)].index(self.MONTHLY_DATES[dataset])
+        month_expr = self._month_expr(dataset)
+
+        query = self._query(dataset, property_id).where(month_expr.in_(months))
+        query = query.order_by(None).order_by(month_expr, model.id)
+
+        rendered = {}
+        chunks = self._tracked(self._chunks(query), {'rows': 0, 'cancelled': False}, None, cancel_event)
+        try:
+            rows = itertools.chain.from_iterable(chunks)
+            for month, group in itertools.groupby(rows, key=lambda row: row[date_index][:7]):
+                rendered[month] = self._write_fragment(dataset, property_key, month, compress, group)
+                state['rows'] += rendered[month][1]
+                if progress:
+                    progress(state['rows'])
+        finally:
+            chunks.close()
+
+        if cancel_event is not None and cancel_event.is_set():
+            state['cancelled'] = True
+            return rendered
+
+        # Mesi senza righe: frammento vuoto, così restano in cache anche loro
+        for month in months:
+            if month not in rendered:
+                rendered[month] = self._write_fragment(dataset, property_key, month, compress, ())
+        return rendered
+
+    def _write_fragment(self, dataset, property_key, month, compress, rows):
+        path = self._fragment_path(dataset, property_key, month, compress)
+        count = 0
+        with self._open_fragment(path + ".part", compress) as handle:
+            writer = csv.writer(handle, delimiter=self.CSV_DELIMITER)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        os.replace(path + ".part", path)
+        return path, count
+
+    def _render_live(self, dataset, property_id, condition, path, compress, state, progress):
+        """Mese parziale o date non valide: scritto in un file temporaneo, senza cache"""
+        query = self._query(dataset, property_id).where(condition)
+        with self._open_fragment(path, compress) as handle:
+            writer = csv.writer(handle, delimiter=self.CSV_DELIMITER)
+            for chunk in self._chunks(query):
+                writer.writerows(chunk)
+                state['rows'] += len(chunk)
+                if progress:
+                    progress(state['rows'])
+
+    def _csv_header(self, columns, compress):
+        buffer = io.StringIO()
+        csv.writer(buffer, delimiter=self.CSV_DELIMITER).writerow([name for name, _ in columns])
+        # BOM: Excel riconosce l'UTF-8 (anche dopo la decompressione del .gz)
+        header = ('\ufeff' + buffer.getvalue()).encode('utf-8')
+        return gzip.compress(header, compresslevel=self.GZIP_LEVEL) if compress else header
+
+    def _load_fragments(self, dataset, property_key, export_format):
+        session = self.db.get_session()
+        try:
+            fragments = session.query(ExportFragment).filter(
+                ExportFragment.dataset == dataset,
+                ExportFragment.property_id == property_key,
+                ExportFragment.format == export_format
+            ).all()
+            return {f.period: {'seq': f.seq, 'rows': f.rows, 'path': f.path} for f in fragments}
+        except Exception as e:
+            self.logger.error(f"DataExportService: Errore lettura frammenti {dataset}: {e}")
+            return {}
+        finally:
+            self.db.close_session(session)
+
+    def _save_fragments(self, dataset, property_key, export_format, seq, rendered):
+        session = self.db.get_session()
+        try:
+            existing = {
+                f.period: f for f in session.query(ExportFragment).filter(
+                    ExportFragment.dataset == dataset,
+                    ExportFragment.property_id == property_key,
+                    ExportFragment.format == export_format,
+                    ExportFragment.period.in_(list(rendered))
+                )
+            }
+            for month, (path, rows) in rendered.items():
+                fragment = existing.get(month)
+                if fragment is None:
+                    fragment = ExportFragment(dataset=dataset, property_id=property_key,
+                                              period=month, format=export_format)
+                    session.add(fragment)
+                fragment.seq = seq
+                fragment.rows = rows
+                fragment.path = path
+                fragment.created_at = datetime.utcnow()
+            session.commit()
+        except Exception as e:
+            # Senza metadati i frammenti verranno solo rigenerati al prossimo export
+            session.rollback()
+            self.logger.error(f"DataExportService: Errore salvataggio frammenti {dataset}: {e}")
+        finally:
+            self.db.close_session(session)
+
+    def clear_fragments(self):
+        """Svuota la cache dei frammenti (dopo un ripristino del database o modifiche esterne)"""
+        session = self.db.get_session()
+        try:
+            session.query(ExportFragment).delete()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"DataExportService: Errore pulizia frammenti: {e}")
+        finally:
+            self.db.close_session(session)
+        shutil.rmtree(self.fragments_dir, ignore_errors=True)
+
+    # ------------------------------------------------------------------
+    # Export incrementale
+    # ------------------------------------------------------------------
+
+    def watermark(self, dataset, property_id=None):
+        """seq dell'ultimo export incrementale del dataset (0 = mai esportato)"""
+        session = self.db.get_session()
+        try:
+            mark = session.query(ExportWatermark).filter(
+                ExportWatermark.dataset == dataset,
+                ExportWatermark.property_id == (property_id or 0)
+            ).first()
+            return mark.seq if mark else 0
+        except Exception as e:
+            self.logger.error(f"DataExportService: Errore lettura watermark {dataset}: {e}")
+            return 0
+        finally:
+            self.db.close_session(session)
+
+    def _save_watermark(self, dataset, property_id, seq, filepath):
+        session = self.db.get_session()
+        try:
+            mark = session.query(ExportWatermark).filter(
+                ExportWatermark.dataset == dataset,
+                ExportWatermark.property_id == (property_id or 0)
+            ).first()
+            if mark is None:
+                mark = ExportWatermark(dataset=dataset, property_id=property_id or 0)
+                session.add(mark)
+            mark.seq = seq
+            mark.filepath = filepath
+            mark.exported_at = datetime.utcnow()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"DataExportService: Errore salvataggio watermark {dataset}: {e}")
+        finally:
+            self.db.close_session(session)
+
+    def _snapshot_query(self, dataset, to_seq, property_id=None):
+        """Tutte le righe attuali come inserite: il registro non copre più since_seq"""
+        model = self.MODELS[dataset]
+        query = select(
+            literal(to_seq).label('_seq'), literal('I').label('_op'), *self._select_columns(dataset)
+        ).select_from(model).outerjoin(
+            Property, model.property_id == Property.id
+        )
+        if property_id:
+            query = query.where(model.property_id == property_id)
+        return query.order_by(model.id)
+
+    def _prune_change_log(self, dataset):
+        """
+        Elimina dal change_log le modifiche del dataset già coperte da tutti i
+        suoi watermark. Prima vengono scartati i frammenti mensili superati da
+        quelle modifiche (senza le righe del registro sembrerebbero aggiornati)
+        e viene salvato il limite della pulizia: un export incrementale da un
+        seq precedente diventa completo
+        """
+        session = self.db.get_session()
+        try:
+            horizon = session.query(func.min(ExportWatermark.seq)).filter(
+                ExportWatermark.dataset == dataset,
+                ExportWatermark.property_id >= 0
+            ).scalar() or 0
+            fragments = [
+                (f.id, f.property_id, f.period, f.seq, f.path)
+                for f in session.query(ExportFragment).filter(ExportFragment.dataset == dataset)
+            ]
+        except Exception as e:
+            self.logger.error(f"DataExportService: Errore lettura watermark {dataset}: {e}")
+            return
+        finally:
+            self.db.close_session(session)
+
+        if horizon <= self.watermark(dataset, self.PRUNED_WATERMARK):
+            return
+
+        table = self.CHANGE_TABLES[dataset]
+        changes = {}
+        stale = []
+        for fragment_id, property_key, period, seq, path in fragments:
+            if property_key not in changes:
+                changes[property_key] = self.change_log.last_changes(table, property_key or None) \
+                    or ({}, float('inf'))
+            by_period, everything = changes[property_key]
+            if seq < max(by_period.get(period, 0), everything):
+                stale.append((fragment_id, path))
+
+        session = self.db.get_session()
+        try:
+            if stale:
+                session.query(ExportFragment).filter(
+                    ExportFragment.id.in_([fragment_id for fragment_id, _ in stale])
+                ).delete(synchronize_session=False)
+                session.commit()
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"DataExportService: Errore pulizia frammenti {dataset}: {e}")
+            return
+        finally:
+            self.db.close_session(session)
+        for _, path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+
+        # Limite salvato prima della pulizia: se questa fallisce si esporta solo di più
+        self._save_watermark(dataset, self.PRUNED_WATERMARK, horizon, None)
+        removed = self.change_log.prune(table, horizon)
+        self.logger.info(
+            f"DataExportService: change_log {table} pulito fino al seq {horizon} "
+            f"({removed} righe, {len(stale)} frammenti scartati)"
+        )
+
+    def _delta_query(self, dataset, since_seq, to_seq, property_id=None):
+        """
+        Righe modificate tra i due seq, una per riga con lo stato attuale:
+        _op è 'D' se la riga non esiste più, 'I' se è stata creata nel
+        frattempo, altrimenti 'U'. Le righe create ed eliminate nello stesso
+        intervallo non compaiono.
+        """
+        model = self.MODELS[dataset]
+        changes = select(
+            ChangeLog.row_id.label('row_id'),
+            func.max(ChangeLog.seq).label('last_seq'),
+            func.max(case((ChangeLog.op == 'I', 1), else_=0)).label('inserted')
+        ).where(
+            ChangeLog.table_name == self.CHANGE_TABLES[dataset],
+            ChangeLog.seq > since_seq,
+            ChangeLog.seq <= to_seq
+        )
+        if property_id:
+            changes = changes.where(ChangeLog.property_id == property_id)
+        changes = changes.group_by(ChangeLog.row_id).subquery()
+
+        deleted = model.id.is_(None)
+        columns = [
+            changes.c.last_seq.label('_seq'),
+            case((deleted, 'D'), (changes.c.inserted == 1, 'I'), else_='U').label('_op'),
+            # L'ID resta anche per le righe eliminate
+            changes.c.row_id.label('id')
+        ] + self._select_columns(dataset)[1:]
+
+        return select(*columns).select_from(changes).outerjoin(
+            model, model.id == changes.c.row_id
+        ).outerjoin(
+            Property, model.property_id == Property.id
+        ).where(
+            not_(and_(deleted, changes.c.inserted == 1))
+        ).order_by(changes.c.last_seq)
+
+    def export_delta(self, dataset, export_format='csv', since_seq=None, property_id=None,
+                     filepath=None, progress=None, cancel_event=None):
+        """
+        Esporta solo le righe inserite, modificate o eliminate dopo un watermark
+
+        Args:
+            since_seq: seq del change_log da cui partire; None = dall'ultimo
+                       export incrementale dello stesso dataset e proprietà
+            (altri argomenti come export)
+
+        Returns:
+            dict: {filepath, rows, duration, cancelled, since_seq, watermark, full};
+            watermark è il seq da passare al prossimo export incrementale; full
+            è True se since_seq precede la pulizia del registro e il file
+            contiene tutte le righe attuali (_op 'I')
+
+        Raises:
+            DataExportError: dataset senza change_log, registro non attivo, formato non valido
+        """
+        self._validate(dataset, export_format)
+        if dataset not in self.CHANGE_TABLES:
+            raise DataExportError(f"Export incrementale non disponibile per {dataset}")
+        if not self.change_log.enabled:
+            raise DataExportError("Export incrementale non disponibile: registro modifiche non attivo")
+
+        started = time.perf_counter()
+        if since_seq is None:
+            since_seq = self.watermark(dataset, property_id)
+        to_seq = self.change_log.current_seq()
+        full = since_seq < self.watermark(dataset, self.PRUNED_WATERMARK)
+        query = self._snapshot_query(dataset, to_seq, property_id) if full \
+            else self._delta_query(dataset, since_seq, to_seq, property_id)
+
+        filepath = filepath or self.export_service.export_path(
+            export_format, suffix=f"_{since_seq}-{to_seq}", prefix=f"dati_{dataset}_delta"
+        )
+        state = {'rows': 0, 'cancelled': False}
+        writer = {
+            'csv': self._write_csv,
+            'csv.gz': self._write_csv,
+            'parquet': self._write_parquet,
+            'arrow': self._write_arrow,
+        }[export_format]
+
+        def write(partial):
+            chunks = self._tracked(self._chunks(query), state, progress, cancel_event)
+            try:
+                writer(partial, list(self.DELTA_COLUMNS) + self._columns(dataset), chunks,
+                       compress=export_format == 'csv.gz')
+            finally:
+                chunks.close()
+            return state['cancelled']
+
+        filepath = self._write(filepath, write)
+        if filepath is not None:
+            self._save_watermark(dataset, property_id, to_seq, filepath)
+            self._prune_change_log(dataset)
+
+        duration = time.perf_counter() - started
+        self.logger.info(
+            f"DataExportService: delta {dataset} ({export_format}) seq {since_seq}-{to_seq}"
+            f"{' (completo)' if full else ''}, "
+            f"{state['rows']} righe in {duration:.1f}s" + (" (annullato)" if filepath is None else f" -> {filepath}")
+        )
+        return {
+            'filepath': filepath, 'rows': state['rows'], 'duration': duration,
+            'cancelled': filepath is None, 'since_seq': since_seq, 'watermark': to_seq, 'full': full
+        }
+
+    # ------------------------------------------------------------------
+    # Scrittori
+    # ------------------------------------------------------------------
+
+    def _write_csv(self, path, columns, chunks, compress=False):
+        # BOM: Excel riconosce l'UTF-8 (anche dopo la decompressione del .gz)
+        if compress:
+            handle = gzip.open(path, 'wt', encoding='utf-8-sig', newline='', compresslevel=self.GZIP_LEVEL)
+        else:
+            handle = open(path, 'w', encoding='utf-8-sig', newline='')
+        with handle:
+            writer = csv.writer(handle, delimiter=self.CSV_DELIMITER)
+            writer.writerow([name for name, _ in columns])
+            for chunk in chunks:
+                writer.writerows(chunk)
+
+    @staticmethod
+    def _arrow_schema(columns):
+        types = {
+            'int': pa.int64(),
+            'float': pa.float64(),
+            'str': pa.string(),
+            'bool': pa.bool_(),
+            'date': pa.date32(),
+            'date_dmy': pa.date32(),
+            'datetime': pa.timestamp('us'),
+        }
+        return pa.schema([(name, types[kind]) for name, kind in columns])
+
+    def _record_batches(self, columns, chunks):
+        """Ogni blocco di righe trasposto in colonne e convertito in un RecordBatch"""
+        schema = self._arrow_schema(columns)
+        date_columns = {i for i, (_, kind) in enumerate(columns) if kind in ('date', 'date_dmy')}
+        for chunk in chunks:
+            arrays = []
+            for i, (values, field) in enumerate(zip(zip(*chunk), schema)):
+                if i in date_columns:
+                    values = [self._to_date(value) for value in values]
+                arrays.append(pa.array(values, type=field.type))
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    @staticmethod
+    def _to_date(value):
+        try:
+            return date.fromisoformat(value) if value else None
+        except ValueError:
+            return None  # Data non valida nel database: esportata vuota
+
+    def _write_parquet(self, path, columns, chunks, compress=False):
+        # Un row group per blocco
+        with pq.ParquetWriter(path, self._arrow_schema(columns), compression='snappy') as writer:
+            for batch in self._record_batches(columns, chunks):
+                writer.write_batch(batch)
+
+    def _write_arrow(self, path, columns, chunks, compress=False):
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, self._arrow_schema(columns)) as writer:
+                for batch in self._record_batches(columns, chunks):
+                    writer.write_batch(batch)
@@ -1,6 +1,81 @@
-from database.models import Deadline
+from database.models import Deadline, DeadlineRecurrence, DeadlineOccurrence
 from database.connection import DatabaseConnection
-from datetime import datetime
+from sqlalchemy import or_
+from datetime import date
+from calendar import monthrange
+
+
+# Mesi tra due occorrenze per ogni frequenza supportata
+FREQUENCY_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'yearly': 12
+}
+
+
+def _add_months(start, months, day):
+    """Somma mesi a una data mantenendo il giorno (limitato a fine mese)"""
+    years, month_index = divmod(start.month - 1 + months, 12)
+    year = start.year + years
+    month = month_index + 1
+    return date(year, month, min(day, monthrange(year, month)[1]))
+
+
+def expand_occurrences(first_due, frequency, interval, until, window_start, window_end):
+    """
+    Genera le occorrenze di una regola ricorrente dentro una finestra
+
+    Parte direttamente dalla prima occorrenza utile della finestra, quindi
+    il costo dipende solo dalla finestra e non dalla storia della regola.
+
+    Args:
+        first_due: Prima scadenza (date)
+        frequency: 'monthly', 'quarterly' o 'yearly'
+        interval: Ogni N periodi
+        until: Ultima data ammessa (date) o None
+        window_start, window_end: Estremi della finestra (date, inclusi)
+
+    Yields:
+        date di ogni occorrenza
+    """
+    step = FREQUENCY_MONTHS[frequency] * max(1, interval or 1)
+    last = min(window_end, until) if until else window_end
+
+    if last < first_due or window_start > last:
+        return
+
+    months_diff = (window_start.year - first_due.year) * 12 + window_start.month - first_due.month
+    n = max(0, months_diff // step)
+
+    while True:
+        occurrence = _add_months(first_due, n * step, first_due.day)
+        if occurrence > last:
+            return
+        if occurrence >= window_start:
+            yield occurrence
+        n += 1
+
+
+# Listener notificati ad ogni modifica delle scadenze (es. scheduler promemoria)
+_listeners = []
+
+
+def add_deadline_listener(callback):
+    """
+    Registra una callback chiamata dopo ogni modifica confermata
+
+    La callback riceve (event, deadline_id, occurrence_date) con event in
+    'saved', 'completed', 'deleted'; occurrence_date è valorizzata solo
+    per le singole occorrenze delle scadenze ricorrenti.
+    """
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+
+def remove_deadline_listener(callback):
+    """Rimuove una callback registrata"""
+    if callback in _listeners:
+        _listeners.remove(callback)
 
 
 class DeadlineService:
@@ -10,6 +85,14 @@ class DeadlineService:
         self.logger = logger
         self.db = DatabaseConnection()
 
+    def _emit(self, event, deadline_id, occurrence_date=None):
+        """Notifica i listener registrati (gli errori non bloccano il chiamante)"""
+        for callback in list(_listeners):
+            try:
+                callback(event, deadline_id, occurrence_date)
+            except Exception as e:
+                self.logger.error(f"DeadlineService: Errore listener scadenze: {e}")
+
     def get_all(self, property_id=None, include_completed=False):
         """Recupera tutte le scadenze con filtri opzionali"""
         session = self.db.get_session()
@@ -36,24 +119,47 @@ class DeadlineService:
             self.db.close_session(session)
 
     def get_next_deadline(self, property_id=None):
-        """Recupera la prossima scadenza non completata"""
+        """Recupera la prossima scadenza non completata (incluse le ricorrenti)"""
         session = self.db.get_session()
         try:
-            query = session.query(Deadline).filter(
-                Deadline.completed == False
+            today = date.today()
+            today_str = today.isoformat()
+
+            # Scadenze singole: prima in ordine di data
+            query = session.query(Deadline).outerjoin(
+                DeadlineRecurrence, Deadline.id == DeadlineRecurrence.deadline_id
+            ).filter(
+                DeadlineRecurrence.id.is_(None),
+                Deadline.completed == False,
+                Deadline.due_date >= today_str
             )
 
             if property_id:
                 query = query.filter(Deadline.property_id == property_id)
 
-            # Solo scadenze future o di oggi
-            today = datetime.now().strftime('%Y-%m-%d')
-            query = query.filter(Deadline.due_date >= today)
-
-            # Prima scadenza
             deadline = query.order_by(Deadline.due_date.asc()).first()
+            best = self._occurrence_dict(deadline) if deadline else None
+
+            # Scadenze ricorrenti: prossima occorrenza non completata di ogni regola
+            rules = self._active_rules(session, today_str, best['due_date'] if best else None, property_id)
+            completed = self._completed_overrides(session, [d.id for d, _ in rules], today_str)
 
-            return deadline.to_dict() if deadline else None
+            for rule_deadline, rule in rules:
+                if rule_deadline.completed:
+                    continue
+
+                horizon = date.fromisoformat(best['due_date']) if best else date.max
+                first_due = date.fromisoformat(rule_deadline.due_date)
+                until = date.fromisoformat(rule.until) if rule.until else None
+
+                for occurrence in expand_occurrences(first_due, rule.frequency, rule.interval,
+                                                     until, today, horizon):
+                    if (rule_deadline.id, occurrence.isoformat()) in completed:
+                        continue
+                    best = self._occurrence_dict(rule_deadline, rule, occurrence, False)
+                    break
+
+            return best
 
         except Exception as e:
             self.logger.error(f"DeadlineService: Errore recupero prossima scadenza: {e}")
@@ -63,22 +169,145 @@ class DeadlineService:
 
     def get_by_date(self, date_str):
         """Recupera scadenze per una data specifica (formato: YYYY-MM-DD)"""
+        return sorted(
+            self.get_range(date_str, date_str, include_completed=True),
+            key=lambda d: d['title']
+        )
+
+    def get_range(self, start_date, end_date, property_id=None, include_completed=True,
+                  deadline_id=None):
+        """
+        Recupera le scadenze in un intervallo, espandendo al volo le ricorrenti
+
+        Args:
+            start_date: Data inizio (yyyy-MM-dd, inclusa)
+            end_date: Data fine (yyyy-MM-dd, inclusa)
+            property_id: ID proprietà opzionale
+            include_completed: Includi occorrenze completate
+            deadline_id: Limita a una sola scadenza (opzionale)
+
+        Returns:
+            Lista di dizionari ordinata per data; le occorrenze ricorrenti
+            hanno 'recurring': True e 'due_date' uguale alla data dell'occorrenza
+        """
         session = self.db.get_session()
         try:
-            deadlines = session.query(Deadline).filter(
-                Deadline.due_date == date_str
-            ).order_by(Deadline.title.asc()).all()
+            results = []
+
+            # Scadenze singole nella finestra
+            query = session.query(Deadline).outerjoin(
+                DeadlineRecurrence, Deadline.id == DeadlineRecurrence.deadline_id
+            ).filter(
+                DeadlineRecurrence.id.is_(None),
+                Deadline.due_date >= start_date,
+                Deadline.due_date <= end_date
+            )
 
-            return [deadline.to_dict() for deadline in deadlines]
+            if property_id:
+                query = query.filter(Deadline.property_id == property_id)
+            if deadline_id:
+                query = query.filter(Deadline.id == deadline_id)
+            if not include_completed:
+                query = query.filter(Deadline.completed == False)
+
+            results.extend(self._occurrence_dict(d) for d in query.all())
+
+            # Regole ricorrenti attive nella finestra
+            rules = self._active_rules(session, start_date, end_date, property_id, deadline_id)
+            completed = self._completed_overrides(session, [d.id for d, _ in rules], start_date, end_date)
+
+            window_start = date.fromisoformat(start_date)
+            window_end = date.fromisoformat(end_date)
+
+            for rule_deadline, rule in rules:
+                first_due = date.fromisoformat(rule_deadline.due_date)
+                until = date.fromisoformat(rule.until) if rule.until else None
+
+                for occurrence in expand_occurrences(first_due, rule.frequency, rule.interval,
+                                                     until, window_start, window_end):
+                    is_completed = bool(rule_deadline.completed) or \
+                        (rule_deadline.id, occurrence.isoformat()) in completed
+                    if is_completed and not include_completed:
+                        continue
+                    results.append(self._occurrence_dict(rule_deadline, rule, occurrence, is_completed))
+
+            results.sort(key=lambda d: (d['due_date'], d['title']))
+            return results
 
         except Exception as e:
-            self.logger.error(f"DeadlineService: Errore recupero scadenze per data: {e}")
+            self.logger.error(f"DeadlineService: Errore recupero scadenze intervallo: {e}")
             return []
         finally:
             self.db.close_session(session)
 
-    def create(self, title, due_date, description=None, property_id=None):
-        """Crea una nuova scadenza"""
+    def _active_rules(self, session, start_date, end_date=None, property_id=None, deadline_id=None):
+        """Regole ricorrenti che possono avere occorrenze nell'intervallo"""
+        query = session.query(Deadline, DeadlineRecurrence).join(
+            DeadlineRecurrence, Deadline.id == DeadlineRecurrence.deadline_id
+        ).filter(
+            or_(DeadlineRecurrence.until.is_(None), DeadlineRecurrence.until >= start_date)
+        )
+
+        if end_date:
+            query = query.filter(Deadline.due_date <= end_date)
+        if property_id:
+            query = query.filter(Deadline.property_id == property_id)
+        if deadline_id:
+            query = query.filter(Deadline.id == deadline_id)
+
+        return query.all()
+
+    def _completed_overrides(self, session, deadline_ids, start_date, end_date=None):
+        """Insieme di (deadline_id, data) delle occorrenze segnate come completate"""
+        if not deadline_ids:
+            return set()
+
+        query = session.query(
+            DeadlineOccurrence.deadline_id, DeadlineOccurrence.occurrence_date
+        ).filter(
+            DeadlineOccurrence.deadline_id.in_(deadline_ids),
+            DeadlineOccurrence.completed == True,
+            DeadlineOccurrence.occurrence_date >= start_date
+        )
+
+        if end_date:
+            query = query.filter(DeadlineOccurrence.occurrence_date <= end_date)
+
+        return set(query.all())
+
+    def _occurrence_dict(self, deadline, rule=None, occurrence=None, completed=None):
+        """Dizionario di una scadenza singola o di una occorrenza ricorrente"""
+        data = deadline.to_dict()
+        data['recurring'] = rule is not None
+
+        if rule is not None:
+            data['due_date'] = occurrence.isoformat()
+            data['first_due_date'] = deadline.due_date
+            data['completed'] = completed
+            data['frequency'] = rule.frequency
+            data['interval'] = rule.interval
+            data['until'] = rule.until
+
+        return data
+
+    def create(self, title, due_date, description=None, property_id=None,
+               frequency=None, interval=1, until=None):
+        """
+        Crea una nuova scadenza, opzionalmente ricorrente
+
+        Args:
+            title: Titolo
+            due_date: Data (prima occorrenza se ricorrente, yyyy-MM-dd)
+            description: Descrizione opzionale
+            property_id: ID proprietà opzionale
+            frequency: None, 'monthly', 'quarterly' o 'yearly'
+            interval: Ogni N periodi (default 1)
+            until: Data fine ricorrenza (yyyy-MM-dd) o None
+        """
+        if frequency and frequency not in FREQUENCY_MONTHS:
+            self.logger.error(f"DeadlineService: Frequenza non valida: {frequency}")
+            return None
+
         session = self.db.get_session()
         try:
             new_deadline = Deadline(
@@ -88,11 +317,23 @@ class DeadlineService:
                 due_date=due_date,
                 completed=False
             )
+
+            if frequency:
+                new_deadline.recurrence = DeadlineRecurrence(
+                    frequency=frequency,
+                    interval=max(1, interval or 1),
+                    until=until
+                )
+
             session.add(new_deadline)
             session.commit()
 
             deadline_id = new_deadline.id
-            self.logger.info(f"DeadlineService: Scadenza creata: {deadline_id}")
+            self.logger.info(
+                f"DeadlineService: Scadenza creata: {deadline_id}"
+                f"{f' (ricorrenza {frequency})' if frequency else ''}"
+            )
+            self._emit('saved', deadline_id)
             return deadline_id
 
         except Exception as e:
@@ -122,6 +363,7 @@ class DeadlineService:
 
             session.commit()
             self.logger.info(f"DeadlineService: Scadenza aggiornata: {deadline_id}")
+            self._emit('completed' if kwargs.get('completed') else 'saved', deadline_id)
             return True
 
         except Exception as e:
@@ -131,10 +373,52 @@ class DeadlineService:
         finally:
             self.db.close_session(session)
 
-    def mark_completed(self, deadline_id):
-        """Segna una scadenza come completata"""
+    def mark_completed(self, deadline_id, occurrence_date=None):
+        """
+        Segna una scadenza come completata
+
+        Args:
+            deadline_id: ID scadenza
+            occurrence_date: Per le ricorrenti, data dell'occorrenza (yyyy-MM-dd);
+                             se None viene chiusa l'intera serie
+        """
+        if occurrence_date:
+            return self.set_occurrence_completed(deadline_id, occurrence_date, True)
         return self.update(deadline_id, completed=True)
 
+    def set_occurrence_completed(self, deadline_id, occurrence_date, completed=True):
+        """Imposta lo stato di una singola occorrenza di una scadenza ricorrente"""
+        session = self.db.get_session()
+        try:
+            override = session.query(DeadlineOccurrence).filter(
+                DeadlineOccurrence.deadline_id == deadline_id,
+                DeadlineOccurrence.occurrence_date == occurrence_date
+            ).first()
+
+            if override:
+                override.completed = completed
+            else:
+                session.add(DeadlineOccurrence(
+                    deadline_id=deadline_id,
+                    occurrence_date=occurrence_date,
+                    completed=completed
+                ))
+
+            session.commit()
+            self.logger.info(
+                f"DeadlineService: Occorrenza {occurrence_date} della scadenza {deadline_id} "
+                f"{'completata' if completed else 'riaperta'}"
+            )
+            self._emit('completed' if completed else 'saved', deadline_id, occurrence_date)
+            return True
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"DeadlineService: Errore aggiornamento occorrenza: {e}")
+            return False
+        finally:
+            self.db.close_session(session)
+
     def delete(self, deadline_id):
         """Elimina una scadenza"""
         session = self.db.get_session()
@@ -149,6 +433,7 @@ class DeadlineService:
             session.delete(deadline)
             session.commit()
             self.logger.info(f"DeadlineService: Scadenza eliminata: {deadline_id}")
+            self._emit('deleted', deadline_id)
             return True
 
         except Exception as e:
@@ -0,0 +1,239 @@
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from services.document_service import DocumentService
+from services.transaction_service import TransactionService
+from validation_utils import validate_metadata, ValidationError
+
+
+# Intestazioni CSV accettate -> chiave dei metadati
+CSV_HEADER_ALIASES = {
+    'file': 'file',
+    'nome file': 'file',
+    'documento': 'file',
+    'data': 'data_fattura',
+    'data fattura': 'data_fattura',
+    'data_fattura': 'data_fattura',
+    'tipo': 'tipo',
+    'importo': 'importo',
+    'fornitore': 'provider',
+    'emittente': 'provider',
+    'provider': 'provider',
+    'servizio': 'service',
+    'service': 'service'
+}
+
+
+class DocumentImportService:
+    """
+    Import multiplo di documenti: metadati raccolti in anticipo (dialog, CSV
+    o file sidecar), copia parallela nell'archivio e un solo commit finale
+    """
+
+    # Copia e hash sono I/O bound: pochi thread bastano a saturare il disco
+    MAX_WORKERS = min(8, (os.cpu_count() or 2) + 2)
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.document_service = DocumentService(logger)
+        self.transaction_service = TransactionService(logger)
+
+    # ------------------------------------------------------------------
+    # Metadati
+    # ------------------------------------------------------------------
+
+    def read_metadata_csv(self, csv_path):
+        """
+        Legge i metadati da un CSV (una riga per file, separatore ; , o tab)
+
+        Returns:
+            dict: nome file (minuscolo) -> metadati
+        """
+        with open(csv_path, 'r', newline='', encoding='utf-8-sig') as f:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=';,\t').delimiter
+            except csv.Error:
+                delimiter = ';'
+
+            reader = csv.reader(f, delimiter=delimiter)
+            header = next(reader, [])
+            keys = [CSV_HEADER_ALIASES.get(h.strip().lower()) for h in header]
+
+            if 'file' not in keys:
+                raise ValueError("Il CSV deve avere una colonna 'file'")
+
+            result = {}
+            for row in reader:
+                record = {key: value.strip() for key, value in zip(keys, row) if key}
+                if record.get('file'):
+                    result[os.path.basename(record.pop('file')).lower()] = record
+
+        return result
+
+    def read_sidecar(self, file_path):
+        """Metadati da un file JSON accanto al documento (fattura.pdf.json o fattura.json)"""
+        for candidate in (f"{file_path}.json", f"{os.path.splitext(file_path)[0]}.json"):
+            if os.path.isfile(candidate):
+                try:
+                    with open(candidate, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    return {CSV_HEADER_ALIASES.get(k.lower(), k): str(v) for k, v in data.items()}
+                except (OSError, ValueError) as e:
+                    self.logger.warning(f"DocumentImportService: Sidecar non valido {candidate}: {e}")
+        return None
+
+    def collect_metadata(self, paths, csv_path=None):
+        """
+        Metadati disponibili per ogni file (CSV ha la precedenza sul sidecar)
+
+        Returns:
+            dict: path -> metadati (dict vuoto se da compilare)
+        """
+        from_csv = self.read_metadata_csv(csv_path) if csv_path else {}
+
+        collected = {}
+        for path in paths:
+            metadata = from_csv.get(os.path.basename(path).lower()) or self.read_sidecar(path) or {}
+            collected[path] = metadata
+        return collected
+
+    # ------------------------------------------------------------------
+    # Import
+    # ------------------------------------------------------------------
+
+    def import_files(self, property_id, items, progress=None):
+        """
+        Importa più documenti
+
+        1. validazione dei metadati (seriale, solo CPU)
+        2. validazione, hash e copia dei file in un pool di thread limitato
+        3. tutte le transazioni e le righe documento in un unico commit
+
+        Args:
+            property_id: ID proprietà
+            items: Lista di (path, metadati)
+            progress: Callback opzionale (completati, totale)
+
+        Returns:
+            Lista di dict per file: {'file', 'status' ('ok'|'error'),
+            'message', 'path', 'transaction_id', 'reused'}
+        """
+        results = [
+            {'file': path, 'status': 'pending', 'message': '', 'path': None,
+             'transaction_id': None, 'reused': False}
+            for path, _ in items
+        ]
+        total = len(items)
+        done = 0
+
+        # 1. Metadati
+        validated = {}
+        for index, (path, metadata) in enumerate(items):
+            try:
+                validated[index] = validate_metadata(metadata)
+            except ValidationError as e:
+                results[index].update(status='error', message=str(e))
+                done += 1
+
+        if progress:
+            progress(done, total)
+
+        # 2. Copia parallela nell'archivio blob
+        batch = []
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix="DocImport") as pool:
+            futures = {
+                pool.submit(self._ingest, items[index][0], property_id, metadata): index
+                for index, metadata in validated.items()
+            }
+
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    stored, document = future.result()
+                    results[index].update(path=stored['path'], reused=stored['reused'])
+                    batch.append((index, document))
+                except Exception as e:
+                    results[index].update(status='error', message=str(e))
+
+                done += 1
+                if progress:
+                    progress(done, total)
+
+        # 3. Un solo commit per tutte le transazioni
+        batch.sort()
+        transaction_ids = self.transaction_service.create_batch([
+            {
+                'property_id': property_id,
+                'date': validated[index]['data_fattura'],
+                'trans_type': validated[index]['tipo'],
+                'amount': validated[index]['importo'],
+                'provider': validated[index]['provider'],
+                'service': validated[index]['service'],
+                'document': document
+            }
+            for index, document in batch
+        ])
+
+        if transaction_ids is None:
+            # Commit fallito: nessuna riga scritta, rimuovi i file copiati
+            for index, _ in batch:
+                self.document_service.delete_document(results[index]['path'])
+                results[index].update(status='error', path=None,
+                                      message="Errore salvataggio nel database")
+        else:
+            for (index, _), transaction_id in zip(batch, transaction_ids):
+                results[index].update(status='ok', transaction_id=transaction_id)
+
+        imported = sum(1 for r in results if r['status'] == 'ok')
+        self.logger.info(
+            f"DocumentImportService: {imported}/{total} documenti importati "
+            f"nella proprietà {property_id}"
+        )
+        return results
+
+    def _ingest(self, path, property_id, metadata):
+        """Lavoro per un file nel pool: validazione, hash e copia in un passaggio"""
+        stored = self.document_service.store_document(path, property_id, metadata)
+        if not stored:
+            raise IOError("Impossibile copiare il file nella cartella documenti")
+
+        document = self.document_service.describe_file(
+            stored['path'],
+            property_id,
+            service=metadata['service'],
+            period=self.document_service.period_from_date(metadata['data_fattura']),
+            content_hash=stored['content_hash']
+        )
+        return stored, document
+
+    def write_report(self, results, exports_dir="exports"):
+        """
+        Scrive un CSV con l'esito di ogni file
+
+        Returns:
+            Path del file creato
+        """
+        os.makedirs(exports_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filepath = os.path.join(exports_dir, f"import_documenti_{timestamp}.csv")
+
+        with open(filepath, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(['File', 'Esito', 'Messaggio', 'Path archivio', 'ID Transazione', 'Riusato'])
+            for result in results:
+                writer.writerow([
+                    result['file'],
+                    'OK' if result['status'] == 'ok' else 'ERRORE',
+                    result['message'],
+                    result['path'] or '',
+                    result['transaction_id'] or '',
+                    'sì' if result['reused'] else ''
+                ])
+
+        self.logger.info(f"DocumentImportService: Report import salvato: {filepath}")
+        return filepath
@@ -1,9 +1,90 @@
 import os
 import shutil
+import sys
+import stat
+import hashlib
+import mimetypes
+import tempfile
+import threading
 from pathlib import Path
+
+from sqlalchemy import func, delete, or_, select, update
+
+from database.models import Document, DocumentArchive, Property
+from database.connection import DatabaseConnection
 from security_manager import SecurityManager
 
 
+# Serializza la scelta del nome file + link (import paralleli nella stessa cartella)
+_PATH_LOCK = threading.Lock()
+
+# Hash dei file appena salvati (path -> (size, hash)): il watcher li indicizza senza rileggerli.
+# Scritto dagli import e letto dal thread del watcher: sempre sotto _STORED_HASHES_LOCK
+_STORED_HASHES = {}
+_STORED_HASHES_MAX = 10000
+_STORED_HASHES_LOCK = threading.Lock()
+
+
+# Blob e hardlink sono in sola lettura: modificare un documento sul posto
+# cambierebbe il contenuto di tutti i documenti che condividono il blob
+READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+WRITE_BITS = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+
+# ioctl FICLONE di Linux: copia copy-on-write (btrfs, XFS, bcachefs...)
+FICLONE = 0x40049409
+
+
+def remove_file(path):
+    """os.remove anche per i file in sola lettura (su Windows va prima tolto l'attributo)"""
+    try:
+        os.remove(path)
+    except PermissionError:
+        os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+        os.remove(path)
+
+
+def _remove_readonly(function, path, _):
+    os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+    function(path)
+
+
+def remove_tree(path):
+    """shutil.rmtree che rimuove anche i file in sola lettura"""
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=_remove_readonly)
+    else:
+        shutil.rmtree(path, onerror=_remove_readonly)
+
+
+def clone_file(source_path, dest_path):
+    """
+    Copia copy-on-write (reflink) di source_path in dest_path
+
+    I due file condividono i blocchi su disco finché uno dei due non viene
+    modificato: nessuno spazio in più e copie indipendenti.
+
+    Returns:
+        True se il clone è riuscito, False se il filesystem non lo supporta
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+
+    with open(source_path, 'rb') as src:
+        with open(dest_path, 'xb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                cloned = True
+            except OSError:
+                cloned = False
+        if not cloned:
+            os.remove(dest_path)
+            return False
+        source_stat = os.fstat(src.fileno())
+    os.utime(dest_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+    return True
+
+
 def get_docs_dir():
     """Ottiene directory documenti basata su environment"""
     from config import Config
@@ -15,9 +96,16 @@ def get_docs_dir():
 class DocumentService:
     """Gestisce le operazioni sui documenti CON SICUREZZA"""
 
+    # Dimensione dei blocchi di lettura per copia e hash
+    CHUNK_SIZE = 1024 * 1024
+
+    # Primo blocco letto per il riconoscimento dei magic bytes
+    HEADER_SIZE = 64 * 1024
+
     def __init__(self, logger):
         self.logger = logger
         self.security = SecurityManager()
+        self.db = DatabaseConnection()
         self.docs_dir = get_docs_dir()
 
         # Crea cartella documenti se non esiste
@@ -27,6 +115,9 @@ class DocumentService:
         # CRITICO: Salva path assoluto della docs_dir per validazione
         self.abs_docs_dir = os.path.abspath(self.docs_dir)
 
+        # Archivio blob a contenuto indirizzato (nascosto, dentro docs_dir)
+        self.blobs_dir = os.path.join(self.docs_dir, ".blobs")
+
     def get_property_folder(self, property_id, sub_directory=None):
         """
         Ottiene il percorso SICURO della cartella di una proprietà
@@ -84,7 +175,7 @@ class DocumentService:
 
     def list_documents(self, property_id, sub_directory=None):
         """
-        Lista i documenti di una proprietà in modo SICURO
+        Lista i documenti di una proprietà dall'indice (nessun accesso al disco)
 
         Args:
             property_id: ID proprietà
@@ -99,35 +190,406 @@ class DocumentService:
             self.logger.error(f"get_property_folder fallito: {e}")
             return []
 
-        if not os.path.exists(folder):
-            os.makedirs(folder, exist_ok=True)
-            return []
+        prefix = self._relative_folder(property_id, folder)
 
+        session = self.db.get_session()
         try:
-            files = os.listdir(folder)
-            files.sort()
-        except PermissionError:
-            self.logger.error(f"Permesso negato per: {folder}")
+            # File direttamente nella cartella
+            files = session.query(Document.name, Document.path, Document.content_hash).filter(
+                Document.property_id == property_id,
+                Document.folder == prefix
+            ).all()
+
+            # Sottocartelle: primo componente delle cartelle più profonde
+            nested = Document.folder.startswith(f"{prefix}/", autoescape=True) if prefix \
+                else Document.folder != ""
+            folders = session.query(Document.folder).filter(
+                Document.property_id == property_id,
+                nested
+            ).distinct().all()
+
+        except Exception as e:
+            self.logger.error(f"DocumentService: Errore lettura indice documenti: {e}")
             return []
+        finally:
+            self.db.close_session(session)
+
+        start = len(prefix) + 1 if prefix else 0
+        subfolders = {row.folder[start:].split("/", 1)[0] for row in folders}
+
+        documents = [
+            {"name": name, "path": os.path.join(folder, name), "is_folder": True}
+            for name in subfolders
+        ]
+        documents.extend(
+            {"name": name, "path": path, "is_folder": False, "content_hash": content_hash}
+            for name, path, content_hash in files
+        )
+        documents.sort(key=lambda d: d["name"])
 
-        documents = []
-        for f in files:
-            file_path = os.path.join(folder, f)
+        return documents
 
-            # VALIDAZIONE: Verifica che file_path sia dentro folder
-            try:
-                self.security.validate_path(file_path, folder)
-            except ValueError:
-                self.logger.warning(f"File ignorato (fuori path): {f}")
-                continue
+    def count_documents(self, property_id):
+        """Numero di documenti indicizzati di una proprietà"""
+        session = self.db.get_session()
+        try:
+            return session.query(func.count(Document.id)).filter(
+                Document.property_id == property_id
+            ).scalar() or 0
+        except Exception as e:
+            self.logger.error(f"DocumentService: Errore conteggio documenti: {e}")
+            return 0
+        finally:
+            self.db.close_session(session)
 
-            documents.append({
-                "name": f,
-                "path": file_path,
-                "is_folder": os.path.isdir(file_path)
-            })
+    def _relative_folder(self, property_id, folder):
+        """Cartella relativa alla cartella della proprietà, con separatore '/'"""
+        base = os.path.abspath(self.get_property_folder(property_id))
+        relative = os.path.relpath(os.path.abspath(folder), base)
+        return "" if relative == "." else relative.replace(os.sep, "/")
 
-        return documents
+    def describe_file(self, file_path, property_id, service=None, period=None, content_hash=None):
+        """
+        Metadati di indice di un file già salvato in docs/
+
+        Args:
+            content_hash: SHA-256 già noto (es. da store_document), evita la rilettura
+
+        Returns:
+            dict con i campi di Document (senza transaction_id)
+        """
+        file_stat = os.stat(file_path)
+
+        if content_hash is None:
+            with _STORED_HASHES_LOCK:
+                stored = _STORED_HASHES.pop(file_path, None)
+            if stored and stored[0] == file_stat.st_size:
+                content_hash = stored[1]
+            else:
+                content_hash = self._hash_file(file_path)
+        mime_type, _ = mimetypes.guess_type(file_path)
+
+        return {
+            'property_id': property_id,
+            'path': file_path,
+            'folder': self._relative_folder(property_id, os.path.dirname(file_path)),
+            'name': os.path.basename(file_path),
+            'size': file_stat.st_size,
+            'mtime': file_stat.st_mtime,
+            'content_hash': content_hash,
+            'mime': mime_type,
+            'period': period,
+            'service': service
+        }
+
+    @staticmethod
+    def period_from_date(data_fattura):
+        """Periodo yyyy-QN da una data dd/MM/yyyy"""
+        _, mese, anno = data_fattura.split("/")
+        return f"{anno}-Q{(int(mese) - 1) // 3 + 1}"
+
+    def index_is_empty(self):
+        """True se la tabella documents non contiene righe"""
+        session = self.db.get_session()
+        try:
+            return session.query(Document.id).first() is None
+        except Exception as e:
+            self.logger.error(f"DocumentService: Errore lettura indice documenti: {e}")
+            return False
+        finally:
+            self.db.close_session(session)
+
+    def rebuild_index(self, property_id=None):
+        """
+        Allinea l'indice al contenuto di docs/ (una sola scansione)
+
+        Aggiunge i file non indicizzati (senza transazione collegata),
+        aggiorna quelli con dimensione o mtime cambiati e rimuove le righe dei
+        file non più presenti. Serve per i documenti salvati prima
+        dell'introduzione dell'indice e come scansione periodica di riserva
+        del watcher.
+
+        Returns:
+            dict: {'added': int, 'updated': int, 'removed': int}
+        """
+        result = {'added': 0, 'updated': 0, 'removed': 0}
+
+        if property_id is not None:
+            property_ids = [int(property_id)]
+        else:
+            property_ids = []
+            for folder_name in os.listdir(self.docs_dir):
+                if folder_name.startswith("property_"):
+                    try:
+                        property_ids.append(int(folder_name.split("_", 1)[1]))
+                    except ValueError:
+                        continue
+
+        session = self.db.get_session()
+        try:
+            existing_properties = {pid for (pid,) in session.query(Property.id).all()}
+            if property_id is None:
+                # Anche le proprietà indicizzate senza cartella (righe da rimuovere)
+                indexed_properties = {pid for (pid,) in session.query(Document.property_id).distinct().all()}
+                property_ids = sorted(set(property_ids) | (indexed_properties & existing_properties))
+
+            for pid in property_ids:
+                if pid not in existing_properties:
+                    continue  # Cartelle orfane: gestite dalla pulizia
+
+                indexed = {
+                    row.path: row for row in
+                    session.query(
+                        Document.id, Document.path, Document.size, Document.mtime,
+                        Document.content_hash, DocumentArchive.id.label('archive_id')
+                    ).outerjoin(
+                        DocumentArchive, DocumentArchive.document_id == Document.id
+                    ).filter(Document.property_id == pid).all()
+                }
+
+                on_disk = set()
+                for root, dirs, files in os.walk(self.get_property_folder(pid)):
+                    dirs[:] = [d for d in dirs if not d.startswith(".")]
+                    for name in files:
+                        if name.startswith("."):
+                            continue
+                        file_path = os.path.join(root, name)
+                        on_disk.add(file_path)
+                        row = indexed.get(file_path)
+                        if row is None:
+                            session.add(Document(**self.describe_file(file_path, pid)))
+                            result['added'] += 1
+                        elif row.archive_id is not None:
+                            if self._reclaim_archived(session, row, file_path, pid):
+                                result['added'] += 1
+                        elif self._refresh_if_changed(session, row, file_path):
+                            result['updated'] += 1
+
+                # I documenti archiviati non sono più nell'albero ma restano indicizzati
+                missing = [
+                    row.id for path, row in indexed.items()
+                    if path not in on_disk and row.archive_id is None
+                ]
+                if missing:
+                    session.execute(delete(Document.__table__).where(
+                        Document.__table__.c.id.in_(missing)
+                    ))
+                    result['removed'] += len(missing)
+
+            session.commit()
+            self.logger.info(
+                f"DocumentService: Indice documenti allineato "
+                f"({result['added']} aggiunti, {result['updated']} aggiornati, {result['removed']} rimossi)"
+            )
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"DocumentService: Errore ricostruzione indice: {e}")
+        finally:
+            self.db.close_session(session)
+
+        return result
+
+    def _reclaim_archived(self, session, row, file_path, property_id):
+        """
+        File presente nel path di un documento archiviato
+
+        Con lo stesso hash è il residuo di un'archiviazione interrotta e lo
+        rimuove il DocumentArchiver. Altrimenti è un file nuovo con lo stesso
+        nome: la riga archiviata passa a un path nascosto nella stessa
+        cartella (.archived-<id>-<nome>, univoco; il contenuto resta nel
+        pacchetto) e il file viene indicizzato. True se indicizzato
+        """
+        described = self.describe_file(file_path, property_id)
+        if described['content_hash'] == row.content_hash:
+            return False
+
+        hidden = os.path.join(os.path.dirname(row.path), f".archived-{row.id}-{os.path.basename(row.path)}")
+        session.execute(
+            update(Document.__table__).where(Document.__table__.c.id == row.id).values(path=hidden)
+        )
+        session.add(Document(**described))
+        return True
+
+    def _path_taken(self, session, path):
+        """Path occupato da un file o da una riga dell'indice (es. documento archiviato)"""
+        return os.path.exists(path) or \
+            session.query(Document.id).filter(Document.path == path).first() is not None
+
+    def _refresh_if_changed(self, session, row, file_path):
+        """Aggiorna dimensione, mtime e hash di un file modificato; True se cambiato"""
+        file_stat = os.stat(file_path)
+        if row.size == file_stat.st_size and row.mtime == file_stat.st_mtime:
+            return False
+
+        session.query(Document).filter(Document.id == row.id).update({
+            'size': file_stat.st_size,
+            'mtime': file_stat.st_mtime,
+            'content_hash': self._hash_file(file_path)
+        })
+        return True
+
+    def property_id_from_path(self, path):
+        """ID proprietà di un percorso sotto docs/property_N (None altrimenti)"""
+        relative = os.path.relpath(os.path.abspath(path), self.abs_docs_dir)
+        top = relative.split(os.sep, 1)[0]
+        if not top.startswith("property_"):
+            return None
+        try:
+            return int(top.split("_", 1)[1])
+        except ValueError:
+            return None
+
+    def canonical_path(self, path):
+        """Percorso nella stessa forma salvata nell'indice (relativo a docs_dir)"""
+        relative = os.path.relpath(os.path.abspath(path), self.abs_docs_dir)
+        return str(self.docs_dir) if relative == "." else os.path.join(self.docs_dir, relative)
+
+    def sync_folder(self, folder_path, unsettled=()):
+        """
+        Allinea l'indice al contenuto di una sola cartella (eventi del watcher)
+
+        Confronta i file presenti con le righe della cartella (indice
+        property_id + folder): aggiunge i nuovi, aggiorna i modificati e
+        rimuove gli scomparsi, comprese le sottocartelle eliminate o spostate.
+        I nomi in unsettled (file ancora in scrittura) restano come sono:
+        né aggiunti, né aggiornati, né rimossi.
+
+        Returns:
+            dict: {'property_id', 'added', 'updated', 'removed', 'subfolders'}
+            con subfolders = sottocartelle presenti su disco; None se il percorso
+            non appartiene a una proprietà esistente
+        """
+        folder_path = self.canonical_path(folder_path)
+        property_id = self.property_id_from_path(folder_path)
+        if property_id is None:
+            return None
+
+        result = {'property_id': property_id, 'added': 0, 'updated': 0, 'removed': 0, 'subfolders': []}
+        folder = self._relative_folder(property_id, folder_path)
+
+        files = {}
+        children = set()
+        if os.path.isdir(folder_path):
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        children.add(entry.name)
+                    elif entry.is_file():
+                        files[entry.name] = entry.path
+
+        result['subfolders'] = [os.path.join(folder_path, name) for name in sorted(children)]
+
+        nested = Document.folder.startswith(f"{folder}/", autoescape=True) if folder \
+            else Document.folder != ""
+        start = len(folder) + 1 if folder else 0
+
+        session = self.db.get_session()
+        removed_hashes = set()
+        try:
+            if session.get(Property, property_id) is None:
+                return None  # Cartella orfana: gestita dalla pulizia
+
+            rows = session.query(
+                Document.id, Document.name, Document.size, Document.mtime, Document.content_hash
+            ).outerjoin(
+                DocumentArchive, DocumentArchive.document_id == Document.id
+            ).filter(
+                Document.property_id == property_id,
+                Document.folder == folder,
+                DocumentArchive.id.is_(None)
+            ).all()
+
+            # Nomi di documenti già archiviati: residuo da rimuovere o file nuovo
+            archived = {row.name: row for row in session.query(
+                Document.id, Document.name, Document.path, Document.content_hash
+            ).join(
+                DocumentArchive, DocumentArchive.document_id == Document.id
+            ).filter(Document.property_id == property_id, Document.folder == folder).all()}
+
+            missing = []
+            for row in rows:
+                file_path = files.pop(row.name, None)
+                if row.name in unsettled:
+                    continue
+                if file_path is None:
+                    missing.append(row.id)
+                    removed_hashes.add(row.content_hash)
+                elif self._refresh_if_changed(session, row, file_path):
+                    removed_hashes.add(row.content_hash)
+                    result['updated'] += 1
+
+            for name, file_path in files.items():
+                if name in unsettled:
+                    continue
+                if name in archived:
+                    if self._reclaim_archived(session, archived[name], file_path, property_id):
+                        result['added'] += 1
+                    continue
+                session.add(Document(**self.describe_file(file_path, property_id)))
+                result['added'] += 1
+
+            # Righe di sottocartelle non più presenti (eliminate o spostate altrove)
+            for (nested_folder,) in session.query(Document.folder).filter(
+                Document.property_id == property_id, nested
+            ).distinct().all():
+                if nested_folder[start:].split("/", 1)[0] not in children:
+                    stale = session.query(Document.id, Document.content_hash).outerjoin(
+                        DocumentArchive, DocumentArchive.document_id == Document.id
+                    ).filter(
+                        Document.property_id == property_id,
+                        Document.folder == nested_folder,
+                        DocumentArchive.id.is_(None)
+                    ).all()
+                    missing.extend(row.id for row in stale)
+                    removed_hashes.update(row.content_hash for row in stale)
+
+            if missing:
+                session.execute(delete(Document.__table__).where(Document.__table__.c.id.in_(missing)))
+                result['removed'] = len(missing)
+
+            session.commit()
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"DocumentService: Errore sincronizzazione cartella {folder_path}: {e}")
+            return None
+        finally:
+            self.db.close_session(session)
+
+        self._release_blobs({h for h in removed_hashes if h})
+        return result
+
+    def _unindex(self, file_path):
+        """Rimuove dall'indice un file o tutti i file sotto una cartella e libera i blob; True se riuscito"""
+        session = self.db.get_session()
+        try:
+            prefix = os.path.join(file_path, "")
+            condition = or_(
+                Document.__table__.c.path == file_path,
+                Document.__table__.c.path.startswith(prefix, autoescape=True)
+            )
+            hashes = {
+                h for (h,) in session.execute(
+                    select(Document.__table__.c.content_hash).where(condition)
+                ) if h
+            }
+            session.execute(delete(DocumentArchive.__table__).where(
+                DocumentArchive.__table__.c.document_id.in_(select(Document.__table__.c.id).where(condition))
+            ))
+            session.execute(delete(Document.__table__).where(condition))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"DocumentService: Errore aggiornamento indice: {e}")
+            return False
+        finally:
+            self.db.close_session(session)
+
+        self._release_blobs(hashes)
+        return True
 
     def save_document(self, source_path, property_id, metadata):
         """
@@ -141,8 +603,47 @@ class DocumentService:
         Returns:
             Path destinazione o None se fallisce
         """
-        # VALIDAZIONE 1: File upload sicuro
-        validation = self.security.validate_file_upload(source_path)
+        stored = self.store_document(source_path, property_id, metadata)
+        return stored['path'] if stored else None
+
+    def store_document(self, source_path, property_id, metadata, content_hash=None):
+        """
+        Salva un documento nell'archivio a contenuto indirizzato
+
+        Il contenuto viene scritto una sola volta in docs/.blobs/ (nome = SHA-256,
+        calcolato durante la copia); il path logico docs/property_N/... è un
+        clone copy-on-write del blob o, se il filesystem non li supporta, un
+        hardlink in sola lettura (copia solo senza hardlink).
+
+        Args:
+            source_path: Path del file sorgente
+            property_id: ID proprietà
+            metadata: Metadati documento
+            content_hash: Hash di un blob già archiviato da riusare senza
+                          rileggere il sorgente (vedi find_duplicate)
+
+        Returns:
+            dict: {'path', 'content_hash', 'size', 'reused'} o None se fallisce
+        """
+        # APERTURA UNICA del sorgente: stat, magic bytes, copia e hash usano lo stesso fd
+        try:
+            src = open(source_path, 'rb')
+        except OSError as e:
+            self.logger.error(f"File non valido: {e}")
+            raise ValueError(f"File non sicuro: impossibile aprire il file ({e.strerror})")
+
+        with src:
+            return self._store_stream(src, source_path, property_id, metadata, content_hash)
+
+    def _store_stream(self, src, source_path, property_id, metadata, content_hash):
+        """Corpo di store_document sul file sorgente già aperto"""
+        source_stat = os.fstat(src.fileno())
+        if not stat.S_ISREG(source_stat.st_mode):
+            raise ValueError("File non sicuro: Path non è un file valido")
+
+        # VALIDAZIONE 1: File upload sicuro (dimensione da fstat, tipo dai magic bytes)
+        header = src.read(self.HEADER_SIZE)
+        validation = self.security.validate_upload_stream(source_path, source_stat.st_size, header)
 
         if not validation['valid']:
             self.logger.error(f"File non valido: {validation['error']}")
@@ -218,43 +719,373 @@ class DocumentService:
             self.logger.critical(f"PATH TRAVERSAL in save: {dest_path}")
             raise ValueError("Operazione bloccata: path non sicuro")
 
-        # Gestisci duplicati
-        counter = 1
-        while os.path.exists(dest_path):
-            base_name = f"{mese}_{anno}_{safe_service}_{counter}"
-            new_filename = f"{base_name}{file_extension}"
-            dest_path = os.path.join(folder, new_filename)
-            counter += 1
-
-            if counter > 999:  # Safety limit
-                raise ValueError("Troppi file con lo stesso nome")
-
-        # COPIA FILE (NON move per sicurezza)
+        # COPIA FILE (NON move per sicurezza): blob + hardlink
+        linked = False
         try:
-            shutil.copy2(source_path, dest_path)
-
-            # Verifica che il file sia stato copiato correttamente
-            if not os.path.exists(dest_path):
-                raise IOError("File non copiato")
-
-            copied_size = os.path.getsize(dest_path)
-            if copied_size != validation['size']:
-                os.remove(dest_path)  # Rimuovi file corrotto
+            # Blob da riusare ricontrollato: se è stato alterato si riparte dal sorgente
+            if content_hash and self._blob_intact(self._blob_path(content_hash), content_hash, source_stat.st_size):
+                blob_path = self._blob_path(content_hash)
+                size = source_stat.st_size
+                reused = True
+            else:
+                content_hash, size, blob_path, reused = self._ingest_blob(src, header, source_stat)
+
+            # Verifica: il nome del blob è l'hash del contenuto letto
+            if size != validation['size']:
                 raise IOError("Dimensione file copiato non corrisponde")
 
-            self.logger.info(f"Documento salvato: {new_filename}")
-            return dest_path
+            # Scelta del nome libero e link atomici rispetto ad altri import paralleli
+            with _PATH_LOCK:
+                # Gestisci duplicati: anche i path indicizzati senza file
+                # (documenti archiviati) sono occupati
+                session = self.db.get_session()
+                try:
+                    counter = 1
+                    while self._path_taken(session, dest_path):
+                        base_name = f"{mese}_{anno}_{safe_service}_{counter}"
+                        new_filename = f"{base_name}{file_extension}"
+                        dest_path = os.path.join(folder, new_filename)
+                        counter += 1
+
+                        if counter > 999:  # Safety limit
+                            raise ValueError("Troppi file con lo stesso nome")
+                finally:
+                    self.db.close_session(session)
+
+                self._link_blob(blob_path, dest_path)
+                linked = True
+
+                with _STORED_HASHES_LOCK:
+                    if len(_STORED_HASHES) >= _STORED_HASHES_MAX:
+                        _STORED_HASHES.clear()
+                    _STORED_HASHES[dest_path] = (size, content_hash)
+
+            self.logger.info(
+                f"Documento salvato: {new_filename} "
+                f"(blob {content_hash[:12]}{', riusato' if reused else ''})"
+            )
+            return {
+                'path': dest_path,
+                'content_hash': content_hash,
+                'size': size,
+                'reused': reused
+            }
 
+        except ValueError:
+            raise
         except Exception as e:
             self.logger.error(f"Errore salvataggio documento: {e}")
             # Cleanup in caso di errore
-            if os.path.exists(dest_path):
+            if linked and os.path.exists(dest_path):
                 try:
-                    os.remove(dest_path)
+                    remove_file(dest_path)
                 except:
                     pass
             return None
 
+    # ------------------------------------------------------------------
+    # Archivio blob a contenuto indirizzato
+    # ------------------------------------------------------------------
+
+    def _blob_path(self, content_hash):
+        """docs/.blobs/ab/cd/<sha256>"""
+        return os.path.join(self.blobs_dir, content_hash[:2], content_hash[2:4], content_hash)
+
+    def _ingest_blob(self, src, header, source_stat):
+        """
+        Copia il sorgente (già aperto) nell'archivio calcolando lo SHA-256 nello stesso passaggio
+
+        Il primo blocco (già letto per i magic bytes) viene scritto da memoria;
+        il resto viene copiato dal kernel con copy_file_range/sendfile mentre
+        l'hash rilegge i blocchi appena scritti dalla copia temporanea (pagine
+        già in cache). Se la copia zero-copy non è disponibile si ripiega su
+        una copia a blocchi con buffer riusato. Un sorgente che cambia
+        dimensione o mtime durante la copia (ancora in scrittura) viene
+        rifiutato.
+        Il file temporaneo viene rinominato nel path del blob solo a copia
+        completata; se il blob esiste già viene scartato (deduplicazione),
+        a meno che il blob non abbia più il contenuto del suo hash: in quel
+        caso il path del blob passa alla copia nuova e i documenti alterati
+        restano sul vecchio inode.
+
+        Returns:
+            (content_hash, size, blob_path, reused)
+        """
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.blobs_dir, prefix=".ingest-")
+
+        sha256 = hashlib.sha256(header)
+        total = source_stat.st_size
+        try:
+            with os.fdopen(fd, 'wb') as dst:
+                dst.write(header)
+                dst.flush()
+
+                offset = len(header)
+                if offset < total:
+                    offset = self._copy_range(src, dst, sha256, offset, total)
+
+                current = os.fstat(src.fileno())
+                if offset != total or current.st_size != total \
+                        or current.st_mtime_ns != source_stat.st_mtime_ns:
+                    raise IOError("File modificato durante la copia")
+
+                os.fsync(dst.fileno())
+
+            content_hash = sha256.hexdigest()
+            blob_path = self._blob_path(content_hash)
+
+            if os.path.exists(blob_path):
+                if self._blob_intact(blob_path, content_hash, total):
+                    os.remove(tmp_path)
+                    return content_hash, total, blob_path, True
+                self.logger.warning(f"Blob {content_hash[:12]} alterato: sostituito dalla nuova copia")
+
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.utime(tmp_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+            os.chmod(tmp_path, READ_ONLY)
+            os.replace(tmp_path, blob_path)
+            return content_hash, total, blob_path, False
+
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _kernel_copy(self, src_fd, dst_fd):
+        """Copia lato kernel disponibile: funzione (count, position) -> byte copiati, o None"""
+        if hasattr(os, 'copy_file_range'):
+            def kernel_copy(count, position):
+                return os.copy_file_range(src_fd, dst_fd, count, position, position)
+            return kernel_copy
+        if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+            def kernel_copy(count, position):
+                os.lseek(dst_fd, position, os.SEEK_SET)
+                return os.sendfile(dst_fd, src_fd, position, count)
+            return kernel_copy
+        return None
+
+    def _copy_range(self, src, dst, sha256, offset, total):
+        """
+        Copia [offset, total) da src a dst aggiornando l'hash
+
+        L'hash legge dalla copia temporanea (privata) e non dal sorgente: un
+        sorgente troncato durante la copia accorcia la copia invece di far
+        leggere pagine inesistenti, e l'hash corrisponde sempre al blob.
+
+        Returns:
+            Offset raggiunto (== total se la copia è completa)
+        """
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+        buffer = bytearray(self.CHUNK_SIZE)
+        view = memoryview(buffer)
+
+        kernel_copy = self._kernel_copy(src_fd, dst_fd)
+        if kernel_copy is not None:
+            try:
+                while offset < total:
+                    copied = kernel_copy(min(self.CHUNK_SIZE, total - offset), offset)
+                    if copied == 0:
+                        break
+                    read = os.preadv(dst_fd, [view[:copied]], offset)
+                    sha256.update(view[:read])
+                    offset += copied
+                return offset
+            except OSError as e:
+                # EXDEV, ENOSYS, EINVAL...: filesystem non supportato, continua a blocchi
+                self.logger.debug(f"Copia zero-copy non disponibile ({e}), copia a blocchi")
+
+        # Fallback: copia a blocchi con buffer riusato (readinto evita allocazioni)
+        src.seek(offset)
+        dst.seek(offset)
+        while offset < total:
+            n = src.readinto(buffer)
+            if not n:
+                break
+            sha256.update(view[:n])
+            dst.write(view[:n])
+            offset += n
+        dst.flush()
+        return offset
+
+    def _blob_intact(self, blob_path, content_hash, size):
+        """
+        Blob riusabile: dimensione attesa e ancora in sola lettura (nessuno
+        può averlo modificato senza togliere la protezione); solo in caso
+        contrario il contenuto viene riletto e confrontato con l'hash
+        """
+        try:
+            blob_stat = os.stat(blob_path)
+        except OSError:
+            return False
+        if blob_stat.st_size != size:
+            return False
+        if not blob_stat.st_mode & WRITE_BITS:
+            return True
+        if not self.verify_document(blob_path, content_hash):
+            return False
+        os.chmod(blob_path, READ_ONLY)  # Blob salvati prima dei permessi in sola lettura
+        return True
+
+    def _link_blob(self, blob_path, dest_path):
+        """
+        Crea il path logico del documento a partire dal blob
+
+        Clone copy-on-write se il filesystem lo supporta (documento
+        modificabile, blocchi condivisi con il blob); altrimenti hardlink in
+        sola lettura (vedi detach_document) o, senza hardlink, copia normale.
+        """
+        if clone_file(blob_path, dest_path):
+            return
+        try:
+            os.link(blob_path, dest_path)
+        except OSError:
+            shutil.copyfile(blob_path, dest_path)
+            shutil.copystat(blob_path, dest_path)
+            os.chmod(dest_path, READ_ONLY | stat.S_IWUSR)
+            return
+        os.chmod(dest_path, READ_ONLY)
+
+    def detach_document(self, file_path):
+        """
+        Rende modificabile un documento prima di aprirlo
+
+        Un documento hardlink al blob condivide il contenuto con gli altri
+        documenti identici: viene sostituito da una copia privata con lo
+        stesso mtime (l'indice resta valido finché il file non cambia).
+        """
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return
+        if file_stat.st_mode & stat.S_IWUSR:
+            return
+
+        with _PATH_LOCK:
+            if file_stat.st_nlink > 1:
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix=".detach-")
+                try:
+                    with os.fdopen(fd, 'wb') as dst, open(file_path, 'rb') as src:
+                        shutil.copyfileobj(src, dst, self.CHUNK_SIZE)
+                    os.utime(tmp_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns))
+                    os.chmod(tmp_path, READ_ONLY | stat.S_IWUSR)
+                    os.replace(tmp_path, file_path)
+                except Exception:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+            else:
+                os.chmod(file_path, READ_ONLY | stat.S_IWUSR)
+        self.logger.info(f"DocumentService: Documento reso modificabile: {file_path}")
+
+    def find_duplicate(self, source_path):
+        """
+        Cerca un documento già archiviato con lo stesso contenuto
+
+        Filtra prima per dimensione sull'indice: il sorgente viene letto
+        (hash) solo se esiste almeno un documento della stessa dimensione.
+
+        Returns:
+            dict del documento esistente (to_dict) o None
+        """
+        try:
+            size = os.path.getsize(source_path)
+        except OSError:
+            return None
+
+        session = self.db.get_session()
+        try:
+            candidates = session.query(Document).filter(Document.size == size).all()
+            if not candidates:
+                return None
+
+            content_hash = self._hash_file(source_path)
+            for doc in candidates:
+                if doc.content_hash == content_hash:
+                    # Documento salvato prima dell'archivio blob: adotta il file esistente
+                    self._ensure_blob(content_hash, doc.path, doc.size, doc.mtime)
+                    return doc.to_dict()
+            return None
+
+        except Exception as e:
+            self.logger.error(f"DocumentService: Errore ricerca duplicati: {e}")
+            return None
+        finally:
+            self.db.close_session(session)
+
+    def _ensure_blob(self, content_hash, existing_path, size, mtime):
+        """
+        Registra un file esistente come blob se non già presente
+
+        Il blob è un clone o una copia in sola lettura: un hardlink
+        renderebbe in sola lettura anche il documento dell'utente.
+        """
+        blob_path = self._blob_path(content_hash)
+        if os.path.exists(blob_path):
+            return
+        try:
+            file_stat = os.stat(existing_path)
+        except OSError:
+            return
+        # Dimensione e mtime dell'indice invariati: l'hash indicizzato è ancora valido
+        if (file_stat.st_size, file_stat.st_mtime) != (size, mtime) \
+                and not self.verify_document(existing_path, content_hash):
+            return
+
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.blobs_dir, prefix=".ingest-")
+        os.close(fd)
+        os.remove(tmp_path)
+        try:
+            if not clone_file(existing_path, tmp_path):
+                shutil.copy2(existing_path, tmp_path)
+            os.chmod(tmp_path, READ_ONLY)
+            os.replace(tmp_path, blob_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                remove_file(tmp_path)
+            raise
+
+    def _hash_file(self, file_path):
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def verify_document(self, file_path, content_hash):
+        """Verifica di integrità: il contenuto deve avere ancora l'hash indicizzato"""
+        try:
+            return self._hash_file(file_path) == content_hash
+        except OSError:
+            return False
+
+    def _release_blobs(self, content_hashes):
+        """Elimina i blob non più referenziati da alcun documento indicizzato"""
+        if not content_hashes:
+            return
+
+        session = self.db.get_session()
+        try:
+            referenced = {
+                h for (h,) in session.query(Document.content_hash).filter(
+                    Document.content_hash.in_(content_hashes)
+                ).distinct().all()
+            }
+        except Exception as e:
+            self.logger.error(f"DocumentService: Errore verifica riferimenti blob: {e}")
+            return
+        finally:
+            self.db.close_session(session)
+
+        for content_hash in set(content_hashes) - referenced:
+            blob_path = self._blob_path(content_hash)
+            try:
+                if os.path.exists(blob_path):
+                    remove_file(blob_path)
+            except OSError as e:
+                self.logger.warning(f"Blob non eliminato {content_hash[:12]}: {e}")
+
     def delete_document(self, file_path):
         """
         Elimina un documento in modo SICURO
@@ -275,9 +1106,16 @@ class DocumentService:
 
         try:
             if os.path.isfile(file_path):
-                os.remove(file_path)
+                remove_file(file_path)
             elif os.path.isdir(file_path):
-                shutil.rmtree(file_path)
+                remove_tree(file_path)
+
+            # Documenti archiviati: via anche i file dai pacchetti, dopo le righe
+            from services.archive_service import get_document_archiver
+            archiver = get_document_archiver(self.logger)
+            packed = archiver.members_under(file_path)
+            if self._unindex(file_path):
+                archiver.drop_members(packed)
 
             self.logger.info(f"Documento eliminato: {file_path}")
             return True
@@ -327,6 +1165,10 @@ class DocumentService:
         """
         Elimina la cartella documenti di una proprietà in modo SICURO
 
+        La cartella viene rinominata nel cestino di docs/ (sparisce subito) e
+        i file sono eliminati a blocchi in background da OrphanFolderGC;
+        i conteggi del risultato vengono dall'indice.
+
         Args:
             property_id: ID proprietà
 
@@ -362,18 +1204,35 @@ class DocumentService:
             return result
 
         try:
-            # Conta file
-            for root, dirs, files in os.walk(folder_path):
-                result['files_deleted'] += len(files)
-                result['folders_deleted'] += len(dirs)
-
-            # Elimina ricorsivamente
-            shutil.rmtree(folder_path)
+            # Conteggi dall'indice: nessuna visita dell'albero nel thread chiamante
+            session = self.db.get_session()
+            try:
+                files, size, folders = session.query(
+                    func.count(Document.id),
+                    func.coalesce(func.sum(Document.size), 0),
+                    func.count(func.distinct(Document.folder))
+                ).filter(Document.property_id == int(property_id)).one()
+            finally:
+                self.db.close_session(session)
+
+            # Rinomina atomica nel cestino, poi eliminazione a blocchi in background
+            from services.orphan_gc_service import get_orphan_gc
+            gc = get_orphan_gc(self.logger)
+            trash_path = gc.enqueue_folder(folder_path, int(property_id), size, files)
+            if not trash_path:
+                result['error'] = "Impossibile spostare la cartella nel cestino"
+                return result
+
+            self._unindex(folder_path)
+            gc.start()
+
+            result['files_deleted'] = files
+            result['folders_deleted'] = folders
             result['success'] = True
 
             self.logger.info(
-                f"Cartella eliminata: {folder_path} "
-                f"({result['files_deleted']} file, {result['folders_deleted']} cartelle)"
+                f"Cartella in eliminazione: {folder_path} -> {trash_path} "
+                f"({files} file, {self.format_size(size)})"
             )
 
         except PermissionError as e:
@@ -386,26 +1245,17 @@ class DocumentService:
         return result
 
     def get_property_folder_size(self, property_id):
-        """Calcola dimensione cartella documenti"""
-        try:
-            folder_path = self.get_property_folder(property_id)
-        except ValueError:
-            return 0
-
-        if not os.path.exists(folder_path):
-            return 0
-
-        total_size = 0
+        """Dimensione totale dei documenti indicizzati di una proprietà"""
+        session = self.db.get_session()
         try:
-            for root, dirs, files in os.walk(folder_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if os.path.exists(file_path):
-                        total_size += os.path.getsize(file_path)
+            return session.query(func.coalesce(func.sum(Document.size), 0)).filter(
+                Document.property_id == property_id
+            ).scalar()
         except Exception as e:
             self.logger.error(f"Errore calcolo dimensione: {e}")
-
-        return total_size
+            return 0
+        finally:
+            self.db.close_session(session)
 
     def format_size(self, size_bytes):
         """Formatta dimensione in formato leggibile"""
@@ -0,0 +1,278 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, QFileSystemWatcher, QTimer, Signal
+
+from services.document_service import DocumentService
+from services.text_index_service import get_text_index
+
+
+class DocumentWatcher(QObject):
+    """
+    Mantiene l'indice documenti allineato ai file copiati a mano in docs/
+
+    Le cartelle sono osservate con QFileSystemWatcher (inotify su Linux,
+    ReadDirectoryChangesW su Windows). Gli eventi di una raffica vengono
+    raccolti in un insieme di cartelle "sporche" e, dopo una breve pausa,
+    ogni cartella è confrontata con le sue righe di indice in un thread di
+    lavoro. Le modifiche al contenuto di un file non generano eventi sulla
+    cartella: le copre la scansione periodica per dimensione/mtime, che fa
+    anche da riserva se il sistema non concede altri watch.
+    """
+
+    # property_id della cartella cambiata (0 = scansione completa)
+    index_changed = Signal(int)
+
+    # Interno: risultati dal thread di lavoro (cartelle da osservare)
+    _synced = Signal(list)
+
+    # Attesa dopo l'ultimo evento prima di sincronizzare (coalescenza raffiche)
+    DEBOUNCE_MS = 500
+
+    # Un file è stabile se l'ultima scrittura (mtime/ctime) è più vecchia di
+    # SETTLE_MS e dimensione/mtime non sono cambiati dal passaggio precedente:
+    # i file ancora in scrittura (copie lunghe, download) sono rimandati
+    SETTLE_MS = 2000
+
+    # Intervallo della scansione completa di riserva
+    SCAN_INTERVAL_MS = 10 * 60 * 1000
+
+    def __init__(self, logger, document_service=None):
+        super().__init__()
+        self.logger = logger
+        self.document_service = document_service or DocumentService(logger)
+        self.docs_dir = self.document_service.canonical_path(self.document_service.docs_dir)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_directory_changed)
+
+        self._dirty = set()
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(self.DEBOUNCE_MS)
+        self._debounce.timeout.connect(self._flush)
+
+        # Nuovo tentativo per le cartelle con file ancora in scrittura
+        self._retry = QTimer(self)
+        self._retry.setSingleShot(True)
+        self._retry.setInterval(self.SETTLE_MS)
+        self._retry.timeout.connect(self._flush)
+
+        # Solo thread di lavoro: {cartella: {nome: (size, mtime_ns)}} dei file non stabili
+        self._unstable = {}
+
+        self._scan_timer = QTimer(self)
+        self._scan_timer.setInterval(self.SCAN_INTERVAL_MS)
+        self._scan_timer.timeout.connect(self.scan)
+
+        # Un solo thread: sincronizzazioni e scansioni non si sovrappongono
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DocWatcher")
+        self._synced.connect(self._on_synced)
+
+    def start(self):
+        """Recupera le modifiche fatte ad app chiusa, registra le cartelle e avvia i timer"""
+        self.scan()
+        self._scan_timer.start()
+
+    def stop(self):
+        self._debounce.stop()
+        self._retry.stop()
+        self._scan_timer.stop()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ------------------------------------------------------------------
+    # Thread GUI
+    # ------------------------------------------------------------------
+
+    def _on_directory_changed(self, path):
+        self._dirty.add(self.document_service.canonical_path(path))
+        self._debounce.start()  # Riavviato ad ogni evento della raffica
+
+    def _flush(self):
+        if not self._dirty:
+            return
+        folders, self._dirty = self._dirty, set()
+        self._pool.submit(self._sync_folders, sorted(folders))
+
+    def _watch(self, folders):
+        """Aggiunge i watch mancanti; le cartelle nuove vanno sincronizzate"""
+        watched = set(self.watcher.directories())
+        new = [folder for folder in folders if folder not in watched and os.path.isdir(folder)]
+        if not new:
+            return []
+
+        failed = self.watcher.addPaths(new)
+        if failed:
+            self.logger.warning(
+                f"DocumentWatcher: {len(failed)} cartelle non osservabili, "
+                f"coperte dalla scansione periodica"
+            )
+        return new
+
+    def _on_synced(self, results):
+        """Risultati di una sincronizzazione: nuovi watch ed eventi di indice"""
+        gone = [folder for folder in self.watcher.directories() if not os.path.isdir(folder)]
+        if gone:
+            self.watcher.removePaths(gone)
+
+        changed = set()
+        subfolders = []
+        for result in results:
+            subfolders.extend(result['subfolders'])
+            if result.get('added') or result.get('updated') or result.get('removed'):
+                changed.add(result['property_id'] or 0)
+
+        # Cartelle comparse (create o spostate dentro docs/): sincronizzate a loro volta
+        new = self._watch(subfolders)
+        if new and results and not results[0].get('initial'):
+            self._dirty.update(new)
+            self._debounce.start()
+
+        # Cartelle con file ancora in scrittura: ritentate dopo SETTLE_MS
+        busy = [folder for result in results for folder in result.get('busy', ())]
+        if busy:
+            self._dirty.update(busy)
+            self._retry.start()
+
+        if changed:
+            get_text_index(self.logger).schedule()
+            for property_id in sorted(changed):
+                self.index_changed.emit(property_id)
+
+    def scan(self):
+        """Scansione completa per dimensione/mtime (riserva del watcher)"""
+        self._pool.submit(self._scan)
+
+    def unwatch(self):
+        """
+        Rilascia i watch e sospende i timer (prima di rinominare docs/: su
+        Windows le cartelle osservate non si possono spostare)
+        """
+        self._debounce.stop()
+        self._retry.stop()
+        self._scan_timer.stop()
+        self._dirty.clear()
+        directories = self.watcher.directories()
+        if directories:
+            self.watcher.removePaths(directories)
+
+    def rewatch(self):
+        """Ricrea i watch e riscansiona (docs/ sostituita, es. dopo un ripristino)"""
+        self.unwatch()
+        self.scan()
+        self._scan_timer.start()
+
+    # ------------------------------------------------------------------
+    # Thread di lavoro
+    # ------------------------------------------------------------------
+
+    def _property_folders(self):
+        folders = []
+        if os.path.isdir(self.docs_dir):
+            with os.scandir(self.docs_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False) and entry.name.startswith("property_"):
+                        folders.append(os.path.join(self.docs_dir, entry.name))
+        return sorted(folders)
+
+    def _collect_folders(self):
+        """Tutte le cartelle sotto docs/ (solo nomi, nessun hash)"""
+        try:
+            folders = [self.docs_dir]
+            for property_folder in self._property_folders():
+                for root, dirs, _ in os.walk(property_folder):
+                    dirs[:] = [d for d in dirs if not d.startswith(".")]
+                    folders.append(root)
+            self._synced.emit([{'property_id': None, 'subfolders': folders, 'initial': True}])
+        except Exception as e:
+            self.logger.error(f"DocumentWatcher: Errore registrazione cartelle: {e}")
+
+    @staticmethod
+    def _file_stats(folder):
+        """Dimensione e tempi dei file della cartella: {nome: (size, mtime_ns, ctime_ns)}"""
+        stats = {}
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue  # Rimosso nel frattempo
+                    stats[entry.name] = (stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+        except OSError:
+            pass
+        return stats
+
+    def _unsettled(self, folder):
+        """
+        Nomi dei file della cartella ancora in scrittura. Il ctime copre le
+        copie che conservano l'mtime del sorgente; il confronto con il
+        passaggio precedente copre le scritture che non aggiornano i tempi
+        """
+        now = time.time_ns()
+        previous = self._unstable.pop(folder, {})
+        unstable = {}
+        for name, (size, mtime_ns, ctime_ns) in self._file_stats(folder).items():
+            recent = now - max(mtime_ns, ctime_ns) < self.SETTLE_MS * 1_000_000
+            if recent or previous.get(name, (size, mtime_ns)) != (size, mtime_ns):
+                unstable[name] = (size, mtime_ns)
+        if unstable:
+            self._unstable[folder] = unstable
+        return set(unstable)
+
+    def _sync_folders(self, folders):
+        results = []
+        busy = []
+
+        for folder in folders:
+            try:
+                if folder == self.docs_dir:
+                    # Radice: solo nuove cartelle proprietà
+                    results.append({'property_id': None, 'subfolders': self._property_folders()})
+                    continue
+
+                # I file ancora in scrittura sono esclusi (l'indice registrerebbe
+                # un file a metà); gli altri della cartella si sincronizzano subito
+                unsettled = self._unsettled(folder)
+                result = self.document_service.sync_folder(folder, unsettled)
+                if result:
+                    results.append(result)
+                if unsettled:
+                    busy.append(folder)
+            except Exception as e:
+                self.logger.error(f"DocumentWatcher: Errore sincronizzazione {folder}: {e}")
+
+        total = {key: sum(r.get(key, 0) for r in results) for key in ('added', 'updated', 'removed')}
+        if any(total.values()):
+            self.logger.info(
+                f"DocumentWatcher: {len(folders)} cartelle sincronizzate "
+                f"({total['added']} aggiunti, {total['updated']} aggiornati, {total['removed']} rimossi)"
+            )
+        if busy:
+            results.append({'property_id': None, 'subfolders': [], 'busy': busy})
+        self._synced.emit(results)
+
+    def _scan(self):
+        try:
+            result = self.document_service.rebuild_index()
+            changed = result['added'] or result['updated'] or result['removed']
+            self._synced.emit([{'property_id': None, 'subfolders': [], **result}] if changed else [])
+        except Exception as e:
+            self.logger.error(f"DocumentWatcher: Errore scansione periodica: {e}")
+        # Registra anche le cartelle sfuggite al watcher
+        self._collect_folders()
+
+
+# Istanza globale del watcher
+_document_watcher = None
+
+
+def get_document_watcher(logger=None):
+    """Ottiene l'istanza globale del DocumentWatcher (creata al primo uso)"""
+    global _document_watcher
+    if _document_watcher is None:
+        _document_watcher = DocumentWatcher(logger)
+    return _document_watcher
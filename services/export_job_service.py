@@ -0,0 +1,354 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from database.models import ExportJob
+from database.connection import DatabaseConnection
+from services.export_service import ExportService
+from services.export_worker import init_worker, run_export, ExportCancelled
+
+
+class ExportJobManager(QObject):
+    """
+    Coda degli export eseguiti in background
+
+    Ogni export è un job registrato nella tabella export_jobs (storico con
+    esito e tempi) ed eseguito in un pool di processi: il thread GUI resta
+    libero e più export, ad esempio di proprietà diverse, girano in parallelo
+    su core diversi. I processi usano "spawn" su tutte le piattaforme, così
+    non ereditano connessioni al database né stato Qt.
+
+    L'avanzamento arriva dai processi su una coda condivisa, letta da un
+    QTimer e riemessa come segnale. L'annullamento toglie dalla coda i job
+    non ancora partiti; quelli in corso si fermano al successivo controllo
+    (ogni PROGRESS_EVERY righe) e il file parziale viene eliminato.
+    """
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_ERROR = 'error'
+    STATUS_CANCELLED = 'cancelled'
+
+    # job_id
+    job_added = Signal(int)
+    # job_id, righe scritte, righe totali
+    job_progress = Signal(int, int, int)
+    # job_id, stato finale
+    job_finished = Signal(int, str)
+
+    # Interno: future completato, dal thread di gestione del pool al thread GUI
+    _completed = Signal(int, object)
+
+    # Un core resta alla GUI; oltre 4 processi il collo di bottiglia è il disco
+    MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+    # Intervallo di lettura della coda di avanzamento
+    POLL_MS = 200
+
+    def __init__(self, logger):
+        super().__init__()
+        self.logger = logger
+        self.db = DatabaseConnection()
+        self.export_service = ExportService()
+
+        self._pool = None
+        self._suspended = False
+        self._manager = None
+        self._progress_queue = None
+        self._cancelled = None
+        self._futures = {}
+        self._progress = {}
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(self.POLL_MS)
+        self._poll_timer.timeout.connect(self._drain_progress)
+        self._completed.connect(self._on_completed)
+
+        self._mark_interrupted()
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def submit(self, export_format, property_id=None, property_name=None, start_date=None, end_date=None,
+               period_label=None, property_names=None):
+        """
+        Mette in coda un export e ritorna l'ID del job (None se non registrato)
+
+        Args:
+            export_format: 'pdf' | 'xlsx'
+            start_date, end_date: filtro yyyy-MM-dd
+            period_label: (inizio, fine) come mostrati nel report (dd/MM/yyyy)
+            property_names: {id: nome} per il PDF diviso per proprietà
+        """
+        session = self.db.get_session()
+        try:
+            job = ExportJob(
+                format=export_format,
+                property_id=property_id,
+                property_name=property_name,
+                start_date=start_date,
+                end_date=end_date,
+                status=self.STATUS_QUEUED
+            )
+            session.add(job)
+            session.flush()
+            job.filepath = os.path.abspath(self.export_service.export_path(export_format, suffix=f"_{job.id}"))
+            session.commit()
+            job_id, filepath = job.id, job.filepath
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"ExportJobManager: Errore registrazione export: {e}")
+            return None
+        finally:
+            self.db.close_session(session)
+
+        spec = {
+            'id': job_id,
+            'format': export_format,
+            'property_id': property_id,
+            'property_name': property_name,
+            'start_date': start_date,
+            'end_date': end_date,
+            'period_label': period_label,
+            'property_names': property_names,
+            'filepath': filepath
+        }
+
+        try:
+            self._ensure_pool()
+            future = self._pool.submit(run_export, spec, self._progress_queue, self._cancelled)
+        except Exception as e:
+            self.logger.error(f"ExportJobManager: Errore avvio export {job_id}: {e}")
+            self._finish(job_id, self.STATUS_ERROR, error=str(e))
+            self.job_finished.emit(job_id, self.STATUS_ERROR)
+            return job_id
+
+        self._futures[job_id] = future
+        self._progress[job_id] = (0, 0)
+        future.add_done_callback(lambda f, job_id=job_id: self._completed.emit(job_id, f))
+
+        self.logger.info(f"ExportJobManager: Export {job_id} ({export_format}) in coda")
+        self._poll_timer.start()
+        self.job_added.emit(job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        """Annulla un job in coda o in corso"""
+        future = self._futures.get(job_id)
+        if future is None:
+            return False
+        # Non ancora partito: basta toglierlo dalla coda (il completamento arriva dal callback)
+        if not future.cancel():
+            self._cancelled[job_id] = True
+        self.logger.info(f"ExportJobManager: Annullamento export {job_id} richiesto")
+        return True
+
+    def is_active(self, job_id):
+        return job_id in self._futures
+
+    def has_active(self):
+        """True se c'è almeno un export in coda o in corso"""
+        return bool(self._futures)
+
+    def progress(self, job_id):
+        """(righe scritte, righe totali) di un job attivo, None se non attivo"""
+        return self._progress.get(job_id)
+
+    def history(self, limit=50):
+        """Ultimi export, dal più recente"""
+        session = self.db.get_session()
+        try:
+            jobs = session.query(ExportJob).order_by(ExportJob.id.desc()).limit(limit).all()
+            return [job.to_dict() for job in jobs]
+        except Exception as e:
+            self.logger.error(f"ExportJobManager: Errore lettura storico export: {e}")
+            return []
+        finally:
+            self.db.close_session(session)
+
+    def shutdown(self):
+        """Annulla i job attivi e chiude il pool (chiamata alla chiusura dell'app)"""
+        self._poll_timer.stop()
+        for job_id, future in list(self._futures.items()):
+            if not future.cancel() and self._cancelled is not None:
+                self._cancelled[job_id] = True
+            self._finish(job_id, self.STATUS_CANCELLED, error="Interrotto alla chiusura dell'app")
+        self._futures.clear()
+
+        if self._pool is not None:
+            # I job in corso si fermano entro PROGRESS_EVERY righe
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    def suspend(self):
+        """
+        Chiude il pool prima della sostituzione del file del database: anche i
+        processi inattivi tengono aperta una connessione al file. Chiamabile
+        da un thread di lavoro (nessun timer Qt).
+
+        Returns:
+            False se ci sono export in coda o in corso (pool lasciato com'è)
+        """
+        if self._futures:
+            return False
+        self._suspended = True
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        return True
+
+    def resume(self):
+        """Riapre il pool dopo suspend: i nuovi processi si connettono al database attuale"""
+        self._suspended = False
+        self._ensure_pool()
+
+    # ------------------------------------------------------------------
+    # Interni
+    # ------------------------------------------------------------------
+
+    def _ensure_pool(self):
+        if self._pool is not None:
+            return
+        if self._suspended:
+            raise RuntimeError("Export sospesi durante il ripristino del database")
+        context = multiprocessing.get_context("spawn")
+        if self._manager is None:
+            self._manager = context.Manager()
+            self._progress_queue = self._manager.Queue()
+            self._cancelled = self._manager.dict()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.MAX_WORKERS,
+            mp_context=context,
+            initializer=init_worker
+        )
+
+    def _drain_progress(self):
+        """Legge gli aggiornamenti arrivati dai processi e li riemette come segnali"""
+        if self._progress_queue is None:
+            return
+        while True:
+            try:
+                job_id, written, total = self._progress_queue.get_nowait()
+            except Exception:  # queue.Empty (o manager già chiuso)
+                break
+            if job_id not in self._futures:
+                continue
+            if self._progress.get(job_id) == (0, 0):
+                # Primo messaggio: il processo ha preso in carico il job
+                self._set_running(job_id)
+            self._progress[job_id] = (written, total)
+            self.job_progress.emit(job_id, written, total)
+
+        if not self._futures:
+            self._poll_timer.stop()
+
+    def _on_completed(self, job_id, future):
+        self._drain_progress()
+        if self._futures.pop(job_id, None) is None:
+            return  # Già chiuso da shutdown
+        self._progress.pop(job_id, None)
+        if self._cancelled is not None:
+            self._cancelled.pop(job_id, None)
+
+        if future.cancelled():
+            status, result, error = self.STATUS_CANCELLED, None, None
+        else:
+            exc = future.exception()
+            if exc is None:
+                status, result, error = self.STATUS_DONE, future.result(), None
+            elif isinstance(exc, ExportCancelled):
+                status, result, error = self.STATUS_CANCELLED, None, None
+            else:
+                status, result, error = self.STATUS_ERROR, None, str(exc) or exc.__class__.__name__
+                if isinstance(exc, BrokenProcessPool):
+                    # Un processo è morto: il pool non accetta altri job, verrà ricreato
+                    self._pool = None
+
+        self._finish(job_id, status, result=result, error=error)
+        if status == self.STATUS_ERROR:
+            self.logger.error(f"ExportJobManager: Export {job_id} fallito: {error}")
+        else:
+            self.logger.info(f"ExportJobManager: Export {job_id} terminato ({status})")
+
+        if not self._futures:
+            self._poll_timer.stop()
+        self.job_finished.emit(job_id, status)
+
+    def _set_running(self, job_id):
+        session = self.db.get_session()
+        try:
+            job = session.get(ExportJob, job_id)
+            if job and job.status == self.STATUS_QUEUED:
+                job.status = self.STATUS_RUNNING
+                job.started_at = datetime.utcnow()
+                session.commit()
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"ExportJobManager: Errore aggiornamento export {job_id}: {e}")
+        finally:
+            self.db.close_session(session)
+
+    def _finish(self, job_id, status, result=None, error=None):
+        session = self.db.get_session()
+        try:
+            job = session.get(ExportJob, job_id)
+            if job is None:
+                return
+            job.status = status
+            job.finished_at = datetime.utcnow()
+            job.error = error[:500] if error else None
+            if result:
+                job.filepath = result['filepath']
+                job.rows = result['rows']
+                job.duration = result['duration']
+            elif status != self.STATUS_DONE:
+                job.filepath = None
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"ExportJobManager: Errore salvataggio esito export {job_id}: {e}")
+        finally:
+            self.db.close_session(session)
+
+    def _mark_interrupted(self):
+        """Job rimasti aperti da un'esecuzione precedente chiusa male (i file parziali vengono rimossi)"""
+        session = self.db.get_session()
+        try:
+            jobs = session.query(ExportJob).filter(
+                ExportJob.status.in_([self.STATUS_QUEUED, self.STATUS_RUNNING])
+            ).all()
+            for job in jobs:
+                if job.filepath and os.path.exists(job.filepath):
+                    os.remove(job.filepath)
+                job.status = self.STATUS_ERROR
+                job.error = "Interrotto: l'applicazione è stata chiusa"
+                job.filepath = None
+            session.commit()
+            if jobs:
+                self.logger.warning(f"ExportJobManager: {len(jobs)} export interrotti nella sessione precedente")
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"ExportJobManager: Errore pulizia export interrotti: {e}")
+        finally:
+            self.db.close_session(session)
+
+
+# Istanza globale del gestore
+_export_jobs = None
+
+
+def get_export_jobs(logger=None):
+    """Ottiene l'istanza globale dell'ExportJobManager (creata al primo uso)"""
+    global _export_jobs
+    if _export_jobs is None:
+        _export_jobs = ExportJobManager(logger)
+    return _export_jobs
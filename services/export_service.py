@@ -7,15 +7,21 @@ from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 
+from services.pdf_report_service import StreamingPdfReport
 from styles import COLORE_ERROR
 
 
 class ExportService:
     """Gestisce l'export di transazioni in PDF e Excel"""
 
+    # Formati dell'export Excel a flusso (stessi valori di export_to_excel)
+    EXCEL_CURRENCY_FORMAT = '€#,##0.00'
+    EXCEL_ROW_BANDS = ('FFFFFF', 'F8F9FA')
+
     def __init__(self):
         self.exports_dir = "exports"
         if not os.path.exists(self.exports_dir):
@@ -294,3 +300,166 @@ class ExportService:
         # Salva
         wb.save(filepath)
         return filepath
+
+    # ------------------------------------------------------------------
+    # Export Excel a flusso
+    # ------------------------------------------------------------------
+
+    def export_path(self, extension, suffix="", prefix="transazioni"):
+        """
+        Percorso nuovo in exports/ per un file di export
+
+        Il timestamp ha la risoluzione del secondo: il nome viene riservato
+        creando il file vuoto in modo esclusivo e, se già preso (due export
+        nello stesso secondo, anche da processi diversi), riceve _2, _3, ...
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(self.exports_dir, f"{prefix}_{timestamp}{suffix}")
+        counter = 1
+        while True:
+            filepath = f"{base}.{extension}" if counter == 1 else f"{base}_{counter}.{extension}"
+            try:
+                os.close(os.open(filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return filepath
+            except FileExistsError:
+                counter += 1
+
+    def _register_excel_styles(self, wb):
+        """
+        Registra nel workbook gli stili con nome usati dall'export a flusso.
+        Ogni combinazione (fascia di colore, tipo transazione, colonna) è
+        calcolata una sola volta: le celle fanno riferimento allo stile per nome
+        invece di creare i propri oggetti Font/PatternFill/Border/Alignment.
+
+        Ritorna {(fascia, entrata): [nome stile per colonna]} per le righe dati.
+        """
+        thin = Side(style='thin')
+        border = Border(left=thin, right=thin, top=thin, bottom=thin)
+
+        def fill(color):
+            return PatternFill(start_color=color, end_color=color, fill_type='solid')
+
+        def add(name, **attrs):
+            wb.add_named_style(NamedStyle(name=name, **attrs))
+            return name
+
+        add('exp_title', font=Font(name='Arial', size=16, bold=True, color='1E7BE7'))
+        add('exp_header', font=Font(name='Arial', size=12, bold=True, color='FFFFFF'),
+            fill=fill('2C3E50'), alignment=Alignment(horizontal='center'), border=border)
+        add('exp_label', border=border)
+        add('exp_total_in', fill=fill('D4EDDA'), border=border, number_format=self.EXCEL_CURRENCY_FORMAT)
+        add('exp_total_out', fill=fill('F8D7DA'), border=border, number_format=self.EXCEL_CURRENCY_FORMAT)
+        add('exp_balance_pos', font=Font(bold=True), fill=fill('D1ECF1'), border=border,
+            number_format=self.EXCEL_CURRENCY_FORMAT)
+        add('exp_balance_neg', font=Font(bold=True), fill=fill('F8D7DA'), border=border,
+            number_format=self.EXCEL_CURRENCY_FORMAT)
+
+        left = Alignment(horizontal='left')
+        right = Alignment(horizontal='right')
+        type_fonts = {True: Font(color='2ECC71', bold=True), False: Font(color='E74C3C', bold=True)}
+
+        row_styles = {}
+        for band, color in enumerate(self.EXCEL_ROW_BANDS):
+            text = add(f'exp_text_{band}', fill=fill(color), border=border, alignment=left)
+            for is_income, font in type_fonts.items():
+                suffix = 'in' if is_income else 'out'
+                kind = add(f'exp_type_{suffix}_{band}', font=font, fill=fill(color),
+                           border=border, alignment=left)
+                amount = add(f'exp_amount_{suffix}_{band}', font=font, fill=fill(color),
+                             border=border, alignment=right, number_format=self.EXCEL_CURRENCY_FORMAT)
+                row_styles[(band, is_income)] = [text, kind, text, text, amount]
+        return row_styles
+
+    def export_to_excel_stream(self, transactions, property_name=None, start_date=None, end_date=None,
+                               filepath=None):
+        """
+        Esporta in Excel a flusso con memoria costante.
+
+        `transactions` può essere un qualsiasi iterabile (tipicamente
+        TransactionService.iter_all) ed è consumato una sola volta: le righe
+        sono scritte nell'ordine ricevuto, senza riordinarle. Il workbook è in
+        modalità write-only, quindi ogni riga finisce subito su un file
+        temporaneo. Il foglio Riepilogo viene creato per primo ma riempito alla
+        fine, quando i totali sono noti.
+        """
+        filepath = filepath or self.export_path("xlsx")
+
+        wb = Workbook(write_only=True)
+        row_styles = self._register_excel_styles(wb)
+
+        ws_summary = wb.create_sheet("Riepilogo")
+        ws_summary.column_dimensions['A'].width = 20
+        ws_summary.column_dimensions['B'].width = 18
+
+        ws_trans = wb.create_sheet("Transazioni")
+        for letter, width in zip('ABCDE', (12, 12, 25, 30, 15)):
+            ws_trans.column_dimensions[letter].width = width
+
+        def cell(ws, value, style):
+            c = WriteOnlyCell(ws, value=value)
+            c.style = style
+            return c
+
+        ws_trans.append([cell(ws_trans, h, 'exp_header')
+                         for h in ('Data', 'Tipo', 'Categoria', 'Fornitore', 'Importo')])
+
+        totale_entrate = 0.0
+        totale_uscite = 0.0
+        for row_idx, trans in enumerate(transactions, start=2):
+            is_income = trans['type'] == 'Entrata'
+            amount = trans['amount']
+            if is_income:
+                totale_entrate += amount
+            elif trans['type'] == 'Uscita':
+                totale_uscite += amount
+
+            styles = row_styles[(row_idx % 2, is_income)]
+            values = (
+                trans['date'],
+                trans['type'],
+                trans.get('service', 'N/A'),
+                trans.get('provider', 'N/A'),
+                amount
+            )
+            ws_trans.append([cell(ws_trans, value, style) for value, style in zip(values, styles)])
+
+        saldo = totale_entrate - totale_uscite
+
+        # Riepilogo: stesse posizioni di export_to_excel (tabella da riga 7)
+        ws_summary.append([cell(ws_summary, '📊 Report Transazioni', 'exp_title')])
+        ws_summary.append([])
+        ws_summary.append([f"Generato il: {datetime.now().strftime('%d/%m/%Y %H:%M')}"])
+        ws_summary.append([f"Proprietà: {property_name}" if property_name else None])
+        ws_summary.append([f"Periodo: {start_date} - {end_date}" if start_date and end_date else None])
+        ws_summary.append([])
+        ws_summary.append([cell(ws_summary, 'Tipo', 'exp_header'), cell(ws_summary, 'Importo', 'exp_header')])
+        ws_summary.append([cell(ws_summary, 'Totale Entrate', 'exp_label'),
+                           cell(ws_summary, totale_entrate, 'exp_total_in')])
+        ws_summary.append([cell(ws_summary, 'Totale Uscite', 'exp_label'),
+                           cell(ws_summary, totale_uscite, 'exp_total_out')])
+        ws_summary.append([cell(ws_summary, 'Saldo Netto', 'exp_label'),
+                           cell(ws_summary, saldo, 'exp_balance_pos' if saldo >= 0 else 'exp_balance_neg')])
+
+        wb.save(filepath)
+        return filepath
+
+    def export_to_pdf_stream(self, transactions, property_name=None, start_date=None, end_date=None,
+                             property_names=None, filepath=None):
+        """
+        Esporta in PDF a flusso con memoria costante (vedi StreamingPdfReport).
+
+        Come export_to_excel_stream consuma una sola volta un iterabile già
+        ordinato. Con property_names ({id: nome}) il report ha una sezione e
+        una voce d'indice per proprietà: le righe devono arrivare raggruppate
+        per property_id (TransactionService.iter_all(order_by_property=True)).
+        """
+        filepath = filepath or self.export_path("pdf")
+        report = StreamingPdfReport(
+            filepath,
+            property_name=property_name,
+            start_date=start_date,
+            end_date=end_date,
+            property_names=property_names
+        )
+        report.build(transactions)
+        return filepath
@@ -0,0 +1,144 @@
+"""
+Codice eseguito nei processi del pool di export
+
+Il modulo non dipende da Qt: qui ci sono solo l'inizializzazione del
+database nel processo figlio e l'esecuzione di un job con avanzamento e
+annullamento cooperativo.
+"""
+import logging
+import os
+import time
+
+from database.connection import DatabaseConnection
+from services.export_service import ExportService
+from services.transaction_service import TransactionService
+
+
+# Ogni quante righe il processo segnala l'avanzamento e controlla l'annullamento
+PROGRESS_EVERY = 500
+
+
+class ExportCancelled(Exception):
+    """Export annullato dall'utente mentre era in corso"""
+
+
+def init_worker():
+    """Initializer del pool: connessione al database del processo figlio"""
+    DatabaseConnection().initialize(logging.getLogger("PropertyManager"))
+
+
+def run_export(job, progress, cancelled):
+    """
+    Esegue un job di export e ritorna {'filepath', 'rows', 'duration'}
+
+    Args:
+        job: dict con id, format ('pdf' | 'xlsx'), property_id, property_name,
+             start_date, end_date (yyyy-MM-dd), period_label, property_names, filepath
+        progress: coda condivisa, riceve (job_id, righe scritte, righe totali)
+        cancelled: dict condiviso {job_id: True} per le richieste di annullamento
+    """
+    logger = logging.getLogger("PropertyManager")
+    job_id = job['id']
+    started = time.perf_counter()
+
+    transaction_service = TransactionService(logger)
+    total = transaction_service.count(job['property_id'], job['start_date'], job['end_date'])
+    progress.put((job_id, 0, total))
+
+    rows = transaction_service.iter_all(
+        property_id=job['property_id'],
+        start_date=job['start_date'],
+        end_date=job['end_date'],
+        order_by_property=job.get('property_names') is not None
+    )
+    written = 0
+
+    def tracked():
+        nonlocal written
+        for row in rows:
+            written += 1
+            if written % PROGRESS_EVERY == 0:
+                if cancelled.get(job_id):
+                    raise ExportCancelled()
+                progress.put((job_id, written, total))
+            yield row
+
+    export_service = ExportService()
+    start_label, end_label = job.get('period_label') or (None, None)
+    try:
+        if job['format'] == 'pdf':
+            filepath = export_service.export_to_pdf_stream(
+                tracked(),
+                property_name=job['property_name'],
+                start_date=start_label,
+                end_date=end_label,
+                property_names=job.get('property_names'),
+                filepath=job['filepath']
+            )
+        else:
+            filepath = export_service.export_to_excel_stream(
+                tracked(),
+                property_name=job['property_name'],
+                start_date=start_label,
+                end_date=end_label,
+                filepath=job['filepath']
+            )
+    except BaseException:
+        rows.close()
+        # Niente file a metà in exports/
+        if os.path.exists(job['filepath']):
+            os.remove(job['filepath'])
+        raise
+
+    progress.put((job_id, written, total))
+    return {'filepath': filepath, 'rows': written, 'duration': time.perf_counter() - started}
+
+
+# Campi delle righe passate ai processi dal report di portafoglio (tuple, più leggere da serializzare)
+PORTFOLIO_ROW_FIELDS = ('property_id', 'date', 'type', 'amount', 'provider', 'service')
+
+
+def render_property_report(job, rows):
+    """
+    Report di una proprietà per il batch di portafoglio (nessun accesso al database)
+
+    Args:
+        job: dict con property_id, property_name, owner, period_label,
+             formats (('pdf', 'xlsx') o sottoinsieme) e paths {formato: percorso}
+        rows: tuple nei campi di PORTFOLIO_ROW_FIELDS, già ordinate
+
+    Returns:
+        dict con property_id, paths scritti, rows, entrate, uscite, duration
+    """
+    started = time.perf_counter()
+    transactions = [dict(zip(PORTFOLIO_ROW_FIELDS, row)) for row in rows]
+    start_label, end_label = job['period_label']
+    title = f"{job['property_name']} ({job['owner']})" if job.get('owner') else job['property_name']
+
+    export_service = ExportService()
+    paths = {}
+    try:
+        if 'pdf' in job['formats']:
+            paths['pdf'] = export_service.export_to_pdf_stream(
+                iter(transactions), property_name=title, start_date=start_label, end_date=end_label,
+                filepath=job['paths']['pdf']
+            )
+        if 'xlsx' in job['formats']:
+            paths['xlsx'] = export_service.export_to_excel_stream(
+                iter(transactions), property_name=title, start_date=start_label, end_date=end_label,
+                filepath=job['paths']['xlsx']
+            )
+    except BaseException:
+        for path in job['paths'].values():
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    return {
+        'property_id': job['property_id'],
+        'paths': paths,
+        'rows': len(transactions),
+        'entrate': sum(t['amount'] or 0 for t in transactions if t['type'] == 'Entrata'),
+        'uscite': sum(t['amount'] or 0 for t in transactions if t['type'] == 'Uscita'),
+        'duration': time.perf_counter() - started
+    }
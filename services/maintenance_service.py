@@ -0,0 +1,336 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database.connection import DatabaseConnection
+from database.models import MaintenanceRun
+from services.backup_service import get_backup_service, BackupError
+from services.text_index_service import get_text_index
+
+
+class MaintenanceError(Exception):
+    """Manutenzione non eseguibile (database non SQLite, già in corso, backup attivo)"""
+
+
+class MaintenanceService:
+    """
+    Manutenzione periodica del database SQLite nei momenti di inattività
+
+    - optimize: PRAGMA optimize, ANALYZE solo delle tabelle che ne hanno bisogno
+    - analyze: statistiche complete per il query planner
+    - incremental_vacuum: restituisce al filesystem le pagine libere senza
+      riscrivere il file (richiede auto_vacuum = INCREMENTAL)
+    - vacuum: riscrittura completa (deframmenta); la prima volta converte il
+      database ad auto_vacuum = INCREMENTAL, dopo serve di rado
+    - integrity_check: controllo completo della struttura
+
+    Ogni esecuzione è registrata in maintenance_runs con durata, dimensione
+    del file e pagine libere prima e dopo. Le operazioni girano su una
+    connessione sqlite3 dedicata; VACUUM sospende l'accesso al database
+    (DatabaseConnection.quiesce) perché richiede il file in esclusiva.
+    """
+
+    TASKS = ('optimize', 'analyze', 'incremental_vacuum', 'integrity_check', 'vacuum')
+
+    # Intervallo minimo tra due esecuzioni riuscite
+    INTERVALS = {
+        'optimize': timedelta(days=1),
+        'analyze': timedelta(days=7),
+        'incremental_vacuum': timedelta(days=1),
+        'integrity_check': timedelta(days=7),
+        'vacuum': timedelta(days=30),
+    }
+
+    # Pagine libere sotto le quali incremental_vacuum non vale la pena
+    MIN_FREE_PAGES = 64
+
+    # Quota di pagine libere oltre la quale VACUUM è anticipato (database
+    # non ancora in auto_vacuum incrementale: incremental_vacuum non le libera)
+    VACUUM_FREE_RATIO = 0.25
+
+    # Attesa prima di ritentare un'operazione eseguita o fallita di recente
+    RETRY_AFTER = timedelta(hours=6)
+
+    # Inattività richiesta (nessuna sessione aperta) prima di iniziare
+    IDLE_SECONDS = 300
+
+    # Controllo periodico del thread di pianificazione
+    CHECK_INTERVAL = 600
+
+    # Attesa dei lock tenuti dall'app (secondi)
+    BUSY_TIMEOUT = 30
+    QUIESCE_TIMEOUT = 15
+
+    AUTO_VACUUM_INCREMENTAL = 2
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+        self.backup_service = get_backup_service(logger)
+
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Callback(attivo) della UI intorno alla sospensione del database (vedi start_schedule)
+        self.busy_notify = None
+
+    def available(self):
+        return self.db.database_path() is not None
+
+    # ------------------------------------------------------------------
+    # Stato e storico
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+        db_path = self.db.database_path()
+        if db_path is None:
+            raise MaintenanceError("Manutenzione disponibile solo per il database SQLite locale")
+        # Autocommit: VACUUM e incremental_vacuum non possono stare in una transazione
+        return sqlite3.connect(db_path, timeout=self.BUSY_TIMEOUT, isolation_level=None)
+
+    @staticmethod
+    def _pragma(connection, name):
+        return connection.execute(f"PRAGMA {name}").fetchone()[0]
+
+    def stats(self):
+        """
+        Stato del file del database
+
+        Returns:
+            dict: {'size', 'page_size', 'page_count', 'free_pages', 'auto_vacuum'}
+        """
+        connection = self._connect()
+        try:
+            return {
+                'size': os.path.getsize(self.db.database_path()),
+                'page_size': self._pragma(connection, "page_size"),
+                'page_count': self._pragma(connection, "page_count"),
+                'free_pages': self._pragma(connection, "freelist_count"),
+                'auto_vacuum': self._pragma(connection, "auto_vacuum"),
+            }
+        finally:
+            connection.close()
+
+    def history(self, limit=50):
+        """Ultime operazioni eseguite, dalla più recente"""
+        session = self.db.get_session()
+        try:
+            runs = session.query(MaintenanceRun).order_by(MaintenanceRun.id.desc()).limit(limit).all()
+            return [run.to_dict() for run in runs]
+        except Exception as e:
+            self.logger.error(f"MaintenanceService: Errore lettura storico manutenzione: {e}")
+            return []
+        finally:
+            self.db.close_session(session)
+
+    def last_runs(self, successful=True):
+        """Ultima esecuzione (solo riuscite, o anche fallite) di ogni operazione: {task: datetime}"""
+        session = self.db.get_session()
+        try:
+            query = session.query(MaintenanceRun.task, MaintenanceRun.started_at)
+            if successful:
+                query = query.filter(MaintenanceRun.status == 'ok')
+            rows = query.order_by(MaintenanceRun.started_at.desc()).all()
+            last = {}
+            for task, started_at in rows:
+                last.setdefault(task, started_at)
+            return last
+        except Exception as e:
+            self.logger.error(f"MaintenanceService: Errore lettura ultime esecuzioni: {e}")
+            return {}
+        finally:
+            self.db.close_session(session)
+
+    def due_tasks(self, now=None):
+        """Operazioni da eseguire ora, nell'ordine di TASKS"""
+        now = now or datetime.utcnow()
+        last = self.last_runs()
+        attempted = self.last_runs(successful=False)
+        stats = self.stats()
+        free_ratio = stats['free_pages'] / max(stats['page_count'], 1)
+        incremental = stats['auto_vacuum'] == self.AUTO_VACUUM_INCREMENTAL
+
+        due = []
+        for task in self.TASKS:
+            if task in attempted and now - attempted[task] < self.RETRY_AFTER:
+                # Appena eseguita, o fallita: niente tentativi a ogni controllo
+                continue
+            expired = task not in last or now - last[task] >= self.INTERVALS[task]
+            if task == 'incremental_vacuum':
+                # Senza auto_vacuum incrementale non libera nulla: ci pensa VACUUM
+                expired = expired and incremental and stats['free_pages'] >= self.MIN_FREE_PAGES
+            elif task == 'vacuum':
+                # Conversione ad auto_vacuum incrementale o molte pagine libere non recuperabili altrimenti
+                expired = expired or (not incremental and free_ratio >= self.VACUUM_FREE_RATIO)
+            if expired:
+                due.append(task)
+        return due
+
+    # ------------------------------------------------------------------
+    # Esecuzione
+    # ------------------------------------------------------------------
+
+    def run(self, tasks=None, trigger='pianificato', progress=None):
+        """
+        Esegue le operazioni indicate (default: quelle scadute)
+
+        Args:
+            tasks: Sottoinsieme di TASKS; None = due_tasks()
+            trigger: 'pianificato' | 'manuale' (registrato nello storico)
+            progress: callback(operazione, fatte, totale)
+
+        Returns:
+            Lista delle esecuzioni registrate (dict come MaintenanceRun.to_dict)
+
+        Raises:
+            MaintenanceError: database non SQLite, manutenzione o backup già in corso
+        """
+        if not self._run_lock.acquire(blocking=False):
+            raise MaintenanceError("Manutenzione già in corso")
+        try:
+            # Niente backup o ripristini in parallelo: VACUUM riscrive il file
+            with self.backup_service.exclusive(timeout=1):
+                tasks = [task for task in self.TASKS if task in tasks] if tasks is not None else self.due_tasks()
+                results = []
+                for done, task in enumerate(tasks):
+                    if progress:
+                        progress(task, done, len(tasks))
+                    results.append(self._run_task(task, trigger))
+                if progress:
+                    progress('', len(tasks), len(tasks))
+                return results
+        except BackupError as e:
+            raise MaintenanceError(str(e))
+        finally:
+            self._run_lock.release()
+
+    def _run_task(self, task, trigger):
+        db_path = self.db.database_path()
+        run = MaintenanceRun(task=task, trigger=trigger, started_at=datetime.utcnow())
+        started = time.perf_counter()
+
+        connection = self._connect()
+        try:
+            run.size_before = os.path.getsize(db_path)
+            run.free_pages_before = self._pragma(connection, "freelist_count")
+
+            if task == 'optimize':
+                connection.execute("PRAGMA optimize").fetchall()
+            elif task == 'analyze':
+                connection.execute("ANALYZE")
+            elif task == 'incremental_vacuum':
+                # Ogni riga restituita è un passo: vanno consumate tutte
+                connection.execute("PRAGMA incremental_vacuum").fetchall()
+            elif task == 'integrity_check':
+                rows = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+                if rows != ['ok']:
+                    raise sqlite3.DatabaseError('; '.join(rows[:5]))
+            elif task == 'vacuum':
+                self._vacuum(connection)
+
+            run.free_pages_after = self._pragma(connection, "freelist_count")
+            run.size_after = os.path.getsize(db_path)
+            run.status = 'ok'
+        except (sqlite3.Error, OSError, TimeoutError) as e:
+            run.status = 'error'
+            run.message = str(e)[:500]
+            self.logger.error(f"MaintenanceService: Errore {task}: {e}")
+        finally:
+            connection.close()
+
+        run.duration = round(time.perf_counter() - started, 3)
+        self._record(run)
+
+        result = run.to_dict()
+        if run.status == 'ok':
+            self.logger.info(
+                f"MaintenanceService: {task} in {run.duration:.2f}s"
+                + (f", {self.backup_service.format_size(result['saved'])} recuperati" if result['saved'] and result['saved'] > 0 else "")
+            )
+        return result
+
+    def _vacuum(self, connection):
+        """VACUUM con il resto dell'app in attesa (richiede il file in esclusiva)"""
+        # L'indicizzazione del testo scriverebbe a blocchi durante il VACUUM: ripresa dopo
+        text_index = get_text_index(self.logger)
+        interrupted = text_index.cancel(self.QUIESCE_TIMEOUT)
+        # Durante la sospensione anche il thread GUI attende get_session: la UI
+        # mostra prima uno stato di attesa bloccante invece di restare congelata
+        notify = self.busy_notify
+        if notify:
+            notify(True)
+        try:
+            with self.db.quiesce(self.QUIESCE_TIMEOUT):
+                if self._pragma(connection, "auto_vacuum") != self.AUTO_VACUUM_INCREMENTAL:
+                    # Il cambio di modalità ha effetto solo con il VACUUM che segue
+                    connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                connection.execute("VACUUM")
+        finally:
+            if notify:
+                notify(False)
+            if interrupted:
+                text_index.schedule()
+
+    def _record(self, run):
+        session = self.db.get_session()
+        try:
+            session.add(run)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"MaintenanceService: Errore registrazione {run.task}: {e}")
+        finally:
+            self.db.close_session(session)
+
+    # ------------------------------------------------------------------
+    # Pianificazione
+    # ------------------------------------------------------------------
+
+    def start_schedule(self, busy_notify=None):
+        """
+        Avvia il thread che esegue le operazioni scadute quando l'app è inattiva
+
+        Args:
+            busy_notify: Callback(attivo) chiamata dal thread della manutenzione
+                         prima (True) e dopo (False) la sospensione del database;
+                         deve ritornare solo quando la UI mostra lo stato di attesa
+        """
+        self.busy_notify = busy_notify
+        if not self.available() or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_schedule, name="DbMaintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def _run_schedule(self):
+        while not self._stop.wait(self.CHECK_INTERVAL):
+            if self.db.idle_seconds() < self.IDLE_SECONDS:
+                continue
+            try:
+                tasks = self.due_tasks()
+                if tasks:
+                    self.run(tasks)
+            except MaintenanceError as e:
+                self.logger.info(f"MaintenanceService: Manutenzione rimandata: {e}")
+            except Exception as e:
+                self.logger.error(f"MaintenanceService: Errore manutenzione pianificata: {e}")
+
+
+# Istanza globale del servizio di manutenzione
+_maintenance_service = None
+
+
+def get_maintenance_service(logger=None):
+    """Ottiene l'istanza globale del MaintenanceService"""
+    global _maintenance_service
+    if _maintenance_service is None:
+        _maintenance_service = MaintenanceService(logger)
+    return _maintenance_service
@@ -0,0 +1,494 @@
+import csv
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func
+
+from database.models import Document, OrphanFolder, Property
+from database.connection import DatabaseConnection
+from services.document_service import DocumentService, remove_file
+
+
+class OrphanFolderGC:
+    """
+    Garbage collector incrementale delle cartelle documenti orfane
+
+    Le cartelle orfane si trovano confrontando gli ID proprietà validi con le
+    cartelle property_N in docs/ (un solo listdir) e con l'indice documenti,
+    senza visitare gli alberi. Prima dell'eliminazione ogni cartella viene
+    rinominata in docs/.trash_* (operazione atomica: sparisce subito e un
+    nuovo property_N con lo stesso ID non la tocca) e messa in coda nella
+    tabella orphan_folders. Il thread di lavoro elimina i file a blocchi,
+    salvando l'avanzamento dopo ogni blocco: se l'app si chiude a metà, il
+    lavoro riprende al prossimo avvio da dove era rimasto.
+    """
+
+    # File eliminati per blocco (avanzamento salvato dopo ogni blocco)
+    BATCH_FILES = 200
+
+    # Pausa tra i blocchi per non saturare il disco
+    BATCH_PAUSE = 0.02
+
+    # Prefisso delle cartelle in attesa di eliminazione
+    TRASH_PREFIX = ".trash_"
+
+    # I blob più giovani di così potrebbero essere in corso di collegamento
+    BLOB_GRACE_SECONDS = 3600
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+        self.document_service = DocumentService(logger)
+        self.docs_dir = str(self.document_service.docs_dir)
+
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._progress = self._empty_progress()
+
+    @staticmethod
+    def _empty_progress():
+        return {
+            'running': False,
+            'path': None,
+            'folders_done': 0,
+            'folders_total': 0,
+            'files_deleted': 0,
+            'bytes_deleted': 0,
+            'blobs_deleted': 0
+        }
+
+    # ------------------------------------------------------------------
+    # Rilevamento (dry-run)
+    # ------------------------------------------------------------------
+
+    def find_orphans(self):
+        """
+        Report delle cartelle orfane senza eliminare nulla
+
+        Dimensione e numero di file vengono dall'indice o dalla coda (None se
+        la cartella non è mai stata indicizzata).
+
+        Returns:
+            Lista di dict: {'property_id', 'path', 'bytes_total', 'files_total',
+            'bytes_deleted', 'files_deleted', 'status', 'queued'}
+        """
+        session = self.db.get_session()
+        try:
+            valid_ids = {pid for (pid,) in session.query(Property.id).all()}
+            indexed = {
+                pid: (files, size) for pid, files, size in session.query(
+                    Document.property_id, func.count(Document.id), func.coalesce(func.sum(Document.size), 0)
+                ).group_by(Document.property_id).all()
+            }
+            queued = {
+                row.path: row.to_dict() for row in
+                session.query(OrphanFolder).filter(OrphanFolder.status != 'done').all()
+            }
+        except Exception as e:
+            self.logger.error(f"OrphanFolderGC: Errore lettura proprietà/indice: {e}")
+            return []
+        finally:
+            self.db.close_session(session)
+
+        orphans = []
+        for folder_name in self._list_docs_dir():
+            path = os.path.join(self.docs_dir, folder_name)
+            if path in queued:
+                continue
+
+            if folder_name.startswith(self.TRASH_PREFIX):
+                # Cestino senza riga in coda (interruzione tra rinomina e insert)
+                property_id = None
+            else:
+                property_id = self._property_id(folder_name)
+                if property_id is None or property_id in valid_ids:
+                    continue
+
+            files, size = indexed.get(property_id, (None, None))
+            orphans.append({
+                'property_id': property_id,
+                'path': path,
+                'bytes_total': size,
+                'files_total': files,
+                'bytes_deleted': 0,
+                'files_deleted': 0,
+                'status': 'found',
+                'queued': False
+            })
+
+        for row in queued.values():
+            orphans.append({**row, 'queued': True})
+
+        orphans.sort(key=lambda o: o['path'])
+        return orphans
+
+    def _list_docs_dir(self):
+        if not os.path.isdir(self.docs_dir):
+            return []
+        with os.scandir(self.docs_dir) as entries:
+            return [
+                entry.name for entry in entries
+                if entry.is_dir(follow_symlinks=False)
+                and (entry.name.startswith("property_") or entry.name.startswith(self.TRASH_PREFIX))
+            ]
+
+    @staticmethod
+    def _property_id(folder_name):
+        try:
+            return int(folder_name.split("_", 1)[1])
+        except (IndexError, ValueError):
+            return None
+
+    def write_report(self, orphans, exports_dir="exports"):
+        """
+        Salva il report a secco in CSV
+
+        Returns:
+            Path del file creato
+        """
+        os.makedirs(exports_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filepath = os.path.join(exports_dir, f"cartelle_orfane_{timestamp}.csv")
+
+        with open(filepath, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(['Cartella', 'ID Proprietà', 'File (indice)', 'Byte (indice)',
+                             'Stato', 'File eliminati', 'Byte eliminati'])
+            for orphan in orphans:
+                writer.writerow([
+                    orphan['path'],
+                    orphan['property_id'] or '',
+                    '' if orphan['files_total'] is None else orphan['files_total'],
+                    '' if orphan['bytes_total'] is None else orphan['bytes_total'],
+                    orphan['status'],
+                    orphan['files_deleted'],
+                    orphan['bytes_deleted']
+                ])
+
+        self.logger.info(f"OrphanFolderGC: Report cartelle orfane salvato: {filepath}")
+        return filepath
+
+    # ------------------------------------------------------------------
+    # Coda
+    # ------------------------------------------------------------------
+
+    def enqueue_folder(self, folder_path, property_id=None, bytes_total=None, files_total=None):
+        """
+        Sposta una cartella nel cestino di docs/ e la mette in coda
+
+        Returns:
+            Path della cartella nel cestino o None in caso di errore
+        """
+        folder_path = str(folder_path)
+        name = os.path.basename(folder_path)
+
+        if name.startswith(self.TRASH_PREFIX):
+            trash_path = folder_path
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
+            trash_path = os.path.join(self.docs_dir, f"{self.TRASH_PREFIX}{name}_{timestamp}")
+            try:
+                os.rename(folder_path, trash_path)
+            except OSError as e:
+                self.logger.error(f"OrphanFolderGC: Impossibile spostare {folder_path} nel cestino: {e}")
+                return None
+
+        session = self.db.get_session()
+        try:
+            if session.query(OrphanFolder.id).filter(OrphanFolder.path == trash_path).first() is None:
+                session.add(OrphanFolder(
+                    property_id=property_id,
+                    path=trash_path,
+                    bytes_total=bytes_total,
+                    files_total=files_total
+                ))
+            session.commit()
+            return trash_path
+        except Exception as e:
+            # La cartella resta nel cestino: find_orphans la ritrova
+            session.rollback()
+            self.logger.error(f"OrphanFolderGC: Errore inserimento in coda: {e}")
+            return None
+        finally:
+            self.db.close_session(session)
+
+    def enqueue(self, orphans):
+        """Mette in coda le cartelle di un report (quelle non ancora in coda)"""
+        queued = 0
+        for orphan in orphans:
+            if orphan['queued']:
+                if orphan['status'] == 'error':
+                    self._save_row(orphan['id'], status='pending', error=None)  # Nuovo tentativo
+                continue
+            if self.enqueue_folder(orphan['path'], orphan['property_id'],
+                                   orphan['bytes_total'], orphan['files_total']):
+                queued += 1
+        return queued
+
+    def has_pending(self):
+        session = self.db.get_session()
+        try:
+            return session.query(OrphanFolder.id).filter(
+                OrphanFolder.status.in_(('pending', 'deleting'))
+            ).first() is not None
+        except Exception as e:
+            self.logger.error(f"OrphanFolderGC: Errore lettura coda: {e}")
+            return False
+        finally:
+            self.db.close_session(session)
+
+    # ------------------------------------------------------------------
+    # Thread di lavoro
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Avvia (o riprende) l'eliminazione in background"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._progress = self._empty_progress()
+            self._progress['running'] = True
+            self._thread = threading.Thread(target=self._run, name="OrphanFolderGC", daemon=True)
+            self._thread.start()
+
+    def resume(self):
+        """Riprende il lavoro lasciato in sospeso (chiamata all'avvio)"""
+        if self.has_pending():
+            self.logger.info("OrphanFolderGC: Ripresa eliminazione cartelle orfane")
+            self.start()
+
+    def stop(self, timeout=2):
+        """Interrompe dopo il blocco corrente (lo stato resta in coda)"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def status(self):
+        """Copia dell'avanzamento corrente (per polling dalla UI)"""
+        with self._lock:
+            return dict(self._progress)
+
+    def _update_progress(self, **changes):
+        with self._lock:
+            for key, value in changes.items():
+                self._progress[key] = value
+
+    def _add_progress(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self._progress[key] += value
+
+    def _run(self):
+        try:
+            # La coda è riletta ad ogni giro: le cartelle accodate nel frattempo vengono incluse
+            attempted = set()
+            while not self._stop.is_set():
+                pending = self._pending_rows(attempted)
+                if not pending:
+                    break
+
+                row_id, path = pending[0]
+                attempted.add(row_id)
+                self._update_progress(path=path, folders_total=len(attempted) + len(pending) - 1)
+                if self._delete_folder(row_id, path):
+                    self._add_progress(folders_done=1)
+
+            if not self._stop.is_set():
+                self._update_progress(path=None)
+                self._add_progress(blobs_deleted=self.sweep_blobs())
+
+            progress = self.status()
+            self.logger.info(
+                f"OrphanFolderGC: {progress['folders_done']}/{progress['folders_total']} cartelle, "
+                f"{progress['files_deleted']} file, "
+                f"{self.document_service.format_size(progress['bytes_deleted'])} liberati, "
+                f"{progress['blobs_deleted']} blob"
+                f"{' (interrotto, riprenderà)' if self._stop.is_set() else ''}"
+            )
+
+        except Exception as e:
+            self.logger.error(f"OrphanFolderGC: Errore: {e}")
+        finally:
+            self._update_progress(running=False)
+
+    def _pending_rows(self, exclude):
+        session = self.db.get_session()
+        try:
+            query = session.query(OrphanFolder.id, OrphanFolder.path).filter(
+                OrphanFolder.status.in_(('pending', 'deleting'))
+            )
+            if exclude:
+                query = query.filter(OrphanFolder.id.not_in(exclude))
+            return query.order_by(OrphanFolder.id).all()
+        finally:
+            self.db.close_session(session)
+
+    def _save_row(self, row_id, **values):
+        session = self.db.get_session()
+        try:
+            session.query(OrphanFolder).filter(OrphanFolder.id == row_id).update(values)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"OrphanFolderGC: Errore salvataggio avanzamento: {e}")
+        finally:
+            self.db.close_session(session)
+
+    def _delete_folder(self, row_id, path):
+        """Elimina un albero a blocchi; True se completato"""
+        try:
+            # Solo cartelle nel cestino dentro docs/
+            self.document_service.security.validate_path(
+                os.path.abspath(path), self.document_service.abs_docs_dir
+            )
+            if not os.path.basename(path).startswith(self.TRASH_PREFIX):
+                raise ValueError("cartella non nel cestino")
+        except ValueError as e:
+            self.logger.critical(f"OrphanFolderGC: Eliminazione bloccata {path}: {e}")
+            self._save_row(row_id, status='error', error=str(e)[:500])
+            return False
+
+        session = self.db.get_session()
+        try:
+            row = session.get(OrphanFolder, row_id)
+            files_deleted, bytes_deleted = row.files_deleted, row.bytes_deleted
+        finally:
+            self.db.close_session(session)
+
+        self._save_row(row_id, status='deleting')
+
+        batch_files = 0
+        batch_bytes = 0
+        try:
+            for root, dirs, files in os.walk(path, topdown=False):
+                for name in files:
+                    file_path = os.path.join(root, name)
+                    try:
+                        file_stat = os.lstat(file_path)
+                        remove_file(file_path)
+                    except FileNotFoundError:
+                        continue
+                    batch_files += 1
+                    # Un hardlink verso docs/.blobs non libera spazio: lo conta sweep_blobs
+                    if file_stat.st_nlink == 1:
+                        batch_bytes += file_stat.st_size
+
+                    if batch_files >= self.BATCH_FILES:
+                        files_deleted += batch_files
+                        bytes_deleted += batch_bytes
+                        self._add_progress(files_deleted=batch_files, bytes_deleted=batch_bytes)
+                        self._save_row(row_id, files_deleted=files_deleted, bytes_deleted=bytes_deleted)
+                        batch_files = batch_bytes = 0
+
+                        if self._stop.is_set():
+                            return False
+                        time.sleep(self.BATCH_PAUSE)
+
+                for name in dirs:
+                    dir_path = os.path.join(root, name)
+                    if os.path.islink(dir_path):
+                        os.remove(dir_path)
+                    else:
+                        os.rmdir(dir_path)
+
+            if os.path.isdir(path):
+                os.rmdir(path)
+
+        except OSError as e:
+            self.logger.error(f"OrphanFolderGC: Errore eliminazione {path}: {e}")
+            self._save_row(row_id, status='error', error=str(e)[:500],
+                           files_deleted=files_deleted + batch_files,
+                           bytes_deleted=bytes_deleted + batch_bytes)
+            return False
+
+        self._add_progress(files_deleted=batch_files, bytes_deleted=batch_bytes)
+        self._save_row(row_id, status='done', error=None,
+                       files_deleted=files_deleted + batch_files,
+                       bytes_deleted=bytes_deleted + batch_bytes)
+        return True
+
+    def sweep_blobs(self):
+        """
+        Elimina i blob non più referenziati
+
+        Le righe dell'indice di una proprietà eliminata spariscono in cascata
+        senza liberare i blob: un blob con un solo link e nessuna riga con il
+        suo hash non è più usato da nessun documento. La dimensione dei blob
+        eliminati si somma a bytes_deleted, perché è lì che lo spazio dei
+        documenti in hardlink viene davvero liberato.
+
+        Returns:
+            Numero di blob eliminati
+        """
+        blobs_dir = self.document_service.blobs_dir
+        if not os.path.isdir(blobs_dir):
+            return 0
+
+        cutoff = time.time() - self.BLOB_GRACE_SECONDS
+        candidates = {}
+        deleted = 0
+
+        for root, _, files in os.walk(blobs_dir):
+            for name in files:
+                blob_path = os.path.join(root, name)
+                try:
+                    blob_stat = os.stat(blob_path)
+                except OSError:
+                    continue
+                if blob_stat.st_nlink == 1 and blob_stat.st_ctime < cutoff:
+                    candidates[name] = (blob_path, blob_stat.st_size)
+
+                if len(candidates) >= 500:
+                    deleted += self._delete_unreferenced(candidates)
+                    candidates = {}
+                    if self._stop.is_set():
+                        return deleted
+
+        return deleted + self._delete_unreferenced(candidates)
+
+    def _delete_unreferenced(self, candidates):
+        if not candidates:
+            return 0
+
+        session = self.db.get_session()
+        try:
+            referenced = {
+                h for (h,) in session.query(Document.content_hash).filter(
+                    Document.content_hash.in_(list(candidates))
+                ).distinct().all()
+            }
+        except Exception as e:
+            self.logger.error(f"OrphanFolderGC: Errore verifica riferimenti blob: {e}")
+            return 0
+        finally:
+            self.db.close_session(session)
+
+        deleted = 0
+        freed = 0
+        for content_hash, (blob_path, size) in candidates.items():
+            if content_hash in referenced:
+                continue
+            try:
+                remove_file(blob_path)
+                deleted += 1
+                freed += size
+            except OSError as e:
+                self.logger.warning(f"OrphanFolderGC: Blob non eliminato {content_hash[:12]}: {e}")
+        self._add_progress(bytes_deleted=freed)
+        return deleted
+
+
+# Istanza globale del garbage collector
+_orphan_gc = None
+
+
+def get_orphan_gc(logger=None):
+    """Ottiene l'istanza globale dell'OrphanFolderGC"""
+    global _orphan_gc
+    if _orphan_gc is None:
+        _orphan_gc = OrphanFolderGC(logger)
+    return _orphan_gc
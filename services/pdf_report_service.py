@@ -0,0 +1,443 @@
+import itertools
+import math
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import (
+    BaseDocTemplate, PageTemplate, Frame, Table, TableStyle, Paragraph, Spacer, PageBreak
+)
+from reportlab.platypus.doctemplate import ActionFlowable
+from reportlab.platypus.flowables import Flowable
+
+from styles import COLORE_ERROR
+
+
+COLORE_ENTRATA = colors.HexColor('#2ecc71')
+COLORE_USCITA = colors.HexColor(COLORE_ERROR)
+
+
+class _LazyStory(list):
+    """
+    Story di ReportLab alimentata da un generatore
+
+    Il motore di impaginazione consuma la story dalla testa (len, [0], del
+    [0], inserimento delle parti spezzate in testa): basta tenere in memoria
+    i pochi flowable davanti al cursore. LOOKAHEAD copre keepWithNext dei
+    titoli di sezione.
+    """
+
+    LOOKAHEAD = 4
+
+    def __init__(self, source):
+        super().__init__()
+        self._source = iter(source)
+
+    def _fill(self, count):
+        while self._source is not None and list.__len__(self) < count:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __len__(self):
+        self._fill(self.LOOKAHEAD)
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        if isinstance(index, int) and index >= 0:
+            self._fill(index + 1)
+        return list.__getitem__(self, index)
+
+
+class _ChunkTable(Table):
+    """Blocco di righe transazione che, disegnato, somma i propri importi ai totali di pagina"""
+
+    def __init__(self, *args, amounts=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self._amounts = list(amounts)
+
+    def split(self, availWidth, availHeight):
+        # Di norma un blocco riempie esattamente una pagina; se viene comunque
+        # spezzato, ogni parte (con l'intestazione ripetuta) tiene i suoi importi
+        parts = super().split(availWidth, availHeight)
+        start = 0
+        for part in parts:
+            count = len(part._cellvalues) - 1
+            part._amounts = self._amounts[start:start + count]
+            start += count
+        return parts
+
+    def draw(self):
+        super().draw()
+        totals = self.canv._doctemplate.page_totals
+        for is_income, amount in self._amounts:
+            totals['entrate' if is_income else 'uscite'] += amount
+
+
+class _FormSlot(Flowable):
+    """Spazio riservato in cui viene disegnato un form PDF definito a fine documento"""
+
+    def __init__(self, name, width, height):
+        super().__init__()
+        self.name = name
+        self.width = width
+        self.height = height
+        self.hAlign = 'CENTER'
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.doForm(self.name)
+
+
+class _SectionHeading(Paragraph):
+    """Titolo di una proprietà: diventa voce dell'indice e segnalibro del PDF"""
+
+    def __init__(self, text, style, section):
+        super().__init__(escape(text), style)
+        self.section = section
+
+
+class _Deferred(ActionFlowable):
+    """Esegue una callback quando la story arriva a questo punto"""
+
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def apply(self, doc):
+        self.callback(doc)
+
+
+class _ReportDoc(BaseDocTemplate):
+    """Documento con totali per pagina, segnalibri e indice delle proprietà"""
+
+    def __init__(self, filename, report, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.report = report
+        self.page_totals = {'entrate': 0.0, 'uscite': 0.0}
+        self.sections = []
+        self.report_story = None
+
+        frame = Frame(self.leftMargin, self.bottomMargin, self.width, self.height,
+                      leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0, id='normal')
+        self.addPageTemplates([PageTemplate(id='Report', frames=[frame], onPageEnd=report.draw_footer)])
+
+    def afterFlowable(self, flowable):
+        if isinstance(flowable, _SectionHeading):
+            section = flowable.section
+            section['page'] = self.page
+            key = f"prop_{len(self.sections)}"
+            self.canv.bookmarkPage(key)
+            self.canv.addOutlineEntry(section['name'], key, level=0)
+            self.sections.append(section)
+
+
+class StreamingPdfReport:
+    """
+    Report PDF delle transazioni a memoria costante
+
+    Le righe arrivano da un generatore e vengono impaginate in blocchi che
+    riempiono esattamente una pagina (altezza di riga fissa, testo lungo
+    troncato), ciascuno una Table con la propria intestazione. Lo stile
+    comune dei blocchi è calcolato una sola volta; per riga resta solo il
+    colore dell'importo delle entrate, raggruppato in intervalli consecutivi.
+
+    Riepilogo in copertina e "Pagina N di M" dipendono da dati noti solo
+    alla fine: sono form PDF richiamati subito e definiti dopo l'ultima
+    pagina, così non serve una seconda passata né tenere le pagine in memoria.
+    Con più proprietà ogni proprietà apre una sezione con segnalibro e il
+    documento termina con l'indice per proprietà.
+    """
+
+    PAGE_SIZE = landscape(A4)
+    MARGINS = {'leftMargin': 1.5 * cm, 'rightMargin': 1.5 * cm, 'topMargin': 2 * cm, 'bottomMargin': 2 * cm}
+
+    COL_WIDTHS = [3 * cm, 3 * cm, 5 * cm, 6 * cm, 3.5 * cm]
+    HEADERS = ['Data', 'Tipo', 'Categoria', 'Fornitore', 'Importo']
+    HEADER_HEIGHT = 20
+    ROW_HEIGHT = 15
+    FONT_SIZE = 9
+
+    def __init__(self, filepath, property_name=None, start_date=None, end_date=None, property_names=None):
+        """
+        property_names: {property_id: nome}. Se indicato il report è diviso in
+        sezioni per proprietà (le righe devono arrivare raggruppate per
+        property_id) con indice finale.
+        """
+        self.filepath = filepath
+        self.property_name = property_name
+        self.start_date = start_date
+        self.end_date = end_date
+        self.property_names = property_names
+
+        self.totals = {'entrate': 0.0, 'uscite': 0.0}
+        self.rows = 0
+
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle(
+            'CustomTitle', parent=styles['Heading1'], fontSize=18,
+            textColor=colors.HexColor('#1e7be7'), spaceAfter=20, alignment=TA_CENTER
+        )
+        self.info_style = ParagraphStyle(
+            'Info', parent=styles['Normal'], fontSize=10,
+            textColor=colors.HexColor('#666666'), alignment=TA_CENTER
+        )
+        self.section_style = ParagraphStyle(
+            'Section', parent=styles['Heading2'], textColor=colors.HexColor('#2c3e50'),
+            spaceBefore=0, spaceAfter=8, keepWithNext=1
+        )
+
+        # Stile comune a tutti i blocchi, calcolato una volta sola
+        self.chunk_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (4, 0), (4, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), self.FONT_SIZE),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+            ('TEXTCOLOR', (4, 1), (4, -1), COLORE_USCITA),
+        ])
+
+        # Caratteri massimi per colonna a FONT_SIZE (Helvetica ~0.55 em di media)
+        self.max_chars = [int((width - 12) / (self.FONT_SIZE * 0.55)) for width in self.COL_WIDTHS]
+
+        self.doc = _ReportDoc(self.filepath, self, pagesize=self.PAGE_SIZE, pageCompression=1, **self.MARGINS)
+
+    # ------------------------------------------------------------------
+    # Impaginazione
+    # ------------------------------------------------------------------
+
+    def _rows_fitting(self, height):
+        return max(1, math.floor((height - self.HEADER_HEIGHT) / self.ROW_HEIGHT))
+
+    def _clip(self, value, column):
+        text = '' if value is None else str(value)
+        limit = self.max_chars[column]
+        return text if len(text) <= limit else text[:limit - 1] + '…'
+
+    def _chunk(self, data, amounts):
+        """Table di un blocco: stile comune + intervalli di righe in entrata"""
+        table = _ChunkTable(
+            [self.HEADERS] + data,
+            colWidths=self.COL_WIDTHS,
+            rowHeights=[self.HEADER_HEIGHT] + [self.ROW_HEIGHT] * len(data),
+            repeatRows=1,
+            style=self.chunk_style,
+            amounts=amounts
+        )
+
+        runs = []
+        start = None
+        for i, (is_income, _) in enumerate(amounts, start=1):
+            if is_income and start is None:
+                start = i
+            elif not is_income and start is not None:
+                runs.append(('TEXTCOLOR', (4, start), (4, i - 1), COLORE_ENTRATA))
+                start = None
+        if start is not None:
+            runs.append(('TEXTCOLOR', (4, start), (4, len(amounts)), COLORE_ENTRATA))
+        if runs:
+            table.setStyle(runs)
+        return table
+
+    def _summary_table(self):
+        entrate, uscite = self.totals['entrate'], self.totals['uscite']
+        saldo = entrate - uscite
+        table = Table([
+            ['Totale Entrate', 'Totale Uscite', 'Saldo Netto'],
+            [f'€ {entrate:,.2f}', f'€ {uscite:,.2f}', f'€ {saldo:,.2f}']
+        ], colWidths=[6 * cm, 6 * cm, 6 * cm])
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (0, 1), colors.HexColor('#d4edda')),
+            ('BACKGROUND', (1, 1), (1, 1), colors.HexColor('#f8d7da')),
+            ('BACKGROUND', (2, 1), (2, 1), colors.HexColor('#d1ecf1') if saldo >= 0 else colors.HexColor('#f8d7da')),
+            ('TEXTCOLOR', (0, 1), (-1, 1), colors.HexColor('#333333')),
+            ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 1), (-1, 1), 14),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+            ('TOPPADDING', (0, 1), (-1, 1), 10),
+            ('BOTTOMPADDING', (0, 1), (-1, 1), 10),
+        ]))
+        return table
+
+    def _cover(self):
+        yield Paragraph("📊 Report Transazioni", self.title_style)
+
+        info_text = f"Generato il: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+        if self.property_name:
+            info_text += f" | Proprietà: {escape(self.property_name)}"
+        if self.start_date and self.end_date:
+            info_text += f" | Periodo: {self.start_date} - {self.end_date}"
+        yield Paragraph(info_text, self.info_style)
+        yield Spacer(1, 0.5 * cm)
+
+        # Le dimensioni non dipendono dai valori: misurate su una tabella vuota
+        width, height = self._summary_table().wrap(self.doc.width, self.doc.height)
+        yield _FormSlot('riepilogo', width, height)
+
+    def _sections(self, transactions):
+        """Righe raggruppate per proprietà (una sola sezione senza property_names)"""
+        if self.property_names is None:
+            yield None, transactions
+        else:
+            yield from itertools.groupby(transactions, key=lambda t: t['property_id'])
+
+    def _body(self, transactions):
+        # Le interruzioni di pagina precedono sezioni e blocchi: un'interruzione
+        # finale aprirebbe una pagina vuota prima della definizione dei form
+        for property_id, rows in self._sections(transactions):
+            yield PageBreak()
+            available = self.doc.height
+            if property_id is not None:
+                section = {
+                    'name': self.property_names.get(property_id) or f"Proprietà {property_id}",
+                    'rows': 0, 'entrate': 0.0, 'uscite': 0.0
+                }
+                heading = _SectionHeading(section['name'], self.section_style, section)
+                available -= heading.wrap(self.doc.width, self.doc.height)[1] + self.section_style.spaceAfter
+                yield heading
+            else:
+                section = None
+
+            capacity = self._rows_fitting(available)
+            data, amounts = [], []
+            first = True
+            for trans in rows:
+                is_income = trans['type'] == 'Entrata'
+                amount = trans['amount'] or 0.0
+                key = 'entrate' if is_income else 'uscite' if trans['type'] == 'Uscita' else None
+                if key:
+                    self.totals[key] += amount
+                    if section:
+                        section[key] += amount
+                if section:
+                    section['rows'] += 1
+                self.rows += 1
+
+                data.append([
+                    trans['date'],
+                    trans['type'],
+                    self._clip(trans.get('service', 'N/A'), 2),
+                    self._clip(trans.get('provider', 'N/A'), 3),
+                    f"€ {amount:,.2f}"
+                ])
+                amounts.append((is_income, amount))
+
+                if len(data) == capacity:
+                    if not first:
+                        yield PageBreak()
+                    yield self._chunk(data, amounts)
+                    data, amounts = [], []
+                    first = False
+                    capacity = self._rows_fitting(self.doc.height)
+
+            if data:
+                if not first:
+                    yield PageBreak()
+                yield self._chunk(data, amounts)
+
+    def _index(self, doc):
+        """Indice per proprietà: aggiunto in testa alla story quando il corpo è impaginato"""
+        if not doc.sections:
+            return
+
+        data = [['Proprietà', 'Transazioni', 'Entrate', 'Uscite', 'Saldo', 'Pagina']]
+        for section in doc.sections:
+            data.append([
+                self._clip(section['name'], 3),
+                section['rows'],
+                f"€ {section['entrate']:,.2f}",
+                f"€ {section['uscite']:,.2f}",
+                f"€ {section['entrate'] - section['uscite']:,.2f}",
+                section['page']
+            ])
+
+        table = Table(data, colWidths=[7 * cm, 3 * cm, 3.5 * cm, 3.5 * cm, 3.5 * cm, 2 * cm], repeatRows=1)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+        ]))
+        doc.report_story[0:0] = [
+            PageBreak(),
+            Paragraph("Indice per proprietà", self.section_style),
+            table
+        ]
+
+    def _define_forms(self, doc):
+        """Definisce i form richiamati in copertina e nei piè di pagina"""
+        canv = doc.canv
+
+        summary = self._summary_table()
+        width, height = summary.wrap(doc.width, doc.height)
+        canv.beginForm('riepilogo', 0, 0, width, height)
+        summary.drawOn(canv, 0, 0)
+        canv.endForm()
+
+        canv.beginForm('pagine_totali', 0, -2, 40, 10)
+        canv.setFont('Helvetica', 8)
+        canv.setFillColor(colors.HexColor('#666666'))
+        canv.drawString(0, 0, str(doc.page))
+        canv.endForm()
+
+    def _story(self, transactions):
+        yield from self._cover()
+        yield from self._body(transactions)
+        yield _Deferred(self._index)
+        # Ultimo elemento: a questo punto il numero di pagine è definitivo
+        yield _Deferred(self._define_forms)
+
+    def draw_footer(self, canv, doc):
+        """Piè di pagina: totali delle righe della pagina e numerazione"""
+        canv.saveState()
+        canv.setFont('Helvetica', 8)
+        canv.setFillColor(colors.HexColor('#666666'))
+        y = doc.bottomMargin - 0.9 * cm
+
+        totals = doc.page_totals
+        if totals['entrate'] or totals['uscite']:
+            canv.drawString(
+                doc.leftMargin, y,
+                f"Totali pagina - Entrate: € {totals['entrate']:,.2f} | Uscite: € {totals['uscite']:,.2f}"
+            )
+
+        label = f"Pagina {doc.page} di "
+        x = doc.leftMargin + doc.width - 1.2 * cm - canv.stringWidth(label, 'Helvetica', 8)
+        canv.drawString(x, y, label)
+        canv.translate(x + canv.stringWidth(label, 'Helvetica', 8), y)
+        canv.doForm('pagine_totali')
+        canv.restoreState()
+
+        totals['entrate'] = 0.0
+        totals['uscite'] = 0.0
+
+    def build(self, transactions):
+        """Impagina le transazioni (iterabile consumato una volta) e ritorna statistiche"""
+        story = _LazyStory(self._story(transactions))
+        self.doc.report_story = story
+        self.doc.build(story)
+        return {'rows': self.rows, 'pages': self.doc.page, **self.totals}
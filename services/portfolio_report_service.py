@@ -0,0 +1,249 @@
+import csv
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from database.models import Property
+from database.connection import DatabaseConnection
+from services.export_service import ExportService
+from services.export_worker import render_property_report, PORTFOLIO_ROW_FIELDS
+from services.transaction_service import TransactionService
+from validation_utils import sanitize_filename, ValidationError
+
+
+class PortfolioReportService:
+    """
+    Rendiconti di fine periodo per tutto il portafoglio in un unico zip
+
+    Le transazioni arrivano da una query per blocco di proprietà, ordinata
+    per proprietà e raggruppata: ogni gruppo diventa un job (PDF e/o Excel)
+    per un pool di processi. Il processo principale legge, spedisce le righe
+    e copia nello zip i file finiti (senza ricomprimerli: PDF e XLSX sono
+    già compressi), quindi il lavoro pesante, l'impaginazione, scala con il
+    numero di core.
+
+    Le proprietà in volo sono al massimo IN_FLIGHT_PER_WORKER per processo,
+    più un blocco letto in anticipo della stessa dimensione: la memoria
+    dipende dal numero di core, non dalla dimensione del portafoglio.
+    """
+
+    # Un core resta alla GUI e al processo che scrive lo zip
+    MAX_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+    # Proprietà in lavorazione o in attesa per ogni processo
+    IN_FLIGHT_PER_WORKER = 2
+
+    # Righe lette per volta dalla query di un blocco di proprietà
+    FETCH_BATCH = 5000
+
+    FORMATS = ('pdf', 'xlsx')
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+        self.export_service = ExportService()
+        self.transaction_service = TransactionService(logger)
+
+    def select_properties(self, property_ids=None, owners=None):
+        """
+        Proprietà del batch: quelle indicate più tutte quelle dei proprietari
+        indicati; tutte se non c'è alcun filtro. Ordinate per ID.
+        """
+        session = self.db.get_session()
+        try:
+            query = session.query(Property)
+            if property_ids or owners:
+                conditions = []
+                if property_ids:
+                    conditions.append(Property.id.in_(list(property_ids)))
+                if owners:
+                    conditions.append(Property.owner.in_(list(owners)))
+                query = query.filter(conditions[0] if len(conditions) == 1 else conditions[0] | conditions[1])
+            return [prop.to_dict() for prop in query.order_by(Property.id).all()]
+        except Exception as e:
+            self.logger.error(f"PortfolioReportService: Errore selezione proprietà: {e}")
+            return []
+        finally:
+            self.db.close_session(session)
+
+    def owners(self):
+        """Proprietari distinti, in ordine alfabetico"""
+        session = self.db.get_session()
+        try:
+            return [owner for (owner,) in session.query(Property.owner).distinct().order_by(Property.owner).all()]
+        except Exception as e:
+            self.logger.error(f"PortfolioReportService: Errore lettura proprietari: {e}")
+            return []
+        finally:
+            self.db.close_session(session)
+
+    # ------------------------------------------------------------------
+    # Lettura raggruppata
+    # ------------------------------------------------------------------
+
+    def _property_rows(self, property_ids, start_date, end_date):
+        """
+        (property_id, righe) per ogni proprietà selezionata, in ordine di ID,
+        anche senza transazioni nel periodo (rendiconto vuoto). Una query per
+        blocco di proprietà, letta per intero: la sessione è già chiusa mentre
+        il batch attende i processi (la manutenzione pianificata parte solo
+        con il database inattivo).
+        """
+        block = self.MAX_WORKERS * self.IN_FLIGHT_PER_WORKER
+        for start in range(0, len(property_ids), block):
+            ids = property_ids[start:start + block]
+            grouped = {property_id: [] for property_id in ids}
+            for row in self.transaction_service.iter_all(
+                start_date=start_date,
+                end_date=end_date,
+                batch_size=self.FETCH_BATCH,
+                order_by_property=True,
+                property_ids=ids
+            ):
+                grouped[row['property_id']].append(tuple(row[field] for field in PORTFOLIO_ROW_FIELDS))
+            for property_id in ids:
+                yield property_id, grouped[property_id]
+
+    # ------------------------------------------------------------------
+    # Batch
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _safe_name(name, fallback):
+        # sanitize_filename tiene solo l'ultimo componente di un percorso: "Via Roma 1/A" -> "A"
+        name = (name or "").replace("/", "-").replace("\\", "-")
+        try:
+            return sanitize_filename(name, max_length=80) or fallback
+        except ValidationError:
+            return fallback
+
+    def _arcname(self, prop, extension):
+        owner = self._safe_name(prop['owner'], "Senza proprietario")
+        name = self._safe_name(prop['name'], f"proprieta_{prop['id']}")
+        return f"{owner}/{name}_{prop['id']}.{extension}"
+
+    def run(self, properties, start_date, end_date, period_label=None, formats=FORMATS,
+            progress=None, cancel_event=None):
+        """
+        Genera i rendiconti delle proprietà e li raccoglie in exports/portafoglio_*.zip
+
+        Args:
+            properties: dict di proprietà (da select_properties)
+            start_date, end_date: filtro yyyy-MM-dd
+            period_label: (inizio, fine) da mostrare nei report
+            formats: sottoinsieme di ('pdf', 'xlsx')
+            progress: callback(proprietà completate, proprietà totali)
+            cancel_event: threading.Event per interrompere il batch
+
+        Returns:
+            dict: {zip_path, properties, rows, files, errors: [(nome, errore)],
+            duration, cancelled}
+        """
+        started = time.perf_counter()
+        result = {
+            'zip_path': None, 'properties': 0, 'rows': 0, 'files': 0,
+            'errors': [], 'duration': 0.0, 'cancelled': False
+        }
+        if not properties:
+            return result
+
+        by_id = {prop['id']: prop for prop in properties}
+        property_ids = sorted(by_id)
+        total = len(property_ids)
+
+        zip_path = self.export_service.export_path("zip", prefix="portafoglio")
+        staging = tempfile.mkdtemp(prefix=".portafoglio_", dir=self.export_service.exports_dir)
+        partial_zip = os.path.join(staging, "portafoglio.zip.part")
+        summary = []
+        limit = self.MAX_WORKERS * self.IN_FLIGHT_PER_WORKER
+
+        def collect(pending, archive):
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                prop = futures.pop(future)
+                try:
+                    report = future.result()
+                except Exception as e:
+                    self.logger.error(f"PortfolioReportService: Errore report proprietà {prop['id']}: {e}")
+                    result['errors'].append((prop['name'], str(e)))
+                else:
+                    for extension, path in report['paths'].items():
+                        archive.write(path, self._arcname(prop, extension))
+                        os.remove(path)
+                        result['files'] += 1
+                    result['rows'] += report['rows']
+                    summary.append((prop, report))
+                result['properties'] += 1
+                if progress:
+                    progress(result['properties'], total)
+            return pending
+
+        futures = {}
+        pool = ProcessPoolExecutor(max_workers=self.MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            with zipfile.ZipFile(partial_zip, 'w', zipfile.ZIP_STORED) as archive:
+                pending = set()
+                for property_id, rows in self._property_rows(property_ids, start_date, end_date):
+                    if cancel_event is not None and cancel_event.is_set():
+                        result['cancelled'] = True
+                        break
+                    while len(pending) >= limit:
+                        pending = collect(pending, archive)
+
+                    prop = by_id[property_id]
+                    job = {
+                        'property_id': property_id,
+                        'property_name': prop['name'],
+                        'owner': prop['owner'],
+                        'period_label': period_label or (None, None),
+                        'formats': formats,
+                        'paths': {
+                            extension: os.path.join(staging, f"{property_id}.{extension}")
+                            for extension in formats
+                        }
+                    }
+                    future = pool.submit(render_property_report, job, rows)
+                    futures[future] = prop
+                    pending.add(future)
+
+                while pending and not result['cancelled']:
+                    pending = collect(pending, archive)
+                    result['cancelled'] = cancel_event is not None and cancel_event.is_set()
+
+                if not result['cancelled']:
+                    archive.writestr("riepilogo.csv", self._summary_csv(summary))
+
+            if not result['cancelled']:
+                os.replace(partial_zip, zip_path)
+                result['zip_path'] = zip_path
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            shutil.rmtree(staging, ignore_errors=True)
+
+        result['duration'] = time.perf_counter() - started
+        self.logger.info(
+            f"PortfolioReportService: {result['properties']}/{total} proprietà, {result['rows']} righe, "
+            f"{len(result['errors'])} errori in {result['duration']:.1f}s"
+            + (" (annullato)" if result['cancelled'] else f" -> {zip_path}")
+        )
+        return result
+
+    @staticmethod
+    def _summary_csv(summary):
+        """Riepilogo del batch (una riga per proprietà) incluso nello zip"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';')
+        writer.writerow(['ID', 'Proprietà', 'Proprietario', 'Transazioni', 'Entrate', 'Uscite', 'Saldo'])
+        for prop, report in sorted(summary, key=lambda item: (item[0]['owner'] or '', item[0]['name'] or '')):
+            writer.writerow([
+                prop['id'], prop['name'], prop['owner'], report['rows'],
+                f"{report['entrate']:.2f}", f"{report['uscite']:.2f}",
+                f"{report['entrate'] - report['uscite']:.2f}"
+            ])
+        # BOM: Excel riconosce l'UTF-8
+        return '\ufeff' + buffer.getvalue()
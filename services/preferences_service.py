@@ -24,7 +24,11 @@ class PreferencesService:
     def get_default_preferences(self):
         """Ritorna le preferenze di default"""
         return {
-            "language": "it"  # Default: Italiano
+            "language": "it",  # Default: Italiano
+            "reminder_lead_days": 3,  # Anticipo promemoria scadenze
+            "thumbnail_cache_mb": 64,  # Budget cache miniature documenti
+            "archive_after_years": 2,  # Trimestri più vecchi archiviati in pacchetti
+            "backup_interval_hours": 24  # Backup automatico del database (0 = disattivato)
         }
 
     def save_preferences(self):
@@ -46,4 +50,27 @@ class PreferencesService:
         if lang_code in ["it", "es", "en"]:
             self.preferences["language"] = lang_code
             return self.save_preferences()
-        return False
\ No newline at end of file
+        return False
+
+    def get_reminder_lead_days(self):
+        """Giorni di anticipo dei promemoria delle scadenze"""
+        return self.preferences.get("reminder_lead_days", 3)
+
+    def set_reminder_lead_days(self, days):
+        """Imposta i giorni di anticipo dei promemoria"""
+        if isinstance(days, int) and days >= 0:
+            self.preferences["reminder_lead_days"] = days
+            return self.save_preferences()
+        return False
+
+    def get_thumbnail_cache_bytes(self):
+        """Budget in byte della cache su disco delle miniature"""
+        return int(self.preferences.get("thumbnail_cache_mb", 64)) * 1024 * 1024
+
+    def get_archive_after_years(self):
+        """Anni dopo i quali un trimestre chiuso viene archiviato"""
+        return int(self.preferences.get("archive_after_years", 2))
+
+    def get_backup_interval_hours(self):
+        """Ore tra un backup automatico e il successivo (0 = disattivato)"""
+        return int(self.preferences.get("backup_interval_hours", 24))
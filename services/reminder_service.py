@@ -0,0 +1,263 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime, date, time, timedelta
+
+from services.deadline_service import DeadlineService, add_deadline_listener, remove_deadline_listener
+
+
+class ReminderScheduler:
+    """
+    Scheduler in-process dei promemoria delle scadenze
+
+    Le notifiche da inviare sono tenute in un min-heap ordinato per orario
+    di invio; il thread di lavoro dorme fino al primo elemento. Le modifiche
+    alle scadenze arrivano come eventi da DeadlineService: le voci superate
+    non vengono rimosse dal heap ma invalidate (token per chiave) e scartate
+    quando emergono in cima.
+
+    Tipi di notifica passati a notify(deadline, kind, days):
+        'reminder' - days giorni all'inizio della scadenza
+        'due'      - scadenza oggi
+        'overdue'  - scadenza superata da days giorni (ripetuta ogni giorno)
+    """
+
+    # Ora del giorno a cui vengono inviate le notifiche
+    NOTIFY_HOUR = 9
+
+    # Giorni di anticipo di default per il promemoria
+    DEFAULT_LEAD_DAYS = 3
+
+    # Scadenze non completate più vecchie di così non vengono più segnalate
+    OVERDUE_LOOKBACK_DAYS = 30
+
+    # Ampiezza della finestra caricata in memoria (ricaricata prima della fine)
+    HORIZON_DAYS = 60
+
+    def __init__(self, logger, notify, lead_days=None, clock=datetime.now):
+        """
+        Args:
+            logger: Logger applicativo
+            notify: Callback(deadline_dict, kind, days), chiamata dal thread di lavoro
+            lead_days: Giorni di anticipo del promemoria
+            clock: Funzione che ritorna l'ora corrente (sostituibile nei test)
+        """
+        self.logger = logger
+        self.notify = notify
+        self.lead_days = self.DEFAULT_LEAD_DAYS if lead_days is None else max(0, lead_days)
+        self.clock = clock
+        self.deadline_service = DeadlineService(logger)
+
+        self._heap = []                  # (fire_at, token, key, kind)
+        self._tokens = {}                # key -> token valido
+        self._entries = {}               # key -> dizionario scadenza
+        self._by_deadline = {}           # deadline_id -> set di key
+        self._seq = itertools.count()
+        self._window = (None, None)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    # ------------------------------------------------------------------
+    # Ciclo di vita
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Carica la finestra iniziale e avvia il thread di lavoro"""
+        if self._running:
+            return
+
+        self._reload()
+        add_deadline_listener(self.on_deadline_event)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="ReminderScheduler", daemon=True)
+        self._thread.start()
+        self.logger.info(f"ReminderScheduler: Avviato ({self.pending()} scadenze pianificate)")
+
+    def stop(self):
+        """Ferma il thread di lavoro"""
+        remove_deadline_listener(self.on_deadline_event)
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def pending(self):
+        """Numero di scadenze attualmente pianificate"""
+        with self._cond:
+            return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # Eventi da DeadlineService
+    # ------------------------------------------------------------------
+
+    def on_deadline_event(self, event, deadline_id, occurrence_date=None):
+        """Aggiorna il heap in modo incrementale dopo una modifica"""
+        with self._cond:
+            if event == 'completed' and occurrence_date:
+                self._cancel((deadline_id, occurrence_date))
+            else:
+                for key in list(self._by_deadline.get(deadline_id, ())):
+                    self._cancel(key)
+
+            window_start, window_end = self._window
+
+        if event == 'saved' and window_start:
+            occurrences = self.deadline_service.get_range(
+                window_start.isoformat(), window_end.isoformat(),
+                include_completed=False, deadline_id=deadline_id
+            )
+            with self._cond:
+                for deadline in occurrences:
+                    self._schedule(deadline)
+
+        with self._cond:
+            self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Gestione heap
+    # ------------------------------------------------------------------
+
+    def _reload(self):
+        """Ricarica la finestra [oggi - lookback, oggi + orizzonte] dal DB"""
+        today = self.clock().date()
+        window_start = today - timedelta(days=self.OVERDUE_LOOKBACK_DAYS)
+        window_end = today + timedelta(days=self.HORIZON_DAYS)
+
+        occurrences = self.deadline_service.get_range(
+            window_start.isoformat(), window_end.isoformat(), include_completed=False
+        )
+
+        with self._cond:
+            self._heap = []
+            self._tokens = {}
+            self._entries = {}
+            self._by_deadline = {}
+            self._window = (window_start, window_end)
+
+            for deadline in occurrences:
+                self._schedule(deadline)
+
+            # Ricarica prima che le scadenze oltre la finestra entrino nel preavviso
+            refresh_day = max(today + timedelta(days=1),
+                              window_end - timedelta(days=self.lead_days + 1))
+            self._push(self._at(refresh_day, 0), ('refresh',), 'refresh')
+
+            self._cond.notify()
+
+    def _at(self, day, hour=None):
+        return datetime.combine(day, time(self.NOTIFY_HOUR if hour is None else hour))
+
+    def _push(self, fire_at, key, kind):
+        token = next(self._seq)
+        self._tokens[key] = token
+        heapq.heappush(self._heap, (fire_at, token, key, kind))
+
+    def _schedule(self, deadline):
+        """Pianifica la prossima notifica di una scadenza (o occorrenza)"""
+        if deadline.get('completed') or not deadline.get('due_date'):
+            return
+
+        key = (deadline['id'], deadline['due_date'])
+        due = date.fromisoformat(deadline['due_date'])
+        due_at = self._at(due)
+        now = self.clock()
+
+        self._entries[key] = deadline
+        self._by_deadline.setdefault(deadline['id'], set()).add(key)
+
+        remind_at = due_at - timedelta(days=self.lead_days)
+        if self.lead_days and now < remind_at:
+            self._push(remind_at, key, 'reminder')
+        elif self.lead_days and now.date() < due:
+            # Già dentro il preavviso: promemoria subito (senza preavviso solo la notifica di scadenza)
+            self._push(now, key, 'reminder')
+        elif now < due_at:
+            self._push(due_at, key, 'due')
+        elif now.date() == due:
+            self._push(now, key, 'due')
+        else:
+            self._push(now, key, 'overdue')
+
+    def _cancel(self, key):
+        """Invalida una chiave: la voce nel heap verrà scartata in lettura"""
+        self._tokens.pop(key, None)
+        deadline = self._entries.pop(key, None)
+        if deadline:
+            keys = self._by_deadline.get(deadline['id'])
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_deadline[deadline['id']]
+
+    def _next_step(self, key, kind, fire_at):
+        """Prossima notifica dopo quella appena inviata"""
+        deadline = self._entries[key]
+        due = date.fromisoformat(deadline['due_date'])
+
+        if kind == 'reminder':
+            self._push(max(fire_at, self._at(due)), key, 'due')
+        else:
+            next_day = max(fire_at.date(), due) + timedelta(days=1)
+            self._push(self._at(next_day), key, 'overdue')
+
+    # ------------------------------------------------------------------
+    # Thread di lavoro
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                fired = None
+                while self._running and fired is None:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+
+                    fire_at, token, key, kind = self._heap[0]
+                    if self._tokens.get(key) != token:
+                        heapq.heappop(self._heap)  # voce superata
+                        continue
+
+                    delay = (fire_at - self.clock()).total_seconds()
+                    if delay > 0:
+                        self._cond.wait(timeout=delay)
+                        continue
+
+                    heapq.heappop(self._heap)
+                    if kind == 'refresh':
+                        fired = (kind, None, 0)
+                        break
+
+                    deadline = self._entries[key]
+                    days = (date.fromisoformat(deadline['due_date']) - self.clock().date()).days
+                    fired = (kind, deadline, abs(days))
+                    self._next_step(key, kind, fire_at)
+
+                if not self._running:
+                    return
+
+            kind, deadline, days = fired
+            if kind == 'refresh':
+                self._reload()
+                continue
+
+            try:
+                self.notify(deadline, kind, days)
+            except Exception as e:
+                self.logger.error(f"ReminderScheduler: Errore invio notifica: {e}")
+
+
+# Istanza globale dello scheduler
+_reminder_scheduler = None
+
+
+def get_reminder_scheduler(logger=None, notify=None, lead_days=None):
+    """Ottiene l'istanza globale del ReminderScheduler (creata al primo uso)"""
+    global _reminder_scheduler
+    if _reminder_scheduler is None:
+        _reminder_scheduler = ReminderScheduler(logger, notify, lead_days)
+    return _reminder_scheduler
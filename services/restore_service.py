@@ -0,0 +1,370 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from database.connection import DatabaseConnection
+from database.models import Base
+from services.archive_service import get_document_archiver
+from services.autocomplete_service import get_autocomplete_index
+from services.backup_service import get_backup_service, BackupError
+from services.categorizer_service import get_categorizer
+from services.change_log_service import get_change_log
+from services.data_export_service import DataExportService
+from services.document_service import DocumentService, get_docs_dir, remove_tree
+from services.export_job_service import get_export_jobs
+from services.orphan_gc_service import get_orphan_gc
+from services.text_index_service import get_text_index
+
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class RestoreService:
+    """
+    Ripristino a caldo del database (e facoltativamente dei documenti)
+
+    Il backup viene ricostruito in un file accanto al database e validato
+    (integrity_check e compatibilità dello schema con i modelli) prima di
+    toccare qualsiasi cosa; lo stato attuale viene salvato con un backup
+    'pre-ripristino'. Poi l'accesso al database viene sospeso (le nuove
+    sessioni attendono, quelle in corso terminano), il pool viene chiuso e
+    il file sostituito con un rename atomico; l'engine viene ricreato e le
+    cache in memoria e su disco ricostruite, senza riavviare l'app.
+    """
+
+    # Tabelle senza le quali il backup non è un database dell'app
+    REQUIRED_TABLES = ('properties', 'transactions')
+
+    # Tabelle di cui mostrare il numero di righe nel riepilogo
+    SUMMARY_TABLES = ('properties', 'transactions', 'documents', 'deadlines', 'suppliers')
+
+    # Attesa massima delle operazioni in corso prima della sostituzione
+    QUIESCE_TIMEOUT = 15
+
+    # Cartelle di docs/ con contenuto indirizzato per hash: valide anche dopo il ripristino
+    DOCS_KEEP = ('.blobs', '.thumbs')
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+        self.backup_service = get_backup_service(logger)
+
+    # ------------------------------------------------------------------
+    # Preparazione e validazione
+    # ------------------------------------------------------------------
+
+    def prepare(self, backup_id=None, path=None):
+        """
+        Ricostruisce il database da ripristinare in un file temporaneo accanto
+        a quello in uso (stesso filesystem: la sostituzione è un rename)
+
+        Args:
+            backup_id: Backup dell'archivio
+            path: In alternativa, file .db o .db.gz (copia esportata o vecchio backup)
+
+        Returns:
+            Percorso del file temporaneo
+        """
+        db_path = self.db.database_path()
+        if db_path is None:
+            raise BackupError("Ripristino disponibile solo per il database SQLite locale")
+
+        fd, candidate = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(db_path)),
+                                         prefix=".restore-", suffix=".db")
+        os.close(fd)
+        try:
+            if backup_id:
+                self.backup_service.materialize(backup_id, candidate)
+            else:
+                with open(path, 'rb') as f:
+                    compressed = f.read(2) == GZIP_MAGIC
+                opener = gzip.open if compressed else open
+                with opener(path, 'rb') as src, open(candidate, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            return candidate
+        except BaseException:
+            os.remove(candidate)
+            raise
+
+    def validate(self, candidate):
+        """
+        Controlla che il file sia un database dell'app integro e leggibile da questa versione
+
+        Returns:
+            dict: {'valid', 'errors': [...], 'warnings': [...], 'counts': {tabella: righe}}
+        """
+        report = {'valid': False, 'errors': [], 'warnings': [], 'counts': {}}
+
+        with open(candidate, 'rb') as f:
+            if f.read(len(SQLITE_HEADER)) != SQLITE_HEADER:
+                report['errors'].append("Il file non è un database SQLite")
+                return report
+
+        connection = sqlite3.connect(f"{Path(candidate).resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            rows = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+            if rows != ['ok']:
+                report['errors'].append(f"Integrità: {'; '.join(rows[:5])}")
+                return report
+
+            tables = {
+                name: {column[1] for column in connection.execute(f'PRAGMA table_info("{name}")')}
+                for (name,) in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+                )
+            }
+
+            for name in self.REQUIRED_TABLES:
+                if name not in tables:
+                    report['errors'].append(f"Tabella {name} assente: non è un database dell'app")
+
+            # create_all crea le tabelle mancanti ma non aggiunge colonne a quelle esistenti
+            for table in Base.metadata.sorted_tables:
+                if table.name not in tables:
+                    report['warnings'].append(f"Tabella {table.name} assente (verrà creata vuota)")
+                    continue
+                missing = [column.name for column in table.columns if column.name not in tables[table.name]]
+                if missing:
+                    report['errors'].append(f"Schema non compatibile: in {table.name} mancano {', '.join(missing)}")
+                extra = [column for column in tables[table.name] if column not in table.columns]
+                if extra:
+                    report['warnings'].append(
+                        f"Colonne sconosciute in {table.name}: {', '.join(sorted(extra))} "
+                        f"(backup di una versione più recente?)"
+                    )
+
+            for name in self.SUMMARY_TABLES:
+                if name in tables:
+                    report['counts'][name] = connection.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+
+        except sqlite3.DatabaseError as e:
+            report['errors'].append(f"Database illeggibile: {e}")
+        finally:
+            connection.close()
+
+        report['valid'] = not report['errors']
+        return report
+
+    # ------------------------------------------------------------------
+    # Ripristino
+    # ------------------------------------------------------------------
+
+    def restore(self, backup_id=None, path=None, documents=False, progress=None):
+        """
+        Ripristina il database da un backup dell'archivio o da un file
+
+        Args:
+            backup_id / path: origine (vedi prepare)
+            documents: Se True ripristina anche docs/ (solo backup combinati dell'archivio)
+            progress: callback(fase, fatto, totale)
+
+        Returns:
+            dict: {'counts', 'warnings', 'safety_backup', 'documents', 'previous_docs', 'duration'}
+
+        Raises:
+            BackupError: backup non valido, database occupato o sostituzione non riuscita
+        """
+        started = time.perf_counter()
+        if documents and not backup_id:
+            raise BackupError("I documenti si ripristinano solo da un backup combinato dell'archivio")
+
+        db_path = os.path.abspath(self.db.database_path() or "")
+        if progress:
+            progress('preparazione', 0, 1)
+        candidate = self.prepare(backup_id=backup_id, path=path)
+        staging = None
+        try:
+            report = self.validate(candidate)
+            if not report['valid']:
+                raise BackupError("Backup non valido:\n" + "\n".join(report['errors']))
+
+            # Documenti estratti prima della sospensione: l'app resta utilizzabile
+            if documents:
+                docs_dir = os.path.abspath(str(get_docs_dir()))
+                staging = tempfile.mkdtemp(prefix=".docs_ripristino_", dir=os.path.dirname(docs_dir))
+                restored_files = self.backup_service.restore_documents(backup_id, staging, progress=progress)
+
+            # Stato attuale recuperabile dall'archivio
+            safety = self.backup_service.create_backup(reason="pre-ripristino", verify=False, progress=progress)
+
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            previous_docs = None
+            orphan_gc = get_orphan_gc(self.logger)
+            export_jobs = get_export_jobs(self.logger)
+            with self.backup_service.exclusive():
+                # I processi del pool di export, anche inattivi, tengono aperto il file del database
+                if not export_jobs.suspend():
+                    raise BackupError("Ci sono export in corso: attendi che terminino o annullali prima del ripristino")
+                orphan_gc.stop()
+                get_text_index(self.logger).cancel(self.QUIESCE_TIMEOUT)
+                try:
+                    with self.db.quiesce(self.QUIESCE_TIMEOUT):
+                        # Prima i documenti: se il rename non riesce il database non è ancora toccato
+                        if staging:
+                            previous_docs = self._swap_documents(staging, stamp)
+                            staging = None
+                        try:
+                            self._replace_database(candidate, db_path)
+                            candidate = None
+                        except BaseException:
+                            if previous_docs:
+                                self._revert_documents(previous_docs, stamp)
+                                previous_docs = None
+                            raise
+                except TimeoutError as e:
+                    orphan_gc.resume()
+                    raise BackupError(str(e))
+                except BaseException:
+                    orphan_gc.resume()
+                    raise
+                finally:
+                    export_jobs.resume()
+
+        finally:
+            if candidate and os.path.exists(candidate):
+                os.remove(candidate)
+            if staging:
+                remove_tree(staging)
+
+        # Da qui il ripristino è avvenuto: gli errori diventano avvisi, non eccezioni
+        warnings = list(report['warnings'])
+        try:
+            self._after_restore()
+        except Exception as e:
+            self.logger.error(f"RestoreService: Errore ricostruzione dopo il ripristino: {e}")
+            warnings.append(f"Ricostruzione di indici e cache incompleta ({e}): verrà completata al prossimo avvio")
+        finally:
+            orphan_gc.resume()
+
+        result = {
+            'counts': report['counts'],
+            'warnings': warnings,
+            'safety_backup': safety['id'],
+            'documents': restored_files if documents else None,
+            'previous_docs': previous_docs,
+            'duration': time.perf_counter() - started,
+        }
+        self.logger.info(
+            f"RestoreService: Ripristinato {backup_id or os.path.basename(path)} in {result['duration']:.1f}s "
+            f"(stato precedente in {safety['id']})"
+        )
+        return result
+
+    def _replace_database(self, candidate, db_path):
+        """
+        Sostituisce il file del database e riapre l'engine (nessuna sessione aperta)
+
+        Se il file ripristinato non si apre torna al precedente.
+
+        Raises:
+            BackupError: sostituzione non riuscita (il database in uso è quello precedente)
+        """
+        rollback = f"{db_path}.rollback"
+        try:
+            if os.path.exists(rollback):
+                os.remove(rollback)
+            try:
+                os.link(db_path, rollback)
+            except OSError:
+                shutil.copy2(db_path, rollback)
+
+            # Un journal o un WAL rimasti del vecchio file verrebbero applicati al nuovo
+            for suffix in ('-journal', '-wal', '-shm'):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            os.replace(candidate, db_path)
+        except OSError as e:
+            raise BackupError(f"Database non sostituibile: {e}")
+
+        try:
+            self.db.reinitialize(self.logger)
+        except Exception as e:
+            self.logger.error(f"RestoreService: Errore apertura database ripristinato: {e}")
+            os.replace(rollback, db_path)
+            self.db.reinitialize(self.logger)
+            raise BackupError(f"Database ripristinato non apribile: {e}")
+        finally:
+            if os.path.exists(rollback):
+                os.remove(rollback)
+
+    def _swap_documents(self, staging, stamp):
+        """
+        Mette l'albero ripristinato al posto di docs/; il precedente resta
+        accanto come docs.prima_del_ripristino_<data>
+
+        Returns:
+            Percorso dell'albero precedente
+
+        Raises:
+            BackupError: rename non riuscito (es. cartella aperta su Windows);
+                         docs/ è rimessa com'era
+        """
+        docs_dir = os.path.abspath(str(get_docs_dir()))
+        previous = f"{docs_dir}.prima_del_ripristino_{stamp}"
+        moved = []
+        try:
+            for name in self.DOCS_KEEP:
+                source = os.path.join(docs_dir, name)
+                if os.path.isdir(source):
+                    os.replace(source, os.path.join(staging, name))
+                    moved.append(name)
+            os.replace(docs_dir, previous)
+            try:
+                os.replace(staging, docs_dir)
+            except OSError:
+                os.replace(previous, docs_dir)
+                raise
+        except OSError as e:
+            for name in moved:
+                os.replace(os.path.join(staging, name), os.path.join(docs_dir, name))
+            raise BackupError(f"Cartella documenti non sostituibile: {e}")
+        return previous
+
+    def _revert_documents(self, previous, stamp):
+        """Rimette docs/ com'era prima di _swap_documents (database non sostituito)"""
+        docs_dir = os.path.abspath(str(get_docs_dir()))
+        discarded = f"{docs_dir}.scartata_{stamp}"
+        try:
+            os.replace(docs_dir, discarded)
+            for name in self.DOCS_KEEP:
+                source = os.path.join(discarded, name)
+                if os.path.isdir(source):
+                    os.replace(source, os.path.join(previous, name))
+            os.replace(previous, docs_dir)
+        except OSError as e:
+            self.logger.critical(
+                f"RestoreService: docs/ non ripristinata dopo l'errore ({e}): "
+                f"la cartella precedente è {previous}"
+            )
+            raise BackupError(
+                f"Database non modificato, ma la cartella documenti precedente è rimasta in {previous}: "
+                f"rinominarla in {docs_dir}"
+            )
+        remove_tree(discarded)
+
+    def _after_restore(self):
+        """Ricostruisce registri e cache legati al contenuto del database"""
+        get_change_log(self.logger).ensure_schema()
+        text_index = get_text_index(self.logger)
+        text_index.ensure_schema()
+
+        # Indice documenti sempre riallineato a docs/: anche ripristinando solo il
+        # database le righe possono riferirsi a file o pacchetti che non ci sono più
+        # (o ignorare quelli nuovi). Prima l'archivio, poi i file nell'albero
+        get_document_archiver(self.logger).reconcile()
+        DocumentService(self.logger).rebuild_index()
+
+        get_autocomplete_index().build(self.logger)
+        get_categorizer().train(self.logger)
+
+        # Frammenti CSV e documenti estratti fanno riferimento al database precedente
+        DataExportService(self.logger).clear_fragments()
+        get_document_archiver(self.logger).clear_cache()
+
+        text_index.schedule()
@@ -0,0 +1,695 @@
+import calendar
+import codecs
+import csv
+import hashlib
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from xml.etree import ElementTree
+
+from sqlalchemy import func, String
+
+from database.models import Transaction, ImportProfile
+from database.connection import DatabaseConnection
+from services.categorizer_service import get_categorizer
+from services.supplier_link_service import SupplierLinkService, normalize_name
+from services.transaction_service import TransactionService
+
+
+# Intestazioni CSV riconosciute automaticamente -> campo della mappatura
+CSV_HEADER_ALIASES = {
+    'data': 'date_column',
+    'data contabile': 'date_column',
+    'data operazione': 'date_column',
+    'data registrazione': 'date_column',
+    'date': 'date_column',
+    'booking date': 'date_column',
+    'importo': 'amount_column',
+    'importo (eur)': 'amount_column',
+    'importo eur': 'amount_column',
+    'amount': 'amount_column',
+    'dare': 'debit_column',
+    'addebiti': 'debit_column',
+    'uscite': 'debit_column',
+    'debit': 'debit_column',
+    'avere': 'credit_column',
+    'accrediti': 'credit_column',
+    'entrate': 'credit_column',
+    'credit': 'credit_column',
+    'controparte': 'counterparty_column',
+    'beneficiario': 'counterparty_column',
+    'ordinante': 'counterparty_column',
+    'beneficiario/ordinante': 'counterparty_column',
+    'counterparty': 'counterparty_column',
+    'payee': 'counterparty_column',
+    'descrizione': 'description_column',
+    'causale': 'description_column',
+    'descrizione operazione': 'description_column',
+    'description': 'description_column',
+    'memo': 'description_column'
+}
+
+DATE_FORMATS = ('dd/MM/yyyy', 'dd.MM.yyyy', 'dd-MM-yyyy', 'yyyy-MM-dd', 'dd/MM/yy', 'yyyyMMdd')
+
+# Campi di una riga grezza, in ordine: come li produce ogni lettore
+RAW_FIELDS = ('line', 'date', 'amount', 'debit', 'credit', 'counterparty', 'description')
+
+
+class StatementImportError(Exception):
+    """File di estratto conto non leggibile o mappatura delle colonne incompleta"""
+
+
+def date_parser(date_format):
+    """
+    Parser di una colonna data: valore -> (yyyy-MM-dd, None) oppure (None, errore)
+
+    Il formato (stile Qt, come nel resto dell'app) diventa una regex con
+    gruppi per giorno, mese e anno; la validità del giorno è controllata sul
+    calendario.
+    """
+    tokens = {'dd': r'(?P<d>\d{1,2})', 'MM': r'(?P<m>\d{1,2})', 'yyyy': r'(?P<y>\d{4})', 'yy': r'(?P<y>\d{2})'}
+    if date_format == 'yyyyMMdd':
+        pattern = re.compile(r'^(?P<y>\d{4})(?P<m>\d{2})(?P<d>\d{2})')
+    else:
+        regex = re.escape(date_format)
+        for token in ('yyyy', 'yy', 'dd', 'MM'):
+            regex = regex.replace(token, tokens[token], 1)
+        pattern = re.compile(f"^{regex}$")
+
+    def parse(value):
+        match = pattern.match(value.strip()) if value else None
+        if not match:
+            return None, f"Data non valida ({date_format} atteso)"
+        year, month, day = int(match['y']), int(match['m']), int(match['d'])
+        if year < 100:
+            year += 2000
+        if not (1900 <= year <= 2100 and 1 <= month <= 12 and 1 <= day <= calendar.monthrange(year, month)[1]):
+            return None, "Data inesistente"
+        return f"{year:04d}-{month:02d}-{day:02d}", None
+
+    return parse
+
+
+def amount_parser(decimal_separator):
+    """
+    Parser di una colonna importo: valore -> (float, None) oppure (None, errore)
+
+    Accetta separatore delle migliaia, simbolo €, spazi, segno iniziale o
+    finale e parentesi per i negativi ("1.234,50-", "(12,00)").
+    """
+    thousands = '.' if decimal_separator == ',' else ','
+    table = str.maketrans({thousands: None, ' ': None, '\xa0': None, '€': None, "'": None, decimal_separator: '.'})
+    pattern = re.compile(r'^[+-]?\d+(?:\.\d+)?$')
+
+    def parse(value):
+        text = (value or "").strip()
+        if not text:
+            return None, None
+        negative = False
+        if text.startswith('(') and text.endswith(')'):
+            negative, text = True, text[1:-1]
+        elif text.endswith('-'):
+            negative, text = True, text[:-1]
+        text = text.translate(table)
+        if len(text) > 20 or not pattern.match(text):
+            return None, "Importo non valido"
+        amount = float(text)
+        return (-amount if negative else amount), None
+
+    return parse
+
+
+def parse_column(values, parser, cache):
+    """
+    Applica un parser a un'intera colonna del blocco. Gli estratti conto
+    ripetono molto date e importi: ogni valore distinto è analizzato una
+    sola volta (cache condivisa tra i blocchi).
+    """
+    results = []
+    for value in values:
+        parsed = cache.get(value)
+        if parsed is None:
+            parsed = cache[value] = parser(value)
+        results.append(parsed)
+    return results
+
+
+class StatementImportService:
+    """
+    Import degli estratti conto bancari (CSV, OFX, CAMT.053)
+
+    Il file è letto in streaming a blocchi di BATCH_SIZE righe; ogni blocco è
+    trasposto in colonne e date e importi sono analizzati colonna per
+    colonna (una volta per valore distinto), raccogliendo gli errori riga
+    per riga. I movimenti già presenti vengono scartati confrontando
+    l'impronta (data, importo con segno, controparte normalizzata) con le
+    transazioni della proprietà nello stesso intervallo di date; i
+    fornitori sono collegati con lo stesso matching di SupplierLinkService
+    e tutto viene inserito con un solo INSERT in un'unica transazione.
+    """
+
+    BATCH_SIZE = 5000
+
+    FORMATS = ('csv', 'ofx', 'camt')
+
+    # Sotto questa confidenza il servizio resta la descrizione del movimento
+    CATEGORY_MIN_CONFIDENCE = 0.6
+
+    DEFAULT_SERVICE = "Movimento bancario"
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+        self.transaction_service = TransactionService(logger)
+        self.supplier_link = SupplierLinkService(logger)
+
+    # ------------------------------------------------------------------
+    # Profili di mappatura
+    # ------------------------------------------------------------------
+
+    def get_profiles(self):
+        session = self.db.get_session()
+        try:
+            return [p.to_dict() for p in session.query(ImportProfile).order_by(ImportProfile.name).all()]
+        except Exception as e:
+            self.logger.error(f"StatementImportService: Errore lettura profili: {e}")
+            return []
+        finally:
+            self.db.close_session(session)
+
+    def save_profile(self, profile):
+        """Crea o aggiorna (per nome) un profilo di mappatura; ritorna l'ID o None"""
+        session = self.db.get_session()
+        try:
+            existing = session.query(ImportProfile).filter(ImportProfile.name == profile['name']).first()
+            if existing is None:
+                existing = ImportProfile(name=profile['name'])
+                session.add(existing)
+            for field in ('delimiter', 'encoding', 'skip_rows', 'date_column', 'amount_column', 'debit_column',
+                          'credit_column', 'counterparty_column', 'description_column', 'date_format',
+                          'decimal_separator'):
+                if field in profile:
+                    setattr(existing, field, profile[field])
+            session.commit()
+            self.logger.info(f"StatementImportService: Profilo salvato: {profile['name']}")
+            return existing.id
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"StatementImportService: Errore salvataggio profilo: {e}")
+            return None
+        finally:
+            self.db.close_session(session)
+
+    def delete_profile(self, profile_id):
+        session = self.db.get_session()
+        try:
+            deleted = session.query(ImportProfile).filter(ImportProfile.id == profile_id).delete()
+            session.commit()
+            return deleted > 0
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"StatementImportService: Errore eliminazione profilo: {e}")
+            return False
+        finally:
+            self.db.close_session(session)
+
+    # ------------------------------------------------------------------
+    # Rilevamento formato e intestazioni
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def detect_format(path):
+        """'csv' | 'ofx' | 'camt' dall'estensione, poi dal contenuto"""
+        ext = os.path.splitext(path)[1].lower()
+        if ext in ('.ofx', '.qfx'):
+            return 'ofx'
+        with open(path, 'rb') as f:
+            head = f.read(4096).decode('utf-8', errors='ignore')
+        if 'OFXHEADER' in head or '<OFX>' in head.upper():
+            return 'ofx'
+        if 'camt.053' in head or '<BkToCstmrStmt' in head:
+            return 'camt'
+        if ext == '.xml':
+            raise StatementImportError("XML non riconosciuto: sono supportati solo gli estratti CAMT.053")
+        return 'csv'
+
+    @staticmethod
+    def _sniff_delimiter(sample):
+        try:
+            return csv.Sniffer().sniff(sample, delimiters=';,\t|').delimiter
+        except csv.Error:
+            return ';'
+
+    def read_csv_header(self, path, encoding='utf-8-sig', skip_rows=0, delimiter=None):
+        """
+        Intestazione del CSV e mappatura proposta dai nomi delle colonne
+
+        Returns:
+            dict: {'delimiter', 'headers': [...], 'mapping': {campo: colonna}}
+        """
+        with open(path, 'r', encoding=encoding, newline='') as f:
+            for _ in range(skip_rows):
+                f.readline()
+            sample = f.read(8192)
+        delimiter = delimiter or self._sniff_delimiter(sample)
+        headers = next(csv.reader(sample.splitlines(), delimiter=delimiter), [])
+        headers = [h.strip() for h in headers]
+
+        mapping = {}
+        for header in headers:
+            field = CSV_HEADER_ALIASES.get(header.lower())
+            if field and field not in mapping:
+                mapping[field] = header
+        return {'delimiter': delimiter, 'headers': headers, 'mapping': mapping}
+
+    # ------------------------------------------------------------------
+    # Lettori (righe grezze a blocchi)
+    # ------------------------------------------------------------------
+
+    def _read_csv(self, path, profile):
+        """Blocchi di righe grezze (RAW_FIELDS) da un CSV secondo il profilo"""
+        encoding = profile.get('encoding') or 'utf-8-sig'
+        skip_rows = profile.get('skip_rows') or 0
+        delimiter = profile.get('delimiter') or self.read_csv_header(path, encoding, skip_rows)['delimiter']
+
+        with open(path, 'r', encoding=encoding, newline='') as f:
+            for _ in range(skip_rows):
+                f.readline()
+            reader = csv.reader(f, delimiter=delimiter)
+            headers = [h.strip().lower() for h in next(reader, [])]
+
+            def index(field):
+                column = profile.get(field)
+                if not column:
+                    return None
+                try:
+                    return headers.index(column.strip().lower())
+                except ValueError:
+                    raise StatementImportError(f"Colonna '{column}' non trovata nell'intestazione")
+
+            columns = [index(field) for field in ('date_column', 'amount_column', 'debit_column', 'credit_column',
+                                                  'counterparty_column', 'description_column')]
+            if columns[0] is None:
+                raise StatementImportError("Mappatura incompleta: manca la colonna della data")
+            if columns[1] is None and columns[2] is None and columns[3] is None:
+                raise StatementImportError("Mappatura incompleta: manca l'importo (o le colonne dare/avere)")
+
+            batch = []
+            line = skip_rows + 1
+            for row in reader:
+                line += 1
+                if not any(cell.strip() for cell in row):
+                    continue
+                batch.append((line,) + tuple(
+                    (row[i] if i < len(row) else "") if i is not None else None
+                    for i in columns
+                ))
+                if len(batch) >= self.BATCH_SIZE:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    _OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+    _OFX_HEADER = re.compile(r'^\s*(ENCODING|CHARSET)\s*:\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+    _XML_ENCODING = re.compile(r'<\?xml[^>]*encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']', re.IGNORECASE)
+
+    @classmethod
+    def _ofx_encoding(cls, path):
+        """
+        Codifica dichiarata nell'intestazione: encoding della dichiarazione XML
+        (OFX 2.x) o ENCODING/CHARSET dell'intestazione SGML (OFX 1.x, es.
+        ENCODING:USASCII + CHARSET:1252). UTF-8 se assente o sconosciuta
+        """
+        with open(path, 'rb') as f:
+            head = f.read(4096).decode('latin-1')
+
+        declared = cls._XML_ENCODING.search(head)
+        if declared:
+            candidate = declared.group(1)
+        else:
+            header = {key.upper(): value.upper() for key, value in cls._OFX_HEADER.findall(head)}
+            charset = header.get('CHARSET', 'NONE')
+            if header.get('ENCODING') == 'UTF-8':
+                candidate = 'utf-8'
+            elif charset.isdigit():
+                candidate = f"cp{charset}"  # Code page Windows (1252)
+            elif charset != 'NONE':
+                candidate = 'iso-' + charset if charset.startswith('8859') else charset
+            elif header.get('ENCODING') == 'USASCII':
+                candidate = 'cp1252'  # CHARSET:NONE: in pratica Windows-1252
+            else:
+                candidate = 'utf-8'
+
+        try:
+            return codecs.lookup(candidate).name
+        except LookupError:
+            return 'utf-8'
+
+    def _read_ofx(self, path):
+        """
+        Movimenti (STMTTRN) di un file OFX 1.x (SGML, tag spesso non chiusi)
+        o 2.x (XML), letto a pezzi da 1 MB senza caricarlo tutto
+        """
+        batch = []
+        current = None
+        count = 0
+        buffer = ""
+        with open(path, 'r', encoding=self._ofx_encoding(path), errors='replace') as f:
+            while True:
+                chunk = f.read(1024 * 1024)
+                buffer += chunk
+                # Si elabora fino all'ultimo '<': un tag può essere spezzato tra due pezzi
+                cut = buffer.rfind('<') if chunk else len(buffer)
+                text, buffer = buffer[:cut], buffer[cut:]
+
+                for closing, tag, value in self._OFX_TAG.findall(text):
+                    tag = tag.upper()
+                    if tag == 'STMTTRN':
+                        if not closing:
+                            current = {}
+                        elif current is not None:
+                            count += 1
+                            batch.append(self._ofx_record(count, current))
+                            current = None
+                            if len(batch) >= self.BATCH_SIZE:
+                                yield batch
+                                batch = []
+                    elif current is not None and not closing and value.strip():
+                        current.setdefault(tag, value.strip())
+
+                if not chunk:
+                    break
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _ofx_record(number, fields):
+        amount = fields.get('TRNAMT', '')
+        if ',' in amount and '.' not in amount:
+            amount = amount.replace(',', '.')
+        return (number, fields.get('DTPOSTED', '')[:8], amount, None, None,
+                fields.get('NAME') or fields.get('PAYEE'), fields.get('MEMO'))
+
+    def _read_camt(self, path):
+        """
+        Movimenti (Ntry) di un estratto CAMT.053, con iterparse: ogni voce è
+        liberata dopo la lettura. Solo le voci contabilizzate (Sts BOOK): le
+        prenotate (PDNG) o informative (INFO) ricompaiono contabilizzate in un
+        estratto successivo
+        """
+        batch = []
+        count = 0
+        ns = None
+        for event, elem in ElementTree.iterparse(path, events=('start', 'end')):
+            if ns is None and event == 'start':
+                ns = {'c': elem.tag[1:].split('}')[0]} if elem.tag.startswith('{') else {'c': ''}
+                continue
+            if event != 'end' or not elem.tag.endswith('Ntry'):
+                continue
+
+            count += 1
+            if self._camt_booked(elem, ns):
+                batch.append(self._camt_record(count, elem, ns))
+            elem.clear()
+            if len(batch) >= self.BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _camt_booked(entry, ns):
+        """Stato della voce: <Sts>BOOK</Sts> (camt.053.001.02) o <Sts><Cd>BOOK</Cd></Sts> (versioni successive)"""
+        prefix = 'c:' if ns['c'] else ''
+        status = entry.find(f'{prefix}Sts/{prefix}Cd', ns)
+        if status is None:
+            status = entry.find(f'{prefix}Sts', ns)
+        if status is None or not (status.text or '').strip():
+            return True  # Stato assente: estratto conto, voce contabilizzata
+        return status.text.strip().upper() == 'BOOK'
+
+    @staticmethod
+    def _camt_record(number, entry, ns):
+        prefix = 'c:' if ns['c'] else ''
+
+        def text(path):
+            found = entry.find(path.replace('c:', prefix), ns)
+            return found.text.strip() if found is not None and found.text else None
+
+        debit = text('c:CdtDbtInd') == 'DBIT'
+        amount = text('c:Amt') or ''
+        if debit and amount:
+            amount = '-' + amount
+        date = (text('c:BookgDt/c:Dt') or (text('c:BookgDt/c:DtTm') or '')[:10]
+                or text('c:ValDt/c:Dt') or '')
+
+        party = 'Cdtr' if debit else 'Dbtr'
+        counterparty = (text(f'.//c:RltdPties/c:{party}/c:Nm')
+                        or text(f'.//c:RltdPties/c:{party}/c:Pty/c:Nm'))
+        remittance = [
+            node.text.strip()
+            for node in entry.findall('.//c:RmtInf/c:Ustrd'.replace('c:', prefix), ns)
+            if node.text and node.text.strip()
+        ]
+        description = " ".join(remittance) or text('c:AddtlNtryInf')
+        return (number, date, amount, None, None, counterparty, description)
+
+    def _batches(self, path, file_format, profile):
+        """(lettore, formato data, separatore decimale) per il formato del file"""
+        if file_format == 'ofx':
+            return self._read_ofx(path), 'yyyyMMdd', '.'
+        if file_format == 'camt':
+            return self._read_camt(path), 'yyyy-MM-dd', '.'
+        if not profile:
+            raise StatementImportError("Per i CSV serve una mappatura delle colonne")
+        return (self._read_csv(path, profile), profile.get('date_format') or 'dd/MM/yyyy',
+                profile.get('decimal_separator') or ',')
+
+    # ------------------------------------------------------------------
+    # Validazione a colonne
+    # ------------------------------------------------------------------
+
+    def _validate_batch(self, batch, parse_date, parse_amount, caches, errors):
+        """
+        Valida un blocco colonna per colonna
+
+        Returns:
+            Lista di (riga, yyyy-MM-dd, importo con segno, controparte, descrizione)
+        """
+        lines, dates, amounts, debits, credits, counterparties, descriptions = zip(*batch)
+
+        parsed_dates = parse_column(dates, parse_date, caches['date'])
+        parsed_amounts = parse_column(amounts, parse_amount, caches['amount']) if amounts[0] is not None else None
+        parsed_debits = parse_column(debits, parse_amount, caches['amount']) if debits[0] is not None else None
+        parsed_credits = parse_column(credits, parse_amount, caches['amount']) if credits[0] is not None else None
+
+        valid = []
+        for i, line in enumerate(lines):
+            iso_date, error = parsed_dates[i]
+            if error:
+                errors.append({'line': line, 'field': 'data', 'value': dates[i], 'message': error})
+                continue
+
+            amount = 0.0
+            failed = False
+            for column, raw, sign in ((parsed_amounts, amounts, 1), (parsed_credits, credits, 1),
+                                      (parsed_debits, debits, -1)):
+                if column is None:
+                    continue
+                value, error = column[i]
+                if error:
+                    errors.append({'line': line, 'field': 'importo', 'value': raw[i], 'message': error})
+                    failed = True
+                    break
+                if value:
+                    # Dare/avere: l'addebito può essere scritto con o senza segno
+                    amount += abs(value) * sign if sign < 0 else value
+            if failed:
+                continue
+            if not amount:
+                errors.append({'line': line, 'field': 'importo', 'value': amounts[i] or debits[i] or credits[i],
+                               'message': "Importo mancante o zero"})
+                continue
+
+            counterparty = (counterparties[i] or "").strip()
+            description = (descriptions[i] or "").strip()
+            if not counterparty and not description:
+                errors.append({'line': line, 'field': 'controparte', 'value': "",
+                               'message': "Né controparte né descrizione"})
+                continue
+
+            valid.append((line, iso_date, round(amount, 2), counterparty, description))
+        return valid
+
+    # ------------------------------------------------------------------
+    # Deduplicazione
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def fingerprint(iso_date, signed_amount, normalized_counterparty):
+        """Impronta di un movimento: data, importo con segno in centesimi, controparte normalizzata"""
+        key = f"{iso_date}|{int(round(signed_amount * 100))}|{normalized_counterparty}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _existing_fingerprints(self, property_id, first_date, last_date, normalize):
+        """Impronte (con molteplicità) delle transazioni della proprietà nell'intervallo del file"""
+        session = self.db.get_session()
+        try:
+            iso_date = (func.substr(Transaction.date, 7, 4, type_=String) + '-'
+                        + func.substr(Transaction.date, 4, 2, type_=String) + '-'
+                        + func.substr(Transaction.date, 1, 2, type_=String))
+            rows = session.query(iso_date, Transaction.type, Transaction.amount, Transaction.provider).filter(
+                Transaction.property_id == property_id,
+                iso_date >= first_date,
+                iso_date <= last_date
+            )
+            return Counter(
+                self.fingerprint(day, -amount if trans_type == 'Uscita' else amount, normalize(provider))
+                for day, trans_type, amount, provider in rows
+            )
+        finally:
+            self.db.close_session(session)
+
+    # ------------------------------------------------------------------
+    # Import
+    # ------------------------------------------------------------------
+
+    def import_statement(self, path, property_id, profile=None, dry_run=False, progress=None):
+        """
+        Importa un estratto conto nelle transazioni di una proprietà
+
+        Args:
+            path: File CSV, OFX o CAMT.053 (XML)
+            property_id: Proprietà di destinazione
+            profile: Mappatura delle colonne (dict come ImportProfile.to_dict), solo CSV
+            dry_run: Se True analizza e deduplica senza scrivere nel DB
+            progress: Callback opzionale (righe lette)
+
+        Returns:
+            dict: {
+                'format', 'rows' (movimenti letti), 'imported', 'duplicates',
+                'errors': [{'line', 'field', 'value', 'message'}],
+                'suppliers_linked', 'duration', 'items' (solo dry_run: anteprima)
+            }
+
+        Raises:
+            StatementImportError: formato non riconosciuto o mappatura non valida
+        """
+        started = time.perf_counter()
+        file_format = self.detect_format(path)
+        reader, date_format, decimal_separator = self._batches(path, file_format, profile)
+        parse_date = date_parser(date_format)
+        parse_amount = amount_parser(decimal_separator)
+        caches = {'date': {}, 'amount': {}}
+
+        result = {
+            'format': file_format, 'rows': 0, 'imported': 0, 'duplicates': 0,
+            'errors': [], 'suppliers_linked': 0, 'duration': 0.0, 'items': []
+        }
+
+        # 1. Lettura e validazione a blocchi
+        records = []
+        try:
+            for batch in reader:
+                result['rows'] += len(batch)
+                records.extend(self._validate_batch(batch, parse_date, parse_amount, caches, result['errors']))
+                if progress:
+                    progress(result['rows'])
+        except (UnicodeDecodeError, ElementTree.ParseError, csv.Error) as e:
+            raise StatementImportError(f"File non leggibile: {e}")
+
+        if not records:
+            result['duration'] = time.perf_counter() - started
+            return result
+
+        # 2. Deduplicazione: contro il DB e dentro il file, rispettando la molteplicità
+        #    (due pagamenti identici nello stesso giorno restano due)
+        normalized = {}
+
+        def normalize(text):
+            key = normalized.get(text)
+            if key is None:
+                key = normalized[text] = normalize_name(text)
+            return key
+
+        first_date = min(record[1] for record in records)
+        last_date = max(record[1] for record in records)
+        existing = self._existing_fingerprints(property_id, first_date, last_date, normalize)
+
+        # 3. Fornitore e categoria: una volta per controparte distinta
+        supplier_index = self.supplier_link.load_index()
+        categorizer = get_categorizer()
+        suppliers = {}
+        categories = {}
+
+        items = []
+        for line, iso_date, amount, counterparty, description in records:
+            provider = (counterparty or description)[:200]
+            digest = self.fingerprint(iso_date, amount, normalize(provider))
+            if existing[digest] > 0:
+                existing[digest] -= 1
+                result['duplicates'] += 1
+                continue
+
+            if provider not in suppliers:
+                suppliers[provider] = self.supplier_link.match_provider(supplier_index, provider, property_id)
+                prediction = categorizer.predict(provider)
+                categories[provider] = (
+                    prediction['category'] if prediction['category_confidence'] >= self.CATEGORY_MIN_CONFIDENCE
+                    else None
+                )
+
+            supplier_id = suppliers[provider]
+            if supplier_id:
+                result['suppliers_linked'] += 1
+            items.append({
+                'property_id': property_id,
+                'date': f"{iso_date[8:10]}/{iso_date[5:7]}/{iso_date[0:4]}",
+                'trans_type': 'Entrata' if amount > 0 else 'Uscita',
+                'amount': abs(amount),
+                'provider': provider,
+                'service': (categories[provider] or description or self.DEFAULT_SERVICE)[:200],
+                'supplier_id': supplier_id
+            })
+
+        # 4. Un solo INSERT e un solo commit
+        if dry_run:
+            result['items'] = items
+            result['imported'] = len(items)
+        elif items:
+            inserted = self.transaction_service.insert_bulk(items)
+            if inserted is None:
+                raise StatementImportError("Errore salvataggio nel database: nessun movimento importato")
+            result['imported'] = inserted
+
+        result['duration'] = time.perf_counter() - started
+        self.logger.info(
+            f"StatementImportService: {os.path.basename(path)} ({file_format}) {result['rows']} righe, "
+            f"{result['imported']} importate, {result['duplicates']} duplicate, {len(result['errors'])} errori "
+            f"in {result['duration']:.1f}s{' (anteprima)' if dry_run else ''}"
+        )
+        return result
+
+    def write_error_report(self, result, exports_dir="exports"):
+        """
+        CSV con le righe scartate per errore (riga, campo, valore, messaggio)
+
+        Returns:
+            Path del file creato o None se non ci sono errori
+        """
+        if not result['errors']:
+            return None
+
+        os.makedirs(exports_dir, exist_ok=True)
+        path = os.path.join(exports_dir, f"import_errori_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(['Riga', 'Campo', 'Valore', 'Errore'])
+            for error in result['errors']:
+                writer.writerow([error['line'], error['field'], error['value'], error['message']])
+
+        self.logger.info(f"StatementImportService: Report errori scritto: {path}")
+        return path
@@ -0,0 +1,345 @@
+import re
+import threading
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from sqlalchemy import delete, func
+
+from database.models import Supplier, SupplierReview, SupplierDocument, Transaction
+from database.connection import DatabaseConnection
+from services.supplier_link_service import normalize_name, blocking_keys, similarity
+
+
+# Domini email generici: non indicano la stessa azienda
+GENERIC_EMAIL_DOMAINS = {
+    'gmail.com', 'yahoo.com', 'yahoo.it', 'hotmail.com', 'hotmail.it', 'outlook.com',
+    'outlook.it', 'libero.it', 'virgilio.it', 'alice.it', 'tiscali.it', 'icloud.com',
+    'live.com', 'live.it', 'pec.it', 'legalmail.it', 'aruba.it'
+}
+
+_DIGITS = re.compile(r'\D+')
+
+
+def normalize_phone(phone):
+    """Ultime 9 cifre del numero (ignora prefisso internazionale e separatori)"""
+    if not phone:
+        return ""
+    digits = _DIGITS.sub('', phone)
+    return digits[-9:] if len(digits) >= 6 else ""
+
+
+def normalize_email(email):
+    """Email in minuscolo senza spazi"""
+    return email.strip().lower() if email else ""
+
+
+def email_domain(email):
+    """Dominio aziendale dell'email (vuoto per i domini generici)"""
+    if '@' not in email:
+        return ""
+    domain = email.rsplit('@', 1)[1]
+    return "" if domain in GENERIC_EMAIL_DOMAINS else domain
+
+
+class SupplierDedupService:
+    """Rileva fornitori duplicati e li unisce"""
+
+    # Punteggio minimo per proporre due fornitori come duplicati
+    DUPLICATE_SCORE = 0.80
+
+    # Blocchi più grandi vengono ignorati (token troppo comuni)
+    MAX_BLOCK_SIZE = 200
+
+    # Token in comune (di almeno 3 caratteri) perché il contenimento dei nomi
+    # conti: "Idraulico" non è un duplicato di "Idraulico Bianchi"
+    MIN_SHARED_TOKENS = 2
+
+    # Indice dei fornitori condiviso tra le istanze, ricostruito quando la
+    # tabella cambia (conteggio, id massimo, ultima modifica)
+    _index_lock = threading.Lock()
+    _index_version = None
+    _index_records = {}
+    _index_blocks = {}
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+
+    @staticmethod
+    def _record(supplier_id, name, phone, email, address, property_id, service_count):
+        """Fornitore con i campi normalizzati per il confronto"""
+        email_norm = normalize_email(email)
+        name_key = normalize_name(name)
+        return {
+            'id': supplier_id,
+            'name': name,
+            'name_key': name_key,
+            'tokens': frozenset(token for token in name_key.split() if len(token) >= 3),
+            'phone': normalize_phone(phone),
+            'email': email_norm,
+            'domain': email_domain(email_norm),
+            'address': normalize_name(address),
+            'property_id': property_id,
+            'service_count': service_count or 0
+        }
+
+    def _load_index(self):
+        """
+        Fornitori normalizzati e blocchi (chiave -> id), dalla cache se la
+        tabella non è cambiata
+
+        Returns:
+            (records, blocks); dizionari vuoti se la lettura fallisce
+        """
+        cls = SupplierDedupService
+        session = self.db.get_session()
+        try:
+            version = tuple(session.query(
+                func.count(Supplier.id), func.max(Supplier.id), func.max(Supplier.updated_at)
+            ).one())
+
+            with cls._index_lock:
+                if version == cls._index_version:
+                    return cls._index_records, cls._index_blocks
+
+            rows = session.query(
+                Supplier.id, Supplier.name, Supplier.phone, Supplier.email,
+                Supplier.address, Supplier.property_id, Supplier.service_count
+            ).all()
+        except Exception as e:
+            self.logger.error(f"SupplierDedupService: Errore caricamento fornitori: {e}")
+            return {}, {}
+        finally:
+            self.db.close_session(session)
+
+        records = {row[0]: self._record(*row) for row in rows}
+        blocks = defaultdict(list)
+        for record in records.values():
+            for key in self._blocks(record):
+                blocks[key].append(record['id'])
+        blocks = dict(blocks)
+
+        with cls._index_lock:
+            cls._index_version = version
+            cls._index_records = records
+            cls._index_blocks = blocks
+        return records, blocks
+
+    def _blocks(self, record):
+        """Chiavi di blocking di un record: nome, telefono, email, dominio"""
+        keys = {f"n:{k}" for k in blocking_keys(record['name_key'])}
+        if record['phone']:
+            keys.add(f"p:{record['phone']}")
+        if record['email']:
+            keys.add(f"e:{record['email']}")
+        if record['domain']:
+            keys.add(f"d:{record['domain']}")
+        return keys
+
+    def score_pair(self, a, b):
+        """
+        Punteggio di duplicazione 0-1 tra due record normalizzati
+
+        Telefono o email identici sono prove forti; il nome pesa di più,
+        l'indirizzo rafforza solo se già simile.
+        """
+        if a['phone'] and a['phone'] == b['phone']:
+            return 0.98
+        if a['email'] and a['email'] == b['email']:
+            return 0.98
+
+        if not a['name_key'] or not b['name_key']:
+            return 0.0
+
+        if len(a['tokens'] & b['tokens']) >= self.MIN_SHARED_TOKENS:
+            # Contenimento dei token ammesso solo con più parole in comune
+            score = similarity(a['name_key'], b['name_key'])
+        else:
+            score = SequenceMatcher(None, a['name_key'], b['name_key'], autojunk=False).ratio()
+
+        if a['domain'] and a['domain'] == b['domain']:
+            score = max(score, 0.90)
+
+        if a['address'] and b['address']:
+            address_score = similarity(a['address'], b['address'])
+            if address_score >= 0.85:
+                score = min(1.0, score + 0.05)
+
+        return score
+
+    def find_duplicates(self, min_score=None):
+        """
+        Trova gruppi di fornitori probabilmente duplicati
+
+        Confronta solo le coppie della stessa proprietà che condividono una
+        chiave di blocking. I gruppi non sono chiusi per transitività: ogni
+        fornitore, dal più usato, raccoglie solo quelli simili direttamente a
+        lui (A~B e B~C non uniscono A e C).
+
+        Returns:
+            Lista di gruppi: [{'supplier_ids': [...], 'names': [...],
+                               'keep_id': int, 'score': float}]
+        """
+        min_score = self.DUPLICATE_SCORE if min_score is None else min_score
+        records, blocks = self._load_index()
+
+        matches = defaultdict(dict)
+        compared = set()
+        for members in blocks.values():
+            if len(members) < 2 or len(members) > self.MAX_BLOCK_SIZE:
+                continue
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    pair = (a, b) if a < b else (b, a)
+                    if pair in compared or records[a]['property_id'] != records[b]['property_id']:
+                        continue
+                    compared.add(pair)
+                    score = self.score_pair(records[a], records[b])
+                    if score >= min_score:
+                        matches[a][b] = matches[b][a] = score
+
+        # Rappresentante = fornitore da tenere: il più usato (a parità, il più vecchio)
+        order = sorted(matches, key=lambda sid: (-records[sid]['service_count'], sid))
+        assigned = set()
+        groups = []
+        for keep_id in order:
+            if keep_id in assigned:
+                continue
+            members = [sid for sid in matches[keep_id] if sid not in assigned]
+            if not members:
+                continue
+            assigned.add(keep_id)
+            assigned.update(members)
+
+            scores = [matches[keep_id][sid] for sid in members]
+            members = sorted(members + [keep_id])
+            groups.append({
+                'supplier_ids': members,
+                'names': [records[sid]['name'] for sid in members],
+                'keep_id': keep_id,
+                'score': round(min(scores), 3)
+            })
+
+        groups.sort(key=lambda g: -g['score'])
+        self.logger.info(f"SupplierDedupService: {len(groups)} gruppi di duplicati trovati")
+        return groups
+
+    def find_similar(self, name, phone=None, email=None, property_id=None, min_score=None):
+        """
+        Fornitori esistenti simili a un nuovo fornitore (prima della creazione)
+
+        Confronta solo i fornitori della stessa proprietà presenti nei blocchi
+        del nuovo nome, telefono ed email.
+
+        Returns:
+            Lista di (score, supplier_id, name) ordinata per score
+        """
+        min_score = self.DUPLICATE_SCORE if min_score is None else min_score
+
+        candidate = self._record(None, name, phone, email, None, property_id, 0)
+        records, blocks = self._load_index()
+
+        candidates = set()
+        for key in self._blocks(candidate):
+            members = blocks.get(key, ())
+            if len(members) <= self.MAX_BLOCK_SIZE:
+                candidates.update(members)
+
+        matches = []
+        for supplier_id in candidates:
+            record = records[supplier_id]
+            if record['property_id'] != property_id:
+                continue
+            score = self.score_pair(candidate, record)
+            if score >= min_score:
+                matches.append((round(score, 3), record['id'], record['name']))
+
+        matches.sort(key=lambda m: (-m[0], m[1]))
+        return matches
+
+    def merge(self, keep_id, duplicate_ids):
+        """
+        Unisce i fornitori duplicati in quello da tenere
+
+        Transazioni, recensioni e documenti vengono riassegnati con UPDATE
+        set-based, i campi vuoti del fornitore tenuto vengono completati,
+        i duplicati eliminati e le statistiche ricalcolate una volta sola.
+
+        Args:
+            keep_id: ID del fornitore da mantenere
+            duplicate_ids: ID dei fornitori da assorbire
+
+        Returns:
+            dict con conteggi delle righe riassegnate o None se fallisce
+        """
+        duplicate_ids = [sid for sid in duplicate_ids if sid != keep_id]
+        if not duplicate_ids:
+            return None
+
+        session = self.db.get_session()
+        try:
+            keep = session.query(Supplier).filter(Supplier.id == keep_id).first()
+            if not keep:
+                return None
+
+            duplicates = session.query(Supplier).filter(
+                Supplier.id.in_(duplicate_ids)
+            ).order_by(Supplier.id.asc()).all()
+
+            # Le transazioni di un'altra proprietà finirebbero su un fornitore non suo
+            if any(dup.property_id != keep.property_id for dup in duplicates):
+                self.logger.error(
+                    f"SupplierDedupService: Fornitori {duplicate_ids} di proprietà diverse da {keep_id}, "
+                    f"unione annullata"
+                )
+                return None
+
+            # Completa i campi mancanti con quelli dei duplicati
+            for field in ('phone', 'email', 'address', 'rating'):
+                if getattr(keep, field) is None:
+                    for dup in duplicates:
+                        if getattr(dup, field) is not None:
+                            setattr(keep, field, getattr(dup, field))
+                            break
+
+            extra_notes = [dup.notes for dup in duplicates if dup.notes]
+            if extra_notes:
+                keep.notes = "\n".join(filter(None, [keep.notes] + extra_notes))
+
+            session.flush()
+
+            counts = {}
+            for model, key in ((Transaction, 'transactions'),
+                               (SupplierReview, 'reviews'),
+                               (SupplierDocument, 'documents')):
+                table = model.__table__
+                res = session.execute(
+                    table.update().where(
+                        table.c.supplier_id.in_(duplicate_ids)
+                    ).values(supplier_id=keep_id)
+                )
+                counts[key] = res.rowcount
+
+            # Elimina con DELETE diretto: i figli sono già stati riassegnati
+            session.execute(delete(Supplier.__table__).where(
+                Supplier.__table__.c.id.in_(duplicate_ids)
+            ))
+            session.commit()
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"SupplierDedupService: Errore unione fornitori: {e}")
+            return None
+        finally:
+            self.db.close_session(session)
+
+        from services.supplier_service import SupplierService
+        SupplierService(self.logger).recompute_stats({keep_id})
+
+        counts['merged'] = len(duplicate_ids)
+        self.logger.info(
+            f"SupplierDedupService: Fornitori {duplicate_ids} uniti in {keep_id} "
+            f"({counts['transactions']} transazioni, {counts['reviews']} recensioni, "
+            f"{counts['documents']} documenti)"
+        )
+        return counts
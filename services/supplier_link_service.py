@@ -0,0 +1,340 @@
+import csv
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import datetime
+from difflib import SequenceMatcher
+
+from sqlalchemy import func, bindparam
+
+from database.models import Transaction, Supplier
+from database.connection import DatabaseConnection
+
+
+# Forme societarie ignorate nel confronto dei nomi
+LEGAL_SUFFIXES = {
+    'spa', 'srl', 'srls', 'sas', 'snc', 'ss', 'sapa', 'scarl', 'scrl', 'sc',
+    'coop', 'societa', 'cooperativa', 'ltd', 'llc', 'inc', 'gmbh', 'ag',
+    'sa', 'sl', 'sarl', 'bv', 'nv', 'plc', 'co', 'e', 'di', 'the'
+}
+
+# Sigle puntate da compattare prima della tokenizzazione (S.p.A. -> spa)
+_DOTTED_ACRONYM = re.compile(r'\b(?:[a-z]\.){2,}[a-z]?\b')
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_name(name):
+    """
+    Normalizza un nome di fornitore per il confronto
+
+    Rimuove accenti, punteggiatura, maiuscole e forme societarie:
+    "ENEL Energia S.p.A." -> "enel energia"
+
+    Args:
+        name: Nome originale
+
+    Returns:
+        Nome normalizzato (stringa vuota se non rimane nulla)
+    """
+    if not name:
+        return ""
+
+    text = unicodedata.normalize('NFKD', name)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = _DOTTED_ACRONYM.sub(lambda m: m.group(0).replace('.', ''), text)
+    tokens = [t for t in _NON_ALNUM.split(text) if t and t not in LEGAL_SUFFIXES]
+
+    return ' '.join(tokens)
+
+
+def blocking_keys(normalized):
+    """Chiavi di blocking: prefisso di 4 caratteri di ogni token significativo"""
+    return {token[:4] for token in normalized.split() if len(token) >= 3}
+
+
+def similarity(a, b, matcher=None):
+    """
+    Punteggio di similarità 0-1 tra due nomi normalizzati
+
+    Combina il ratio di SequenceMatcher con il contenimento dei token,
+    così "enel" e "enel energia" risultano simili.
+    """
+    if a == b:
+        return 1.0
+
+    tokens_a = set(a.split())
+    tokens_b = set(b.split())
+    containment = 0.0
+    if tokens_a and tokens_b:
+        containment = len(tokens_a & tokens_b) / min(len(tokens_a), len(tokens_b))
+
+    if matcher is None:
+        matcher = SequenceMatcher(None, a, b, autojunk=False)
+
+    return max(matcher.ratio(), containment * 0.92)
+
+
+class SupplierIndex:
+    """Indice in memoria dei fornitori: hash sui nomi normalizzati + blocchi per il fuzzy"""
+
+    # Blocchi più grandi di così (token troppo comuni) vengono ignorati
+    MAX_BLOCK_SIZE = 200
+
+    def __init__(self, suppliers):
+        """
+        Args:
+            suppliers: Iterabile di tuple (id, name, property_id)
+        """
+        self.by_key = defaultdict(list)
+        self.blocks = defaultdict(list)
+        self.entries = {}
+
+        for supplier_id, name, property_id in suppliers:
+            key = normalize_name(name)
+            if not key:
+                continue
+            self.entries[supplier_id] = (key, property_id, name)
+            self.by_key[key].append(supplier_id)
+            for block in blocking_keys(key):
+                self.blocks[block].append(supplier_id)
+
+    def candidates(self, key):
+        """Fornitori che condividono almeno una chiave di blocking"""
+        found = set()
+        for block in blocking_keys(key):
+            members = self.blocks.get(block, ())
+            if len(members) <= self.MAX_BLOCK_SIZE:
+                found.update(members)
+        return found
+
+    def exact(self, key, property_id=None):
+        """Match esatto sul nome normalizzato, filtrato per proprietà compatibile"""
+        return [
+            sid for sid in self.by_key.get(key, ())
+            if self._property_compatible(sid, property_id)
+        ]
+
+    def fuzzy(self, key, property_id=None, min_score=0.0):
+        """
+        Match fuzzy limitato ai candidati del blocco
+
+        Returns:
+            Lista di (score, supplier_id) ordinata per score decrescente
+        """
+        matcher = SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(key)
+
+        scored = []
+        for sid in self.candidates(key):
+            if not self._property_compatible(sid, property_id):
+                continue
+            other = self.entries[sid][0]
+            matcher.set_seq1(other)
+            # Scarta subito i candidati che non possono superare la soglia
+            if matcher.real_quick_ratio() < min_score and not (set(key.split()) & set(other.split())):
+                continue
+            score = similarity(other, key, matcher)
+            if score >= min_score:
+                scored.append((score, sid))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+    def _property_compatible(self, supplier_id, property_id):
+        """Un fornitore senza proprietà vale per tutte"""
+        supplier_property = self.entries[supplier_id][1]
+        return property_id is None or supplier_property is None or supplier_property == property_id
+
+
+class SupplierLinkService:
+    """Collega in blocco le transazioni storiche (solo provider testuale) ai fornitori"""
+
+    # Soglie di matching
+    AUTO_LINK_SCORE = 0.90
+    REVIEW_SCORE = 0.70
+    MIN_MARGIN = 0.05
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+
+    def link_transactions(self, property_id=None, dry_run=False):
+        """
+        Collega le transazioni con supplier_id NULL ai fornitori esistenti
+
+        Le transazioni vengono raggruppate per (provider, property_id), quindi il
+        matching viene eseguito una sola volta per nome distinto.
+
+        Args:
+            property_id: Limita il collegamento a una proprietà (opzionale)
+            dry_run: Se True calcola i match senza scrivere nel DB
+
+        Returns:
+            dict: {
+                'linked': int (transazioni collegate),
+                'matches': [dict] (match applicati),
+                'ambiguous': [dict] (da rivedere manualmente),
+                'unmatched': int (provider distinti senza candidati)
+            }
+        """
+        result = {'linked': 0, 'matches': [], 'ambiguous': [], 'unmatched': 0}
+
+        session = self.db.get_session()
+        try:
+            suppliers = session.query(Supplier.id, Supplier.name, Supplier.property_id).all()
+            index = SupplierIndex(suppliers)
+
+            query = session.query(
+                Transaction.provider,
+                Transaction.property_id,
+                func.count(Transaction.id)
+            ).filter(Transaction.supplier_id.is_(None))
+
+            if property_id:
+                query = query.filter(Transaction.property_id == property_id)
+
+            groups = query.group_by(Transaction.provider, Transaction.property_id).all()
+
+            updates = []
+            for provider, trans_property_id, count in groups:
+                key = normalize_name(provider)
+                if not key:
+                    result['unmatched'] += 1
+                    continue
+
+                match = self._match(index, key, trans_property_id)
+
+                if match['status'] == 'linked':
+                    supplier_id = match['supplier_id']
+                    updates.append({
+                        'b_provider': provider,
+                        'b_property_id': trans_property_id,
+                        'b_supplier_id': supplier_id
+                    })
+                    result['linked'] += count
+                    result['matches'].append({
+                        'provider': provider,
+                        'property_id': trans_property_id,
+                        'supplier_id': supplier_id,
+                        'supplier_name': index.entries[supplier_id][2],
+                        'score': match['score'],
+                        'transactions': count
+                    })
+                elif match['status'] == 'ambiguous':
+                    result['ambiguous'].append({
+                        'provider': provider,
+                        'property_id': trans_property_id,
+                        'transactions': count,
+                        'candidates': [
+                            {'supplier_id': sid, 'name': index.entries[sid][2], 'score': round(score, 3)}
+                            for score, sid in match['candidates']
+                        ]
+                    })
+                else:
+                    result['unmatched'] += 1
+
+            if updates and not dry_run:
+                table = Transaction.__table__
+                stmt = table.update().where(
+                    table.c.provider == bindparam('b_provider'),
+                    table.c.property_id == bindparam('b_property_id'),
+                    table.c.supplier_id.is_(None)
+                ).values(supplier_id=bindparam('b_supplier_id'))
+
+                session.execute(stmt, updates)
+                session.commit()
+
+                # Ricalcola le statistiche una sola volta per i fornitori toccati
+                from services.supplier_service import SupplierService
+                SupplierService(self.logger).recompute_stats(
+                    {u['b_supplier_id'] for u in updates}
+                )
+
+            self.logger.info(
+                f"SupplierLinkService: {result['linked']} transazioni collegate, "
+                f"{len(result['ambiguous'])} ambigue, {result['unmatched']} senza match"
+                f"{' (dry run)' if dry_run else ''}"
+            )
+            return result
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"SupplierLinkService: Errore collegamento transazioni: {e}")
+            return result
+        finally:
+            self.db.close_session(session)
+
+    def load_index(self):
+        """Indice dei fornitori attuali (per il matching fuori da link_transactions)"""
+        session = self.db.get_session()
+        try:
+            return SupplierIndex(session.query(Supplier.id, Supplier.name, Supplier.property_id).all())
+        except Exception as e:
+            self.logger.error(f"SupplierLinkService: Errore lettura fornitori: {e}")
+            return SupplierIndex([])
+        finally:
+            self.db.close_session(session)
+
+    def match_provider(self, index, provider, property_id=None):
+        """ID del fornitore collegabile con sicurezza a un provider testuale, None se ambiguo o assente"""
+        key = normalize_name(provider)
+        if not key:
+            return None
+        match = self._match(index, key, property_id)
+        return match['supplier_id'] if match['status'] == 'linked' else None
+
+    def _match(self, index, key, property_id):
+        """Match esatto via hash, poi fuzzy sui candidati del blocco"""
+        exact = index.exact(key, property_id)
+        if len(exact) == 1:
+            return {'status': 'linked', 'supplier_id': exact[0], 'score': 1.0}
+        if len(exact) > 1:
+            # Preferisci il fornitore assegnato alla stessa proprietà
+            same_property = [sid for sid in exact if index.entries[sid][1] == property_id]
+            if len(same_property) == 1:
+                return {'status': 'linked', 'supplier_id': same_property[0], 'score': 1.0}
+            return {'status': 'ambiguous', 'candidates': [(1.0, sid) for sid in exact]}
+
+        scored = index.fuzzy(key, property_id, min_score=self.REVIEW_SCORE)
+        if not scored:
+            return {'status': 'unmatched'}
+
+        best_score, best_id = scored[0]
+        runner_up = scored[1][0] if len(scored) > 1 else 0.0
+
+        if best_score >= self.AUTO_LINK_SCORE and best_score - runner_up >= self.MIN_MARGIN:
+            return {'status': 'linked', 'supplier_id': best_id, 'score': round(best_score, 3)}
+
+        return {'status': 'ambiguous', 'candidates': scored[:5]}
+
+    def write_review_report(self, result, exports_dir="exports"):
+        """
+        Scrive un CSV con i match ambigui da rivedere
+
+        Returns:
+            Path del file creato o None se non ci sono ambiguità
+        """
+        if not result['ambiguous']:
+            return None
+
+        os.makedirs(exports_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filepath = os.path.join(exports_dir, f"collegamento_fornitori_{timestamp}.csv")
+
+        with open(filepath, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(['Provider', 'ID Proprietà', 'Transazioni', 'ID Fornitore', 'Fornitore', 'Score'])
+            for item in result['ambiguous']:
+                for candidate in item['candidates']:
+                    writer.writerow([
+                        item['provider'],
+                        item['property_id'],
+                        item['transactions'],
+                        candidate['supplier_id'],
+                        candidate['name'],
+                        candidate['score']
+                    ])
+
+        self.logger.info(f"SupplierLinkService: Report revisione salvato: {filepath}")
+        return filepath
@@ -1,6 +1,7 @@
-from database.models import Supplier, Property, SupplierDocument, SupplierReview
+from database.models import Supplier, Property, SupplierDocument, SupplierReview, Transaction
 from database.connection import DatabaseConnection
-from sqlalchemy import func, desc
+from services.autocomplete_service import get_autocomplete_index
+from sqlalchemy import func, desc, update, select, and_
 from datetime import datetime
 
 
@@ -134,6 +135,7 @@ class SupplierService:
             session.commit()
 
             supplier_id = new_supplier.id
+            get_autocomplete_index().add_category(category)
             self.logger.info(f"SupplierService: Fornitore creato: {supplier_id} - {name}")
             return supplier_id
 
@@ -206,6 +208,60 @@ class SupplierService:
         finally:
             self.db.close_session(session)
 
+    def recompute_stats(self, supplier_ids=None):
+        """
+        Ricalcola statistiche (totale speso, numero servizi, ultimo servizio)
+        dalle transazioni di uscita collegate, con un unico UPDATE
+
+        Args:
+            supplier_ids: Insieme di ID fornitore (None = tutti)
+
+        Returns:
+            True se successo
+        """
+        session = self.db.get_session()
+        try:
+            expense_filter = and_(
+                Transaction.supplier_id == Supplier.id,
+                Transaction.type == 'Uscita'
+            )
+
+            # dd/MM/yyyy -> yyyy-MM-dd per ottenere la data massima corretta
+            iso_date = (func.substr(Transaction.date, 7, 4) + '-' +
+                        func.substr(Transaction.date, 4, 2) + '-' +
+                        func.substr(Transaction.date, 1, 2))
+
+            def correlated(column):
+                return select(column).where(expense_filter).correlate(Supplier).scalar_subquery()
+
+            stmt = update(Supplier).values(
+                total_spent=correlated(func.coalesce(func.sum(Transaction.amount), 0.0)),
+                service_count=correlated(func.count(Transaction.id)),
+                last_service_date=correlated(func.max(iso_date))
+            )
+
+            if supplier_ids is not None:
+                supplier_ids = list(supplier_ids)
+                if not supplier_ids:
+                    return True
+                stmt = stmt.where(Supplier.id.in_(supplier_ids))
+
+            session.execute(stmt.execution_options(synchronize_session=False))
+            session.commit()
+
+            self.logger.info(
+                f"SupplierService: Statistiche ricalcolate per "
+                f"{len(supplier_ids) if supplier_ids is not None else 'tutti i'} fornitori"
+            )
+            return True
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"SupplierService: Errore ricalcolo statistiche: {e}")
+            return False
+        finally:
+            self.db.close_session(session)
+
     def delete(self, supplier_id):
         """Elimina un fornitore e tutti i dati associati"""
         session = self.db.get_session()
@@ -0,0 +1,457 @@
+import importlib.util
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import chain
+from xml.etree import ElementTree
+
+from sqlalchemy import text as sql_text, or_, select, delete
+
+from database.models import Document, DocumentText, Transaction
+from database.connection import DatabaseConnection
+
+
+MONTHS_IT = [
+    'gennaio', 'febbraio', 'marzo', 'aprile', 'maggio', 'giugno',
+    'luglio', 'agosto', 'settembre', 'ottobre', 'novembre', 'dicembre'
+]
+
+# Testo massimo conservato per documento (le scansioni possono essere enormi)
+MAX_TEXT_CHARS = 200_000
+
+# Estrattore PDF facoltativo: senza pypdf i PDF sono indicizzati solo per
+# parole chiave (nessun processo avviato) e ritentati quando viene installato
+PDF_SUPPORT = importlib.util.find_spec("pypdf") is not None
+PDF_SKIPPED = "pypdf non installato"
+
+_WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS document_texts_fts USING fts5(
+        keywords, text,
+        content='document_texts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS document_texts_ai AFTER INSERT ON document_texts BEGIN
+        INSERT INTO document_texts_fts(rowid, keywords, text) VALUES (new.id, new.keywords, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS document_texts_ad AFTER DELETE ON document_texts BEGIN
+        INSERT INTO document_texts_fts(document_texts_fts, rowid, keywords, text)
+        VALUES ('delete', old.id, old.keywords, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS document_texts_au AFTER UPDATE ON document_texts BEGIN
+        INSERT INTO document_texts_fts(document_texts_fts, rowid, keywords, text)
+        VALUES ('delete', old.id, old.keywords, old.text);
+        INSERT INTO document_texts_fts(rowid, keywords, text) VALUES (new.id, new.keywords, new.text);
+    END"""
+]
+
+
+def extract_text(path):
+    """
+    Estrae il testo da un file (eseguita nei processi del pool)
+
+    Returns:
+        (testo, errore) - errore è None se l'estrazione è riuscita
+    """
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == '.txt':
+            with open(path, 'rb') as f:
+                raw = f.read(MAX_TEXT_CHARS * 4)
+            try:
+                content = raw.decode('utf-8')
+            except UnicodeDecodeError:
+                content = raw.decode('latin-1')
+
+        elif ext == '.pdf':
+            try:
+                from pypdf import PdfReader
+            except ImportError:
+                return "", PDF_SKIPPED
+            reader = PdfReader(path)
+            parts = []
+            length = 0
+            for page in reader.pages:
+                page_text = page.extract_text() or ""
+                parts.append(page_text)
+                length += len(page_text)
+                if length >= MAX_TEXT_CHARS:
+                    break
+            content = "\n".join(parts)
+
+        elif ext == '.docx':
+            with zipfile.ZipFile(path) as archive:
+                root = ElementTree.fromstring(archive.read('word/document.xml'))
+            paragraphs = []
+            for paragraph in root.iter(f'{_WORD_NAMESPACE}p'):
+                paragraphs.append(''.join(node.text or '' for node in paragraph.iter(f'{_WORD_NAMESPACE}t')))
+            content = "\n".join(paragraphs)
+
+        elif ext == '.xlsx':
+            from openpyxl import load_workbook
+            workbook = load_workbook(path, read_only=True, data_only=True)
+            try:
+                cells = []
+                for sheet in workbook.worksheets:
+                    for row in sheet.iter_rows(values_only=True):
+                        cells.extend(str(value) for value in row if value is not None)
+            finally:
+                workbook.close()
+            content = " ".join(cells)
+
+        else:
+            return "", None  # Formato senza testo (immagini, doc/xls binari)
+
+        return content[:MAX_TEXT_CHARS], None
+
+    except Exception as e:
+        return "", f"{type(e).__name__}: {e}"[:500]
+
+
+def build_keywords(name, service, provider, date_str, period):
+    """Metadati ricercabili: nome file, servizio, fornitore, mese e anno in parole"""
+    words = [os.path.splitext(name or "")[0].replace('_', ' '), service or "", provider or ""]
+
+    if date_str and date_str.count('/') == 2:
+        _, month, year = date_str.split('/')
+        if month.isdigit() and 1 <= int(month) <= 12:
+            words.extend([MONTHS_IT[int(month) - 1], year])
+    elif period and '-Q' in period:
+        year, quarter = period.split('-Q')
+        first = (int(quarter) - 1) * 3
+        words.extend(MONTHS_IT[first:first + 3] + [year])
+
+    return " ".join(w for w in words if w)
+
+
+class TextIndexService:
+    """
+    Estrazione del testo dei documenti e ricerca full-text
+
+    L'estrazione gira in un pool di processi (il parsing dei PDF è CPU bound)
+    ed è incrementale: vengono elaborati solo i documenti senza testo o con
+    content_hash cambiato. Su SQLite l'indice è una tabella FTS5 con
+    contenuto esterno, aggiornata da trigger su document_texts.
+    """
+
+    MAX_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+    # Righe scritte per commit durante la sincronizzazione
+    COMMIT_BATCH = 100
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.db = DatabaseConnection()
+        self.fts_enabled = False
+        self._sync_lock = threading.Lock()
+        self._thread = None
+        self._rerun = False
+        self._cancel = threading.Event()
+
+    def ensure_schema(self):
+        """Crea tabella FTS5 e trigger (solo SQLite); ricostruisce l'indice se nuova"""
+        session = self.db.get_session()
+        try:
+            if session.get_bind().dialect.name != 'sqlite':
+                self.fts_enabled = False
+                return False
+
+            exists = session.execute(sql_text(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='document_texts_fts'"
+            )).first() is not None
+
+            for statement in FTS_DDL:
+                session.execute(sql_text(statement))
+
+            if not exists:
+                session.execute(sql_text(
+                    "INSERT INTO document_texts_fts(document_texts_fts) VALUES ('rebuild')"
+                ))
+
+            session.commit()
+            self.fts_enabled = True
+            return True
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"TextIndexService: FTS5 non disponibile, ricerca semplice: {e}")
+            self.fts_enabled = False
+            return False
+        finally:
+            self.db.close_session(session)
+
+    # ------------------------------------------------------------------
+    # Indicizzazione
+    # ------------------------------------------------------------------
+
+    def schedule(self):
+        """Avvia una sincronizzazione in background (una sola alla volta)"""
+        with self._sync_lock:
+            if self._thread and self._thread.is_alive():
+                self._rerun = True
+                return
+            self._cancel.clear()
+            self._thread = threading.Thread(target=self._background_sync, name="TextIndex", daemon=True)
+            self._thread.start()
+
+    def cancel(self, timeout=None):
+        """
+        Interrompe la sincronizzazione in corso (ripristino, VACUUM) e ne
+        attende la fine: il testo già scritto resta, il resto viene ripreso
+        dalla sincronizzazione successiva
+
+        Returns:
+            True se una sincronizzazione era in corso
+        """
+        with self._sync_lock:
+            thread = self._thread
+            running = bool(thread and thread.is_alive())
+            if running:
+                self._rerun = False
+                self._cancel.set()
+        if running:
+            thread.join(timeout)
+        return running
+
+    def _background_sync(self):
+        while True:
+            self.sync()
+            with self._sync_lock:
+                if not self._rerun:
+                    return
+                # Richiesta arrivata dopo un'eventuale interruzione: vale di nuovo
+                self._rerun = False
+                self._cancel.clear()
+
+    def sync(self):
+        """
+        Allinea il testo estratto ai documenti indicizzati
+
+        Nessuna sessione resta aperta durante l'estrazione (può durare
+        minuti): i documenti da elaborare sono letti prima, i risultati scritti
+        dopo in sessioni brevi da COMMIT_BATCH righe, saltando i documenti
+        eliminati o cambiati nel frattempo. cancel() interrompe tra un blocco
+        e l'altro.
+
+        Returns:
+            dict: {'extracted': int, 'failed': int, 'skipped': int, 'removed': int}
+        """
+        result = {'extracted': 0, 'failed': 0, 'skipped': 0, 'removed': 0}
+
+        session = self.db.get_session()
+        try:
+            # Testi di documenti non più esistenti (le delete su documents sono set-based)
+            removed = session.execute(delete(DocumentText.__table__).where(
+                DocumentText.__table__.c.document_id.not_in(select(Document.__table__.c.id))
+            ))
+            result['removed'] = removed.rowcount
+            session.commit()
+
+            stale = [
+                DocumentText.id.is_(None),
+                DocumentText.content_hash.is_(None),
+                DocumentText.content_hash != Document.content_hash
+            ]
+            if PDF_SUPPORT:
+                stale.append(DocumentText.error == PDF_SKIPPED)  # PDF saltati finché mancava pypdf
+
+            pending = session.query(
+                Document.id, Document.path, Document.content_hash, Document.name,
+                Document.service, Document.period, Transaction.provider, Transaction.date
+            ).outerjoin(
+                Transaction, Document.transaction_id == Transaction.id
+            ).outerjoin(
+                DocumentText, DocumentText.document_id == Document.id
+            ).filter(or_(*stale)).all()
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"TextIndexService: Errore lettura documenti da indicizzare: {e}")
+            return result
+        finally:
+            self.db.close_session(session)
+
+        if not pending:
+            return result
+
+        # Senza estrattore i PDF non passano dal pool: solo parole chiave
+        skipped = [] if PDF_SUPPORT else [row for row in pending if row[1].lower().endswith('.pdf')]
+        to_extract = [row for row in pending if not row[1].lower().endswith('.pdf')] if skipped else pending
+
+        pool = None
+        cancelled = False
+        try:
+            extracted = []
+            if to_extract:
+                # spawn: il fork di un processo Qt con più thread può bloccarsi
+                pool = ProcessPoolExecutor(max_workers=self.MAX_WORKERS,
+                                           mp_context=multiprocessing.get_context("spawn"))
+                extracted = pool.map(extract_text, [row[1] for row in to_extract], chunksize=8)
+
+            batch = []
+            outcomes = chain(((row, ("", PDF_SKIPPED)) for row in skipped), zip(to_extract, extracted))
+            for outcome in outcomes:
+                if self._cancel.is_set():
+                    cancelled = True
+                    break
+                batch.append(outcome)
+                if len(batch) >= self.COMMIT_BATCH:
+                    self._write_batch(batch, result)
+                    batch = []
+            if batch and not cancelled:
+                self._write_batch(batch, result)
+
+            self.logger.info(
+                f"TextIndexService: {result['extracted']} documenti indicizzati, "
+                f"{result['failed']} non leggibili, {result['skipped']} PDF senza estrattore, "
+                f"{result['removed']} rimossi" + (" (interrotta)" if cancelled else "")
+            )
+
+        except Exception as e:
+            self.logger.error(f"TextIndexService: Errore indicizzazione testo: {e}")
+        finally:
+            if pool is not None:
+                # Interrotta: i processi finiscono il blocco in corso senza farsi attendere
+                pool.shutdown(wait=not cancelled, cancel_futures=True)
+
+        return result
+
+    def _write_batch(self, batch, result):
+        """Scrive in una sessione breve il testo estratto di un blocco di documenti"""
+        doc_ids = [row[0] for row, _ in batch]
+
+        session = self.db.get_session()
+        try:
+            # Documenti ancora presenti con lo stesso contenuto letto per l'estrazione
+            current = dict(session.query(Document.id, Document.content_hash).filter(Document.id.in_(doc_ids)).all())
+            text_ids = dict(session.query(DocumentText.document_id, DocumentText.id).filter(
+                DocumentText.document_id.in_(doc_ids)
+            ).all())
+
+            for row, (content, error) in batch:
+                doc_id, _, content_hash, name, service, period, provider, date_str = row
+                if doc_id not in current or current[doc_id] != content_hash:
+                    continue  # Eliminato o modificato: lo riprende la prossima sincronizzazione
+
+                values = {
+                    'content_hash': content_hash,
+                    'keywords': build_keywords(name, service, provider, date_str, period),
+                    'text': content,
+                    'error': error,
+                    'extracted_at': datetime.utcnow()
+                }
+                if doc_id in text_ids:
+                    session.query(DocumentText).filter(DocumentText.id == text_ids[doc_id]).update(values)
+                else:
+                    session.add(DocumentText(document_id=doc_id, **values))
+
+                if error == PDF_SKIPPED:
+                    result['skipped'] += 1
+                else:
+                    result['failed' if error else 'extracted'] += 1
+
+            session.commit()
+
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self.db.close_session(session)
+
+    # ------------------------------------------------------------------
+    # Ricerca
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _tokens(query):
+        return [t.lower() for t in _TOKEN.findall(query or "")]
+
+    def search(self, query, property_id=None, limit=50):
+        """
+        Cerca documenti per contenuto e metadati ("fattura enel marzo")
+
+        Le parole sono cercate come prefisso nel testo e nei metadati; prima i
+        documenti che le contengono tutte, altrimenti quelli che ne contengono almeno una.
+
+        Returns:
+            Lista di dict: {'document_id', 'transaction_id', 'property_id',
+            'name', 'path', 'content_hash', 'snippet'} ordinata per rilevanza
+        """
+        tokens = self._tokens(query)
+        if not tokens:
+            return []
+
+        session = self.db.get_session()
+        try:
+            if self.fts_enabled:
+                rows = self._fts_search(session, " ".join(f'"{token}"*' for token in tokens), property_id, limit)
+                if not rows and len(tokens) > 1:
+                    # Nessun documento con tutte le parole: basta una, i più pertinenti prima
+                    rows = self._fts_search(session, " OR ".join(f'"{token}"*' for token in tokens), property_id, limit)
+            else:
+                # Ricerca semplice (database senza FTS5)
+                query_rows = session.query(
+                    Document.id, Document.transaction_id, Document.property_id, Document.name,
+                    Document.path, Document.content_hash, DocumentText.keywords
+                ).join(DocumentText, DocumentText.document_id == Document.id)
+                for token in tokens:
+                    pattern = f"%{token}%"
+                    query_rows = query_rows.filter(or_(
+                        DocumentText.keywords.ilike(pattern), DocumentText.text.ilike(pattern)
+                    ))
+                if property_id:
+                    query_rows = query_rows.filter(Document.property_id == property_id)
+                rows = query_rows.limit(limit).all()
+
+            return [
+                {
+                    'document_id': row[0],
+                    'transaction_id': row[1],
+                    'property_id': row[2],
+                    'name': row[3],
+                    'path': row[4],
+                    'content_hash': row[5],
+                    'snippet': row[6] or ""
+                }
+                for row in rows
+            ]
+
+        except Exception as e:
+            self.logger.error(f"TextIndexService: Errore ricerca: {e}")
+            return []
+        finally:
+            self.db.close_session(session)
+
+    def _fts_search(self, session, match, property_id, limit):
+        sql = """
+            SELECT d.id, d.transaction_id, d.property_id, d.name, d.path, d.content_hash,
+                   snippet(document_texts_fts, 1, '[', ']', '…', 12) AS snippet
+            FROM document_texts_fts
+            JOIN document_texts dt ON dt.id = document_texts_fts.rowid
+            JOIN documents d ON d.id = dt.document_id
+            WHERE document_texts_fts MATCH :match
+        """
+        params = {'match': match, 'limit': limit}
+        if property_id:
+            sql += " AND d.property_id = :property_id"
+            params['property_id'] = property_id
+        sql += " ORDER BY bm25(document_texts_fts, 5.0, 1.0) LIMIT :limit"
+        return session.execute(sql_text(sql), params).all()
+
+
+# Istanza globale dell'indicizzatore
+_text_index = None
+
+
+def get_text_index(logger=None):
+    """Ottiene l'istanza globale del TextIndexService"""
+    global _text_index
+    if _text_index is None:
+        _text_index = TextIndexService(logger)
+    return _text_index
@@ -0,0 +1,248 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, Signal, QBuffer, QByteArray, QIODevice, QSize, Qt
+from PySide6.QtGui import QImage, QImageReader
+
+try:
+    from PySide6.QtPdf import QPdfDocument
+except ImportError:  # QtPdf non presente in alcune build di PySide6
+    QPdfDocument = None
+
+from services.archive_service import get_document_archiver
+from services.document_service import get_docs_dir
+
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp'}
+
+
+class ThumbnailCache:
+    """
+    Cache su disco delle miniature PNG con eviction LRU entro un budget in byte
+
+    Chiave = hash del contenuto + lato della miniatura. L'ordine LRU è tenuto
+    in memoria e ricostruito all'avvio dall'mtime dei file (aggiornato ad ogni
+    accesso), così sopravvive ai riavvii.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()   # key -> dimensione file (meno recente per primo)
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def _load(self):
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".png"):
+                    continue
+                file_stat = os.stat(os.path.join(root, name))
+                found.append((file_stat.st_mtime, name[:-4], file_stat.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.total_bytes += size
+
+        self._evict()
+
+    def get(self, key):
+        """PNG in cache (bytes) o None; segna la voce come usata di recente"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            with self._lock:
+                self.total_bytes -= self._entries.pop(key, 0)
+            return None
+
+    def put(self, key, data):
+        """Salva una miniatura (scrittura atomica) e applica il budget"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".thumb-")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        """Rimuove le voci meno recenti finché il totale rientra nel budget"""
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+class ThumbnailService(QObject):
+    """
+    Genera miniature della prima pagina (PDF) e delle immagini in un pool di thread
+
+    Il rendering produce QImage/PNG fuori dal thread GUI; il risultato arriva
+    alla UI tramite il segnale thumbnail_ready (connessione in coda).
+    """
+
+    # key, immagine (QImage nullo se il formato non è supportato)
+    thumbnail_ready = Signal(str, QImage)
+
+    DEFAULT_SIZE = 64
+    DEFAULT_BUDGET_MB = 64
+    MAX_WORKERS = 2
+
+    def __init__(self, logger, max_bytes=None, cache_dir=None):
+        super().__init__()
+        self.logger = logger
+        self.cache = ThumbnailCache(
+            cache_dir or os.path.join(get_docs_dir(), ".thumbs"),
+            max_bytes or self.DEFAULT_BUDGET_MB * 1024 * 1024
+        )
+        self._pool = ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix="Thumbnail")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(path, content_hash=None, size=DEFAULT_SIZE):
+        """
+        Chiave di cache: hash del contenuto + lato; per i file non indicizzati
+        (es. documenti fornitore) si usa path + dimensione + mtime del file
+        """
+        if not content_hash:
+            try:
+                file_stat = os.stat(path)
+                identity = f"{os.path.abspath(path)}|{file_stat.st_size}|{file_stat.st_mtime_ns}"
+            except OSError:
+                identity = os.path.abspath(path)
+            content_hash = hashlib.sha256(identity.encode('utf-8')).hexdigest()
+        return f"{content_hash}_{size}"
+
+    @staticmethod
+    def is_supported(path):
+        ext = os.path.splitext(path)[1].lower()
+        return ext in IMAGE_EXTENSIONS or (ext == '.pdf' and QPdfDocument is not None)
+
+    def request(self, path, content_hash=None, size=DEFAULT_SIZE):
+        """
+        Richiede la miniatura di un file
+
+        Returns:
+            (key, QImage) se già in cache, altrimenti (key, None) e il risultato
+            arriverà con thumbnail_ready
+        """
+        key = self.make_key(path, content_hash, size)
+
+        data = self.cache.get(key)
+        if data is not None:
+            return key, QImage.fromData(data, "PNG")
+
+        with self._lock:
+            if key in self._pending:
+                return key, None
+            self._pending.add(key)
+
+        self._pool.submit(self._work, key, path, size)
+        return key, None
+
+    def _work(self, key, path, size):
+        image = QImage()
+        try:
+            if not os.path.exists(path):
+                path = get_document_archiver(self.logger).resolve_path(path)
+            image = self.render(path, size)
+            if not image.isNull():
+                self.cache.put(key, self._to_png(image))
+        except Exception as e:
+            self.logger.warning(f"ThumbnailService: Miniatura non generata per {path}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+            self.thumbnail_ready.emit(key, image)
+
+    @staticmethod
+    def render(path, size):
+        """Miniatura della prima pagina/immagine nel lato size (QImage nullo se non supportato)"""
+        ext = os.path.splitext(path)[1].lower()
+        target = QSize(size, size)
+
+        if ext == '.pdf':
+            if QPdfDocument is None:
+                return QImage()
+            document = QPdfDocument(None)
+            try:
+                if document.load(path) != QPdfDocument.Error.None_ or document.pageCount() == 0:
+                    return QImage()
+                page_size = document.pagePointSize(0).toSize().scaled(target, Qt.AspectRatioMode.KeepAspectRatio)
+                return document.render(0, page_size)
+            finally:
+                document.close()
+
+        if ext in IMAGE_EXTENSIONS:
+            # Decodifica direttamente alla dimensione ridotta (JPEG: scaling nel decoder)
+            reader = QImageReader(path)
+            reader.setAutoTransform(True)
+            original = reader.size()
+            if original.isValid():
+                reader.setScaledSize(original.scaled(target, Qt.AspectRatioMode.KeepAspectRatio))
+            return reader.read()
+
+        return QImage()
+
+    @staticmethod
+    def _to_png(image):
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        image.save(buffer, "PNG")
+        buffer.close()
+        return bytes(data)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Istanza globale del servizio miniature
+_thumbnail_service = None
+
+
+def get_thumbnail_service(logger=None, max_bytes=None):
+    """Ottiene l'istanza globale del ThumbnailService (creata al primo uso)"""
+    global _thumbnail_service
+    if _thumbnail_service is None:
+        _thumbnail_service = ThumbnailService(logger, max_bytes)
+    return _thumbnail_service
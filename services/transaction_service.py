@@ -1,6 +1,9 @@
-from database.models import Transaction
+from database.models import Transaction, Document
 from database.connection import DatabaseConnection
-from sqlalchemy import and_, func, cast, Integer
+from services.autocomplete_service import get_autocomplete_index
+from services.categorizer_service import get_categorizer
+from sqlalchemy import and_, func, cast, insert, Integer
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 
 
@@ -55,6 +58,84 @@ class TransactionService:
         finally:
             self.db.close_session(session)
 
+    def count(self, property_id=None, start_date=None, end_date=None):
+        """Numero di transazioni con gli stessi filtri di get_all"""
+        session = self.db.get_session()
+        try:
+            query = session.query(func.count(Transaction.id))
+
+            if property_id:
+                query = query.filter(Transaction.property_id == property_id)
+
+            if start_date and end_date:
+                parsed_date = self._parse_date_for_filter(Transaction.date)
+                query = query.filter(
+                    and_(
+                        parsed_date >= start_date,
+                        parsed_date <= end_date
+                    )
+                )
+
+            return query.scalar() or 0
+
+        except Exception as e:
+            self.logger.error(f"TransactionService: Errore conteggio transazioni: {e}")
+            return 0
+        finally:
+            self.db.close_session(session)
+
+    def iter_all(self, property_id=None, start_date=None, end_date=None, batch_size=1000,
+                 order_by_property=False, property_ids=None):
+        """
+        Come get_all ma a flusso: restituisce un generatore di dizionari
+        letti a blocchi di batch_size righe, senza caricare tutto in memoria.
+        La sessione resta aperta finché il generatore non è esaurito o chiuso.
+        Con order_by_property le righe arrivano raggruppate per proprietà;
+        property_ids limita la lettura a più proprietà in una sola query.
+        """
+        session = self.db.get_session()
+        try:
+            query = session.query(
+                Transaction.id,
+                Transaction.property_id,
+                Transaction.supplier_id,
+                Transaction.date,
+                Transaction.type,
+                Transaction.amount,
+                Transaction.provider,
+                Transaction.service
+            )
+
+            if property_id:
+                query = query.filter(Transaction.property_id == property_id)
+            if property_ids is not None:
+                query = query.filter(Transaction.property_id.in_(property_ids))
+
+            if start_date and end_date:
+                parsed_date = self._parse_date_for_filter(Transaction.date)
+                query = query.filter(
+                    and_(
+                        parsed_date >= start_date,
+                        parsed_date <= end_date
+                    )
+                )
+
+            # Stesso ordinamento di get_all (entro ogni proprietà se raggruppate)
+            if order_by_property:
+                query = query.order_by(Transaction.property_id, Transaction.date.desc())
+            else:
+                query = query.order_by(Transaction.date.desc())
+            query = query.yield_per(batch_size)
+
+            for row in query:
+                yield row._asdict()
+
+        except Exception as e:
+            self.logger.error(f"TransactionService: Errore lettura transazioni a flusso: {e}")
+            raise
+        finally:
+            self.db.close_session(session)
+
     def get_monthly_summary(self, year, property_id=None):
         """Recupera il riepilogo mensile per un anno"""
         session = self.db.get_session()
@@ -139,6 +220,10 @@ class TransactionService:
                     setattr(transaction, field, value)
 
             session.commit()
+
+            if kwargs.get('provider') or kwargs.get('service'):
+                get_autocomplete_index().add_transaction(kwargs.get('provider'), kwargs.get('service'))
+
             self.logger.info(f"TransactionService: Transazione aggiornata: {transaction_id}")
             return True
 
@@ -210,8 +295,31 @@ class TransactionService:
         finally:
             self.db.close_session(session)
 
+    @staticmethod
+    def _attach_document(session, transaction, document):
+        """
+        Collega il documento alla transazione; se il watcher ha già indicizzato
+        il file (riga senza transazione) la riga esistente viene completata
+        """
+        session.flush()  # id della transazione: nel savepoint entra solo il documento
+
+        existing = session.query(Document).filter(Document.path == document['path']).first()
+        if existing is None:
+            try:
+                with session.begin_nested():
+                    session.add(Document(transaction_id=transaction.id, **document))
+                return
+            except IntegrityError:
+                # Il watcher ha inserito la stessa riga nel frattempo: si completa quella
+                existing = session.query(Document).filter(Document.path == document['path']).one()
+
+        for field, value in document.items():
+            if value is not None:
+                setattr(existing, field, value)
+        existing.transaction_id = transaction.id
+
     def create_with_supplier(self, property_id, date, trans_type, amount,
-                             provider, service, supplier_id=None):
+                             provider, service, supplier_id=None, document=None):
         """
         Crea una nuova transazione con collegamento al fornitore
 
@@ -223,6 +331,8 @@ class TransactionService:
             provider: Nome fornitore
             service: Servizio/categoria
             supplier_id: ID fornitore (opzionale)
+            document: Campi di indice del file allegato (vedi
+                      DocumentService.describe_file), scritti nella stessa transazione DB
 
         Returns:
             ID transazione creata o None
@@ -239,10 +349,18 @@ class TransactionService:
                 service=service
             )
             session.add(new_transaction)
+
+            if document:
+                self._attach_document(session, new_transaction, document)
+
             session.commit()
 
             transaction_id = new_transaction.id
 
+            # Aggiorna indice autocompletamento e categorizzatore (nessuna query)
+            get_autocomplete_index().add_transaction(provider, service)
+            get_categorizer().learn(provider, service, supplier_id)
+
             # AGGIORNA STATISTICHE FORNITORE se collegato
             if supplier_id and trans_type == 'Uscita':
                 # Converti data da dd/MM/yyyy a yyyy-MM-dd
@@ -271,13 +389,120 @@ class TransactionService:
         finally:
             self.db.close_session(session)
 
+    def create_batch(self, items):
+        """
+        Crea più transazioni (con eventuale documento allegato) in un solo commit
+
+        Args:
+            items: Lista di dict con le chiavi di create_with_supplier
+                   (property_id, date, trans_type, amount, provider, service,
+                   supplier_id opzionale, document opzionale)
+
+        Returns:
+            Lista degli ID creati (stesso ordine di items) o None se il commit fallisce
+        """
+        if not items:
+            return []
+
+        session = self.db.get_session()
+        try:
+            transactions = []
+            for item in items:
+                new_transaction = Transaction(
+                    property_id=item['property_id'],
+                    supplier_id=item.get('supplier_id'),
+                    date=item['date'],
+                    type=item['trans_type'],
+                    amount=item['amount'],
+                    provider=item['provider'],
+                    service=item['service']
+                )
+                session.add(new_transaction)
+                if item.get('document'):
+                    self._attach_document(session, new_transaction, item['document'])
+                transactions.append(new_transaction)
+
+            session.commit()
+            transaction_ids = [t.id for t in transactions]
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"TransactionService: Errore creazione transazioni in blocco: {e}")
+            return None
+        finally:
+            self.db.close_session(session)
+
+        self._after_batch(items)
+
+        self.logger.info(f"TransactionService: {len(transaction_ids)} transazioni create in blocco")
+        return transaction_ids
+
+    def insert_bulk(self, items):
+        """
+        Inserisce molte transazioni (senza documenti) con un solo INSERT
+        executemany e un solo commit: nessun oggetto ORM per riga
+
+        Args:
+            items: Lista di dict con property_id, date (dd/MM/yyyy), trans_type,
+                   amount, provider, service e supplier_id opzionale
+
+        Returns:
+            Numero di transazioni inserite o None se il commit fallisce
+        """
+        if not items:
+            return 0
+
+        session = self.db.get_session()
+        try:
+            session.execute(insert(Transaction.__table__), [
+                {
+                    'property_id': item['property_id'],
+                    'supplier_id': item.get('supplier_id'),
+                    'date': item['date'],
+                    'type': item['trans_type'],
+                    'amount': item['amount'],
+                    'provider': item['provider'],
+                    'service': item['service']
+                }
+                for item in items
+            ])
+            session.commit()
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"TransactionService: Errore inserimento in blocco: {e}")
+            return None
+        finally:
+            self.db.close_session(session)
+
+        self._after_batch(items)
+
+        self.logger.info(f"TransactionService: {len(items)} transazioni inserite in blocco")
+        return len(items)
+
+    def _after_batch(self, items):
+        """Indici in memoria e statistiche fornitori dopo una scrittura in blocco"""
+        # Aggiorna indice autocompletamento e categorizzatore (nessuna query)
+        autocomplete = get_autocomplete_index()
+        categorizer = get_categorizer()
+        for item in items:
+            autocomplete.add_transaction(item['provider'], item['service'])
+            categorizer.learn(item['provider'], item['service'], item.get('supplier_id'))
+
+        # Statistiche fornitori ricalcolate una volta sola
+        supplier_ids = {item['supplier_id'] for item in items if item.get('supplier_id')}
+        if supplier_ids:
+            from services.supplier_service import SupplierService
+            SupplierService(self.logger).recompute_stats(supplier_ids)
+
     # MODIFICA anche il metodo create esistente per supportare supplier_id:
 
-    def create(self, property_id, date, trans_type, amount, provider, service, supplier_id=None):
+    def create(self, property_id, date, trans_type, amount, provider, service, supplier_id=None,
+               document=None):
         """
         Crea una nuova transazione (versione base con supporto supplier_id)
         """
         return self.create_with_supplier(
             property_id, date, trans_type, amount,
-            provider, service, supplier_id
+            provider, service, supplier_id, document
         )
@@ -102,6 +102,10 @@ class TranslationManager:
                     "view_transactions": "📋 Visualizza transazioni",
                     "export": "Esporta",
                     "export_transactions": "Esporta transazioni",
+                    "export_history": "Storico export",
+                    "portfolio_reports": "Rendiconti portafoglio",
+                    "data_export": "Esporta dati",
+                    "import_statement": "Importa estratto conto",
                     "expenses": "Uscite",
                     "income": "Entrate",
                     "filter": "Filtra:",
@@ -118,9 +122,13 @@ class TranslationManager:
                 "settings": {
                      "title": "Impostazioni",
                     "backup_db": "Backup Database",
-                    "backup_db_desc": "Crea una copia di sicurezza completa dei tuoi dati",
+                    "backup_db_desc": "Backup a caldo, compresso e incrementale (anche automatico ogni giorno)",
+                    "verify_backups": "Verifica Backup",
+                    "verify_backups_desc": "Ricostruisce i backup e ne controlla l'integrità",
+                    "db_maintenance": "Manutenzione Database",
+                    "db_maintenance_desc": "Statistiche, compattazione e controllo integrità: storico e spazio recuperato",
                     "restore_db": "Ripristina Database",
-                    "restore_db_desc": "Ripristina i dati da un backup precedente",
+                    "restore_db_desc": "Ripristina dati e documenti da un backup, senza riavviare",
                     "language_section": "🌐 Lingua",
                     "change_language": "Cambia Lingua",
                     "change_language_desc": "Seleziona la lingua dell'applicazione",
@@ -136,6 +144,8 @@ class TranslationManager:
                     "clean_exports_desc": "Elimina automaticamente i report più vecchi di 30 giorni",
                     "clean_orphaned": "Pulisci Cartelle Orfane",
                     "clean_orphaned_desc": "Elimina cartelle documenti di proprietà non più esistenti",
+                    "archive_documents": "Archivia Trimestri Chiusi",
+                    "archive_documents_desc": "Comprime i documenti dei trimestri più vecchi in un pacchetto per anno",
                     "version": "Versione 1.0.0"
                 },
                 "months": {
@@ -255,6 +265,10 @@ class TranslationManager:
                     "view_transactions": "📋 Ver transacciones",
                     "export": "Exportar",
                     "export_transactions": "Exportar transacciones",
+                    "export_history": "Historial de exportaciones",
+                    "portfolio_reports": "Informes de cartera",
+                    "data_export": "Exportar datos",
+                    "import_statement": "Importar extracto bancario",
                     "expenses": "Gastos",
                     "income": "Ingresos",
                     "filter": "Filtrar:",
@@ -271,9 +285,13 @@ class TranslationManager:
                 "settings": {
                     "title": "Configuración",
                     "backup_db": "Copia de seguridad de la base de datos",
-                    "backup_db_desc": "Crea una copia de seguridad completa de tus datos",
+                    "backup_db_desc": "Copia en caliente, comprimida e incremental (también automática cada día)",
+                    "verify_backups": "Verificar Copias de Seguridad",
+                    "verify_backups_desc": "Reconstruye las copias y comprueba su integridad",
+                    "db_maintenance": "Mantenimiento de Base de Datos",
+                    "db_maintenance_desc": "Estadísticas, compactación y control de integridad: historial y espacio recuperado",
                     "restore_db": "Restaurar Base de Datos",
-                    "restore_db_desc": "Restaura los datos desde una copia de seguridad anterior",
+                    "restore_db_desc": "Restaura datos y documentos desde una copia, sin reiniciar",
                     "language_section": "🌐 Idioma",
                     "change_language": "Cambiar Idioma",
                     "change_language_desc": "Selecciona el idioma de la aplicación",
@@ -289,6 +307,8 @@ class TranslationManager:
                     "clean_exports_desc": "Elimina automáticamente los informes de más de 30 días",
                     "clean_orphaned": "Limpiar Carpetas Huérfanas",
                     "clean_orphaned_desc": "Elimina carpetas de documentos de propiedades que ya no existen",
+                    "archive_documents": "Archivar Trimestres Cerrados",
+                    "archive_documents_desc": "Comprime los documentos de los trimestres más antiguos en un paquete por año",
                     "version": "Versión 1.0.0"
                 },
                 "months": {
@@ -409,6 +429,10 @@ class TranslationManager:
                     "transactions": "Transactions",
                     "export": "Export",
                     "export_transactions": "Export transactions",
+                    "export_history": "Export history",
+                    "portfolio_reports": "Portfolio statements",
+                    "data_export": "Export data",
+                    "import_statement": "Import bank statement",
                     "expenses": "Expenses",
                     "income": "Income",
                     "filter": "Filter:",
@@ -425,9 +449,13 @@ class TranslationManager:
                 "settings": {
                     "title": "Settings",
                     "backup_db": "Backup Database",
-                    "backup_db_desc": "Create a complete backup of your data",
+                    "backup_db_desc": "Online, compressed, incremental backup (also automatic every day)",
+                    "verify_backups": "Verify Backups",
+                    "verify_backups_desc": "Rebuild the backups and check their integrity",
+                    "db_maintenance": "Database Maintenance",
+                    "db_maintenance_desc": "Statistics, compaction and integrity checks: history and space reclaimed",
                     "restore_db": "Restore Database",
-                    "restore_db_desc": "Restore data from a previous backup",
+                    "restore_db_desc": "Restore data and documents from a backup, without restarting",
                     "language_section": "🌐 Language",
                     "change_language": "Change Language",
                     "change_language_desc": "Select the application language",
@@ -443,6 +471,8 @@ class TranslationManager:
                     "clean_exports_desc": "Automatically delete reports older than 30 days",
                     "clean_orphaned": "Clean Orphaned Folders",
                     "clean_orphaned_desc": "Delete document folders from properties that no longer exist",
+                    "archive_documents": "Archive Closed Quarters",
+                    "archive_documents_desc": "Compress documents of older quarters into one pack per year",
                     "version": "Version 1.0.0"
                 },
                 "months": {
@@ -4,9 +4,9 @@ import os
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QListWidget, QListWidgetItem, QSizePolicy
+    QListWidget, QListWidgetItem, QSizePolicy, QSystemTrayIcon, QApplication, QProgressDialog
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QObject, Signal
 from dialogs import CustomTitleBar
 import logging
 from styles import *
@@ -17,6 +17,13 @@ from services.property_service import PropertyService
 from services.transaction_service import TransactionService
 from services.document_service import DocumentService
 from services.deadline_service import DeadlineService
+from services.reminder_service import get_reminder_scheduler
+from services.thumbnail_service import get_thumbnail_service
+from services.document_watcher import get_document_watcher
+from services.orphan_gc_service import get_orphan_gc
+from services.export_job_service import get_export_jobs
+from services.backup_service import get_backup_service
+from services.maintenance_service import get_maintenance_service
 
 from views.dashboard_view import DashboardView
 from views.properties_view import PropertiesView
@@ -28,6 +35,81 @@ from views.settings_view import SettingsView
 from views.suppliers_view import SuppliersView
 
 
+class ReminderNotifier(QObject):
+    """Porta le notifiche dello scheduler sul thread GUI e le mostra nella tray"""
+
+    notification = Signal(dict, str, int)
+
+    # Giorni di ritardo oltre i quali la notifica diventa critica
+    ESCALATION_DAYS = 7
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.tray = QSystemTrayIcon(QIcon("icons/calendar.png"), parent)
+        self.tray.setToolTip("Property Manager")
+        if QSystemTrayIcon.isSystemTrayAvailable():
+            self.tray.show()
+        # Connessione in coda: il segnale arriva dal thread dello scheduler
+        self.notification.connect(self.show_notification, Qt.ConnectionType.QueuedConnection)
+
+    def notify(self, deadline, kind, days):
+        """Callback dello scheduler (thread di lavoro)"""
+        self.notification.emit(deadline, kind, days)
+
+    def show_notification(self, deadline, kind, days):
+        title = deadline.get('title', '')
+        due = deadline.get('due_date', '')
+        recurring = " 🔁" if deadline.get('recurring') else ""
+
+        if kind == 'reminder':
+            header = f"⏰ Scadenza tra {days} giorn{'o' if days == 1 else 'i'}"
+            icon = QSystemTrayIcon.MessageIcon.Information
+        elif kind == 'due':
+            header = "📅 Scadenza oggi"
+            icon = QSystemTrayIcon.MessageIcon.Warning
+        else:
+            header = f"⚠️ Scadenza superata da {days} giorn{'o' if days == 1 else 'i'}"
+            icon = (QSystemTrayIcon.MessageIcon.Critical if days >= self.ESCALATION_DAYS
+                    else QSystemTrayIcon.MessageIcon.Warning)
+
+        self.tray.showMessage(header, f"{title}{recurring} ({due})", icon, 10000)
+
+
+class MaintenanceNotifier(QObject):
+    """Stato di attesa modale mentre la manutenzione sospende l'accesso al database (VACUUM)"""
+
+    busy = Signal(bool)
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.window = parent
+        self.dialog = None
+        # Bloccante: il database viene sospeso solo quando l'attesa è già visibile
+        self.busy.connect(self.set_busy, Qt.ConnectionType.BlockingQueuedConnection)
+
+    def notify(self, active):
+        """Callback della manutenzione (thread di lavoro)"""
+        self.busy.emit(active)
+
+    def set_busy(self, active):
+        if active:
+            self.dialog = QProgressDialog(
+                "Compattazione del database in corso...\nL'applicazione torna disponibile al termine.",
+                None, 0, 0, self.window
+            )
+            self.dialog.setWindowTitle("🛠️ Manutenzione database")
+            self.dialog.setWindowModality(Qt.ApplicationModal)
+            self.dialog.setMinimumDuration(0)
+            self.dialog.show()
+            QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+            # Disegnata subito: durante la sospensione il thread GUI può restare in attesa
+            QApplication.processEvents()
+        elif self.dialog is not None:
+            QApplication.restoreOverrideCursor()
+            self.dialog.close()
+            self.dialog = None
+
+
 class DashboardWindow(QMainWindow):
     def __init__(self, db_service, preferences_service, supplier_service, logger):
         super().__init__()
@@ -51,6 +133,12 @@ class DashboardWindow(QMainWindow):
         self.document_service = DocumentService(self.logger)
         self.deadline_service = DeadlineService(self.logger)
 
+        # Cache miniature documenti (budget da preferenze)
+        self.thumbnail_service = get_thumbnail_service(
+            self.logger,
+            self.preferences_service.get_thumbnail_cache_bytes()
+        )
+
         # Finestra principale
         self.setWindowTitle("Property Manager MVP")
         self.setGeometry(200, 200, 1200, 700)
@@ -108,6 +196,35 @@ class DashboardWindow(QMainWindow):
             self
         ))
 
+        # Promemoria scadenze (heap in memoria aggiornato dagli eventi)
+        self.reminder_notifier = ReminderNotifier(self)
+        self.reminder_scheduler = get_reminder_scheduler(
+            self.logger,
+            self.reminder_notifier.notify,
+            self.preferences_service.get_reminder_lead_days()
+        )
+        self.reminder_scheduler.start()
+
+        # Indice documenti allineato ai file aggiunti/rimossi a mano in docs/
+        self.document_watcher = get_document_watcher(self.logger)
+        self.document_watcher.start()
+
+        # Eliminazione cartelle orfane interrotta alla chiusura precedente
+        self.orphan_gc = get_orphan_gc(self.logger)
+        self.orphan_gc.resume()
+
+        # Coda export in background (segna come interrotti quelli rimasti aperti)
+        self.export_jobs = get_export_jobs(self.logger)
+
+        # Backup automatico del database quando l'ultimo è più vecchio dell'intervallo
+        self.backup_service = get_backup_service(self.logger)
+        self.backup_service.start_schedule(self.preferences_service.get_backup_interval_hours())
+
+        # ANALYZE/optimize, compattazione e controllo integrità quando l'app è inattiva
+        self.maintenance_notifier = MaintenanceNotifier(self)
+        self.maintenance_service = get_maintenance_service(self.logger)
+        self.maintenance_service.start_schedule(self.maintenance_notifier.notify)
+
         # SCHERMO INTERO DI DEFAULT
         self.showMaximized()
 
@@ -202,6 +319,7 @@ class DashboardWindow(QMainWindow):
             self.show_view(SettingsView(
                 self.property_service,
                 self.transaction_service,
+                self.document_service,
                 self.logger,
                 self
             ))
@@ -225,6 +343,25 @@ class DashboardWindow(QMainWindow):
             self.menu.setCurrentRow(index)
             self.menu_navigation(index)
 
+    def on_database_restored(self):
+        """Riallinea servizi in memoria e vista corrente dopo un ripristino a caldo"""
+        self.reminder_scheduler.stop()
+        self.reminder_scheduler.start()
+        self.document_watcher.rewatch()
+        self.menu_navigation(self.menu.currentRow())
+
+    def closeEvent(self, event):
+        """Ferma lo scheduler dei promemoria alla chiusura"""
+        self.reminder_scheduler.stop()
+        self.reminder_notifier.tray.hide()
+        self.thumbnail_service.shutdown()
+        self.document_watcher.stop()
+        self.orphan_gc.stop()
+        self.export_jobs.shutdown()
+        self.backup_service.stop()
+        self.maintenance_service.stop()
+        super().closeEvent(event)
+
     def resizeEvent(self, event):
         """Ridimensiona il menu laterale"""
         if hasattr(self, 'menu'):
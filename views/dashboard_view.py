@@ -349,7 +349,8 @@ class DashboardView(BaseView):
         next_deadline = self.deadline_service.get_next_deadline(property_id)
 
         if next_deadline:
-            self.deadline_title_label.setText(f"📌 {next_deadline['title']}")
+            icon = "🔁" if next_deadline.get('recurring') else "📌"
+            self.deadline_title_label.setText(f"{icon} {next_deadline['title']}")
 
             due_date = datetime.strptime(next_deadline['due_date'], "%Y-%m-%d")
             days_left = (due_date - datetime.now()).days
@@ -1,15 +1,19 @@
 import os
 
-from PySide6.QtCore import Qt, QSize, QUrl
+from PySide6.QtCore import Qt, QSize, QUrl, QObject, QThread, QTimer, Signal
 from PySide6.QtGui import QDesktopServices
 from PySide6.QtGui import QIcon, QColor
 from PySide6.QtWidgets import (
     QVBoxLayout, QHBoxLayout, QLabel, QComboBox,
     QPushButton, QListWidget, QListWidgetItem, QWidget,
-    QFileDialog, QDialog, QMessageBox
+    QFileDialog, QDialog, QMessageBox, QProgressDialog, QLineEdit
 )
 
-from dialogs import DocumentMetadataDialog
+from dialogs import DocumentMetadataDialog, BatchMetadataDialog, LazyThumbnailLoader
+from services.document_import_service import DocumentImportService
+from services.text_index_service import get_text_index
+from services.document_watcher import get_document_watcher
+from services.archive_service import get_document_archiver
 from styles import *
 from views.base_view import BaseView
 from translations_manager import get_translation_manager
@@ -17,6 +21,27 @@ from translations_manager import get_translation_manager
 DOCS_DIR = "docs"
 
 
+class DocumentImportWorker(QObject):
+    """Esegue l'import multiplo fuori dal thread GUI"""
+
+    progress = Signal(int, int)
+    finished = Signal(list)
+
+    def __init__(self, import_service, property_id, items):
+        super().__init__()
+        self.import_service = import_service
+        self.property_id = property_id
+        self.items = items
+
+    def run(self):
+        results = self.import_service.import_files(
+            self.property_id,
+            self.items,
+            progress=lambda done, total: self.progress.emit(done, total)
+        )
+        self.finished.emit(results)
+
+
 class DocumentsView(BaseView):
     """View per la gestione documenti"""
 
@@ -54,6 +79,13 @@ class DocumentsView(BaseView):
         add_doc_btn.clicked.connect(self.add_document)
         header_layout.addWidget(add_doc_btn)
 
+        batch_btn = QPushButton("📥 Import multiplo")
+        batch_btn.setStyleSheet(default_aggiungi_button)
+        batch_btn.setFixedHeight(36)
+        batch_btn.setToolTip("Importa più documenti insieme (metadati da tabella, CSV o file .json)")
+        batch_btn.clicked.connect(self.batch_import)
+        header_layout.addWidget(batch_btn)
+
         main_layout.addLayout(header_layout)
 
         # Combo proprietà
@@ -65,6 +97,30 @@ class DocumentsView(BaseView):
         self.property_selector.currentIndexChanged.connect(self.change_property)
         main_layout.addWidget(self.property_selector)
 
+        # Ricerca nel contenuto dei documenti (indice full-text)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("🔍 Cerca nei documenti (es. fattura enel marzo)")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.setStyleSheet(f"""
+            QLineEdit {{
+                background-color: {COLORE_WIDGET_2};
+                color: white;
+                border: 2px solid {COLORE_SECONDARIO};
+                border-radius: 8px;
+                padding: 8px 12px;
+                font-size: 14px;
+            }}
+            QLineEdit:focus {{
+                border: 2px solid #007BFF;
+            }}
+        """)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.load_documents)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        main_layout.addWidget(self.search_input)
+
         # Lista documenti
         self.docs_list = QListWidget()
         self.docs_list.setStyleSheet(f"""
@@ -79,8 +135,20 @@ class DocumentsView(BaseView):
             }}
         """)
         main_layout.addWidget(self.docs_list)
+
+        # Miniature caricate in background solo per le righe visibili
+        self.thumbnail_loader = LazyThumbnailLoader(self.docs_list)
+        self.current_sub_directory = None
         self.load_documents()
 
+        # File aggiunti/rimossi a mano nella cartella documenti
+        get_document_watcher(self.logger).index_changed.connect(self.on_index_changed)
+
+    def on_index_changed(self, property_id):
+        """Ricarica la lista se il watcher ha aggiornato l'indice della proprietà mostrata"""
+        if self.selected_property and property_id in (0, self.selected_property["id"]):
+            self.load_documents(self.current_sub_directory)
+
     def change_property(self, index):
         """Cambia proprietà selezionata"""
         if index >= 0 and index < len(self.proprieta):
@@ -89,14 +157,26 @@ class DocumentsView(BaseView):
 
     def load_documents(self, sub_directory=None):
         """Carica i documenti della proprietà usando l'ID"""
+        self.current_sub_directory = sub_directory
         self.docs_list.clear()
+        self.thumbnail_loader.reset()
         if not self.selected_property:
             return
 
-        documents = self.document_service.list_documents(
-            self.selected_property["id"],
-            sub_directory
-        )
+        query = self.search_input.text().strip()
+        if query:
+            # Risultati della ricerca, ordinati per rilevanza
+            documents = [
+                {"name": r["name"], "path": r["path"], "is_folder": False,
+                 "content_hash": r["content_hash"], "snippet": r["snippet"]}
+                for r in get_text_index(self.logger).search(query, self.selected_property["id"])
+            ]
+            sub_directory = None
+        else:
+            documents = self.document_service.list_documents(
+                self.selected_property["id"],
+                sub_directory
+            )
 
         # Aggiungi navigazione indietro se in sottocartella
         if sub_directory:
@@ -110,8 +190,16 @@ class DocumentsView(BaseView):
             layout.setContentsMargins(10, 0, 10, 0)
             layout.setSpacing(10)
 
+            # Segnaposto miniatura (sostituito quando la riga diventa visibile)
+            thumb_label = QLabel("📁" if doc["is_folder"] else "📄")
+            thumb_label.setFixedSize(28, 28)
+            thumb_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            layout.addWidget(thumb_label)
+
             label = QLabel(doc["name"])
             label.setStyleSheet("color: white; font-size: 14px;")
+            if doc.get("snippet"):
+                label.setToolTip(doc["snippet"])
             layout.addWidget(label, stretch=1)
 
             if doc["is_folder"]:
@@ -179,6 +267,11 @@ class DocumentsView(BaseView):
             self.docs_list.setItemWidget(item, row_widget)
             row_widget.setStyleSheet(f"background-color: {bg_color.name()};border-radius: 5px;")
 
+            if not doc["is_folder"]:
+                self.thumbnail_loader.register(item, thumb_label, doc["path"], doc.get("content_hash"))
+
+        self.thumbnail_loader.schedule()
+
     def add_document(self):
         """Aggiunge nuovi documenti CON VALIDAZIONE"""
         from validation_utils import parse_decimal, ValidationError
@@ -192,6 +285,24 @@ class DocumentsView(BaseView):
 
         for path in selected_files:
             filename = os.path.basename(path)
+
+            # Contenuto già archiviato? (confronto per dimensione, hash solo se serve)
+            reuse_hash = None
+            duplicate = self.document_service.find_duplicate(path)
+            if duplicate:
+                reply = QMessageBox.question(
+                    self,
+                    "📄 Documento già archiviato",
+                    f"Il contenuto di '{filename}' è già presente in archivio:\n\n"
+                    f"{duplicate['path']}\n\n"
+                    f"Riutilizzare il file archiviato (nessuna nuova copia)?\n"
+                    f"Scegli 'No' per saltare questo file.",
+                    QMessageBox.Yes | QMessageBox.No
+                )
+                if reply != QMessageBox.Yes:
+                    continue
+                reuse_hash = duplicate['content_hash']
+
             meta_dialog = DocumentMetadataDialog(filename, self)
             if meta_dialog.exec() != QDialog.Accepted:
                 continue
@@ -202,33 +313,50 @@ class DocumentsView(BaseView):
                 # converti importo
                 importo_float = parse_decimal(metadata["importo"], "Importo")
 
-                # Salva transazione
+                # Copia il file, poi transazione e indice documento in un'unica scrittura
+                property_id = self.selected_property["id"]
+                stored = self.document_service.store_document(
+                    path,
+                    property_id,
+                    metadata=metadata,
+                    content_hash=reuse_hash
+                )
+
+                if not stored:
+                    raise IOError("Impossibile copiare il file nella cartella documenti")
+
+                dest_path = stored['path']
+                document = self.document_service.describe_file(
+                    dest_path,
+                    property_id,
+                    service=metadata['service'],
+                    period=self.document_service.period_from_date(metadata["data_fattura"]),
+                    content_hash=stored['content_hash']
+                )
+
                 trans_id = self.transaction_service.create(
-                    property_id=self.selected_property["id"],
+                    property_id=property_id,
                     date=metadata["data_fattura"],
                     trans_type=metadata["tipo"],
                     amount=importo_float,
                     provider=metadata['provider'],
-                    service=metadata['service']
+                    service=metadata['service'],
+                    document=document
                 )
 
                 if trans_id:
-                    dest_path = self.document_service.save_document(
-                        path,
-                        self.selected_property["id"],
-                        metadata=metadata
+                    self.logger.info(f"Documento salvato: {dest_path}")
+                    get_text_index(self.logger).schedule()
+                    QMessageBox.information(
+                        self,
+                        "✅ Successo",
+                        f"Documento salvato correttamente!\n\n"
+                        f"📄 {os.path.basename(dest_path)}\n"
+                        f"💰 {importo_float:,.2f}€"
                     )
-
-                    if dest_path:
-                        self.logger.info(f"Documento salvato: {dest_path}")
-                        QMessageBox.information(
-                            self,
-                            "✅ Successo",
-                            f"Documento salvato correttamente!\n\n"
-                            f"📄 {os.path.basename(dest_path)}\n"
-                            f"💰 {importo_float:,.2f}€"
-                        )
                 else:
+                    # Nessuna riga scritta: rimuovi il file appena copiato
+                    self.document_service.delete_document(dest_path)
                     self.logger.error(f"Impossibile salvare la transazione nel database")
                     QMessageBox.warning(
                         self,
@@ -255,9 +383,100 @@ class DocumentsView(BaseView):
 
         self.load_documents()
 
+    def batch_import(self):
+        """Import multiplo: metadati raccolti in anticipo, copia parallela, un solo commit"""
+        if not self.selected_property:
+            return
+
+        paths, _ = QFileDialog.getOpenFileNames(self, "Seleziona i documenti da importare")
+        if not paths:
+            return
+
+        import_service = DocumentImportService(self.logger)
+
+        csv_path = None
+        reply = QMessageBox.question(
+            self,
+            "📥 Import multiplo",
+            "Vuoi caricare i metadati da un file CSV?\n\n"
+            "Colonne: file; data; tipo; importo; fornitore; servizio\n"
+            "Senza CSV vengono usati i file .json accanto ai documenti, se presenti.",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            csv_path, _ = QFileDialog.getOpenFileName(self, "File CSV metadati", "", "CSV (*.csv)")
+
+        try:
+            metadata = import_service.collect_metadata(paths, csv_path or None)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, f"⚠️ {self.tm.get("common", "error")}", f"CSV non valido:\n\n{e}")
+            return
+
+        dialog = BatchMetadataDialog(metadata, self)
+        if dialog.exec() != QDialog.Accepted:
+            return
+        items = dialog.get_data()
+
+        self.import_progress = QProgressDialog("Importazione documenti...", None, 0, len(items), self)
+        self.import_progress.setWindowTitle("📥 Import multiplo")
+        self.import_progress.setWindowModality(Qt.WindowModal)
+        self.import_progress.setMinimumDuration(0)
+
+        self.import_thread = QThread(self)
+        self.import_worker = DocumentImportWorker(import_service, self.selected_property["id"], items)
+        self.import_worker.moveToThread(self.import_thread)
+        self.import_thread.started.connect(self.import_worker.run)
+        self.import_worker.progress.connect(self.on_import_progress)
+        self.import_worker.finished.connect(
+            lambda results: self.on_import_finished(import_service, results)
+        )
+        self.import_worker.finished.connect(self.import_thread.quit)
+        self.import_thread.finished.connect(self.import_worker.deleteLater)
+        self.import_thread.start()
+
+    def on_import_progress(self, done, total):
+        self.import_progress.setMaximum(total)
+        self.import_progress.setValue(done)
+
+    def on_import_finished(self, import_service, results):
+        """Riepilogo per file al termine dell'import"""
+        self.import_progress.close()
+
+        imported = [r for r in results if r['status'] == 'ok']
+        failed = [r for r in results if r['status'] != 'ok']
+        reused = sum(1 for r in imported if r['reused'])
+
+        report_path = import_service.write_report(results)
+
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Information if not failed else QMessageBox.Warning)
+        box.setWindowTitle("📥 Import multiplo")
+        box.setText(
+            f"✅ Importati: {len(imported)}\n"
+            f"♻️ Contenuti già in archivio (nessuna copia): {reused}\n"
+            f"❌ Errori: {len(failed)}\n\n"
+            f"📄 Report: {report_path}"
+        )
+        box.setDetailedText("\n".join(
+            f"{'OK ' if r['status'] == 'ok' else 'ERR'} {os.path.basename(r['file'])}"
+            f"{': ' + r['message'] if r['message'] else ''}"
+            for r in results
+        ))
+        box.exec()
+
+        if imported:
+            get_text_index(self.logger).schedule()
+        self.load_documents()
+
     def open_file(self, path):
         """ Apre il file con l'applicazione predefinita del sistema"""
         try:
+            # Documenti archiviati: estratto il solo file richiesto dal pacchetto
+            resolved = get_document_archiver(self.logger).resolve_path(path)
+            if resolved == path:
+                # Hardlink condiviso con il blob: copia privata modificabile
+                self.document_service.detach_document(path)
+            path = resolved
             QDesktopServices.openUrl(QUrl.fromLocalFile(path))
             self.logger.info(f"Apertura file: {path}")
         except Exception as e:
@@ -159,8 +159,7 @@ class PropertiesView(BaseView):
         num_uscite = len([t for t in transactions if t['type'] == 'Uscita'])
 
         # Conta documenti
-        docs = self.document_service.list_documents(property_id)
-        num_docs = len(docs)
+        num_docs = self.document_service.count_documents(property_id)
 
         # Conta scadenze attive e totali
         deadlines_active = self.deadline_service.get_all(property_id=property_id, include_completed=False)
@@ -11,7 +11,8 @@ from PySide6.QtWidgets import (
     QHeaderView
 )
 
-from dialogs import ExportDialog, TransactionDialogWithSuppliers
+from dialogs import ExportDialog, ExportJobsDialog, PortfolioReportDialog, DataExportDialog, \
+    StatementImportDialog, TransactionDialogWithSuppliers
 from services import supplier_service
 from services.export_service import ExportService
 from styles import *
@@ -32,6 +33,7 @@ class ReportView(BaseView):
 
         # Export service
         self.export_service = ExportService()
+        self.export_jobs_dialog = None
         self.supplier_service = supplier_service
 
         super().__init__(property_service, transaction_service, None, parent)
@@ -97,6 +99,30 @@ class ReportView(BaseView):
         export_btn.clicked.connect(self.open_export_dialog)
         actions_layout.addWidget(export_btn)
 
+        # Bottone coda/storico export
+        export_jobs_btn = QPushButton(f"🕘 {self.tm.get('report', 'export_history')}")
+        export_jobs_btn.setStyleSheet(default_export_button)
+        export_jobs_btn.clicked.connect(self.open_export_jobs)
+        actions_layout.addWidget(export_jobs_btn)
+
+        # Bottone rendiconti di portafoglio (tutte le proprietà in un batch)
+        portfolio_btn = QPushButton(f"🗂️ {self.tm.get('report', 'portfolio_reports')}")
+        portfolio_btn.setStyleSheet(default_export_button)
+        portfolio_btn.clicked.connect(self.open_portfolio_reports)
+        actions_layout.addWidget(portfolio_btn)
+
+        # Bottone export dati grezzi (CSV/Parquet)
+        data_export_btn = QPushButton(f"🧾 {self.tm.get('report', 'data_export')}")
+        data_export_btn.setStyleSheet(default_export_button)
+        data_export_btn.clicked.connect(self.open_data_export)
+        actions_layout.addWidget(data_export_btn)
+
+        # Bottone import estratto conto (CSV/OFX/CAMT.053)
+        import_statement_btn = QPushButton(f"🏦 {self.tm.get('report', 'import_statement')}")
+        import_statement_btn.setStyleSheet(default_export_button)
+        import_statement_btn.clicked.connect(self.open_statement_import)
+        actions_layout.addWidget(import_statement_btn)
+
         main_layout.addLayout(actions_layout)
 
         # --- TABELLE CATEGORIE IN ALTO ---
@@ -380,7 +406,29 @@ class ReportView(BaseView):
             self.tm,
             self
         )
-        dialog.exec()
+        if dialog.exec() and dialog.job_id is not None:
+            self.open_export_jobs()
+
+    def open_portfolio_reports(self):
+        """Apre il dialog dei rendiconti di portafoglio"""
+        PortfolioReportDialog(self.logger, self).exec()
+
+    def open_data_export(self):
+        """Apre il dialog dell'export dei dati grezzi"""
+        DataExportDialog(self.property_service, self.logger, self).exec()
+
+    def open_statement_import(self):
+        """Apre il dialog di import dell'estratto conto e aggiorna il report se sono arrivati movimenti"""
+        if StatementImportDialog(self.property_service, self.logger, self).exec():
+            self.update_report()
+
+    def open_export_jobs(self):
+        """Mostra gli export in corso e lo storico (finestra non modale)"""
+        if self.export_jobs_dialog is None:
+            self.export_jobs_dialog = ExportJobsDialog(self.logger, self)
+        self.export_jobs_dialog.refresh()
+        self.export_jobs_dialog.show()
+        self.export_jobs_dialog.raise_()
 
     def update_category_table(self, table, data, color):
         """Aggiorna tabella categorie SENZA riga totale"""
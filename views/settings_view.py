@@ -1,19 +1,107 @@
 import os
-import shutil
 from datetime import datetime
 
-from PySide6.QtCore import Qt, QPropertyAnimation, QEasingCurve, Property, QPoint
+from PySide6.QtCore import Qt, QPropertyAnimation, QEasingCurve, Property, QPoint, QTimer, QObject, QThread, Signal
 from PySide6.QtGui import QColor
 from PySide6.QtWidgets import (
     QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-    QFrame, QMessageBox, QFileDialog, QWidget, QGraphicsDropShadowEffect, QDialog
+    QFrame, QMessageBox, QFileDialog, QWidget, QGraphicsDropShadowEffect, QDialog, QProgressDialog
 )
 
+from services.archive_service import get_document_archiver
+from services.backup_service import get_backup_service, BackupError
+from services.document_watcher import get_document_watcher
+from services.export_job_service import get_export_jobs
+from services.orphan_gc_service import get_orphan_gc
+from services.preferences_service import PreferencesService
+from services.restore_service import RestoreService
 from views.base_view import BaseView
+from dialogs import RestoreBackupDialog, MaintenanceDialog
 from styles import *
 from translations_manager import get_translation_manager
 
 
+class DocumentArchiveWorker(QObject):
+    """Esegue l'archiviazione dei trimestri chiusi fuori dal thread GUI"""
+
+    progress = Signal(int, int)
+    finished = Signal(dict)
+
+    def __init__(self, archiver, years):
+        super().__init__()
+        self.archiver = archiver
+        self.years = years
+
+    def run(self):
+        result = self.archiver.archive(
+            self.years,
+            progress=lambda done, total: self.progress.emit(done, total)
+        )
+        self.finished.emit(result)
+
+
+class BackupWorker(QObject):
+    """Esegue backup o verifica dei backup fuori dal thread GUI"""
+
+    # fase, fatto, totale
+    progress = Signal(str, int, int)
+    # risultato, messaggio di errore ("" se nessuno)
+    finished = Signal(dict, str)
+
+    def __init__(self, service, verify_only=False, include_documents=False):
+        super().__init__()
+        self.service = service
+        self.verify_only = verify_only
+        self.include_documents = include_documents
+
+    def run(self):
+        report = lambda phase, done, total: self.progress.emit(phase, done, total)
+        try:
+            if self.verify_only:
+                result = {'verified': self.service.verify_all(progress=report)}
+            else:
+                result = self.service.create_backup(progress=report, include_documents=self.include_documents)
+        except BackupError as e:
+            self.finished.emit({}, str(e))
+            return
+        except Exception as e:
+            self.finished.emit({}, f"Errore imprevisto: {e}")
+            return
+        self.finished.emit(result, "")
+
+
+class RestoreWorker(QObject):
+    """Esegue il ripristino a caldo fuori dal thread GUI"""
+
+    # fase, fatto, totale
+    progress = Signal(str, int, int)
+    # risultato, messaggio di errore ("" se nessuno)
+    finished = Signal(dict, str)
+
+    def __init__(self, service, backup_id, path, documents):
+        super().__init__()
+        self.service = service
+        self.backup_id = backup_id
+        self.path = path
+        self.documents = documents
+
+    def run(self):
+        try:
+            result = self.service.restore(
+                backup_id=self.backup_id,
+                path=self.path,
+                documents=self.documents,
+                progress=lambda phase, done, total: self.progress.emit(phase, done, total)
+            )
+        except (BackupError, OSError) as e:
+            self.finished.emit({}, str(e))
+            return
+        except Exception as e:
+            self.finished.emit({}, f"Errore imprevisto: {e}")
+            return
+        self.finished.emit(result, "")
+
+
 class SettingItem(QFrame):
     """Widget personalizzato per ogni elemento delle impostazioni con animazioni"""
 
@@ -209,10 +297,11 @@ class SettingsSection(QWidget):
 class SettingsView(BaseView):
     """View per le impostazioni dell'applicazione - Versione migliorata"""
 
-    def __init__(self, property_service, transaction_service, logger, parent=None):
+    def __init__(self, property_service, transaction_service, document_service, logger, parent=None):
         self.logger = logger
         self.tm = get_translation_manager()
-        super().__init__(property_service, transaction_service, None, parent)
+        self.main_window = parent
+        super().__init__(property_service, transaction_service, document_service, parent)
 
     def setup_ui(self):
         """Costruisce l'interfaccia impostazioni"""
@@ -281,6 +370,20 @@ class SettingsView(BaseView):
             self.backup_database
         ))
 
+        db_section.add_item(SettingItem(
+            "🩺",
+            self.tm.get("settings", "verify_backups"),
+            self.tm.get("settings", "verify_backups_desc"),
+            self.verify_backups
+        ))
+
+        db_section.add_item(SettingItem(
+            "🧹",
+            self.tm.get("settings", "db_maintenance"),
+            self.tm.get("settings", "db_maintenance_desc"),
+            self.open_maintenance
+        ))
+
         db_section.add_item(SettingItem(
             "📥",
             self.tm.get("settings", "restore_db"),
@@ -314,6 +417,13 @@ class SettingsView(BaseView):
             self.clean_orphaned_folders
         ))
 
+        files_section.add_item(SettingItem(
+            "📦",
+            self.tm.get("settings", "archive_documents"),
+            self.tm.get("settings", "archive_documents_desc"),
+            self.archive_old_documents
+        ))
+
         scroll_layout.addWidget(files_section)
 
         # === SEZIONE INFO ===
@@ -482,69 +592,209 @@ class SettingsView(BaseView):
                 )
 
     def backup_database(self):
-        """Crea backup del database"""
-        try:
-            db_path = "property_manager.db"
-            if not os.path.exists(db_path):
-                QMessageBox.warning(self, self.tm.get("common", "error"), "Database non trovato!")
-                return
-
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            default_name = f"backup_property_manager_{timestamp}.db"
-
-            backup_path, _ = QFileDialog.getSaveFileName(
-                self,
-                "Salva Backup Database",
-                default_name,
-                "Database Files (*.db);;All Files (*)"
-            )
+        """Backup online del database (a passi, compresso e incrementale) nell'archivio backups/"""
+        service = get_backup_service(self.logger)
+        if not service.available():
+            QMessageBox.warning(self, self.tm.get("common", "error"),
+                                "Il backup è disponibile solo per il database SQLite locale.")
+            return
+        reply = QMessageBox.question(
+            self,
+            "💾 Backup",
+            "Includere anche i documenti?\n\n"
+            "Vengono salvati solo i file nuovi o modificati dall'ultimo backup completo.",
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+            QMessageBox.No
+        )
+        if reply == QMessageBox.Cancel:
+            return
+        self._run_backup_worker(service, verify_only=False, include_documents=reply == QMessageBox.Yes)
+
+    def verify_backups(self):
+        """Ricostruisce ogni backup dell'archivio ed esegue integrity_check"""
+        service = get_backup_service(self.logger)
+        if not service.list_backups():
+            QMessageBox.information(self, "🩺 Verifica backup", "Nessun backup da verificare.")
+            return
+        self._run_backup_worker(service, verify_only=True)
+
+    def _run_backup_worker(self, service, verify_only, include_documents=False):
+        phases = {'copia': "Copia del database", 'archivio': "Compressione blocchi", 'documenti': "Documenti",
+                  'verifica': "Verifica"}
+
+        self.backup_progress = QProgressDialog("Backup in corso...", None, 0, 0, self)
+        self.backup_progress.setWindowTitle("💾 Backup")
+        self.backup_progress.setWindowModality(Qt.WindowModal)
+        self.backup_progress.setMinimumDuration(0)
+
+        def on_progress(phase, done, total):
+            self.backup_progress.setLabelText(f"{phases.get(phase, phase)}...")
+            self.backup_progress.setMaximum(max(total, 1))
+            self.backup_progress.setValue(done)
+
+        self.backup_thread = QThread(self)
+        self.backup_worker = BackupWorker(service, verify_only, include_documents)
+        self.backup_worker.moveToThread(self.backup_thread)
+        self.backup_thread.started.connect(self.backup_worker.run)
+        self.backup_worker.progress.connect(on_progress)
+        self.backup_worker.finished.connect(
+            self.on_verify_finished if verify_only else self.on_backup_finished
+        )
+        self.backup_worker.finished.connect(self.backup_thread.quit)
+        self.backup_thread.finished.connect(self.backup_worker.deleteLater)
+        self.backup_thread.start()
+
+    def on_backup_finished(self, manifest, error):
+        self.backup_progress.close()
+        if error:
+            QMessageBox.critical(self, self.tm.get("common", "error"), f"Errore durante il backup:\n{error}")
+            return
+
+        service = get_backup_service(self.logger)
+        status = "✅ integrità verificata" if manifest['verified'] else \
+            f"⚠️ verifica non riuscita: {manifest.get('verify_message')}"
+        reply = QMessageBox.question(
+            self,
+            "✅ Backup Completato",
+            f"Database: {self.document_service.format_size(manifest['size'])}\n"
+            f"Blocchi nuovi: {manifest['new_blocks']}/{manifest['blocks_total']} "
+            f"({self.document_service.format_size(manifest['stored_bytes'])} scritti)\n"
+            f"Archivio backup: {len(service.list_backups())} backup, "
+            f"{self.document_service.format_size(service.archive_size())}\n"
+            f"{status}\n\n"
+            f"Vuoi salvarne anche una copia compressa in un'altra posizione?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
 
-            if backup_path:
-                shutil.copy2(db_path, backup_path)
-                QMessageBox.information(
-                    self,
-                    "✅ Backup Completato",
-                    f"Database salvato con successo!\n\n📁 {backup_path}"
-                )
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Salva Copia del Backup",
+            f"{manifest['id']}.db.gz",
+            "Backup compresso (*.db.gz);;All Files (*)"
+        )
+        if path:
+            try:
+                service.export_copy(manifest['id'], path)
+                QMessageBox.information(self, "✅ Copia salvata", f"📁 {path}")
+            except (BackupError, OSError) as e:
+                QMessageBox.critical(self, self.tm.get("common", "error"), f"Errore durante la copia:\n{e}")
+
+    def on_verify_finished(self, result, error):
+        self.backup_progress.close()
+        if error:
+            QMessageBox.critical(self, self.tm.get("common", "error"), f"Errore durante la verifica:\n{error}")
+            return
+
+        verified = result['verified']
+        failed = {backup_id: message for backup_id, (ok, message) in verified.items() if not ok}
+        if not failed:
+            QMessageBox.information(self, "🩺 Verifica backup", f"Tutti i {len(verified)} backup sono integri.")
+            return
+        QMessageBox.warning(
+            self,
+            "🩺 Verifica backup",
+            f"{len(failed)} backup su {len(verified)} non sono validi:\n\n"
+            + "\n".join(f"  • {backup_id}: {message}" for backup_id, message in failed.items())
+        )
 
-        except Exception as e:
-            QMessageBox.critical(self, self.tm.get("common", "error"), f"Errore durante il backup:\n{str(e)}")
+    def open_maintenance(self):
+        """Storico della manutenzione del database (tempi, spazio recuperato) ed esecuzione manuale"""
+        if not get_backup_service(self.logger).available():
+            QMessageBox.warning(self, self.tm.get("common", "error"),
+                                "La manutenzione è disponibile solo per il database SQLite locale.")
+            return
+        MaintenanceDialog(self.logger, self).exec()
 
     def restore_database(self):
-        """Ripristina database da backup"""
+        """Ripristino a caldo da un backup dell'archivio o da file, senza riavviare"""
+        service = get_backup_service(self.logger)
+        if not service.available():
+            QMessageBox.warning(self, self.tm.get("common", "error"),
+                                "Il ripristino è disponibile solo per il database SQLite locale.")
+            return
+        if get_export_jobs(self.logger).has_active():
+            QMessageBox.warning(self, "♻️ Ripristino",
+                                "Ci sono export in corso: attendi che terminino o annullali prima del ripristino.")
+            return
+
+        dialog = RestoreBackupDialog(self.logger, self)
+        if dialog.exec() != QDialog.Accepted:
+            return
+        backup_id, path = dialog.source()
+        documents = dialog.documents()
+
         reply = QMessageBox.question(
             self,
             "⚠️ Conferma Ripristino",
             "Sei sicuro di voler ripristinare il database?\n\n"
-            "⚠️ ATTENZIONE: Tutti i dati attuali verranno sovrascritti!\n"
-            "Questa operazione è IRREVERSIBILE!\n\n"
-            "Assicurati di aver fatto un backup prima di procedere.",
+            "I dati attuali verranno sostituiti da quelli del backup"
+            + (" (documenti compresi)" if documents else "") + ".\n"
+            "Lo stato attuale viene prima salvato nell'archivio come backup «pre-ripristino».",
             QMessageBox.Yes | QMessageBox.No,
             QMessageBox.No
         )
-
-        if reply == QMessageBox.Yes:
-            try:
-                backup_path, _ = QFileDialog.getOpenFileName(
-                    self,
-                    "Seleziona Backup Database",
-                    "",
-                    "Database Files (*.db);;All Files (*)"
-                )
-
-                if backup_path:
-                    db_path = "property_manager.db"
-                    shutil.copy2(backup_path, db_path)
-
-                    QMessageBox.information(
-                        self,
-                        "✅ Ripristino Completato",
-                        "Database ripristinato con successo!\n\n"
-                        "⚠️ Riavvia l'applicazione per applicare le modifiche."
-                    )
-
-            except Exception as e:
-                QMessageBox.critical(self, self.tm.get("common", "error"), f"Errore durante il ripristino:\n{str(e)}")
+        if reply != QMessageBox.Yes:
+            return
+
+        phases = {'preparazione': "Preparazione del backup", 'documenti': "Estrazione documenti",
+                  'copia': "Salvataggio dello stato attuale", 'archivio': "Salvataggio dello stato attuale"}
+
+        self.restore_progress = QProgressDialog("Ripristino in corso...", None, 0, 0, self)
+        self.restore_progress.setWindowTitle("♻️ Ripristino")
+        self.restore_progress.setWindowModality(Qt.ApplicationModal)
+        self.restore_progress.setMinimumDuration(0)
+
+        def on_progress(phase, done, total):
+            self.restore_progress.setLabelText(f"{phases.get(phase, phase)}...")
+            self.restore_progress.setMaximum(max(total, 1))
+            self.restore_progress.setValue(done)
+
+        # Le cartelle osservate bloccherebbero il rename di docs/ (Windows)
+        self.restore_documents = documents
+        if documents:
+            get_document_watcher(self.logger).unwatch()
+
+        self.restore_thread = QThread(self)
+        self.restore_worker = RestoreWorker(RestoreService(self.logger), backup_id, path, documents)
+        self.restore_worker.moveToThread(self.restore_thread)
+        self.restore_thread.started.connect(self.restore_worker.run)
+        self.restore_worker.progress.connect(on_progress)
+        self.restore_worker.finished.connect(self.on_restore_finished)
+        self.restore_worker.finished.connect(self.restore_thread.quit)
+        self.restore_thread.finished.connect(self.restore_worker.deleteLater)
+        self.restore_thread.start()
+
+    def on_restore_finished(self, result, error):
+        self.restore_progress.close()
+        if error:
+            if self.restore_documents:
+                get_document_watcher(self.logger).rewatch()
+            QMessageBox.critical(self, self.tm.get("common", "error"),
+                                 f"Ripristino non eseguito, il database attuale non è stato modificato:\n{error}")
+            return
+
+        counts = result['counts']
+        message = (
+            f"Database ripristinato in {result['duration']:.1f} s.\n\n"
+            f"Proprietà: {counts.get('properties', 0)}\n"
+            f"Transazioni: {counts.get('transactions', 0):,}\n"
+            f"Documenti indicizzati: {counts.get('documents', 0):,}\n"
+        )
+        if result['documents'] is not None:
+            message += f"\nFile ripristinati: {result['documents']:,}\n" \
+                       f"Cartella precedente: {result['previous_docs']}\n"
+        message += f"\nStato precedente salvato come backup {result['safety_backup']}."
+        if result['warnings']:
+            message += "\n\nAvvisi:\n" + "\n".join(f"  • {warning}" for warning in result['warnings'][:10])
+
+        # Le viste e i servizi in memoria si riallineano al nuovo database (questa vista compresa)
+        main_window = self.main_window
+        QMessageBox.information(self, "✅ Ripristino Completato", message)
+        if main_window is not None and hasattr(main_window, 'on_database_restored'):
+            main_window.on_database_restored()
 
     def open_exports_folder(self):
         """Apri cartella export"""
@@ -590,49 +840,17 @@ class SettingsView(BaseView):
             QMessageBox.critical(self, self.tm.get("common", "error"), f"Errore durante la pulizia:\n{str(e)}")
 
     def clean_orphaned_folders(self):
-        """Pulisce cartelle documenti senza proprietà associate"""
-        try:
-            docs_dir = "docs"
-            if not os.path.exists(docs_dir):
-                QMessageBox.information(self, "Info", "Nessuna cartella documenti trovata.")
-                return
-
-            properties = self.property_service.get_all()
-            valid_property_ids = {prop['id'] for prop in properties}
-
-            orphaned_folders = []
-            total_size = 0
+        """Pulisce cartelle documenti senza proprietà associate (report a secco, poi in background)"""
+        gc = get_orphan_gc(self.logger)
+        if gc.status()['running']:
+            self.show_orphan_gc_progress()
+            return
 
-            for folder_name in os.listdir(docs_dir):
-                folder_path = os.path.join(docs_dir, folder_name)
-
-                if not os.path.isdir(folder_path):
-                    continue
-
-                if folder_name.startswith("property_"):
-                    try:
-                        property_id = int(folder_name.split("_")[1])
-
-                        if property_id not in valid_property_ids:
-                            folder_size = 0
-                            for root, dirs, files in os.walk(folder_path):
-                                for file in files:
-                                    file_path = os.path.join(root, file)
-                                    if os.path.exists(file_path):
-                                        folder_size += os.path.getsize(file_path)
-
-                            orphaned_folders.append({
-                                'name': folder_name,
-                                'path': folder_path,
-                                'size': folder_size,
-                                'property_id': property_id
-                            })
-                            total_size += folder_size
-
-                    except (ValueError, IndexError):
-                        continue
+        try:
+            # Confronto proprietà valide / cartelle / indice: nessuna visita degli alberi
+            orphans = gc.find_orphans()
 
-            if not orphaned_folders:
+            if not orphans:
                 QMessageBox.information(
                     self,
                     f"✅ {self.tm.get("common", "success")}",
@@ -641,62 +859,147 @@ class SettingsView(BaseView):
                 )
                 return
 
-            def format_size(size_bytes):
-                if size_bytes == 0:
-                    return "0 B"
-                units = ['B', 'KB', 'MB', 'GB']
-                unit_index = 0
-                size = float(size_bytes)
-                while size >= 1024 and unit_index < len(units) - 1:
-                    size /= 1024
-                    unit_index += 1
-                return f"{size:.2f} {units[unit_index]}"
+            report_path = gc.write_report(orphans)
 
-            total_size_str = format_size(total_size)
+            def describe(orphan):
+                name = os.path.basename(orphan['path'])
+                size = "dimensione non indicizzata" if orphan['bytes_total'] is None \
+                    else self.document_service.format_size(orphan['bytes_total'])
+                if orphan['queued']:
+                    return (f"  • {name} ({size}) - in coda, "
+                            f"{orphan['files_deleted']} file già eliminati")
+                return f"  • {name} ({size})"
 
-            orphaned_list = "\n".join([
-                f"  • {f['name']} ({format_size(f['size'])})"
-                for f in orphaned_folders
-            ])
+            shown = orphans[:15]
+            orphaned_list = "\n".join(describe(o) for o in shown)
+            if len(orphans) > len(shown):
+                orphaned_list += f"\n  … e altre {len(orphans) - len(shown)}"
+
+            total_size = sum(o['bytes_total'] or 0 for o in orphans)
 
             reply = QMessageBox.question(
                 self,
                 "🗑️ Cartelle Orfane Trovate",
-                f"Trovate {len(orphaned_folders)} cartelle senza proprietà associate:\n\n"
+                f"Trovate {len(orphans)} cartelle senza proprietà associate:\n\n"
                 f"{orphaned_list}\n\n"
-                f"Spazio totale occupato: {total_size_str}\n\n"
+                f"Spazio indicizzato: {self.document_service.format_size(total_size)}\n"
+                f"📄 Report: {report_path}\n\n"
+                f"L'eliminazione avviene in background e a blocchi: se chiudi l'app\n"
+                f"riprende al prossimo avvio.\n\n"
                 f"⚠️ Vuoi eliminarle definitivamente?",
                 QMessageBox.Yes | QMessageBox.No,
                 QMessageBox.No
             )
 
             if reply == QMessageBox.Yes:
-                deleted_count = 0
-                deleted_size = 0
-                errors = []
-
-                for folder_info in orphaned_folders:
-                    try:
-                        shutil.rmtree(folder_info['path'])
-                        deleted_count += 1
-                        deleted_size += folder_info['size']
-                    except Exception as e:
-                        errors.append(f"{folder_info['name']}: {str(e)}")
-
-                result_message = (
-                    f"✅ Pulizia completata!\n\n"
-                    f"Cartelle eliminate: {deleted_count}/{len(orphaned_folders)}\n"
-                    f"Spazio liberato: {format_size(deleted_size)}"
-                )
-
-                if errors:
-                    result_message += f"\n\n⚠️ Errori:\n" + "\n".join(errors)
-
-                QMessageBox.information(self, "Pulizia Completata", result_message)
+                gc.enqueue(orphans)
+                gc.start()
+                self.show_orphan_gc_progress()
 
         except Exception as e:
             QMessageBox.critical(
                 self,
                 f"❌ {self.tm.get("common", "error")}",
                 f"Errore durante la pulizia:\n\n{str(e)}"
-            )
\ No newline at end of file
+            )
+
+    def show_orphan_gc_progress(self):
+        """Avanzamento dell'eliminazione (non modale, aggiornato con un timer)"""
+        gc = get_orphan_gc(self.logger)
+
+        self.gc_progress = QProgressDialog("Eliminazione cartelle orfane...", "Interrompi", 0, 0, self)
+        self.gc_progress.setWindowTitle("🗑️ Pulizia cartelle orfane")
+        self.gc_progress.setWindowModality(Qt.NonModal)
+        self.gc_progress.setMinimumDuration(0)
+        self.gc_progress.setAutoClose(False)
+        self.gc_progress.setAutoReset(False)
+        self.gc_progress.canceled.connect(lambda: gc.stop(timeout=0))
+        self.gc_progress.show()
+
+        self.gc_timer = QTimer(self)
+        self.gc_timer.setInterval(300)
+        self.gc_timer.timeout.connect(self.update_orphan_gc_progress)
+        self.gc_timer.start()
+
+    def update_orphan_gc_progress(self):
+        """Aggiorna il dialog dallo stato del GC; riepilogo al termine"""
+        status = get_orphan_gc(self.logger).status()
+
+        self.gc_progress.setMaximum(max(status['folders_total'], 1))
+        self.gc_progress.setValue(status['folders_done'])
+        self.gc_progress.setLabelText(
+            f"Cartelle: {status['folders_done']}/{status['folders_total']}\n"
+            f"File eliminati: {status['files_deleted']} "
+            f"({self.document_service.format_size(status['bytes_deleted'])})"
+        )
+
+        if status['running']:
+            return
+
+        self.gc_timer.stop()
+        self.gc_progress.close()
+
+        message = (
+            f"Cartelle eliminate: {status['folders_done']}/{status['folders_total']}\n"
+            f"File eliminati: {status['files_deleted']}\n"
+            f"Spazio liberato: {self.document_service.format_size(status['bytes_deleted'])}"
+        )
+        if status['folders_done'] < status['folders_total']:
+            message += "\n\n⏸️ Interrotta: riprenderà al prossimo avvio."
+        elif status['blobs_deleted']:
+            message += f"\nBlob non più usati rimossi: {status['blobs_deleted']}"
+
+        QMessageBox.information(self, "Pulizia Completata", message)
+
+    def archive_old_documents(self):
+        """Archivia in pacchetti zip i documenti dei trimestri chiusi più vecchi"""
+        archiver = get_document_archiver(self.logger)
+        years = PreferencesService(self.logger).get_archive_after_years()
+
+        groups = archiver.candidates(years)
+        if not groups:
+            QMessageBox.information(
+                self,
+                "📦 Archiviazione",
+                f"Nessun documento di trimestri chiusi da più di {years} anni da archiviare."
+            )
+            return
+
+        documents = sum(len(rows) for rows in groups.values())
+        reply = QMessageBox.question(
+            self,
+            "📦 Archiviazione",
+            f"{documents} documenti di trimestri chiusi da più di {years} anni\n"
+            f"verranno compressi in {len(groups)} pacchetti (uno per proprietà e anno).\n\n"
+            f"I documenti restano visibili e apribili dalla sezione Documenti.\n\n"
+            f"Procedere?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+
+        self.archive_progress = QProgressDialog("Archiviazione documenti...", None, 0, len(groups), self)
+        self.archive_progress.setWindowTitle("📦 Archiviazione")
+        self.archive_progress.setWindowModality(Qt.WindowModal)
+        self.archive_progress.setMinimumDuration(0)
+
+        self.archive_thread = QThread(self)
+        self.archive_worker = DocumentArchiveWorker(archiver, years)
+        self.archive_worker.moveToThread(self.archive_thread)
+        self.archive_thread.started.connect(self.archive_worker.run)
+        self.archive_worker.progress.connect(lambda done, total: self.archive_progress.setValue(done))
+        self.archive_worker.finished.connect(self.on_archive_finished)
+        self.archive_worker.finished.connect(self.archive_thread.quit)
+        self.archive_thread.finished.connect(self.archive_worker.deleteLater)
+        self.archive_thread.start()
+
+    def on_archive_finished(self, result):
+        self.archive_progress.close()
+        QMessageBox.information(
+            self,
+            "📦 Archiviazione completata",
+            f"Documenti archiviati: {result['documents']}\n"
+            f"Pacchetti scritti: {result['packs']}\n"
+            f"Dimensione: {self.document_service.format_size(result['bytes_before'])} → "
+            f"{self.document_service.format_size(result['bytes_packed'])}"
+        )
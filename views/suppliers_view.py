@@ -8,6 +8,7 @@ from PySide6.QtCore import Qt, QUrl, QSize
 from PySide6.QtGui import QColor, QDesktopServices, QIcon
 
 from views.base_view import BaseView
+from dialogs import LazyThumbnailLoader
 from styles import *
 from translations_manager import get_translation_manager
 from validation_utils import validate_required_text, ValidationError
@@ -642,14 +643,19 @@ class SupplierDetailsDialog(QDialog):
                 }}
             """)
             
+            # Miniature caricate in background solo per le righe visibili
+            thumbnail_loader = LazyThumbnailLoader(docs_list, size=80)
+
             for doc in documents:
                 item_widget = self.create_document_item(doc)
                 item = QListWidgetItem()
                 item.setSizeHint(item_widget.sizeHint())
                 docs_list.addItem(item)
                 docs_list.setItemWidget(item, item_widget)
+                thumbnail_loader.register(item, item_widget.thumb_label, doc['file_path'])
             
             layout.addWidget(docs_list)
+            thumbnail_loader.schedule()
         
         return widget
     
@@ -669,7 +675,10 @@ class SupplierDetailsDialog(QDialog):
         
         icon_label = QLabel(icon)
         icon_label.setStyleSheet("font-size: 24px;")
+        icon_label.setFixedSize(40, 40)
+        icon_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(icon_label)
+        widget.thumb_label = icon_label  # Sostituita dalla miniatura quando visibile
         
         # Info documento
         info_layout = QVBoxLayout()
@@ -845,6 +854,19 @@ class SuppliersView(BaseView):
         header_layout.addWidget(title)
         header_layout.addStretch()
 
+        link_btn = QPushButton("🔗 Collega Transazioni")
+        link_btn.setStyleSheet(default_export_button)
+        link_btn.setFixedHeight(36)
+        link_btn.setToolTip("Collega ai fornitori le transazioni registrate solo con il nome")
+        link_btn.clicked.connect(self.link_transactions)
+        header_layout.addWidget(link_btn)
+
+        duplicates_btn = QPushButton("🧬 Trova Duplicati")
+        duplicates_btn.setStyleSheet(default_export_button)
+        duplicates_btn.setFixedHeight(36)
+        duplicates_btn.clicked.connect(self.merge_duplicates)
+        header_layout.addWidget(duplicates_btn)
+
         add_btn = QPushButton("+ Aggiungi Fornitore")
         add_btn.setStyleSheet(default_aggiungi_button)
         add_btn.setFixedHeight(36)
@@ -1170,6 +1192,22 @@ class SuppliersView(BaseView):
                 notes = notes_input.toPlainText().strip() or None
                 rating = rating_spin.value() if rating_spin.value() > 0 else None
 
+                # Avvisa se esiste già un fornitore molto simile
+                from services.supplier_dedup_service import SupplierDedupService
+                similar = SupplierDedupService(self.logger).find_similar(name, phone, email, property_id)
+                if similar:
+                    similar_list = "\n".join(f"  • {s_name}" for _, _, s_name in similar[:5])
+                    reply = QMessageBox.question(
+                        self,
+                        "⚠️ Possibile Duplicato",
+                        f"Esistono già fornitori simili a '{name}':\n\n{similar_list}\n\n"
+                        f"Vuoi crearlo comunque?",
+                        QMessageBox.Yes | QMessageBox.No,
+                        QMessageBox.No
+                    )
+                    if reply != QMessageBox.Yes:
+                        return
+
                 supplier_id = self.supplier_service.create(
                     name=name,
                     category=category,
@@ -1347,3 +1385,75 @@ class SuppliersView(BaseView):
                     "❌ Errore",
                     "Impossibile eliminare il fornitore."
                 )
+
+    def link_transactions(self):
+        """Collega in blocco le transazioni storiche ai fornitori"""
+        from services.supplier_link_service import SupplierLinkService
+
+        reply = QMessageBox.question(
+            self,
+            "🔗 Collega Transazioni",
+            "Vuoi collegare automaticamente le transazioni senza fornitore "
+            "ai fornitori registrati?\n\n"
+            "I casi ambigui non verranno modificati e saranno salvati in un report.",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+
+        if reply != QMessageBox.Yes:
+            return
+
+        link_service = SupplierLinkService(self.logger)
+        result = link_service.link_transactions(self.current_property_id)
+        report_path = link_service.write_review_report(result)
+
+        message = (
+            f"✅ Transazioni collegate: {result['linked']}\n"
+            f"⚠️ Nomi ambigui: {len(result['ambiguous'])}\n"
+            f"❓ Nomi senza corrispondenza: {result['unmatched']}"
+        )
+        if report_path:
+            message += f"\n\n📁 Report da rivedere:\n{report_path}"
+
+        QMessageBox.information(self, "🔗 Collegamento Completato", message)
+        self.load_suppliers()
+
+    def merge_duplicates(self):
+        """Propone l'unione dei gruppi di fornitori duplicati"""
+        from services.supplier_dedup_service import SupplierDedupService
+
+        dedup_service = SupplierDedupService(self.logger)
+        groups = dedup_service.find_duplicates()
+
+        if not groups:
+            QMessageBox.information(self, "✅ Nessun Duplicato", "Non sono stati trovati fornitori duplicati.")
+            return
+
+        merged_groups = 0
+        for group in groups:
+            keep_name = group['names'][group['supplier_ids'].index(group['keep_id'])]
+            names_list = "\n".join(f"  • {name}" for name in group['names'])
+
+            reply = QMessageBox.question(
+                self,
+                "🧬 Fornitori Duplicati",
+                f"Questi fornitori sembrano duplicati (somiglianza {group['score']:.0%}):\n\n"
+                f"{names_list}\n\n"
+                f"Vuoi unirli in '{keep_name}'?\n"
+                f"Transazioni, recensioni e documenti verranno spostati.",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+                QMessageBox.No
+            )
+
+            if reply == QMessageBox.Cancel:
+                break
+            if reply == QMessageBox.Yes:
+                if dedup_service.merge(group['keep_id'], group['supplier_ids']):
+                    merged_groups += 1
+                else:
+                    QMessageBox.warning(self, "❌ Errore", f"Impossibile unire i fornitori di '{keep_name}'.")
+
+        if merged_groups:
+            QMessageBox.information(self, "✅ Successo", f"Gruppi di fornitori uniti: {merged_groups}")
+            self.populate_categories()
+            self.load_suppliers()